@@ -23,6 +23,7 @@ from alert_manager.model import (
     Alert, VwapAlert, KlineData, AlertsCollection,
 )
 from .storage import AlertStorage
+from candle_columns import as_records
 
 # Импортируем (асинхронный) модуль отправки
 from . import telegram_sender 
@@ -160,7 +161,7 @@ async def run_alert_checks(
     logger.info("[ALERT_CHECKER] Запуск проверки алертов для 1h...")
     
     klines_map: Dict[str, List[KlineData]] = {
-        coin.get("symbol"): coin.get("data", [])
+        coin.get("symbol"): as_records(coin.get("data"))
         for coin in cache_data.get("data", [])
         if coin.get("symbol")
     }
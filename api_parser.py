@@ -3,7 +3,11 @@
 Этот модуль отвечает за ПАРСИНГ сырых ответов API от бирж
 и приведение их к ЕДИНОМУ внутреннему формату.
 
-Единый формат:
+Основные парсеры (parse_{exchange}_{type}) - векторные: весь ответ
+переводится в типизированные numpy-колонки (CandleColumns) за один проход.
+
+Построчные парсеры (parse_{exchange}_{type}_rows) возвращают старый формат
+и оставлены как эталон (тесты, бенчмарк bench_api_parser.py):
 Klines: [{'openTime': int, 'openPrice': float, 'highPrice': float, 'lowPrice': float, 'closePrice': float, 'volume': float, 'closeTime': int, 'volumeDelta': float (optional)}]
 OI:     [{'openTime': int, 'openInterest': float, 'closeTime': int}]
 FR:     [{'openTime': int, 'fundingRate': float, 'closeTime': int}]
@@ -12,6 +16,11 @@ FR:     [{'openTime': int, 'fundingRate': float, 'closeTime': int}]
 import logging
 from typing import List, Dict, Any, Optional
 
+import numpy as np
+
+from api_helpers import get_interval_duration_ms
+from candle_columns import CandleColumns
+
 # --- Используем логгер из родительского пакета ---
 try:
     from .logging_setup import logger
@@ -20,9 +29,13 @@ except ImportError:
     import logging
     logger = logging.getLogger(__name__)
 
+# ============================================================================
+# === ПОСТРОЧНЫЕ ПАРСЕРЫ (старый формат: список словарей) ===
+# ============================================================================
+
 # --- BINANCE Parsers ---
 
-def parse_binance_klines(raw_data: List[List[Any]], timeframe: str) -> List[Dict[str, Any]]:
+def parse_binance_klines_rows(raw_data: List[List[Any]], timeframe: str) -> List[Dict[str, Any]]:
     """
     Парсит Klines (свечи) от Binance.
     Формат Binance: [openTime, open, high, low, close, volume, closeTime, ..., takerBuyBaseAssetVolume (idx 9), ...]
@@ -74,7 +87,7 @@ def parse_binance_klines(raw_data: List[List[Any]], timeframe: str) -> List[Dict
         logger.error(f"BINANCE_PARSER (klines): Ошибка парсинга Klines: {e}. Raw data (sample): {str(raw_data)[:200]}...", exc_info=True)
         return []
 
-def parse_binance_oi(raw_data: List[Dict[str, str]], timeframe: str) -> List[Dict[str, Any]]:
+def parse_binance_oi_rows(raw_data: List[Dict[str, str]], timeframe: str) -> List[Dict[str, Any]]:
     """
     Парсит Open Interest (OI) от Binance.
     """
@@ -101,7 +114,7 @@ def parse_binance_oi(raw_data: List[Dict[str, str]], timeframe: str) -> List[Dic
         logger.error(f"BINANCE_PARSER (oi): Ошибка парсинга OI: {e}. Raw data (sample): {str(raw_data)[:200]}...", exc_info=True)
         return []
 
-def parse_binance_fr(raw_data: List[Dict[str, str]], timeframe: str) -> List[Dict[str, Any]]:
+def parse_binance_fr_rows(raw_data: List[Dict[str, str]], timeframe: str) -> List[Dict[str, Any]]:
     """
     Парсит Funding Rate (FR) от Binance.
     """
@@ -130,16 +143,13 @@ def parse_binance_fr(raw_data: List[Dict[str, str]], timeframe: str) -> List[Dic
 
 # --- BYBIT Parsers ---
 
-def parse_bybit_klines(raw_data: List[List[str]], timeframe: str) -> List[Dict[str, Any]]:
+def parse_bybit_klines_rows(raw_data: List[List[str]], timeframe: str) -> List[Dict[str, Any]]:
     """
     Парсит Klines (свечи) от Bybit V5.
     Bybit НЕ предоставляет taker volume, поэтому volumeDelta будет None (kline.get() вернет None).
     """
     parsed_klines = []
     try:
-        # Импортируем локально, чтобы избежать циклической зависимости
-        from ..api_helpers import get_interval_duration_ms
-
         for kline in raw_data:
             if len(kline) < 6:
                 logger.warning(f"BYBIT_PARSER (klines): Пропущена свеча, неполные данные: {kline}")
@@ -167,7 +177,7 @@ def parse_bybit_klines(raw_data: List[List[str]], timeframe: str) -> List[Dict[s
         logger.error(f"BYBIT_PARSER (klines): Ошибка парсинга Klines: {e}. Raw data (sample): {str(raw_data)[:200]}...", exc_info=True)
         return []
 
-def parse_bybit_oi(raw_data: List[Dict[str, str]], timeframe: str) -> List[Dict[str, Any]]:
+def parse_bybit_oi_rows(raw_data: List[Dict[str, str]], timeframe: str) -> List[Dict[str, Any]]:
     """
     Парсит Open Interest (OI) от Bybit V5.
     """
@@ -185,7 +195,7 @@ def parse_bybit_oi(raw_data: List[Dict[str, str]], timeframe: str) -> List[Dict[
         logger.error(f"BYBIT_PARSER (oi): Ошибка парсинга OI: {e}. Raw data (sample): {str(raw_data)[:200]}...", exc_info=True)
         return []
 
-def parse_bybit_fr(raw_data: List[Dict[str, str]], timeframe: str) -> List[Dict[str, Any]]:
+def parse_bybit_fr_rows(raw_data: List[Dict[str, str]], timeframe: str) -> List[Dict[str, Any]]:
     """
     Парсит Funding Rate (FR) от Bybit V5.
     """
@@ -201,4 +211,182 @@ def parse_bybit_fr(raw_data: List[Dict[str, str]], timeframe: str) -> List[Dict[
         return parsed_fr[::-1]
     except (ValueError, TypeError, KeyError) as e:
         logger.error(f"BYBIT_PARSER (fr): Ошибка парсинга FR: {e}. Raw data (sample): {str(raw_data)[:200]}...", exc_info=True)
-        return []
\ No newline at end of file
+        return []
+
+
+# ============================================================================
+# === ВЕКТОРНЫЕ ПАРСЕРЫ (CandleColumns) ===
+# ============================================================================
+
+def _rows_matrix(rows: List[List[Any]], width: int) -> np.ndarray:
+    """Список строк ответа -> object-матрица (rows x width)."""
+    if all(len(row) == len(rows[0]) for row in rows):
+        matrix = np.array(rows, dtype=object)
+        return matrix[:, :width]
+    return np.array([row[:width] for row in rows], dtype=object)
+
+
+def _float_or_nan(column: np.ndarray) -> np.ndarray:
+    """astype(float64), но битые значения -> NaN (а не ошибка для всего ответа)."""
+    try:
+        return column.astype(np.float64)
+    except (ValueError, TypeError):
+        result = np.full(len(column), np.nan)
+        for i, value in enumerate(column):
+            try:
+                result[i] = float(value)
+            except (ValueError, TypeError):
+                pass
+        return result
+
+
+def _point_columns(times: List[Any], values: List[Any], field: str) -> CandleColumns:
+    """Колонки OI/FR: openTime, значение и closeTime = openTime + 1."""
+    open_time = np.array(times, dtype=object).astype(np.int64)
+    return CandleColumns({
+        'openTime': open_time,
+        field: np.array(values, dtype=object).astype(np.float64),
+        'closeTime': open_time + 1,
+    })
+
+
+# --- BINANCE Parsers ---
+
+def parse_binance_klines(raw_data: List[List[Any]], timeframe: str) -> CandleColumns:
+    """
+    Векторный парсер Klines от Binance (см. parse_binance_klines_rows).
+    volumeDelta = 2 * takerBuyBaseAssetVolume (idx 9) - volume.
+    """
+    # Защита от ошибочного роутинга (данные OI/FR по Klines URL)
+    is_dict = raw_data and isinstance(raw_data[0], dict)
+    if is_dict and ('sumOpenInterest' in raw_data[0] or 'fundingRate' in raw_data[0]):
+        logger.critical("BINANCE_PARSER (klines): КРИТИЧЕСКАЯ ОШИБКА: Получены данные OI/FR по Klines URL. Отклоняю.")
+        return CandleColumns.empty()
+
+    try:
+        rows = []
+        for kline in raw_data:
+            if not isinstance(kline, list):
+                continue
+            if len(kline) < 10:
+                logger.warning(f"BINANCE_PARSER (klines): Пропущена свеча, неполные данные (меньше 10 полей): {kline}")
+                continue
+            rows.append(kline)
+        if not rows:
+            return CandleColumns.empty()
+
+        matrix = _rows_matrix(rows, 10)
+        prices = matrix[:, 1:6].astype(np.float64)
+        volume = prices[:, 4]
+        return CandleColumns({
+            'openTime': matrix[:, 0].astype(np.int64),
+            'openPrice': prices[:, 0],
+            'highPrice': prices[:, 1],
+            'lowPrice': prices[:, 2],
+            'closePrice': prices[:, 3],
+            'volume': volume,
+            'closeTime': matrix[:, 6].astype(np.int64),
+            'volumeDelta': 2 * _float_or_nan(matrix[:, 9]) - volume,
+        })
+    except (ValueError, TypeError, IndexError) as e:
+        logger.error(f"BINANCE_PARSER (klines): Ошибка парсинга Klines: {e}. Raw data (sample): {str(raw_data)[:200]}...", exc_info=True)
+        return CandleColumns.empty()
+
+
+def parse_binance_oi(raw_data: List[Dict[str, str]], timeframe: str) -> CandleColumns:
+    """Векторный парсер Open Interest (OI) от Binance."""
+    try:
+        times, values = [], []
+        for item in raw_data:
+            open_time = item.get("timestamp") or item.get("fundingTime")
+            oi_value = item.get("sumOpenInterest")
+            # Пропускаем, если не хватает ключевых полей для OI
+            if open_time is None or oi_value is None:
+                continue
+            times.append(open_time)
+            values.append(oi_value)
+        if not times:
+            return CandleColumns.empty()
+        return _point_columns(times, values, 'openInterest')
+    except (ValueError, TypeError, KeyError, AttributeError) as e:
+        logger.error(f"BINANCE_PARSER (oi): Ошибка парсинга OI: {e}. Raw data (sample): {str(raw_data)[:200]}...", exc_info=True)
+        return CandleColumns.empty()
+
+
+def parse_binance_fr(raw_data: List[Dict[str, str]], timeframe: str) -> CandleColumns:
+    """Векторный парсер Funding Rate (FR) от Binance."""
+    # Защита FR-парсера от данных OI
+    is_dict = raw_data and isinstance(raw_data[0], dict)
+    if is_dict and 'sumOpenInterest' in raw_data[0]:
+        logger.critical("BINANCE_PARSER (fr): КРИТИЧЕСКАЯ ОШИБКА: Получены данные OI по FR URL. Отклоняю.")
+        return CandleColumns.empty()
+
+    try:
+        if not raw_data:
+            return CandleColumns.empty()
+        times = [item["fundingTime"] for item in raw_data]
+        values = [item["fundingRate"] for item in raw_data]
+        return _point_columns(times, values, 'fundingRate')
+    except (ValueError, TypeError, KeyError) as e:
+        logger.error(f"BINANCE_PARSER (fr): Ошибка парсинга FR: {e}. Raw data (sample): {str(raw_data)[:200]}...", exc_info=True)
+        return CandleColumns.empty()
+
+
+# --- BYBIT Parsers ---
+
+def parse_bybit_klines(raw_data: List[List[str]], timeframe: str) -> CandleColumns:
+    """
+    Векторный парсер Klines от Bybit V5.
+    volumeDelta нет (NaN). Bybit отдает свечи от новых к старым - разворачиваем.
+    """
+    try:
+        rows = []
+        for kline in raw_data:
+            if len(kline) < 6:
+                logger.warning(f"BYBIT_PARSER (klines): Пропущена свеча, неполные данные: {kline}")
+                continue
+            rows.append(kline)
+        if not rows:
+            return CandleColumns.empty()
+
+        matrix = _rows_matrix(rows, 6)[::-1]
+        open_time = matrix[:, 0].astype(np.int64)
+        prices = matrix[:, 1:6].astype(np.float64)
+        return CandleColumns({
+            'openTime': open_time,
+            'openPrice': prices[:, 0],
+            'highPrice': prices[:, 1],
+            'lowPrice': prices[:, 2],
+            'closePrice': prices[:, 3],
+            'volume': prices[:, 4],
+            'closeTime': open_time + get_interval_duration_ms(timeframe) - 1,
+        })
+    except (ValueError, TypeError, IndexError) as e:
+        logger.error(f"BYBIT_PARSER (klines): Ошибка парсинга Klines: {e}. Raw data (sample): {str(raw_data)[:200]}...", exc_info=True)
+        return CandleColumns.empty()
+
+
+def parse_bybit_oi(raw_data: List[Dict[str, str]], timeframe: str) -> CandleColumns:
+    """Векторный парсер Open Interest (OI) от Bybit V5 (от старых к новым)."""
+    try:
+        if not raw_data:
+            return CandleColumns.empty()
+        times = [item["timestamp"] for item in reversed(raw_data)]
+        values = [item["openInterest"] for item in reversed(raw_data)]
+        return _point_columns(times, values, 'openInterest')
+    except (ValueError, TypeError, KeyError) as e:
+        logger.error(f"BYBIT_PARSER (oi): Ошибка парсинга OI: {e}. Raw data (sample): {str(raw_data)[:200]}...", exc_info=True)
+        return CandleColumns.empty()
+
+
+def parse_bybit_fr(raw_data: List[Dict[str, str]], timeframe: str) -> CandleColumns:
+    """Векторный парсер Funding Rate (FR) от Bybit V5 (от старых к новым)."""
+    try:
+        if not raw_data:
+            return CandleColumns.empty()
+        times = [item["fundingRateTimestamp"] for item in reversed(raw_data)]
+        values = [item["fundingRate"] for item in reversed(raw_data)]
+        return _point_columns(times, values, 'fundingRate')
+    except (ValueError, TypeError, KeyError) as e:
+        logger.error(f"BYBIT_PARSER (fr): Ошибка парсинга FR: {e}. Raw data (sample): {str(raw_data)[:200]}...", exc_info=True)
+        return CandleColumns.empty()
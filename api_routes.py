@@ -1,16 +1,23 @@
+import asyncio
 import logging
 import os 
 import json
-from fastapi import APIRouter, HTTPException, Depends, Security
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, HTTPException, Depends, Security, Request, Query
+from fastapi.responses import JSONResponse, Response
 from fastapi.security import HTTPBearer
 from pydantic import BaseModel
 from typing import List, Dict, Any, Optional 
 
 # --- Импорты для воркера, кэша и FR ---
 # --- ИЗМЕНЕНИЕ №1: Импортируем add_task_to_queue ---
-from cache_manager import load_from_cache, get_redis_connection, add_task_to_queue, get_worker_status 
+from cache_manager import load_serializable_from_cache, load_response_body, get_redis_connection, add_task_to_queue, add_payload_to_queue, get_worker_status 
+from cache_manager import get_cache_version, get_cache_symbols, load_from_cache, load_indicator_results, save_indicator_results
+from cache_manager import load_indicator_states, save_indicator_states
 from api_utils import make_serializable
+from indicator_calculator import add_indicators_resumable
+from indicators.registry import resolve_columns
+from indicators.streaming import STREAMING_COLUMNS
+from task_locks import running_task_types, task_types
 
 # --- Импорты из config ---
 try:
@@ -19,8 +26,8 @@ try:
         ALLOWED_CACHE_KEYS, 
         REDIS_TASK_QUEUE_KEY,
         SECRET_TOKEN,
-        WORKER_LOCK_KEY,
-        WORKER_LOCK_VALUE
+        INDICATOR_RESULT_TTL_SECONDS,
+        INDICATOR_API_MAX_CONCURRENCY
     )
 except ImportError:
     # Фоллбэки
@@ -28,8 +35,8 @@ except ImportError:
     ALLOWED_CACHE_KEYS = ['1h', '4h', '8h', '12h', '1d', 'global_fr']
     REDIS_TASK_QUEUE_KEY = "data_collector_task_queue"
     SECRET_TOKEN = os.environ.get("SECRET_TOKEN")
-    WORKER_LOCK_KEY = "data_collector_lock"
-    WORKER_LOCK_VALUE = "processing"
+    INDICATOR_RESULT_TTL_SECONDS = 900
+    INDICATOR_API_MAX_CONCURRENCY = 1
     
 # Создаем объект Router
 router = APIRouter()
@@ -59,7 +66,11 @@ def verify_cron_secret(credentials: HTTPBearer = Security(security)):
 
 
 async def _check_lock_and_queue_task(task_payload: Dict[str, Any], log_prefix: str) -> JSONResponse:
-    """Проверяет блокировку и добавляет задачу в очередь Redis."""
+    """
+    Проверяет блокировки типов задачи и добавляет задачу в очередь Redis.
+    409 - только если ВСЕ таймфреймы задачи уже выполняются; задачи других
+    типов (например, 1h во время сбора 4h) ставятся в очередь.
+    """
     
     redis_conn = await get_redis_connection() 
     
@@ -70,9 +81,10 @@ async def _check_lock_and_queue_task(task_payload: Dict[str, Any], log_prefix: s
             detail="Сервис недоступен: Redis (для блокировки) не подключен."
         )
         
-    lock_status = None
+    requested = task_types(task_payload)
+    running: List[str] = []
     try:
-        lock_status = await redis_conn.get(WORKER_LOCK_KEY)
+        running = await running_task_types(redis_conn, requested)
     except Exception as e: 
         logging.error(f"{log_prefix} API: Ошибка при проверке блокировки Redis: {e}", exc_info=True)
         raise HTTPException(
@@ -80,19 +92,19 @@ async def _check_lock_and_queue_task(task_payload: Dict[str, Any], log_prefix: s
             detail=f"Внутренняя ошибка сервера при проверке блокировки: {e}"
         )
 
-    # lock_status уже str.
-    if lock_status and lock_status.decode('utf-8') == WORKER_LOCK_VALUE: # ИСПРАВЛЕНО: Декодируем байты
-        msg = f"{log_prefix} Воркер занят. Задача не добавлена."
-        logging.warning(f"{log_prefix} API: Задача отклонена (409). Сборщик уже занят.")
+    if requested and len(running) == len(requested):
+        msg = f"{log_prefix} Воркер занят ({', '.join(running)}). Задача не добавлена."
+        logging.warning(f"{log_prefix} API: Задача отклонена (409). Сборщик уже занят: {running}.")
         return JSONResponse({"status": "worker_locked", "message": msg}, status_code=409)
 
-    task_name = task_payload.get('timeframe', 'UNKNOWN')
+    task_name = task_payload.get('timeframe') or ",".join(task_payload.get('timeframes', [])) or 'UNKNOWN'
     try:
         # ДОБАВЛЕНО: Проверяем размер очереди ДО добавления
         queue_size_before = await redis_conn.llen(REDIS_TASK_QUEUE_KEY)
         logging.info(f"{log_prefix} [DEBUG] Размер очереди ДО добавления: {queue_size_before}")
         
-        await add_task_to_queue(task_payload.get('timeframe'), redis_conn) # ИСПРАВЛЕНО: Использование add_task_to_queue
+        if not await add_payload_to_queue(task_payload, redis_conn):
+            raise RuntimeError("rpush в очередь не выполнен")
         
         # ДОБАВЛЕНО: Проверяем размер очереди ПОСЛЕ добавления
         queue_size_after = await redis_conn.llen(REDIS_TASK_QUEUE_KEY)
@@ -133,18 +145,14 @@ async def get_market_data(request: MarketDataRequest):
             raise HTTPException(status_code=400, detail=f"Timeframe '{tf}' не поддерживается для запроса данных.")
 
         # --- БИЗНЕС-ЛОГИКА: Проверяем кэш ---
-        cached_data = await load_from_cache(tf, redis_conn=redis_conn)
+        # (Фильтр по symbols применяется на уровне кэша: читаются только нужные шарды)
+        # (Декодированные данные берутся из локального LRU, пока не изменилась версия в Redis)
+        cached_data = await load_serializable_from_cache(tf, redis_conn=redis_conn, symbols=request.symbols or None)
         
-        if cached_data and cached_data.get('data'): # ИСПРАВЛЕНО: Проверяем на наличие данных
+        # (При фильтре 'data' может быть пустой, поэтому наличие кэша проверяем и по audit.count)
+        if cached_data and (cached_data.get('data') or cached_data.get('audit', {}).get('count')):
             # 1. Если данные есть
-            if request.symbols:
-                filtered_data = [
-                    item for item in cached_data.get('data', []) 
-                    if item.get('symbol') in request.symbols
-                ]
-                response_data[tf] = {"data": make_serializable(filtered_data), "audit": cached_data.get('audit', {})}
-            else:
-                response_data[tf] = {"data": make_serializable(cached_data.get('data', [])), "audit": cached_data.get('audit', {})}
+            response_data[tf] = {"data": cached_data.get('data', []), "audit": cached_data.get('audit', {})}
         
         else:
             # --- ИЗМЕНЕНИЕ №1: Логика "промаха" кэша ---
@@ -199,11 +207,41 @@ async def trigger_fr_update(
     
     task_payload = {"timeframe": "global_fr"}
     return await _check_lock_and_queue_task(task_payload, log_prefix)
+
+
+class CollectMarketDataRequest(BaseModel):
+    timeframes: List[str]
+
+
+@router.post("/internal/collect-market-data", status_code=202)
+async def trigger_market_data_collection(
+    request: CollectMarketDataRequest,
+    is_authenticated: bool = Depends(verify_cron_secret)
+):
+    """
+    ЗАЩИЩЕННЫЙ Эндпоинт. Ставит ОДНУ задачу на несколько таймфреймов
+    ({"timeframes": [...]}): воркер собирает их за один проход
+    (общий список монет, FR, HTTP-сессия и лимиты запросов).
+    """
+    log_prefix = "[CRON_JOB_API]"
+
+    # Порядок сохраняем, дубликаты убираем
+    timeframes = list(dict.fromkeys(request.timeframes))
+    if not timeframes:
+        raise HTTPException(status_code=400, detail="Необходимо указать хотя бы один timeframe.")
+    for tf in timeframes:
+        if tf not in ALLOWED_CACHE_KEYS:
+            raise HTTPException(status_code=400, detail=f"Timeframe '{tf}' не поддерживается.")
+
+    logging.info(f"{log_prefix} Получен авторизованный запрос на сбор {timeframes} за один проход...")
+    return await _check_lock_and_queue_task({"timeframes": timeframes}, log_prefix)
     
 @router.get("/get-cache/{key}", response_class=JSONResponse)
-async def get_raw_cache(key: str):
+async def get_raw_cache(key: str, request: Request):
     """
     Возвращает сырые данные из кэша Redis по ключу. 
+    Быстрый путь: отдает готовое тело ответа, сохраненное воркером
+    (gzip как есть, если клиент его принимает), без декодирования JSON.
     """
     if key not in ALLOWED_CACHE_KEYS:
         raise HTTPException(status_code=400, detail=f"Ключ '{key}' не разрешен.")
@@ -212,15 +250,128 @@ async def get_raw_cache(key: str):
     if not redis_conn:
         raise HTTPException(status_code=503, detail="Сервис недоступен: Redis не подключен.")
 
-    data = await load_from_cache(key, redis_conn=redis_conn)
+    accepts_gzip = 'gzip' in request.headers.get('accept-encoding', '').lower()
+    body = await load_response_body(key, redis_conn=redis_conn, gzip_encoded=accepts_gzip)
+    if body:
+        headers = {"Vary": "Accept-Encoding"}
+        if accepts_gzip:
+            headers["Content-Encoding"] = "gzip"
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    # Фоллбэк: старый кэш без готового тела ответа
+    safe_data = await load_serializable_from_cache(key, redis_conn=redis_conn)
     
-    if data:
-        safe_data = make_serializable(data)
+    if safe_data:
         return JSONResponse(content=safe_data)
     else:
         raise HTTPException(status_code=404, detail=f"Ключ '{key}' пуст.")
 
 
+def _split_query(value: Optional[str]) -> Optional[List[str]]:
+    """'a,b, c' -> ['a', 'b', 'c'] без дубликатов (None/пусто - None)."""
+    if not value:
+        return None
+    items = list(dict.fromkeys(item.strip() for item in value.split(',') if item.strip()))
+    return items or None
+
+
+# Расчет /indicators идет в потоке этого процесса, а не в cpu_pool: при
+# SERVICE_MODE=api пул создавал бы каждый воркер gunicorn. Одновременных
+# расчетов - не больше INDICATOR_API_MAX_CONCURRENCY, остальные ждут
+# и обычно получают уже сохраненный результат.
+_indicator_compute_guard = asyncio.Semaphore(INDICATOR_API_MAX_CONCURRENCY)
+
+
+@router.get("/indicators/{timeframe}", response_class=JSONResponse)
+async def get_indicators(
+    timeframe: str,
+    symbols: Optional[str] = None,
+    indicator_set: Optional[str] = Query(None, alias="set")
+):
+    """
+    Индикаторы по свечам из кэша: ?symbols=BTCUSDT,ETHUSDT&set=rsi,macd
+    (set - группы/колонки indicators/registry.py, без set - все; без symbols - все монеты).
+
+    Результат каждой монеты сохраняется в Redis на INDICATOR_RESULT_TTL_SECONDS
+    по (таймфрейм, версия кэша, набор, монета): одинаковые запросы разных
+    клиентов считаются один раз, новая публикация кэша дает новые ключи.
+    Без symbols список монет берется из манифеста кэша, и шарды читаются
+    только для монет, которых нет среди сохраненных результатов.
+    """
+    if timeframe not in ALLOWED_CACHE_KEYS or timeframe == 'global_fr':
+        raise HTTPException(status_code=400, detail=f"Timeframe '{timeframe}' не поддерживается.")
+
+    requested_symbols = _split_query(symbols)
+    names = _split_query(indicator_set)
+    try:
+        columns = resolve_columns(names)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    redis_conn = await get_redis_connection()
+    if not redis_conn:
+        raise HTTPException(status_code=503, detail="Сервис недоступен: Redis не подключен.")
+
+    log_prefix = f"[INDICATORS] '{timeframe}'"
+    version = await get_cache_version(timeframe, redis_conn)
+    # None - старый кэш без манифеста: монеты известны только после загрузки
+    order = requested_symbols or await get_cache_symbols(timeframe, redis_conn)
+    results: Dict[str, Dict[str, Any]] = {}
+    if version is not None and order:
+        results = await load_indicator_results(timeframe, version, columns, order, redis_conn)
+
+    if order is None or len(results) < len(order):
+        waited = _indicator_compute_guard.locked()
+        async with _indicator_compute_guard:
+            if waited and version is not None and order:
+                # Пока ждали, такой же запрос мог посчитать и сохранить эти монеты
+                results.update(await load_indicator_results(
+                    timeframe, version, columns, [s for s in order if s not in results], redis_conn
+                ))
+
+            if order is None or len(results) < len(order):
+                missing = None if order is None else [s for s in order if s not in results]
+                market_data = await load_from_cache(timeframe, redis_conn=redis_conn, symbols=missing, as_columns=True)
+                if not market_data and not results:
+                    raise HTTPException(status_code=404, detail=f"Данных '{timeframe}' в кэше нет.")
+
+                items = [item for item in (market_data or {}).get('data', []) if item.get('symbol')]
+                if order is None:
+                    order = [item['symbol'] for item in items]
+                    if version is not None:
+                        results = await load_indicator_results(timeframe, version, columns, order, redis_conn)
+                        items = [item for item in items if item['symbol'] not in results]
+
+                if items:
+                    for item in items:
+                        item.setdefault('timeframe', timeframe)
+                    # Рекурсивные индикаторы продолжаются с состояния прошлого расчета
+                    # (cache:{tf}:indicator_state): после новой публикации кэша
+                    # считаются только новые свечи
+                    states = {}
+                    if any(column in STREAMING_COLUMNS for column in columns):
+                        states = await load_indicator_states(timeframe, redis_conn, [item['symbol'] for item in items])
+                    new_states = await asyncio.to_thread(add_indicators_resumable, {'data': items}, names, states)
+                    computed = {item['symbol']: make_serializable(item) for item in items}
+                    results.update(computed)
+                    logging.info(f"{log_prefix} Посчитаны индикаторы {names or 'все'} для {len(computed)} монет (из кэша: {len(results) - len(computed)}, с состояния: {len(states)}).")
+
+                    # Пока считали, кэш мог смениться - тогда результат не сохраняем под старой версией
+                    if version is not None and await get_cache_version(timeframe, redis_conn) == version:
+                        try:
+                            await save_indicator_results(timeframe, version, columns, computed, redis_conn, INDICATOR_RESULT_TTL_SECONDS)
+                            await save_indicator_states(timeframe, new_states, redis_conn)
+                        except Exception as e:
+                            logging.error(f"{log_prefix} Не удалось сохранить результаты индикаторов: {e}", exc_info=True)
+
+    return JSONResponse({
+        "timeframe": timeframe,
+        "version": version,
+        "indicators": columns,
+        "data": [results[symbol] for symbol in order if symbol in results],
+    })
+
+
 @router.get("/queue-status")
 async def get_queue_status():
     """
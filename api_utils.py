@@ -2,6 +2,8 @@ import numpy as np
 import pandas as pd
 from decimal import Decimal
 
+from candle_columns import CandleColumns
+
 def make_serializable(obj):
     """
     Рекурсивно обходит структуру данных и заменяет несовместимые с JSON
@@ -12,6 +14,8 @@ def make_serializable(obj):
         return {key: make_serializable(val) for key, val in obj.items()}
     elif isinstance(obj, list):
         return [make_serializable(item) for item in obj]
+    elif isinstance(obj, CandleColumns):
+        return make_serializable(obj.to_records())
     elif isinstance(obj, Decimal):
         return float(obj)
     elif isinstance(obj, (np.integer, np.floating)):
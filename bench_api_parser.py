@@ -0,0 +1,85 @@
+# bench_api_parser.py
+"""
+Микро-бенчмарк парсеров ответов API (api_parser.py):
+построчные parse_*_rows (список словарей) против векторных parse_* (CandleColumns).
+
+Запуск:
+    python bench_api_parser.py [--candles 1000] [--repeat 200]
+"""
+import argparse
+import random
+import time
+from typing import Any, Callable, Dict, List
+
+import api_parser
+
+HOUR_MS = 60 * 60 * 1000
+
+
+def build_responses(candles: int) -> Dict[str, List[Any]]:
+    """Генерирует сырые ответы бирж в их собственном формате (строки/числа как в API)."""
+    rnd = random.Random(42)
+    start = 1_700_000_000_000 - (1_700_000_000_000 % HOUR_MS)
+    binance_klines, bybit_klines, binance_oi, bybit_oi, binance_fr, bybit_fr = [], [], [], [], [], []
+
+    price = 100.0
+    for i in range(candles):
+        open_time = start + i * HOUR_MS
+        open_price = price
+        price = max(price * (1 + rnd.gauss(0, 0.01)), 1e-6)
+        volume = rnd.uniform(1e3, 1e7)
+        high = max(open_price, price) * 1.002
+        low = min(open_price, price) * 0.998
+        binance_klines.append([
+            open_time, f"{open_price:.6f}", f"{high:.6f}", f"{low:.6f}", f"{price:.6f}", f"{volume:.3f}",
+            open_time + HOUR_MS - 1, f"{volume * price:.3f}", rnd.randint(100, 10_000),
+            f"{volume * rnd.random():.3f}", f"{volume * price * 0.5:.3f}", "0",
+        ])
+        bybit_klines.append([
+            str(open_time), f"{open_price:.6f}", f"{high:.6f}", f"{low:.6f}", f"{price:.6f}",
+            f"{volume:.3f}", f"{volume * price:.3f}",
+        ])
+        binance_oi.append({"symbol": "BTCUSDT", "sumOpenInterest": f"{rnd.uniform(1e5, 1e9):.4f}",
+                           "sumOpenInterestValue": "0", "timestamp": open_time})
+        bybit_oi.append({"openInterest": f"{rnd.uniform(1e5, 1e9):.4f}", "timestamp": str(open_time)})
+        binance_fr.append({"symbol": "BTCUSDT", "fundingTime": open_time,
+                           "fundingRate": f"{rnd.gauss(0.0001, 0.0002):.8f}", "markPrice": "0"})
+        bybit_fr.append({"symbol": "BTCUSDT", "fundingRate": f"{rnd.gauss(0.0001, 0.0002):.8f}",
+                         "fundingRateTimestamp": str(open_time)})
+
+    # Bybit отдает данные от новых к старым
+    return {
+        "binance_klines": binance_klines, "bybit_klines": bybit_klines[::-1],
+        "binance_oi": binance_oi, "bybit_oi": bybit_oi[::-1],
+        "binance_fr": binance_fr, "bybit_fr": bybit_fr[::-1],
+    }
+
+
+def bench(func: Callable, raw: List[Any], repeat: int) -> float:
+    """Лучшее время одного вызова, мкс."""
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func(raw, "1h")
+        times.append(time.perf_counter() - t0)
+    return min(times) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк парсеров api_parser")
+    parser.add_argument("--candles", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    responses = build_responses(args.candles)
+
+    print(f"Ответ: {args.candles} записей, лучший из {args.repeat} запусков")
+    print(f"{'parser':<16} {'rows, us':>12} {'numpy, us':>12} {'speedup':>9}")
+    for name, raw in responses.items():
+        rows_us = bench(getattr(api_parser, f"parse_{name}_rows"), raw, args.repeat)
+        numpy_us = bench(getattr(api_parser, f"parse_{name}"), raw, args.repeat)
+        print(f"{name:<16} {rows_us:>12.1f} {numpy_us:>12.1f} {rows_us / numpy_us:>8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# bench_cache_codec.py
+"""
+Бенчмарк кодеков кэша (cache_codec.py) на реалистичном payload:
+250 монет x 799 свечей 4h (формат format_final_structure).
+
+Запуск:
+    python bench_cache_codec.py [--coins 250] [--candles 799] [--repeat 5]
+"""
+import argparse
+import random
+import time
+from typing import Any, Dict, List
+
+import cache_codec
+
+FOUR_HOURS_MS = 4 * 60 * 60 * 1000
+
+
+def build_payload(coins: int, candles: int) -> Dict[str, Any]:
+    """Генерирует данные в формате cache:4h (klines + OI + FR)."""
+    rnd = random.Random(42)
+    start = 1_700_000_000_000 - (1_700_000_000_000 % FOUR_HOURS_MS)
+    data: List[Dict[str, Any]] = []
+
+    for i in range(coins):
+        price = rnd.uniform(0.01, 50_000)
+        oi = rnd.uniform(1e5, 1e9)
+        candles_list = []
+        for j in range(candles):
+            open_price = price
+            price = max(price * (1 + rnd.gauss(0, 0.01)), 1e-6)
+            open_time = start + j * FOUR_HOURS_MS
+            volume = rnd.uniform(1e3, 1e7)
+            oi *= 1 + rnd.gauss(0, 0.005)
+            candles_list.append({
+                "openTime": open_time,
+                "openPrice": open_price,
+                "highPrice": max(open_price, price) * (1 + rnd.random() * 0.005),
+                "lowPrice": min(open_price, price) * (1 - rnd.random() * 0.005),
+                "closePrice": price,
+                "volume": volume,
+                "closeTime": open_time + FOUR_HOURS_MS - 1,
+                "volumeDelta": rnd.uniform(-volume, volume),
+                "openInterest": oi,
+                "fundingRate": rnd.gauss(0.0001, 0.0002),
+            })
+        data.append({"symbol": f"COIN{i}USDT", "exchanges": ["binance", "bybit"], "data": candles_list})
+
+    return {
+        "openTime": start,
+        "closeTime": start + candles * FOUR_HOURS_MS - 1,
+        "timeframe": "4h",
+        "audit_report": {"missing_klines": [], "missing_oi": [], "missing_fr": []},
+        "data": data,
+    }
+
+
+def bench(payload: Dict[str, Any], codec: str, repeat: int) -> Dict[str, float]:
+    encode_times, decode_times = [], []
+    encoded = b""
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        encoded = cache_codec.encode(payload, codec)
+        encode_times.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        cache_codec.decode(encoded)
+        decode_times.append(time.perf_counter() - t0)
+
+    return {
+        "encode_ms": min(encode_times) * 1000,
+        "decode_ms": min(decode_times) * 1000,
+        "size_kb": len(encoded) / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк кодеков кэша")
+    parser.add_argument("--coins", type=int, default=250)
+    parser.add_argument("--candles", type=int, default=799)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"Генерация payload: {args.coins} монет x {args.candles} свечей 4h...")
+    payload = build_payload(args.coins, args.candles)
+
+    print(f"{'codec':<14} {'encode, ms':>12} {'decode, ms':>12} {'size, KB':>12}")
+    for codec in cache_codec.available_codecs():
+        result = bench(payload, codec, args.repeat)
+        print(f"{codec:<14} {result['encode_ms']:>12.1f} {result['decode_ms']:>12.1f} {result['size_kb']:>12.1f}")
+
+    missing = set(cache_codec._CODECS) - set(cache_codec.available_codecs())
+    if missing:
+        print(f"Пропущены (нет зависимостей): {', '.join(sorted(missing))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+# cache_codec.py
+"""
+Этот модуль отвечает за СЕРИАЛИЗАЦИЮ данных кэша (payload <-> bytes).
+
+Формат самоописывающий:
+    b"KDC" + <1 байт id кодека> + <тело>   - новые кодеки (orjson/msgpack + zstd)
+    b"\x1f\x8b..."                         - gzip(JSON), старый формат (без заголовка)
+    b"{..."                                - обычный JSON, самый старый кэш
+
+Поэтому decode() читает любой ключ, независимо от того, каким кодеком
+он был записан, а кодек для записи можно менять по ключу (config.CACHE_CODEC_BY_KEY).
+"""
+import gzip
+import json
+import logging
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+# --- Опциональные зависимости (без них доступен только gzip-json) ---
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"KDC"
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_LEVEL = 3
+
+DEFAULT_CODEC = "gzip-json"
+
+
+def _to_builtin(obj: Any) -> Any:
+    """default-хук для numpy-типов (msgpack/orjson не знают про np.int64 и т.п.)."""
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError(f"Тип {type(obj).__name__} не сериализуется")
+
+
+# --- gzip + json (старый формат, без заголовка) ---
+
+def _encode_gzip_json(obj: Any) -> bytes:
+    return gzip.compress(json.dumps(obj, default=_to_builtin).encode('utf-8'))
+
+
+def _decode_gzip_json(data: bytes) -> Any:
+    return json.loads(gzip.decompress(data).decode('utf-8'))
+
+
+# --- orjson + zstd ---
+
+def _encode_orjson_zstd(obj: Any) -> bytes:
+    raw = orjson.dumps(obj, default=_to_builtin, option=orjson.OPT_SERIALIZE_NUMPY)
+    return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+
+
+def _decode_orjson_zstd(data: bytes) -> Any:
+    return orjson.loads(zstandard.ZstdDecompressor().decompress(data))
+
+
+# --- msgpack + zstd ---
+
+def _encode_msgpack_zstd(obj: Any) -> bytes:
+    raw = msgpack.packb(obj, default=_to_builtin, use_bin_type=True)
+    return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+
+
+def _decode_msgpack_zstd(data: bytes) -> Any:
+    raw = zstandard.ZstdDecompressor().decompress(data)
+    return msgpack.unpackb(raw, raw=False, strict_map_key=False)
+
+
+# name -> (id в заголовке, encode, decode, доступен ли)
+# id None = кодек пишется без заголовка (gzip распознается по своей сигнатуре)
+_CODECS: Dict[str, Tuple[Optional[int], Callable[[Any], bytes], Callable[[bytes], Any], bool]] = {
+    "gzip-json": (None, _encode_gzip_json, _decode_gzip_json, True),
+    "orjson-zstd": (1, _encode_orjson_zstd, _decode_orjson_zstd, orjson is not None and zstandard is not None),
+    "msgpack-zstd": (2, _encode_msgpack_zstd, _decode_msgpack_zstd, msgpack is not None and zstandard is not None),
+}
+_CODECS_BY_ID = {codec_id: name for name, (codec_id, _, _, _) in _CODECS.items() if codec_id is not None}
+
+
+def available_codecs() -> list:
+    """Список кодеков, для которых установлены зависимости."""
+    return [name for name, (_, _, _, available) in _CODECS.items() if available]
+
+
+def resolve_codec(name: Optional[str]) -> str:
+    """Возвращает имя кодека, фоллбэк на gzip-json, если он неизвестен или недоступен."""
+    if not name:
+        return DEFAULT_CODEC
+    codec = _CODECS.get(name)
+    if codec is None:
+        logger.warning(f"[CODEC] Неизвестный кодек '{name}'. Использую '{DEFAULT_CODEC}'.")
+        return DEFAULT_CODEC
+    if not codec[3]:
+        logger.warning(f"[CODEC] Кодек '{name}' недоступен (не установлены зависимости). Использую '{DEFAULT_CODEC}'.")
+        return DEFAULT_CODEC
+    return name
+
+
+def encode(obj: Any, codec: Optional[str] = None) -> bytes:
+    """Сериализует объект выбранным кодеком (с заголовком формата)."""
+    name = resolve_codec(codec)
+    codec_id, encode_func, _, _ = _CODECS[name]
+    body = encode_func(obj)
+    if codec_id is None:
+        return body
+    return MAGIC + bytes([codec_id]) + body
+
+
+def decode(data: bytes) -> Any:
+    """
+    Десериализует bytes, определяя формат по заголовку.
+    Поддерживает новые кодеки, gzip(JSON) и обычный JSON.
+    """
+    if data.startswith(MAGIC) and len(data) > len(MAGIC):
+        codec_id = data[len(MAGIC)]
+        name = _CODECS_BY_ID.get(codec_id)
+        if name is None:
+            raise ValueError(f"Неизвестный id кодека в заголовке: {codec_id}")
+        if not _CODECS[name][3]:
+            raise ValueError(f"Кодек '{name}' недоступен (не установлены зависимости)")
+        return _CODECS[name][2](data[len(MAGIC) + 1:])
+
+    if data.startswith(GZIP_MAGIC):
+        return _decode_gzip_json(data)
+
+    return json.loads(data.decode('utf-8'))
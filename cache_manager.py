@@ -1,8 +1,10 @@
 import logging
 import json
 import gzip  # <-- ИЗМЕНЕНИЕ №1 (Уже было)
+import hashlib
+from collections import OrderedDict
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List, Tuple
 from redis.asyncio import Redis as AsyncRedis
 from urllib.parse import urlparse
 
@@ -12,8 +14,21 @@ from config import (
     UPSTASH_REDIS_TOKEN,
     REDIS_TASK_QUEUE_KEY,
     WORKER_LOCK_KEY,
-    WORKER_LOCK_VALUE
+    WORKER_LOCK_VALUE,
+    SHARDED_CACHE_KEYS,
+    CACHE_SHARD_GRACE_SECONDS,
+    LOCAL_CACHE_MAX_ENTRIES,
+    CACHE_STORE_RESPONSE_BODY,
+    CACHE_CODEC_DEFAULT,
+    CACHE_CODEC_BY_KEY,
+    INDICATOR_RESULT_TTL_SECONDS,
+    INDICATOR_STATE_TTL_INTERVALS
 )
+from api_helpers import get_interval_duration_ms
+from api_utils import make_serializable
+from candle_columns import CandleColumns
+import cache_codec
+from task_locks import running_task_types
 
 logger = logging.getLogger(__name__)
 _redis_pool: Optional[AsyncRedis] = None
@@ -60,96 +75,553 @@ async def check_redis_health() -> bool:
     return False
 
 
-async def load_from_cache(key: str, redis_conn: AsyncRedis) -> Optional[Dict[str, Any]]:
-    """Загружает данные из Redis по ключу. Декодирует JSON."""
+def _codec_for_key(key: str) -> str:
+    """Кодек, которым пишется ключ (CACHE_CODEC_BY_KEY или CACHE_CODEC_DEFAULT)."""
+    return CACHE_CODEC_BY_KEY.get(key, CACHE_CODEC_DEFAULT)
+
+
+def _encode_payload(data: Any, key: str) -> bytes:
+    """Сериализует объект кодеком, настроенным для ключа."""
+    return cache_codec.encode(data, _codec_for_key(key))
+
+
+def _decode_payload(data_bytes: bytes, cache_key: str) -> Optional[Any]:
+    """
+    Десериализует данные любого поддерживаемого формата
+    (новые кодеки, gzip(JSON) или обычный JSON старого кэша).
+    """
+    try:
+        return cache_codec.decode(data_bytes)
+    except Exception as e:
+        logger.error(f"[CACHE] Ошибка десериализации ключа {cache_key}: {e}")
+        return None
+
+
+def _version_key(key: str) -> str:
+    """Ключ с версией данных (меняется при каждой публикации)."""
+    return f"cache:{key}:ver"
+
+
+def _body_key(key: str) -> str:
+    """Ключ готового (gzip) тела ответа /get-cache/{key}."""
+    return f"cache:{key}:body"
+
+
+def encode_response_body(data: Any) -> bytes:
+    """
+    Кодирует данные в JSON-тело ответа так же, как это делает JSONResponse
+    (после make_serializable: NaN/inf -> null, numpy -> python).
+    """
+    return json.dumps(
+        make_serializable(data),
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode('utf-8')
+
+
+def _build_response_body(data: Dict[str, Any]) -> Optional[bytes]:
+    """Готовит gzip-тело ответа при записи (или None, если отключено в config)."""
+    if not CACHE_STORE_RESPONSE_BODY:
+        return None
+    return gzip.compress(encode_response_body(data))
+
+
+def _manifest_key(key: str) -> str:
+    """Ключ манифеста шардированного кэша."""
+    return f"cache:{key}:manifest"
+
+
+def _shard_key(key: str, version: int, symbol: str) -> str:
+    """Ключ шарда (данные одной монеты) для конкретной версии кэша."""
+    return f"cache:{key}:v{version}:{symbol}"
+
+
+def _build_audit(data: Dict[str, Any]) -> None:
+    """Добавляет блок 'audit' в данные, если его нет."""
+    if 'audit' in data:
+        return
+
+    data_content = data.get('data')
+    count = 0
+    if isinstance(data_content, (list, dict)):
+        count = len(data_content)
+
+    data['audit'] = {
+        "timestamp": int(datetime.now().timestamp() * 1000),
+        "source": "data_collector",
+        "count": count
+    }
+
+
+def _to_storage_item(item: Any) -> Any:
+    """
+    Монета с CandleColumns хранится в колоночном виде:
+    {"symbol", "exchanges", "columns": {колонка: [значения]}}.
+    """
+    if isinstance(item, dict) and isinstance(item.get('data'), CandleColumns):
+        stored = {k: v for k, v in item.items() if k != 'data'}
+        stored['columns'] = item['data'].to_dict()
+        return stored
+    return item
+
+
+def _from_storage_item(item: Any, as_columns: bool = False) -> Any:
+    """
+    Обратная операция к _to_storage_item. По умолчанию отдает свечи в старом
+    формате (список словарей), as_columns=True - в виде CandleColumns.
+    Старые записи ("data": [...]) при as_columns тоже переводятся в колонки.
+    """
+    if not isinstance(item, dict):
+        return item
+    if 'columns' in item:
+        restored = {k: v for k, v in item.items() if k != 'columns'}
+        candles = CandleColumns.from_dict(item['columns'])
+        restored['data'] = candles if as_columns else candles.to_records()
+        return restored
+    if as_columns and isinstance(item.get('data'), list):
+        restored = dict(item)
+        restored['data'] = CandleColumns.from_records(item['data'])
+        return restored
+    return item
+
+
+def _is_shardable(key: str, data: Dict[str, Any]) -> bool:
+    """Шардируем только таймфреймы формата [{"symbol": ..., "data": [...]}, ...]."""
+    return key in SHARDED_CACHE_KEYS and isinstance(data.get('data'), list)
+
+
+async def _load_manifest(key: str, redis_conn: AsyncRedis) -> Optional[Dict[str, Any]]:
+    """Загружает манифест шардированного кэша (или None, если его нет)."""
+    manifest_bytes = await redis_conn.get(_manifest_key(key))
+    if not manifest_bytes:
+        return None
+    return _decode_payload(manifest_bytes, _manifest_key(key))
+
+
+async def _load_sharded(
+    key: str,
+    manifest: Dict[str, Any],
+    redis_conn: AsyncRedis,
+    symbols: Optional[List[str]] = None,
+    as_columns: bool = False
+) -> Optional[Dict[str, Any]]:
+    """
+    Собирает ответ из манифеста и нужных шардов (один MGET).
+    Возвращает None, если хотя бы один шард версии уже исчез (гонка с writer'ом).
+    """
+    version = manifest.get('version')
+    manifest_symbols = manifest.get('symbols', [])
+
+    if symbols is not None:
+        wanted = set(symbols)
+        manifest_symbols = [s for s in manifest_symbols if s in wanted]
+
+    items: List[Dict[str, Any]] = []
+    if manifest_symbols:
+        shard_keys = [_shard_key(key, version, s) for s in manifest_symbols]
+        shard_values = await redis_conn.mget(shard_keys)
+
+        for shard_key, shard_bytes in zip(shard_keys, shard_values):
+            if shard_bytes is None:
+                logger.warning(f"[CACHE] Шард {shard_key} отсутствует (версия {version} уже заменена?).")
+                return None
+            item = _decode_payload(shard_bytes, shard_key)
+            if item is not None:
+                items.append(_from_storage_item(item, as_columns))
+
+    result = dict(manifest.get('meta', {}))
+    result['data'] = items
+    return result
+
+
+async def load_from_cache(
+    key: str,
+    redis_conn: AsyncRedis,
+    symbols: Optional[List[str]] = None,
+    as_columns: bool = False
+) -> Optional[Dict[str, Any]]:
+    """
+    Загружает данные из Redis по ключу.
+
+    Для шардированных ключей читает манифест и только шарды запрошенных
+    монет (symbols=None - все монеты). Если манифеста нет - читает старый
+    монолитный ключ cache:{key}.
+
+    Свечи отдаются списками словарей; as_columns=True - в виде CandleColumns
+    (для внутренних потребителей: агрегация, индикаторы).
+    """
+    if key in SHARDED_CACHE_KEYS:
+        # Две попытки: если между чтением манифеста и шардов writer
+        # опубликовал новую версию, а старые шарды уже истекли.
+        for _ in range(2):
+            manifest = await _load_manifest(key, redis_conn)
+            if manifest is None:
+                break
+            result = await _load_sharded(key, manifest, redis_conn, symbols, as_columns)
+            if result is not None:
+                return result
+
     cache_key = f"cache:{key}"
     data_bytes = await redis_conn.get(cache_key)
-    
-    if data_bytes:
-        try:
-            # --- ИЗМЕНЕНИЕ №3: Сначала распаковываем --- (Уже было)
-            data_bytes = gzip.decompress(data_bytes)
-            # ----------------------------------------
-            data_str = data_bytes.decode('utf-8')
-            return json.loads(data_str)
-        except (IOError, gzip.BadGzipFile, json.JSONDecodeError, UnicodeDecodeError) as e:
-            # --- ИЗМЕНЕНИЕ №3: Обработка, если данные не сжаты (старый кэш) --- (Уже было)
-            logger.warning(f"[CACHE] Не удалось распаковать gzip для {cache_key} (возможно, старый кэш? Ошибка: {e}). Попытка прочитать как обычный JSON...")
-            try:
-                # Попытка прочитать как обычный (не сжатый) JSON
-                data_str = data_bytes.decode('utf-8')
-                return json.loads(data_str)
-            except Exception as e_inner:
-                logger.error(f"[CACHE] Ошибка десериализации ключа {cache_key} (даже как fallback): {e_inner}")
-                return None
-            # -----------------------------------------------------------------
-    return None
+
+    if not data_bytes:
+        return None
+
+    data = _decode_payload(data_bytes, cache_key)
+    if data and isinstance(data.get('data'), list):
+        if symbols is not None:
+            wanted = set(symbols)
+            data['data'] = [item for item in data['data'] if item.get('symbol') in wanted]
+        data['data'] = [_from_storage_item(item, as_columns) for item in data['data']]
+    return data
+
+
+async def _save_sharded(
+    redis_conn: AsyncRedis,
+    key: str,
+    data: Dict[str, Any],
+    expiry_seconds: Optional[int] = None
+) -> bool:
+    """
+    Публикует данные таймфрейма по схеме "шард на монету + манифест".
+
+    1. Шарды новой версии пишутся пайплайном (старые читатели их не видят).
+    2. Манифест переключается одним SET - это и есть атомарная публикация.
+    3. Шарды предыдущей версии получают короткий TTL, монолитный ключ удаляется.
+    """
+    previous = await _load_manifest(key, redis_conn)
+
+    version = data['audit']['timestamp']
+    if previous and previous.get('version', 0) >= version:
+        version = previous['version'] + 1
+
+    items = data['data']
+    meta = {k: v for k, v in data.items() if k != 'data'}
+
+    symbols: List[str] = []
+    total_size = 0
+
+    async with redis_conn.pipeline(transaction=False) as pipe:
+        for item in items:
+            symbol = item.get('symbol')
+            if not symbol:
+                continue
+            shard_bytes = _encode_payload(_to_storage_item(item), key)
+            total_size += len(shard_bytes)
+            pipe.set(_shard_key(key, version, symbol), shard_bytes, ex=expiry_seconds)
+            symbols.append(symbol)
+        await pipe.execute()
+
+    manifest = {"version": version, "symbols": symbols, "meta": meta}
+    manifest_bytes = _encode_payload(manifest, key)
+    total_size += len(manifest_bytes)
+    body_bytes = _build_response_body(data)
+
+    # Манифест, версия и готовое тело ответа переключаются вместе (MULTI/EXEC)
+    async with redis_conn.pipeline(transaction=True) as pipe:
+        pipe.set(_manifest_key(key), manifest_bytes, ex=expiry_seconds)
+        pipe.set(_version_key(key), str(version), ex=expiry_seconds)
+        if body_bytes is not None:
+            pipe.set(_body_key(key), body_bytes, ex=expiry_seconds)
+        else:
+            pipe.delete(_body_key(key))
+        result = (await pipe.execute())[0]
+
+    async with redis_conn.pipeline(transaction=False) as pipe:
+        if previous and previous.get('version') != version:
+            for symbol in previous.get('symbols', []):
+                pipe.expire(_shard_key(key, previous['version'], symbol), CACHE_SHARD_GRACE_SECONDS)
+        pipe.delete(f"cache:{key}")
+        await pipe.execute()
+
+    logger.info(f"[CACHE] Успешно сохранено {data['audit']['count']} записей в cache:{key} "
+                f"(шардов: {len(symbols)}, версия {version}, сжато: {total_size} байт).")
+    return bool(result)
 
 
 async def save_to_cache(redis_conn: AsyncRedis, key: str, data: Dict[str, Any], expiry_seconds: Optional[int] = None) -> bool:
-    """Сохраняет данные в Redis."""
+    """Сохраняет данные в Redis (шардированно для таймфреймов, одним ключом для остального)."""
     cache_key = f"cache:{key}"
-    
-    if 'audit' not in data:
-        # --- ИЗМЕНЕНИЕ №1: Корректный подсчет count ---
-        data_content = data.get('data')
-        count = 0
-        if isinstance(data_content, (list, dict)):
-            count = len(data_content)
-        # --- КОНЕЦ ИЗМЕНЕНИЯ №1 ---
-            
-        data['audit'] = {
-            "timestamp": int(datetime.now().timestamp() * 1000),
-            "source": "data_collector",
-            # --- ИЗМЕНЕНИЕ №1: Используем новую переменную ---
-            "count": count
-        }
-        
+    _build_audit(data)
+
     try:
-        data_json = json.dumps(data)
-        data_bytes = data_json.encode('utf-8')
-        
-        # --- ИЗМЕНЕНИЕ №2: Сжимаем данные перед отправкой --- (Уже было)
-        compressed_data = gzip.compress(data_bytes)
-        # -------------------------------------------------
-        
-        if expiry_seconds:
-            result = await redis_conn.set(cache_key, compressed_data, ex=expiry_seconds)
-        else:
-            result = await redis_conn.set(cache_key, compressed_data)
-            
-        # --- ИЗМЕНЕНИЕ №1: 'count' теперь будет корректным ---
-        logger.info(f"[CACHE] Успешно сохранено {data['audit']['count']} записей в {cache_key} (Сжато: {len(data_bytes)} -> {len(compressed_data)} байт).")
+        if _is_shardable(key, data):
+            return await _save_sharded(redis_conn, key, data, expiry_seconds)
+
+        stored = data
+        if isinstance(data.get('data'), list):
+            stored = dict(data, data=[_to_storage_item(item) for item in data['data']])
+        compressed_data = _encode_payload(stored, key)
+
+        body_bytes = _build_response_body(data)
+
+        async with redis_conn.pipeline(transaction=True) as pipe:
+            pipe.set(cache_key, compressed_data, ex=expiry_seconds)
+            pipe.set(_version_key(key), str(data['audit']['timestamp']), ex=expiry_seconds)
+            if body_bytes is not None:
+                pipe.set(_body_key(key), body_bytes, ex=expiry_seconds)
+            else:
+                pipe.delete(_body_key(key))
+            result = (await pipe.execute())[0]
+
+        logger.info(f"[CACHE] Успешно сохранено {data['audit']['count']} записей в {cache_key} (Кодек: {cache_codec.resolve_codec(_codec_for_key(key))}, {len(compressed_data)} байт).")
         return result
     except Exception as e:
         logger.error(f"[CACHE] Ошибка при сохранении ключа {cache_key} в Redis: {e}", exc_info=True)
         return False
 
 
+class _VersionedLRU:
+    """
+    LRU декодированных (и уже прошедших make_serializable) ответов.
+    Ключ записи: (ключ кэша, версия, набор символов) - при смене версии
+    старые записи просто перестают запрашиваться и вытесняются.
+    """
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple, Any]" = OrderedDict()
+
+    def get(self, entry_key: Tuple) -> Optional[Any]:
+        value = self._entries.get(entry_key)
+        if value is not None:
+            self._entries.move_to_end(entry_key)
+        return value
+
+    def put(self, entry_key: Tuple, value: Any) -> None:
+        self._entries[entry_key] = value
+        self._entries.move_to_end(entry_key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+_local_cache = _VersionedLRU(LOCAL_CACHE_MAX_ENTRIES)
+
+
+async def get_cache_version(key: str, redis_conn: AsyncRedis) -> Optional[str]:
+    """Возвращает текущую версию данных ключа (или None для кэша без версии)."""
+    version = await redis_conn.get(_version_key(key))
+    if version is None:
+        return None
+    return version.decode('utf-8') if isinstance(version, bytes) else str(version)
+
+
+async def get_cache_symbols(key: str, redis_conn: AsyncRedis) -> Optional[List[str]]:
+    """
+    Список монет ключа из манифеста шардированного кэша - без чтения шардов.
+    None - манифеста нет (старый монолитный кэш, монеты известны только после загрузки).
+    """
+    if key not in SHARDED_CACHE_KEYS:
+        return None
+    manifest = await _load_manifest(key, redis_conn)
+    if manifest is None:
+        return None
+    return list(manifest.get('symbols', []))
+
+
+async def load_serializable_from_cache(
+    key: str,
+    redis_conn: AsyncRedis,
+    symbols: Optional[List[str]] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    То же, что load_from_cache + make_serializable, но через локальный LRU.
+    Пока версия в Redis не изменилась, повторный запрос стоит один GET.
+    """
+    version = await get_cache_version(key, redis_conn)
+    entry_key = (key, version, tuple(sorted(set(symbols))) if symbols is not None else None)
+
+    if version is not None:
+        cached = _local_cache.get(entry_key)
+        if cached is not None:
+            return cached
+
+    data = await load_from_cache(key, redis_conn=redis_conn, symbols=symbols)
+    if data is None:
+        return None
+
+    safe_data = make_serializable(data)
+    if version is not None:
+        _local_cache.put(entry_key, safe_data)
+    return safe_data
+
+
+async def load_response_body(
+    key: str,
+    redis_conn: AsyncRedis,
+    gzip_encoded: bool = True
+) -> Optional[bytes]:
+    """
+    Возвращает готовое тело ответа /get-cache/{key} (gzip или обычный JSON),
+    сохраненное воркером при записи. Байты кэшируются в локальном LRU по версии.
+    None - тела нет (старый кэш или CACHE_STORE_RESPONSE_BODY=False).
+    """
+    version = await get_cache_version(key, redis_conn)
+    entry_key = (key, version, 'body.gz' if gzip_encoded else 'body')
+
+    if version is not None:
+        cached = _local_cache.get(entry_key)
+        if cached is not None:
+            return cached
+
+    body_gz = await redis_conn.get(_body_key(key))
+    if not body_gz:
+        return None
+
+    body = body_gz if gzip_encoded else gzip.decompress(body_gz)
+    if version is not None:
+        _local_cache.put(entry_key, body)
+    return body
+
+
+def _indicator_state_key(key: str) -> str:
+    """HASH состояний инкрементальных индикаторов ключа: поле - монета."""
+    return f"cache:{key}:indicator_state"
+
+
+async def load_indicator_states(
+    key: str,
+    redis_conn: AsyncRedis,
+    symbols: Optional[List[str]] = None
+) -> Dict[str, Dict[str, Any]]:
+    """Состояния индикаторов (indicators/streaming.py) {symbol: dict}; битые пропускаются."""
+    state_key = _indicator_state_key(key)
+    if symbols is None:
+        raw = await redis_conn.hgetall(state_key)
+    else:
+        symbols = list(dict.fromkeys(symbols))
+        raw = dict(zip(symbols, await redis_conn.hmget(state_key, symbols))) if symbols else {}
+
+    states = {}
+    for symbol, data_bytes in raw.items():
+        if data_bytes is None:
+            continue
+        symbol = symbol.decode('utf-8') if isinstance(symbol, bytes) else symbol
+        state = _decode_payload(data_bytes, f"{state_key}:{symbol}")
+        if state is not None:
+            states[symbol] = state
+    return states
+
+
+async def save_indicator_states(key: str, states: Dict[str, Dict[str, Any]], redis_conn: AsyncRedis) -> None:
+    """
+    Сохраняет состояния индикаторов рядом с кэшем ключа (одним пайплайном).
+
+    HASH живет INDICATOR_STATE_TTL_INTERVALS интервалов таймфрейма с последней
+    записи; поля монет, которых больше нет в манифесте кэша (делистинг),
+    удаляются, а их состояния не записываются.
+    """
+    if not states:
+        return
+    state_key = _indicator_state_key(key)
+    stale: List[str] = []
+    symbols = await get_cache_symbols(key, redis_conn)
+    if symbols is not None:
+        listed = set(symbols)
+        states = {symbol: state for symbol, state in states.items() if symbol in listed}
+        for field in await redis_conn.hkeys(state_key):
+            field = field.decode('utf-8') if isinstance(field, bytes) else field
+            if field not in listed:
+                stale.append(field)
+
+    expiry_seconds = max(INDICATOR_RESULT_TTL_SECONDS, INDICATOR_STATE_TTL_INTERVALS * get_interval_duration_ms(key) // 1000)
+    async with redis_conn.pipeline(transaction=False) as pipe:
+        if states:
+            pipe.hset(state_key, mapping={symbol: _encode_payload(state, key) for symbol, state in states.items()})
+        if stale:
+            pipe.hdel(state_key, *stale)
+        pipe.expire(state_key, expiry_seconds)
+        await pipe.execute()
+    if stale:
+        logger.info(f"[CACHE] {state_key}: удалены состояния монет не из манифеста: {stale}")
+
+
+def _indicator_result_key(key: str, version: str, columns: List[str], symbol: str) -> str:
+    """
+    Ключ посчитанных индикаторов монеты для версии кэша и набора колонок
+    (набор - хэш отсортированных колонок, чтобы ключ был коротким).
+    """
+    set_id = hashlib.sha1(','.join(sorted(columns)).encode('utf-8')).hexdigest()[:12]
+    return f"cache:{key}:v{version}:indicators:{set_id}:{symbol}"
+
+
+async def load_indicator_results(
+    key: str,
+    version: str,
+    columns: List[str],
+    symbols: List[str],
+    redis_conn: AsyncRedis
+) -> Dict[str, Dict[str, Any]]:
+    """Сохраненные результаты /indicators {symbol: item} (одним MGET); промахи пропускаются."""
+    symbols = list(dict.fromkeys(symbols))
+    if not symbols:
+        return {}
+    result_keys = [_indicator_result_key(key, version, columns, symbol) for symbol in symbols]
+    results = {}
+    for symbol, result_key, data_bytes in zip(symbols, result_keys, await redis_conn.mget(result_keys)):
+        if data_bytes is None:
+            continue
+        item = _decode_payload(data_bytes, result_key)
+        if item is not None:
+            results[symbol] = item
+    return results
+
+
+async def save_indicator_results(
+    key: str,
+    version: str,
+    columns: List[str],
+    items: Dict[str, Dict[str, Any]],
+    redis_conn: AsyncRedis,
+    expiry_seconds: int
+) -> None:
+    """Сохраняет результаты /indicators по монетам с TTL (пайплайном)."""
+    if not items:
+        return
+    async with redis_conn.pipeline(transaction=False) as pipe:
+        for symbol, item in items.items():
+            pipe.set(_indicator_result_key(key, version, columns, symbol), _encode_payload(item, key), ex=expiry_seconds)
+        await pipe.execute()
+
+
 async def clear_queue(redis_conn: AsyncRedis, queue_key: str):
     """Очищает очередь задач."""
     await redis_conn.delete(queue_key)
     
     
 async def get_worker_status(redis_conn: AsyncRedis) -> Optional[bytes]:
-    """Возвращает статус блокировки воркера (bytes или None)."""
-    return await redis_conn.get(WORKER_LOCK_KEY)
+    """Возвращает токен любой занятой блокировки типа задачи (bytes или None)."""
+    async for key in redis_conn.scan_iter(match=f"{WORKER_LOCK_KEY}:*"):
+        lock_status = await redis_conn.get(key)
+        if lock_status:
+            return lock_status
+    return None
 
 
 async def check_if_task_is_running(timeframe: str, redis_conn: AsyncRedis) -> bool:
-    """Проверяет, выполняется ли задача для данного timeframe."""
-    lock_status = await get_worker_status(redis_conn)
-    return lock_status and lock_status.decode('utf-8') == WORKER_LOCK_VALUE
+    """Проверяет, выполняется ли задача для данного timeframe (блокировка типа задачи)."""
+    return timeframe in await running_task_types(redis_conn, [timeframe])
 
 
 async def add_task_to_queue(timeframe: str, redis_conn: AsyncRedis) -> bool:
     """Добавляет задачу с заданным timeframe в очередь Redis."""
-    task_payload = {"timeframe": timeframe}
+    return await add_payload_to_queue({"timeframe": timeframe}, redis_conn)
+
+
+async def add_payload_to_queue(task_payload: Dict[str, Any], redis_conn: AsyncRedis) -> bool:
+    """
+    Добавляет задачу в очередь Redis как есть:
+    {"timeframe": "1h"} или {"timeframes": ["1h", "4h"]} (один проход воркера).
+    """
     task_json = json.dumps(task_payload)
-    
+
     try:
         await redis_conn.rpush(REDIS_TASK_QUEUE_KEY, task_json.encode('utf-8'))
         return True
     except Exception as e:
-        logger.error(f"[QUEUE] Не удалось добавить задачу '{timeframe}' в очередь: {e}", exc_info=True)
+        logger.error(f"[QUEUE] Не удалось добавить задачу {task_payload} в очередь: {e}", exc_info=True)
         return False
\ No newline at end of file
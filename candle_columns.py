@@ -0,0 +1,205 @@
+# candle_columns.py
+"""
+Этот модуль содержит КОЛОНОЧНОЕ представление свечей одной монеты
+(struct of arrays) для всего пайплайна сборщика.
+
+Вместо списка словарей (~10 Python-объектов на свечу) каждая величина
+хранится в одном numpy-массиве:
+
+    openTime, closeTime                         -> int64
+    openPrice, highPrice, lowPrice, closePrice,
+    volume, volumeDelta, openInterest, fundingRate -> float64
+
+Пропуски: NaN для float-колонок, MISSING_INT для int-колонок.
+В старый формат (список словарей) данные переводятся только на краю
+API (to_records) - см. make_serializable и cache_manager.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+import numpy as np
+
+INT_FIELDS = ('openTime', 'closeTime')
+FLOAT_FIELDS = (
+    'openPrice', 'highPrice', 'lowPrice', 'closePrice',
+    'volume', 'volumeDelta', 'openInterest', 'fundingRate',
+)
+# Порядок полей в словаре свечи (как в merge_data)
+KLINE_FIELDS = (
+    'openTime', 'openPrice', 'highPrice', 'lowPrice', 'closePrice',
+    'volume', 'closeTime', 'volumeDelta',
+)
+# Эти поля попадают в словарь свечи, только если значение есть
+# (merge_data добавляет их только при найденном OI/FR)
+OPTIONAL_FIELDS = ('openInterest', 'fundingRate')
+FIELDS = KLINE_FIELDS + OPTIONAL_FIELDS
+
+MISSING_INT = np.iinfo(np.int64).min
+
+
+def _int_column(values: Iterable[Any]) -> np.ndarray:
+    values = [MISSING_INT if v is None else v for v in values]
+    return np.array(values, dtype=np.int64)
+
+
+def _float_column(values: Iterable[Any]) -> np.ndarray:
+    # None -> NaN делает сам numpy
+    return np.array(list(values), dtype=np.float64)
+
+
+def _column_to_list(field: str, column: np.ndarray) -> List[Any]:
+    """Переводит колонку в список Python-значений (пропуски -> None)."""
+    values = column.tolist()
+    if field in INT_FIELDS:
+        return [None if v == MISSING_INT else v for v in values]
+    return [None if v != v else v for v in values]
+
+
+class CandleColumns:
+    """
+    Свечи одной монеты в колоночном виде.
+
+    Поддерживает len(), срезы (cc[:-1], cc[-399:]), доступ к колонке
+    по имени (cc['closePrice']) и обратное преобразование в список словарей.
+    """
+    __slots__ = ('columns',)
+
+    def __init__(self, columns: Optional[Dict[str, np.ndarray]] = None):
+        columns = columns or {}
+        length = len(next(iter(columns.values()))) if columns else 0
+        self.columns: Dict[str, np.ndarray] = {}
+        for field in INT_FIELDS:
+            column = columns.get(field)
+            self.columns[field] = (
+                np.asarray(column, dtype=np.int64) if column is not None
+                else np.full(length, MISSING_INT, dtype=np.int64)
+            )
+        for field in FLOAT_FIELDS:
+            column = columns.get(field)
+            self.columns[field] = (
+                np.asarray(column, dtype=np.float64) if column is not None
+                else np.full(length, np.nan, dtype=np.float64)
+            )
+
+    # --- Конструкторы ---
+
+    @classmethod
+    def empty(cls) -> 'CandleColumns':
+        return cls({})
+
+    @classmethod
+    def from_records(cls, records: List[Dict[str, Any]]) -> 'CandleColumns':
+        """Строит колонки из списка словарей (старый формат)."""
+        if not records:
+            return cls.empty()
+        columns = {}
+        for field in INT_FIELDS:
+            columns[field] = _int_column(r.get(field) for r in records)
+        for field in FLOAT_FIELDS:
+            columns[field] = _float_column(r.get(field) for r in records)
+        return cls(columns)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, List[Any]]) -> 'CandleColumns':
+        """Обратная операция к to_dict() (чтение из кэша)."""
+        length = max((len(v) for v in data.values()), default=0)
+        columns = {}
+        for field in INT_FIELDS:
+            columns[field] = _int_column(data.get(field) or [None] * length)
+        for field in FLOAT_FIELDS:
+            columns[field] = _float_column(data.get(field) or [None] * length)
+        return cls(columns)
+
+    @classmethod
+    def concat(cls, parts: List['CandleColumns']) -> 'CandleColumns':
+        parts = [p for p in parts if len(p)]
+        if not parts:
+            return cls.empty()
+        return cls({f: np.concatenate([p.columns[f] for p in parts]) for f in FIELDS})
+
+    # --- Доступ ---
+
+    def __len__(self) -> int:
+        return len(self.columns['openTime'])
+
+    def __getitem__(self, item: Union[str, int, slice, np.ndarray]) -> Union[np.ndarray, 'CandleColumns']:
+        if isinstance(item, str):
+            return self.columns[item]
+        if isinstance(item, (int, np.integer)):
+            item = slice(item, item + 1 if item != -1 else None)
+        return CandleColumns({f: c[item] for f, c in self.columns.items()})
+
+    def __setitem__(self, field: str, column: np.ndarray) -> None:
+        dtype = np.int64 if field in INT_FIELDS else np.float64
+        self.columns[field] = np.asarray(column, dtype=dtype)
+
+    def __repr__(self) -> str:
+        return f"CandleColumns(len={len(self)})"
+
+    @property
+    def nbytes(self) -> int:
+        return sum(c.nbytes for c in self.columns.values())
+
+    def has_value(self, field: str, index: int = -1) -> bool:
+        """Есть ли значение поля в свече index (по умолчанию - в последней)."""
+        if not len(self):
+            return False
+        value = self.columns[field][index]
+        if field in INT_FIELDS:
+            return value != MISSING_INT
+        return not np.isnan(value)
+
+    def copy(self) -> 'CandleColumns':
+        return CandleColumns({f: c.copy() for f, c in self.columns.items()})
+
+    def sorted_by_time(self) -> 'CandleColumns':
+        """Стабильная сортировка по openTime (как sorted(..., key=openTime))."""
+        order = np.argsort(self.columns['openTime'], kind='stable')
+        return self[order]
+
+    # --- Преобразование на краю API ---
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        """Переводит в старый формат: список словарей свечей."""
+        lists = {f: _column_to_list(f, self.columns[f]) for f in FIELDS}
+        records = []
+        for i in range(len(self)):
+            record = {f: lists[f][i] for f in KLINE_FIELDS}
+            for f in OPTIONAL_FIELDS:
+                value = lists[f][i]
+                if value is not None:
+                    record[f] = value
+            records.append(record)
+        return records
+
+    def to_frame(self) -> 'pd.DataFrame':
+        """
+        DataFrame для расчета индикаторов (колонки как у pd.DataFrame(records):
+        OI/FR добавляются, только если есть хоть одно значение).
+        """
+        import pandas as pd
+
+        fields = list(KLINE_FIELDS) + [f for f in OPTIONAL_FIELDS if not np.isnan(self.columns[f]).all()]
+        return pd.DataFrame({f: self.columns[f] for f in fields})
+
+    def to_dict(self) -> Dict[str, List[Any]]:
+        """Компактная форма для кэша: {колонка: список значений}."""
+        return {f: _column_to_list(f, self.columns[f]) for f in FIELDS}
+
+
+def as_records(candles: Union[CandleColumns, List[Dict[str, Any]], None]) -> List[Dict[str, Any]]:
+    """Возвращает свечи в старом формате, независимо от представления."""
+    if isinstance(candles, CandleColumns):
+        return candles.to_records()
+    return candles or []
+
+
+def as_columns(candles: Union[CandleColumns, List[Dict[str, Any]], List[CandleColumns], None]) -> CandleColumns:
+    """
+    Возвращает свечи в колоночном формате, независимо от представления.
+    Список частей (CandleColumns от нескольких ответов API) склеивается.
+    """
+    if isinstance(candles, CandleColumns):
+        return candles
+    if candles and any(isinstance(c, CandleColumns) for c in candles):
+        return CandleColumns.concat([as_columns(c if isinstance(c, CandleColumns) else [c]) for c in candles])
+    return CandleColumns.from_records(candles or [])
@@ -1,3 +1,4 @@
+import logging
 import os
 from dotenv import load_dotenv
 
@@ -19,7 +20,26 @@ WORKER_LOCK_KEY = "data_collector_lock"
 # (НОВАЯ КОНСТАНТА для проверки блокировки)
 WORKER_LOCK_VALUE = "processing" # <-- ИСПРАВЛЕНИЕ
 
-WORKER_LOCK_TIMEOUT_SECONDS = 1800 # 30 минут
+WORKER_LOCK_TIMEOUT_SECONDS = 1800 # 30 минут (устарело: глобальная блокировка до task_locks.py)
+
+# Блокировки по типу задачи: {WORKER_LOCK_KEY}:{1h|4h|...} (task_locks.py).
+# Аренда короткая и продлевается heartbeat-ом, пока задача выполняется.
+WORKER_LOCK_LEASE_SECONDS = 60
+# Ожидание занятой блокировки/зависимости: пауза удваивается от 2 сек до этого предела
+WORKER_LOCK_POLL_MAX_SECONDS = 15
+# Сколько задач РАЗНЫХ типов один процесс воркера выполняет одновременно
+WORKER_MAX_PARALLEL_TASKS = int(os.environ.get("WORKER_MAX_PARALLEL_TASKS", 2))
+
+# Воркер ждет задачу блокирующим BLMOVE (task_queue.py) столько секунд.
+# Должно быть меньше socket_timeout соединения Redis (30 сек, cache_manager.py).
+WORKER_QUEUE_BLOCK_TIMEOUT = 20
+# TTL ключа жизни воркера: задачи воркера, не продлившего его, возвращаются в очередь
+WORKER_CONSUMER_TTL_SECONDS = 60
+
+# Режим процесса API (main.py):
+#   'combined' - API и воркер в одном процессе (локальный запуск, как раньше);
+#   'api'      - только API; воркер запускается отдельно: python -m worker
+SERVICE_MODE = os.environ.get("SERVICE_MODE", "combined").lower()
 
 # ============================================================================
 # === Конфигурация API (Этого Сервера) ===
@@ -29,6 +49,164 @@ SECRET_TOKEN = os.environ.get("SECRET_TOKEN")
 POST_TIMEFRAMES = ['1h', '4h', '8h', '12h', '1d']
 ALLOWED_CACHE_KEYS = ['1h', '4h', '8h', '12h', '1d', 'global_fr']
 
+# ============================================================================
+# === Производные таймфреймы (ресемплинг вместо запроса к биржам) ===
+# ============================================================================
+# {таймфрейм: базовый таймфрейм}. Производный таймфрейм не запрашивается
+# с бирж, а строится из cache:{базовый} (data_collector/resampler.py).
+# Глубина ограничена базовым кэшем: 1h (399 свечей) -> 4h дает ~99 свечей.
+# Переопределение через окружение: DERIVED_TIMEFRAMES="8h:4h,12h:4h"
+_DERIVED_TIMEFRAMES_DEFAULT = {'8h': '4h'}
+
+
+def _parse_derived_timeframes(value, default):
+    """
+    "8h:4h,12h:4h" -> {'8h': '4h', '12h': '4h'}. Битые пары пропускаются
+    с предупреждением (конфиг не должен ронять API и воркер при импорте);
+    если не осталось ни одной - default.
+    """
+    if not value:
+        return dict(default)
+    mapping = {}
+    for pair in value.split(","):
+        if not pair.strip():
+            continue
+        parts = [part.strip() for part in pair.split(":")]
+        if len(parts) != 2 or not all(parts):
+            logging.warning(f"[CONFIG] DERIVED_TIMEFRAMES: пропущена некорректная пара '{pair.strip()}' (ожидается 'tf:base').")
+            continue
+        mapping[parts[0]] = parts[1]
+    if not mapping:
+        logging.warning(f"[CONFIG] DERIVED_TIMEFRAMES='{value}' не содержит корректных пар, используется {default}.")
+        return dict(default)
+    return mapping
+
+
+DERIVED_TIMEFRAMES = _parse_derived_timeframes(os.environ.get("DERIVED_TIMEFRAMES"), _DERIVED_TIMEFRAMES_DEFAULT)
+
+# ============================================================================
+# === Инкрементальное обновление Klines ===
+# ============================================================================
+# Для этих таймфреймов воркер передает в fetch_market_data текущий кэш,
+# и с бирж запрашиваются только свечи с последнего openTime (data_collector/incremental.py).
+INCREMENTAL_REFRESH_TIMEFRAMES = ['1h', '4h', '12h', '1d']
+# Если с последней свечи кэша прошло больше интервалов - полный сбор
+INCREMENTAL_MAX_NEW_CANDLES = 48
+# Сколько последних точек FR запрашивать при инкрементальном обновлении
+INCREMENTAL_FR_LIMIT = 10
+
+# ============================================================================
+# === Лимиты запросов к биржам (data_collector/rate_limiter.py) ===
+# ============================================================================
+# Семейство эндпоинтов -> вес за period секунд и потолок одновременных запросов.
+#   binance:fapi         - /fapi/v1/klines (вес по limit), 2400 веса/мин на IP
+#   binance:futures_data - /futures/data/openInterestHist, 1000 запросов/5 мин
+#   binance:funding      - /fapi/v1/fundingRate, 500 запросов/5 мин
+#   bybit:market         - /v5/market/*, 600 запросов/5 сек на IP
+# weight_header - заголовок биржи с расходом веса ИМЕННО этого лимита: по нему
+# синхронизируется только это ведро (X-MBX-USED-WEIGHT-1M - вес /fapi на IP,
+# к лимитам futures_data и funding он не относится)
+RATE_LIMITS = {
+    'binance:fapi': {'capacity': 2400, 'period': 60, 'max_concurrency': 20, 'weight_header': 'X-MBX-USED-WEIGHT-1M'},
+    'binance:futures_data': {'capacity': 1000, 'period': 300, 'max_concurrency': 10},
+    'binance:funding': {'capacity': 500, 'period': 300, 'max_concurrency': 10},
+    'bybit:market': {'capacity': 600, 'period': 5, 'max_concurrency': 20},
+    'default': {'capacity': 100, 'period': 1, 'max_concurrency': 5},
+}
+# Какую долю лимита биржи используем (запас на другие процессы с того же IP)
+RATE_LIMIT_SAFETY_FACTOR = 0.8
+# Пауза после 429/418, если биржа не прислала Retry-After (сек)
+RATE_LIMIT_DEFAULT_RETRY_AFTER = 5
+# Лимит веса Binance за минуту (для X-MBX-USED-WEIGHT-1M)
+BINANCE_WEIGHT_LIMIT_1M = 2400
+
+# ============================================================================
+# === Повторы запросов к биржам (data_collector/retry_policy.py) ===
+# ============================================================================
+# Повторяются только временные ошибки: 429/418, 5xx, таймаут, обрыв соединения.
+RETRY_MAX_ATTEMPTS = 4
+# Экспоненциальная пауза с jitter: random(0, min(MAX, BASE * 2**n)) сек
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 10.0
+# Общий бюджет времени одной задачи (все попытки и паузы), сек
+RETRY_TASK_BUDGET_SECONDS = 45.0
+
+# ============================================================================
+# === HTTP-сессия для запросов к биржам (data_collector/http_session.py) ===
+# ============================================================================
+# Одна ClientSession на процесс: соединения с биржами переиспользуются между циклами.
+HTTP_CONNECTOR_LIMIT = 100       # всего открытых соединений
+HTTP_LIMIT_PER_HOST = 30         # соединений на один хост (fapi.binance.com, api.bybit.com)
+HTTP_DNS_CACHE_TTL = 300         # сек
+HTTP_KEEPALIVE_TIMEOUT = 60      # сек простоя, после которых соединение закрывается
+# Запрашивать br-сжатие (работает, только если установлен пакет Brotli)
+HTTP_ENABLE_BROTLI = os.environ.get("HTTP_ENABLE_BROTLI", "true").lower() == "true"
+
+# ============================================================================
+# === Потоковая обработка ответов бирж ===
+# ============================================================================
+# Потоковый сбор: ответы парсятся по мере прихода, монета сливается,
+# как только пришли все ее Klines/OI/FR (data_collector/__init__.py)
+STREAMING_PIPELINE = os.environ.get("STREAMING_PIPELINE", "true").lower() == "true"
+
+# ============================================================================
+# === Пул процессов для CPU-работы (data_collector/cpu_pool.py) ===
+# ============================================================================
+# Парсинг и слияние выполняются вне event loop API (индикаторы /indicators -
+# в потоке процесса API, см. INDICATOR_API_MAX_CONCURRENCY).
+# 0 - без пула (все в текущем процессе). По умолчанию: ядер - 1 (одно - event loop).
+CPU_POOL_WORKERS = int(os.environ.get("CPU_POOL_WORKERS", max(0, (os.cpu_count() or 1) - 1)))
+# spawn: процессы пула не наследуют event loop, потоки и соединения родителя
+CPU_POOL_START_METHOD = os.environ.get("CPU_POOL_START_METHOD", "spawn")
+
+# ============================================================================
+# === Шардированный кэш (один ключ на монету + манифест) ===
+# ============================================================================
+# Ключи, которые хранятся по схеме:
+#   cache:{tf}:manifest           -> версия, список символов, audit/метаданные
+#   cache:{tf}:v{version}:{symbol} -> данные одной монеты
+SHARDED_CACHE_KEYS = ['1h', '4h', '8h', '12h', '1d']
+# Сколько секунд живут шарды ПРЕДЫДУЩЕЙ версии после переключения манифеста
+# (чтобы читатели, успевшие получить старый манифест, дочитали свои шарды)
+CACHE_SHARD_GRACE_SECONDS = 120
+
+# ============================================================================
+# === Локальный (in-process) кэш декодированных ответов API ===
+# ============================================================================
+# Каждый процесс gunicorn держит LRU уже декодированных данных.
+# Актуальность проверяется одним GET по ключу cache:{key}:ver.
+LOCAL_CACHE_MAX_ENTRIES = 32
+
+# Сохранять ли при записи готовое тело ответа /get-cache/{key}
+# (gzip-сжатый JSON в cache:{key}:body), чтобы API отдавал его без пересериализации
+CACHE_STORE_RESPONSE_BODY = True
+
+# ============================================================================
+# === Индикаторы по запросу (GET /indicators/{timeframe}) ===
+# ============================================================================
+# Результаты хранятся в Redis по (таймфрейм, версия кэша, набор, монета):
+#   cache:{tf}:v{version}:indicators:{набор}:{symbol}
+# Новая версия кэша дает новые ключи, TTL убирает старые
+INDICATOR_RESULT_TTL_SECONDS = int(os.environ.get("INDICATOR_RESULT_TTL_SECONDS", 900))
+# Сколько расчетов /indicators один процесс API выполняет одновременно.
+# API не использует пул процессов (cpu_pool): при SERVICE_MODE=api каждый из
+# воркеров gunicorn создал бы свой пул и съел ядра, отданные воркеру сбора
+# (render.yaml). Расчет идет в потоке процесса API, остальные запросы ждут.
+INDICATOR_API_MAX_CONCURRENCY = int(os.environ.get("INDICATOR_API_MAX_CONCURRENCY", 1))
+# Состояния рекурсивных индикаторов (cache:{tf}:indicator_state, HASH по монетам)
+# живут столько интервалов таймфрейма с последней записи (не меньше
+# INDICATOR_RESULT_TTL_SECONDS): переживают публикацию кэша, но не копятся вечно
+INDICATOR_STATE_TTL_INTERVALS = 3
+
+# ============================================================================
+# === Кодек сериализации кэша (см. cache_codec.py) ===
+# ============================================================================
+# Доступные: 'gzip-json' (старый формат), 'orjson-zstd', 'msgpack-zstd'.
+# Чтение не зависит от настройки: формат определяется по заголовку данных.
+CACHE_CODEC_DEFAULT = os.environ.get("CACHE_CODEC", "msgpack-zstd")
+# Переопределение кодека для отдельных ключей, например {'global_fr': 'gzip-json'}
+CACHE_CODEC_BY_KEY = {}
+
 # ============================================================================
 # === Конфигурация Источника Монет (Coin Sifter API) ===
 # ============================================================================
@@ -16,6 +16,7 @@ import time
 # Импортируем из модулей этого пакета
 from . import task_builder
 from . import data_processing
+from . import incremental
 
 # --- ИСПРАВЛЕНИЕ: Добавляем прямой импорт get_global_fr_data для worker.py ---
 from .fr_fetcher import get_global_fr_data
@@ -23,6 +24,17 @@ from .fr_fetcher import get_global_fr_data
 
 from . import fr_fetcher # Оставляем импорт модуля, если он используется внутри
 from .fetch_strategies import CONCURRENCY_LIMIT
+from .rate_limiter import limiter_stats, global_semaphore
+from .retry_policy import retry_stats
+from .http_session import get_http_session
+from . import cpu_pool
+from candle_columns import CandleColumns, as_columns
+
+try:
+    from config import STREAMING_PIPELINE
+except ImportError:
+    STREAMING_PIPELINE = True
+
 # --- Используем logger напрямую ---
 import logging
 logger = logging.getLogger(__name__)
@@ -36,14 +48,218 @@ __all__ = [
 # --------------------------------------
 
 
+def _tasks_in_launch_order(tasks_to_run: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Klines/OI задачи (перемешанные для распределения нагрузки), затем FR."""
+    klines_oi_tasks = [t for t in tasks_to_run if t['task_info']['data_type'] in ['klines', 'oi']]
+    fr_tasks = [t for t in tasks_to_run if t['task_info']['data_type'] == 'fr']
+    random.shuffle(klines_oi_tasks)
+    return klines_oi_tasks + fr_tasks
+
+
+def _parse_result(task: Dict[str, Any], result: Any, log_prefix: str) -> Optional[CandleColumns]:
+    """Парсит ответ одной задачи в CandleColumns (None - ошибка запроса/пустой ответ)."""
+    task_info = task['task_info']
+    symbol = task_info['symbol']
+    data_type = task_info['data_type']
+
+    try:
+        if isinstance(result, Exception):
+            logger.error(f"{log_prefix} Ошибка запроса для {symbol} ({data_type}): {result}")
+            return None
+
+        task_info_result, raw_data = result
+
+        if not raw_data:
+            return None
+
+        # Основной парсинг (векторные парсеры -> CandleColumns;
+        # части одного symbol/data_type склеиваются в merge_columns)
+        parsed_result = task['parser'](raw_data, task['timeframe'])
+        return as_columns(parsed_result) if parsed_result else None
+
+    except Exception as e:
+        logger.error(f"{log_prefix} Ошибка парсинга для {symbol} ({data_type}): {e}", exc_info=True)
+        return None
+
+
+def _raw_item(task: Dict[str, Any], result: Any, log_prefix: str) -> Optional[cpu_pool.ParseItem]:
+    """Ответ задачи для парсинга в пуле процессов (None - ошибка запроса/пустой ответ)."""
+    task_info = task['task_info']
+    if isinstance(result, Exception):
+        logger.error(f"{log_prefix} Ошибка запроса для {task_info['symbol']} ({task_info['data_type']}): {result}")
+        return None
+    try:
+        task_info_result, raw_data = result
+    except Exception as e:
+        logger.error(f"{log_prefix} Ошибка парсинга для {task_info['symbol']} ({task_info['data_type']}): {e}", exc_info=True)
+        return None
+    if not raw_data:
+        return None
+    return (task_info['symbol'], task_info['data_type'], task['parser'], raw_data, task['timeframe'])
+
+
+def _add_prefetched_fr(
+    symbol_data: Dict[str, list],
+    symbol: str,
+    prefetched_fr_data: Optional[Dict[str, List[Dict]]]
+) -> None:
+    """Предварительно собранные FR монеты (задачи FR в этом случае не создаются)."""
+    fr_list = prefetched_fr_data.get(symbol) if prefetched_fr_data else None
+    if fr_list:
+        symbol_data['fr'].append(as_columns(fr_list))
+
+
+async def _fetch_and_parse(
+    tasks_to_run: List[Dict[str, Any]],
+    log_prefix: str,
+    prefetched_fr_data: Optional[Dict[str, List[Dict]]] = None
+) -> Optional[Dict[str, Dict[str, list]]]:
+    """
+    Шаги 2-4: выполняет задачи (общая ClientSession процесса) и парсит ответы.
+    Возвращает processed_data {symbol: {data_type: [части CandleColumns]}}
+    или None при критической ошибке gather.
+    """
+    # 2. Выполняем задачи параллельно
+    logger.info(f"{log_prefix} 2/6: Запуск асинхронного сбора данных (Лимит: {CONCURRENCY_LIMIT})...")
+    start_fetch_time = time.time()
+    
+    # Общий на процесс потолок: параллельные сборы (несколько таймфреймов) делят его
+    semaphore = global_semaphore(CONCURRENCY_LIMIT)
+    
+    # Общая долгоживущая сессия процесса (keep-alive, DNS-кэш, см. http_session.py)
+    session = await get_http_session()
+    
+    # Собираем задачи В ТОМ ПОРЯДКЕ, в котором они будут запущены
+    tasks_in_gather_order = _tasks_in_launch_order(tasks_to_run)
+    # Передаем ОДИН ClientSession всем задачам
+    async_tasks = [task["fetch_strategy"](session, task["task_info"], semaphore) for task in tasks_in_gather_order]
+        
+    try:
+        results = await asyncio.gather(*async_tasks, return_exceptions=True)
+    except Exception as e:
+        logger.error(f"{log_prefix} 2/6: Критическая ошибка во время asyncio.gather: {e}", exc_info=True)
+        return None
+
+    end_fetch_time = time.time()
+    logger.info(f"{log_prefix} 2/6: Сбор данных завершен за {end_fetch_time - start_fetch_time:.2f} сек.")
+    logger.info(f"{log_prefix} 2/6: Лимитеры бирж: {limiter_stats()}. Повторы: {retry_stats()}")
+
+    # 3. Добавляем prefetched FR (если они были)
+    if prefetched_fr_data:
+        logger.info(f"{log_prefix} 3/6: Добавляю предварительно собранные {len(prefetched_fr_data)} FR...")
+        # (FR данные добавляются после парсинга - задачи FR в этом случае не создаются)
+    else:
+        logger.info(f"{log_prefix} 3/6: Предварительно собранные FR отсутствуют.")
+
+    
+    # 4. Парсинг и обработка результатов
+    logger.info(f"{log_prefix} 4/6: Начинаю парсинг Klines/OI/FR...")
+    start_parse_time = time.time()
+    
+    # (Парсинг - в пуле процессов, по шардам монет; см. cpu_pool.py)
+    items = [_raw_item(task, result, log_prefix) for task, result in zip(tasks_in_gather_order, results)]
+    del results
+    processed_data = await cpu_pool.parse_in_pool([item for item in items if item is not None], prefetched_fr_data)
+
+    end_parse_time = time.time()
+    logger.info(f"{log_prefix} 4/6: Парсинг завершен за {end_parse_time - start_parse_time:.2f} сек.")
+
+    return processed_data
+
+
+async def _fetch_parse_merge_streaming(
+    tasks_to_run: List[Dict[str, Any]],
+    log_prefix: str,
+    prefetched_fr_data: Optional[Dict[str, List[Dict]]] = None
+) -> Dict[str, CandleColumns]:
+    """
+    Потоковый вариант шагов 2-5: ответы обрабатываются по мере прихода
+    (asyncio.as_completed). Каждый ответ сразу парсится (сырой JSON
+    освобождается), а монета сливается (merge_columns), как только пришли
+    все ее Klines/OI/FR. Парсинг идет, пока остальные запросы ждут сеть,
+    и в памяти не копятся сырые ответы всех ~750 запросов.
+    С пулом процессов (cpu_pool.py) готовая монета парсится и сливается
+    в процессе пула, event loop только принимает ответы.
+    Возвращает merged_data {symbol: CandleColumns}.
+    """
+    logger.info(f"{log_prefix} 2-5/6: Потоковый сбор, парсинг и слияние (Лимит: {CONCURRENCY_LIMIT})...")
+    start_time = time.time()
+
+    semaphore = global_semaphore(CONCURRENCY_LIMIT)
+    session = await get_http_session()
+
+    # Сколько ответов ждем по каждой монете
+    pending_count: Dict[str, int] = defaultdict(int)
+    for task in tasks_to_run:
+        pending_count[task['task_info']['symbol']] += 1
+
+    async def run(task: Dict[str, Any]):
+        try:
+            result = await task["fetch_strategy"](session, task["task_info"], semaphore)
+        except Exception as e:
+            result = e
+        return task, result
+
+    parsed_data: Dict[str, Dict[str, list]] = defaultdict(lambda: defaultdict(list))
+    # С пулом процессов монета целиком (сырые ответы) уходит в процесс пула
+    raw_items: Dict[str, list] = defaultdict(list)
+    pool_jobs = []
+    merged_data: Dict[str, CandleColumns] = {}
+    parse_seconds = 0.0
+
+    for next_done in asyncio.as_completed([run(task) for task in _tasks_in_launch_order(tasks_to_run)]):
+        task, result = await next_done
+        symbol = task['task_info']['symbol']
+
+        step_start = time.time()
+        if cpu_pool.cpu_pool.enabled:
+            item = _raw_item(task, result, log_prefix)
+            if item is not None:
+                raw_items[symbol].append(item)
+        else:
+            parsed = _parse_result(task, result, log_prefix)
+            if parsed is not None:
+                parsed_data[symbol][task['task_info']['data_type']].append(parsed)
+        # Сырой ответ больше не нужен (в пуле - после отправки монеты)
+        del result
+
+        pending_count[symbol] -= 1
+        if pending_count[symbol] == 0:
+            if cpu_pool.cpu_pool.enabled:
+                pool_jobs.append(asyncio.ensure_future(cpu_pool.cpu_pool.run(
+                    cpu_pool.parse_merge_shard,
+                    raw_items.pop(symbol, []),
+                    cpu_pool.fr_subset(prefetched_fr_data, [symbol]),
+                )))
+            else:
+                symbol_data = parsed_data.pop(symbol, None) or defaultdict(list)
+                _add_prefetched_fr(symbol_data, symbol, prefetched_fr_data)
+                merged_data.update(data_processing.merge_columns({symbol: symbol_data}))
+        parse_seconds += time.time() - step_start
+
+    for shard_result in await asyncio.gather(*pool_jobs):
+        merged_data.update(shard_result)
+
+    logger.info(
+        f"{log_prefix} 2-5/6: Готово за {time.time() - start_time:.2f} сек. "
+        f"(парсинг и слияние: {parse_seconds:.2f} сек., монет: {len(merged_data)})."
+    )
+    logger.info(f"{log_prefix} 2-5/6: Лимитеры бирж: {limiter_stats()}. Повторы: {retry_stats()}")
+    return merged_data
+
+
 async def fetch_market_data(
     coins: List[Dict], 
     timeframe: str, 
     prefetched_fr_data: Optional[Dict[str, List[Dict]]] = None, 
-    skip_formatting: bool = False
+    skip_formatting: bool = False,
+    previous_data: Optional[Dict[str, CandleColumns]] = None
 ) -> Dict[str, Any]:
     """
     Основная функция-оркестратор.
+    previous_data ({symbol: CandleColumns} из текущего кэша) включает
+    инкрементальный режим: запрашиваются только новые свечи (см. incremental.py),
+    монеты с разрывами собираются полностью.
     ...
     """
     log_prefix = f"[{timeframe.upper()}] DATA_COLLECTOR:"
@@ -57,10 +273,15 @@ async def fetch_market_data(
 
     # 1. Готовим задачи
     logger.info(f"{log_prefix} 1/6: Подготовка задач (Klines/OI/FR)...")
+    incremental_plan = incremental.plan_incremental(previous_data, timeframe) if previous_data else {}
+    if incremental_plan:
+        logger.info(f"{log_prefix} 1/6: Инкрементальное обновление для {len(incremental_plan)} из {len(coins)} монет.")
+    plan_kwargs = {"incremental_plan": incremental_plan} if incremental_plan else {}
     tasks_to_run = task_builder.prepare_tasks(
         coins, 
         timeframe, 
-        prefetched_fr_data
+        prefetched_fr_data,
+        **plan_kwargs
     )
     
     if not tasks_to_run:
@@ -70,112 +291,51 @@ async def fetch_market_data(
     logger.info(f"{log_prefix} 1/6: Готово. Всего {len(tasks_to_run)} задач.")
 
 
-    # 2. Выполняем задачи параллельно
-    logger.info(f"{log_prefix} 2/6: Запуск асинхронного сбора данных (Лимит: {CONCURRENCY_LIMIT})...")
-    start_fetch_time = time.time()
-    
-    semaphore = asyncio.Semaphore(CONCURRENCY_LIMIT)
-    async_tasks = []
-    
-    # --- ИСПРАВЛЕНИЕ УТЕЧКИ: Создаем ОДНУ ClientSession в контекстном менеджере ---
-    
-    # --- ИЗМЕНЕНИЕ: Логика сопоставления задач и результатов ---
-    tasks_in_gather_order = [] 
-    
-    async with aiohttp.ClientSession() as session:
-        
-        # Распределяем Klines, OI, FR задачи
-        klines_oi_tasks = [t for t in tasks_to_run if t['task_info']['data_type'] in ['klines', 'oi']]
-        fr_tasks = [t for t in tasks_to_run if t['task_info']['data_type'] == 'fr']
-
-        # Перемешиваем Klines/OI задачи для лучшего распределения нагрузки
-        random.shuffle(klines_oi_tasks)
-        
-        # Собираем задачи В ТОМ ПОРЯДКЕ, в котором они будут запущены
-        tasks_in_gather_order = klines_oi_tasks + fr_tasks
-        
-        # Собираем все задачи
-        for task in tasks_in_gather_order:
-            strategy_func = task["fetch_strategy"]
-            task_info = task["task_info"]
-            # Передаем ОДИН ClientSession всем задачам
-            async_tasks.append(strategy_func(session, task_info, semaphore)) 
-            
-        try:
-            results = await asyncio.gather(*async_tasks, return_exceptions=True)
-        except Exception as e:
-            logger.error(f"{log_prefix} 2/6: Критическая ошибка во время asyncio.gather: {e}", exc_info=True)
-            return {"data": [], "audit": {"symbols": 0}}
-    # --- КОНЕЦ ИСПРАВЛЕНИЯ УТЕЧКИ ---
-
-    end_fetch_time = time.time()
-    logger.info(f"{log_prefix} 2/6: Сбор данных завершен за {end_fetch_time - start_fetch_time:.2f} сек.")
-    
-# ... (Остальная часть функции fetch_market_data остается без изменений) ...
+    # 2-5. Потоковый режим: парсинг и слияние по мере прихода ответов
+    # (инкрементальному режиму нужны части до слияния - он идет обычным путем)
+    if STREAMING_PIPELINE and not incremental_plan:
+        merged_data = await _fetch_parse_merge_streaming(tasks_to_run, log_prefix, prefetched_fr_data)
+        return _finalize(merged_data, coins, timeframe, skip_formatting, log_prefix, start_total_time)
 
-    # 3. Добавляем prefetched FR (если они были)
-    if prefetched_fr_data:
-        logger.info(f"{log_prefix} 3/6: Добавляю предварительно собранные {len(prefetched_fr_data)} FR...")
-        # (FR данные добавляются на шаге парсинга/обработки)
-    else:
-        logger.info(f"{log_prefix} 3/6: Предварительно собранные FR отсутствуют.")
+    # 2-4. Сбор и парсинг
+    processed_data = await _fetch_and_parse(tasks_to_run, log_prefix, prefetched_fr_data)
+    if processed_data is None:
+        return {"data": [], "audit": {"symbols": 0}}
 
-    
-    # 4. Парсинг и обработка результатов
-    logger.info(f"{log_prefix} 4/6: Начинаю парсинг Klines/OI/FR...")
-    start_parse_time = time.time()
-    
-    processed_data = defaultdict(lambda: defaultdict(list))
-    
-    # --- ИЗМЕНЕНИЕ: Используем tasks_in_gather_order для zip ---
-    for task, result in zip(tasks_in_gather_order, results):
-    # ---------------------------------------------------------
-        task_info = task['task_info']
-        symbol = task_info['symbol']
-        data_type = task_info['data_type']
-        
-        try:
-            if isinstance(result, Exception):
-                logger.error(f"{log_prefix} Ошибка запроса для {symbol} ({data_type}): {result}")
-                continue
-                
-            task_info_result, raw_data = result
-            
-            if not raw_data:
-                continue
-                
-            parser_func = task['parser']
-            timeframe_arg = task['timeframe']
-            
-            # --- Логика для FR из prefetched_fr_data ---
-            if data_type == 'fr' and prefetched_fr_data:
-                fr_list = prefetched_fr_data.get(symbol, [])
-                if fr_list:
-                    processed_data[symbol][data_type].extend(fr_list)
-                continue
-            # ---------------------------------------------
-
-            # Основной парсинг
-            parsed_result = parser_func(raw_data, timeframe_arg)
-
-            if parsed_result:
-                processed_data[symbol][data_type].extend(parsed_result)
-            
-        except Exception as e:
-            logger.error(f"{log_prefix} Ошибка парсинга для {symbol} ({data_type}): {e}", exc_info=True)
-            
-    end_parse_time = time.time()
-    logger.info(f"{log_prefix} 4/6: Парсинг завершен за {end_parse_time - start_parse_time:.2f} сек.")
+    # 4a. Вклейка новых свечей в кэш; монеты с разрывами - полный сбор
+    if incremental_plan:
+        gap_symbols = set(incremental.splice_incremental(processed_data, previous_data, incremental_plan, timeframe))
+        if gap_symbols:
+            logger.warning(f"{log_prefix} 4/6: Разрывы у {len(gap_symbols)} монет, выполняю полный сбор для них.")
+            gap_coins = [c for c in coins if c['symbol'].split(':')[0] in gap_symbols]
+            full_data = await _fetch_and_parse(
+                task_builder.prepare_tasks(gap_coins, timeframe, prefetched_fr_data), log_prefix, prefetched_fr_data
+            )
+            for symbol in gap_symbols:
+                processed_data.pop(symbol, None)
+            if full_data:
+                processed_data.update(full_data)
 
 
-    # 5. Объединение данных (Klines + OI + FR)
+    # 5. Объединение данных (Klines + OI + FR) - в колоночном виде (CandleColumns)
     logger.info(f"{log_prefix} 5/6: Начинаю объединение данных Klines/OI/FR...")
     start_merge_time = time.time()
-    merged_data = data_processing.merge_data(processed_data)
+    merged_data = await cpu_pool.merge_in_pool(processed_data)
     end_merge_time = time.time()
     logger.info(f"{log_prefix} 5/6: Объединение данных завершено за {end_merge_time - start_merge_time:.2f} сек.")
 
-    
+    return _finalize(merged_data, coins, timeframe, skip_formatting, log_prefix, start_total_time)
+
+
+def _finalize(
+    merged_data: Dict[str, CandleColumns],
+    coins: List[Dict],
+    timeframe: str,
+    skip_formatting: bool,
+    log_prefix: str,
+    start_total_time: float
+) -> Dict[str, Any]:
+    """Шаг 6 (или merged_data как есть при skip_formatting)."""
     # --- ИЗМЕНЕНИЕ №1: Переносим 'skip_formatting' ДО шага 6 ---
     # (Это нужно, чтобы worker.py мог получить ПОЛНЫЕ (800 свечей) merged_data
     # для '4h' ПЕРЕД тем, как 'format_final_structure' их обрежет)
@@ -196,5 +356,4 @@ async def fetch_market_data(
 
     end_total_time = time.time()
     logger.info(f"{log_prefix} --- Полный цикл сбора данных завершен за {end_total_time - start_total_time:.2f} сек. ---")
-    
     return final_structured_data
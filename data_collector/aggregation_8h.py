@@ -1,15 +1,19 @@
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Union
 from collections import defaultdict
 import time 
 
+import numpy as np
+
+from candle_columns import CandleColumns, MISSING_INT, as_columns
+
 # --- Импорты из других модулей проекта ---
 try:
     # --- ИЗМЕНЕНИЕ №1: (Импорты из корня, а не относительные) ---
     from api_helpers import get_interval_duration_ms
     from cache_manager import save_to_cache, get_redis_connection
     from data_collector.logging_setup import logger
-    from data_collector.data_processing import merge_data, format_final_structure
+    from data_collector.data_processing import merge_data, merge_columns, format_final_structure
 
 except ImportError:
     # Фоллбэки
@@ -22,6 +26,7 @@ except ImportError:
     async def save_to_cache(redis_conn, tf, data): pass # --- Исправлена заглушка ---
     async def get_redis_connection(): return None # --- Исправлена заглушка ---
     def merge_data(data): return {}
+    def merge_columns(data): return {}
     def format_final_structure(data, coins, tf): return {}
 
 
@@ -149,6 +154,102 @@ def _build_8h_candles_from_end(candles_4h: List[Dict], data_type: str, symbol: s
     return result
 
 
+# ============================================================================
+# === ВЕКТОРНАЯ АГРЕГАЦИЯ 4h -> 8h (CandleColumns) ===
+# ============================================================================
+
+def _pair_indices_from_end(open_time: np.ndarray, close_time: np.ndarray) -> tuple:
+    """
+    Векторный аналог обхода _build_8h_candles_from_end: индексы пар
+    (первая 4h, вторая 4h) в порядке возрастания времени.
+
+    1. Якорь - последняя свеча (индекс >= 1), чей closeTime закрывает 8h.
+    2. Свечи [0..якорь] режутся на непрерывные участки
+       (openTime == closeTime предыдущей + 1).
+    3. Внутри участка пары собираются от его конца: обход "с конца"
+       при разрыве сдвигается на одну свечу и продолжает с конца
+       предыдущего участка - ровно это и дает разбиение на участки.
+    """
+    eight_hours_ms = get_interval_duration_ms('8h')
+    empty = np.array([], dtype=np.int64)
+    if len(open_time) < 2 or not eight_hours_ms:
+        return empty, empty
+
+    is_anchor = (close_time != MISSING_INT) & (close_time != 0) & ((close_time + 1) % eight_hours_ms == 0)
+    is_anchor[0] = False
+    anchors = np.flatnonzero(is_anchor)
+    if not len(anchors):
+        return empty, empty
+
+    size = anchors[-1] + 1
+    open_time, close_time = open_time[:size], close_time[:size]
+
+    linked = np.zeros(size, dtype=bool)
+    linked[1:] = (open_time[1:] == close_time[:-1] + 1) & (close_time[:-1] != MISSING_INT)
+
+    run_starts = np.flatnonzero(~linked)
+    run_ends = np.append(run_starts[1:] - 1, size - 1)
+    run_id = np.cumsum(~linked) - 1
+
+    idx = np.arange(size)
+    is_second = ((run_ends[run_id] - idx) % 2 == 0) & (idx > run_starts[run_id])
+    second = np.flatnonzero(is_second)
+    return second - 1, second
+
+
+def build_8h_columns(candles_4h: Union[CandleColumns, List[Dict]], symbol: str) -> Dict[str, CandleColumns]:
+    """
+    Агрегирует смерженные 4h свечи одной монеты в 8h за один векторный проход.
+    Возвращает {'klines', 'oi', 'fr'} (формат processed_data для merge_columns),
+    с теми же правилами, что и _aggregate_* для пар свечей.
+    """
+    candles = as_columns(candles_4h)
+    first, second = _pair_indices_from_end(candles['openTime'], candles['closeTime'])
+    if not len(second):
+        return {'klines': CandleColumns.empty(), 'oi': CandleColumns.empty(), 'fr': CandleColumns.empty()}
+
+    open_time = candles['openTime'][first]
+    close_time = candles['closeTime'][second]
+    times_ok = (open_time != MISSING_INT) & (close_time != MISSING_INT)
+
+    # --- Klines (как _aggregate_klines_4h_to_8h) ---
+    open_price = candles['openPrice'][first]
+    close_price = candles['closePrice'][second]
+    high = np.stack([candles['highPrice'][first], candles['highPrice'][second]])
+    low = np.stack([candles['lowPrice'][first], candles['lowPrice'][second]])
+    klines_ok = (
+        ~np.isnan(open_price) & ~np.isnan(close_price)
+        & ~np.isnan(high).any(axis=0) & ~np.isnan(low).any(axis=0)
+        & (close_time != MISSING_INT)
+    )
+    volume = np.nan_to_num(candles['volume'][first]) + np.nan_to_num(candles['volume'][second])
+    volume_delta = np.nan_to_num(candles['volumeDelta'][first]) + np.nan_to_num(candles['volumeDelta'][second])
+    klines = CandleColumns({
+        'openTime': open_time,
+        'openPrice': open_price,
+        'highPrice': high.max(axis=0),
+        'lowPrice': low.min(axis=0),
+        'closePrice': close_price,
+        'volume': np.round(volume, 2),
+        'closeTime': close_time,
+        'volumeDelta': np.round(volume_delta, 2),
+    })[klines_ok]
+
+    # --- OI: значение второй 4h свечи ---
+    oi_value = candles['openInterest'][second]
+    oi = CandleColumns({'openTime': open_time, 'openInterest': oi_value, 'closeTime': close_time})
+    oi = oi[times_ok & ~np.isnan(oi_value)]
+
+    # --- FR: вторая 4h свеча, иначе первая ---
+    fr_second = candles['fundingRate'][second]
+    fr_value = np.where(np.isnan(fr_second), candles['fundingRate'][first], fr_second)
+    fr = CandleColumns({'openTime': open_time, 'fundingRate': fr_value, 'closeTime': close_time})
+    fr = fr[times_ok & ~np.isnan(fr_value)]
+
+    logger.debug(f"[8H_GEN_CORE] {symbol}: Построено {len(klines)} 8h-свечей из {len(candles)} 4h-свечей.")
+    return {'klines': klines, 'oi': oi, 'fr': fr}
+
+
 # --- ИЗМЕНЕНИЕ №2: Адаптация к формату final_structured_data (из worker.py) ---
 async def generate_and_save_8h_cache(
     data_4h_list: List[Dict], # 1. Принимаем список (из cache:4h -> data)
@@ -159,7 +260,8 @@ async def generate_and_save_8h_cache(
     
     Args:
         data_4h_list: Список данных 4h из кэша (ОБРЕЗАННЫЙ, 399 свечей).
-                 Ожидаемый формат: [{"symbol": "BTCUSDT", "data": [...]}, ...]
+                 Ожидаемый формат: [{"symbol": "BTCUSDT", "data": [...]}, ...],
+                 где "data" - список словарей или CandleColumns.
         coins_from_api: Список монет с биржи
     """
     logger.info(f"[8H_GEN] Начинаю генерацию данных 8h из (обрезанных [:-1]) данных 4h...")
@@ -183,31 +285,21 @@ async def generate_and_save_8h_cache(
         # 'data' в этом формате УЖЕ содержит СМЕРЖЕННЫЕ (klines+oi+fr) свечи 4h
         candles_4h = coin_data.get('data', []) 
         
-        if not symbol or not candles_4h or len(candles_4h) < 2:
+        if not symbol or candles_4h is None or len(candles_4h) < 2:
             continue
         
         symbols_with_data_count += 1
         
-        # 3. Так как данные уже смержены,
-        # мы передаем один и тот же список свечей (candles_4h)
-        # во все функции агрегации.
-        oi_4h = candles_4h
-        fr_4h = candles_4h
-        # --------------------------------------------------
-
-        # Агрегируем разные типы данных отдельно
-        klines_8h = _build_8h_candles_from_end(candles_4h, 'klines', symbol)
-        ois_8h = _build_8h_candles_from_end(oi_4h, 'oi', symbol)
-        frs_8h = _build_8h_candles_from_end(fr_4h, 'fr', symbol)
-
-        if not klines_8h:
-             logger.debug(f"[8H_GEN] _build_8h_candles_from_end(klines) вернул [] для {symbol}. Пропускаю монету.")
+        # Так как данные уже смержены, klines/OI/FR 8h строятся
+        # из одних и тех же 4h свечей за один векторный проход.
+        aggregated = build_8h_columns(candles_4h, symbol)
+
+        if not aggregated['klines']:
+             logger.debug(f"[8H_GEN] build_8h_columns вернул 0 klines для {symbol}. Пропускаю монету.")
              symbols_skipped_no_klines_count += 1
              continue 
 
-        processed_data_8h[symbol]['klines'] = klines_8h
-        processed_data_8h[symbol]['oi'] = ois_8h
-        processed_data_8h[symbol]['fr'] = frs_8h 
+        processed_data_8h[symbol] = aggregated
         symbols_processed_count += 1
     # --- КОНЕЦ ИЗМЕНЕНИЯ №2 ---
 
@@ -221,7 +313,7 @@ async def generate_and_save_8h_cache(
         return
 
     logger.info(f"[8H_GEN] Начинаю слияние данных 8h...")
-    merged_8h_data = merge_data(processed_data_8h)
+    merged_8h_data = merge_columns(processed_data_8h)
     logger.info(f"[8H_GEN] Слияние данных 8h завершено для {len(merged_8h_data)} монет.")
 
     if not merged_8h_data:
@@ -0,0 +1,220 @@
+# data_collector/cpu_pool.py
+"""
+Пул процессов для CPU-работы сборщика (парсинг и слияние).
+
+Воркер живет в одном event loop с FastAPI (main.py), поэтому парсинг
+~750 ответов и слияние в этом же потоке задерживали ответы API.
+Здесь эта работа уходит в ProcessPoolExecutor:
+
+    - монеты делятся на шарды (shard_symbols), шард - одна задача пула;
+    - в процесс пула уходят сырые ответы/части, назад возвращаются
+      CandleColumns (numpy-массивы, pickle без поэлементного копирования);
+    - функции шардов - верхнего уровня (их можно передать в spawn-процесс).
+
+CPU_POOL_WORKERS = 0 (или одно ядро) - пул не создается, шарды
+считаются в текущем процессе. Если пул недоступен (например, парсер
+нельзя передать в другой процесс) - тоже считаем на месте.
+"""
+import asyncio
+import multiprocessing
+import os
+import pickle
+from collections import defaultdict
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    from .logging_setup import logger
+except ImportError:
+    import logging
+    logger = logging.getLogger(__name__)
+
+try:
+    from config import CPU_POOL_WORKERS, CPU_POOL_START_METHOD
+except ImportError:
+    CPU_POOL_WORKERS = max(0, (os.cpu_count() or 1) - 1)
+    CPU_POOL_START_METHOD = "spawn"
+
+from candle_columns import CandleColumns, as_columns
+
+# (symbol, data_type, parser, raw_data, timeframe)
+ParseItem = Tuple[str, str, Callable, Any, str]
+
+
+# --- Функции, выполняемые в процессах пула ---
+
+def parse_shard(
+    items: List[ParseItem],
+    prefetched_fr_data: Optional[Dict[str, List[Dict]]] = None
+) -> Dict[str, Dict[str, List[CandleColumns]]]:
+    """Парсит ответы шарда: {symbol: {data_type: [части CandleColumns]}}."""
+    processed_data = defaultdict(lambda: defaultdict(list))
+    for symbol, data_type, parser, raw_data, timeframe in items:
+        try:
+            parsed = parser(raw_data, timeframe)
+            if parsed:
+                processed_data[symbol][data_type].append(as_columns(parsed))
+        except Exception as e:
+            logger.error(f"[CPU_POOL] Ошибка парсинга для {symbol} ({data_type}): {e}", exc_info=True)
+
+    if prefetched_fr_data:
+        for symbol in {item[0] for item in items}:
+            fr_list = prefetched_fr_data.get(symbol)
+            if fr_list:
+                processed_data[symbol]['fr'].append(as_columns(fr_list))
+
+    # defaultdict с lambda не передается между процессами
+    return {symbol: dict(data_types) for symbol, data_types in processed_data.items()}
+
+
+def merge_shard(processed_data: Dict[str, Dict[str, Any]]) -> Dict[str, CandleColumns]:
+    """merge_columns для шарда монет."""
+    from .data_processing import merge_columns
+    return merge_columns(processed_data)
+
+
+def parse_merge_shard(
+    items: List[ParseItem],
+    prefetched_fr_data: Optional[Dict[str, List[Dict]]] = None
+) -> Dict[str, CandleColumns]:
+    """Парсинг и слияние шарда за одну передачу в процесс пула."""
+    return merge_shard(parse_shard(items, prefetched_fr_data))
+
+
+def _run_task(func: Callable, *args: Any) -> Any:
+    """
+    func(*args) в процессе пула. Ошибка самой функции помечается
+    (атрибут переживает pickle), чтобы CpuPool.run отличил ее от ошибок
+    пула (передача аргументов, упавший процесс) и не считал шард повторно.
+    """
+    try:
+        return func(*args)
+    except Exception as e:
+        e.raised_in_task = True
+        raise
+
+
+# Ошибки пула, а не функции: задачу можно посчитать в текущем процессе.
+# TypeError/AttributeError - не удалось передать функцию/аргументы (pickle),
+# RuntimeError - пул уже остановлен (submit после shutdown)
+_POOL_ERRORS = (BrokenProcessPool, pickle.PicklingError, TypeError, AttributeError, RuntimeError)
+
+
+# --- Пул ---
+
+class CpuPool:
+    """Ленивый ProcessPoolExecutor (один на процесс)."""
+
+    def __init__(self, workers: int = CPU_POOL_WORKERS, start_method: str = CPU_POOL_START_METHOD):
+        self.workers = workers
+        self.start_method = start_method
+        self._executor: Optional[Executor] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.workers > 0
+
+    def executor(self) -> Executor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context(self.start_method),
+            )
+            logger.info(f"[CPU_POOL] Создан пул процессов: {self.workers} (start_method={self.start_method}).")
+        return self._executor
+
+    async def run(self, func: Callable, *args: Any) -> Any:
+        """
+        func(*args) в процессе пула (или на месте, если пул выключен/недоступен).
+        Ошибки самой функции пробрасываются: на месте повторяется только
+        задача, которую не удалось передать в пул или которую потерял пул.
+        """
+        if not self.enabled:
+            return func(*args)
+        name = getattr(func, '__name__', func)
+        try:
+            executor = self.executor()
+        except Exception as e:
+            logger.warning(f"[CPU_POOL] {name}: пул не запущен ({e}), считаю в текущем процессе.")
+            return func(*args)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, _run_task, func, *args)
+        except _POOL_ERRORS as e:
+            if getattr(e, 'raised_in_task', False):
+                raise
+            logger.warning(f"[CPU_POOL] {name}: пул недоступен ({e!r}), считаю в текущем процессе.")
+            if isinstance(e, BrokenProcessPool):
+                self.shutdown()
+            return func(*args)
+
+    async def map_shards(self, func: Callable, shards: List[Any], *args: Any) -> List[Any]:
+        """func(shard, *args) для всех шардов параллельно."""
+        return list(await asyncio.gather(*(self.run(func, shard, *args) for shard in shards)))
+
+    def shutdown(self) -> None:
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+            logger.info("[CPU_POOL] Пул процессов остановлен.")
+
+
+cpu_pool = CpuPool()
+
+
+def shard_symbols(symbols: List[str], shards: int) -> List[List[str]]:
+    """Делит монеты на shards групп (по кругу, чтобы шарды были равными)."""
+    shards = max(1, min(shards, len(symbols)))
+    return [symbols[i::shards] for i in range(shards)] if symbols else []
+
+
+def _shard_count() -> int:
+    # Несколько шардов на процесс пула - чтобы медленный шард не держал остальные
+    return cpu_pool.workers * 2 if cpu_pool.enabled else 1
+
+
+async def parse_in_pool(
+    items: List[ParseItem],
+    prefetched_fr_data: Optional[Dict[str, List[Dict]]] = None
+) -> Dict[str, Dict[str, List[CandleColumns]]]:
+    """Шаг 4 (парсинг) по шардам монет."""
+    groups = _group_items(items)
+    shard_runs = []
+    for symbols in shard_symbols(list(groups), _shard_count()):
+        shard_items = [item for symbol in symbols for item in groups[symbol]]
+        shard_runs.append(cpu_pool.run(parse_shard, shard_items, fr_subset(prefetched_fr_data, symbols)))
+
+    processed_data = defaultdict(lambda: defaultdict(list))
+    for shard_result in await asyncio.gather(*shard_runs):
+        for symbol, data_types in shard_result.items():
+            processed_data[symbol].update(data_types)
+    return processed_data
+
+
+async def merge_in_pool(processed_data: Dict[str, Dict[str, Any]]) -> Dict[str, CandleColumns]:
+    """Шаг 5 (merge_columns) по шардам монет."""
+    shards = [
+        {symbol: dict(processed_data[symbol]) for symbol in symbols}
+        for symbols in shard_symbols(list(processed_data), _shard_count())
+    ]
+    merged_data: Dict[str, CandleColumns] = {}
+    for shard_result in await cpu_pool.map_shards(merge_shard, shards):
+        merged_data.update(shard_result)
+    return merged_data
+
+
+def _group_items(items: List[ParseItem]) -> Dict[str, List[ParseItem]]:
+    groups: Dict[str, List[ParseItem]] = defaultdict(list)
+    for item in items:
+        groups[item[0]].append(item)
+    return groups
+
+
+def fr_subset(
+    prefetched_fr_data: Optional[Dict[str, List[Dict]]],
+    symbols: Any
+) -> Optional[Dict[str, List[Dict]]]:
+    """Только FR нужных монет (меньше данных на передачу в пул)."""
+    if not prefetched_fr_data:
+        return None
+    return {symbol: prefetched_fr_data[symbol] for symbol in symbols if symbol in prefetched_fr_data}
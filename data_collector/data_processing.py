@@ -4,9 +4,13 @@
 (Логика 8h ВЫНЕСЕНА в aggregation_8h.py)
 """
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Union
 from collections import defaultdict
 
+import numpy as np
+
+from candle_columns import CandleColumns, as_columns, MISSING_INT
+
 # Используем try-except для импорта логгера, если он уже настроен
 try:
     from .logging_setup import logger
@@ -14,9 +18,10 @@ except ImportError:
     logger = logging.getLogger(__name__)
 
 
-def merge_data(processed_data: Dict[str, Dict[str, list]]) -> Dict[str, list]:
+def merge_data_rows(processed_data: Dict[str, Dict[str, list]]) -> Dict[str, list]:
     """
-    (Код этой функции не изменен)
+    Построчное слияние (два курсора по отсортированным спискам).
+    Эталон для merge_data / merge_columns (golden-тест).
     """
     final_data = {}
 
@@ -75,10 +80,135 @@ def merge_data(processed_data: Dict[str, Dict[str, list]]) -> Dict[str, list]:
     return final_data
 
 
-def format_final_structure(market_data: Dict[str, list], coins: List[Dict], timeframe: str) -> Dict[str, Any]:
+def _symbol_ids(lengths: List[int]) -> np.ndarray:
+    """Номер монеты для каждой строки склеенного массива."""
+    return np.repeat(np.arange(len(lengths)), lengths)
+
+
+def _batch_asof_join(
+    kline_sym: np.ndarray,
+    kline_time: np.ndarray,
+    sources: List[CandleColumns],
+    field: str
+) -> np.ndarray:
+    """
+    Backward as-of join (как pandas.merge_asof(by=symbol)) сразу по всем монетам:
+    для каждой свечи берет field из последней записи ЭТОЙ ЖЕ монеты
+    с openTime <= openTime свечи. Нет такой записи - NaN.
+
+    Ключ сортировки = (номер монеты, ранг времени), поэтому один
+    np.searchsorted обслуживает весь батч.
+    """
+    source = CandleColumns.concat(sources)
+    if not len(source):
+        return np.full(len(kline_time), np.nan)
+    source_sym = _symbol_ids([len(s) for s in sources])
+
+    # Ранги времен (общие для свечей и источника), чтобы ключ не переполнял int64
+    _, ranks = np.unique(np.concatenate([kline_time, source['openTime']]), return_inverse=True)
+    ranks = ranks.reshape(-1)
+    n_ranks = int(ranks.max()) + 1
+    kline_key = kline_sym * n_ranks + ranks[:len(kline_time)]
+    source_key = source_sym * n_ranks + ranks[len(kline_time):]
+
+    order = np.argsort(source_key, kind='stable')
+    source_key = source_key[order]
+    source_sym = source_sym[order]
+    values = source[field][order]
+
+    idx = np.searchsorted(source_key, kline_key, side='right') - 1
+    safe_idx = np.clip(idx, 0, None)
+    found = (idx >= 0) & (source_sym[safe_idx] == kline_sym)
+    return np.where(found, values[safe_idx], np.nan)
+
+
+def merge_columns(processed_data: Dict[str, Dict[str, Any]]) -> Dict[str, CandleColumns]:
+    """
+    Векторное слияние Klines + OI + FR всех монет одним батчем.
+    Входные данные могут быть списками словарей, CandleColumns или
+    списками частей CandleColumns (см. fetch_market_data).
+    """
+    symbols: List[str] = []
+    kline_parts, oi_parts, fr_parts = [], [], []
+
+    for symbol, data_types in processed_data.items():
+        klines = as_columns(data_types.get('klines'))
+        # Свечи без openTime пропускаются (как в merge_data_rows)
+        klines = klines[klines['openTime'] != MISSING_INT]
+        if not len(klines):
+            continue
+        symbols.append(symbol)
+        kline_parts.append(klines)
+        oi_parts.append(as_columns(data_types.get('oi')))
+        fr_parts.append(as_columns(data_types.get('fr')))
+
+    if not symbols:
+        return {}
+
+    lengths = [len(k) for k in kline_parts]
+    klines = CandleColumns.concat(kline_parts)
+    kline_sym = _symbol_ids(lengths)
+
+    # Стабильная сортировка по (монета, openTime); монеты уже идут блоками
+    order = np.lexsort((klines['openTime'], kline_sym))
+    klines = klines[order]
+
+    klines['openInterest'] = _batch_asof_join(kline_sym, klines['openTime'], oi_parts, 'openInterest')
+    klines['fundingRate'] = _batch_asof_join(kline_sym, klines['openTime'], fr_parts, 'fundingRate')
+
+    final_data = {}
+    bounds = np.cumsum([0] + lengths)
+    for i, symbol in enumerate(symbols):
+        final_data[symbol] = klines[bounds[i]:bounds[i + 1]]
+    return final_data
+
+
+def merge_data(processed_data: Dict[str, Dict[str, list]]) -> Dict[str, list]:
+    """
+    Объединяет Klines + OI + FR в список словарей на монету.
+    Считается через merge_columns (as-of join на np.searchsorted);
+    результат совпадает с merge_data_rows.
+    """
+    return {symbol: candles.to_records() for symbol, candles in merge_columns(processed_data).items()}
+
+
+def _is_missing_in_last(candles: Union[CandleColumns, list], field: str) -> bool:
+    """Отсутствует ли field в последней свече (для audit_report)."""
+    if isinstance(candles, CandleColumns):
+        return not candles.has_value(field)
+    last_candle = candles[-1]
+    return field not in last_candle or last_candle[field] is None
+
+
+def _time_bounds(data_list_formatted: List[Dict[str, Any]]) -> tuple:
+    """Общий (min openTime, max closeTime) по всем монетам."""
+    open_times, close_times = [], []
+    for coin_data in data_list_formatted:
+        candles = coin_data['data']
+        if isinstance(candles, CandleColumns):
+            valid_open = candles['openTime'][candles['openTime'] != MISSING_INT]
+            valid_close = candles['closeTime'][candles['closeTime'] != MISSING_INT]
+            if len(valid_open):
+                open_times.append(int(valid_open.min()))
+            if len(valid_close):
+                close_times.append(int(valid_close.max()))
+        else:
+            open_times.extend(c['openTime'] for c in candles if 'openTime' in c)
+            close_times.extend(c['closeTime'] for c in candles if 'closeTime' in c)
+    return (min(open_times) if open_times else None, max(close_times) if close_times else None)
+
+
+def format_final_structure(
+    market_data: Dict[str, Union[list, CandleColumns]],
+    coins: List[Dict],
+    timeframe: str,
+    drop_incomplete: bool = True
+) -> Dict[str, Any]:
     """
     Форматирует собранные данные в финальную структуру с метаданными,
     включает 'audit_report' и ОБРЕЗАЕТ данные до 399 свечей.
+    Свечи могут быть списками словарей или CandleColumns (тип сохраняется).
+    drop_incomplete=False - последняя свеча уже закрыта (производные таймфреймы).
     
     (Код ИЗМЕНЕН - добавлена проверка для '8h')
     """
@@ -106,7 +236,7 @@ def format_final_structure(market_data: Dict[str, list], coins: List[Dict], time
         # --- ОТМЕНА ИЗМЕНЕНИЯ: Возвращаем к оригинальной логике (ОБРЕЗАЕМ ВСЕ) ---
         
         # Для 8h данные УЖЕ агрегированы и полны. Обрезка [:-1] не нужна.
-        if timeframe == '8h':
+        if timeframe == '8h' or not drop_incomplete:
             candles_completed = candles
         else:
             # Для 1h, 4h и т.д. - удаляем последнюю (неполную) свечу
@@ -127,10 +257,9 @@ def format_final_structure(market_data: Dict[str, list], coins: List[Dict], time
             continue
 
         # Проверка наличия OI/FR в ПОСЛЕДНЕЙ из обрезанных свечей
-        last_candle = final_candles[-1]
-        if 'openInterest' not in last_candle or last_candle['openInterest'] is None:
+        if _is_missing_in_last(final_candles, 'openInterest'):
             missing_oi_symbols.append(symbol)
-        if 'fundingRate' not in last_candle or last_candle['fundingRate'] is None:
+        if _is_missing_in_last(final_candles, 'fundingRate'):
             missing_fr_symbols.append(symbol)
 
         data_list_formatted.append({
@@ -157,9 +286,7 @@ def format_final_structure(market_data: Dict[str, list], coins: List[Dict], time
         logging.warning(f"{log_prefix} AUDIT [FR]: Отсутствует FR (в посл. свече) для {len(missing_fr_symbols)}/{num_checked} монет: {sorted(missing_fr_symbols)[:5]}...")
 
     # --- Расчет общего openTime/closeTime ---
-    all_final_candles = [candle for coin_data in data_list_formatted for candle in coin_data['data']]
-    min_open_time = min(c['openTime'] for c in all_final_candles if 'openTime' in c) if all_final_candles else None
-    max_close_time = max(c['closeTime'] for c in all_final_candles if 'closeTime' in c) if all_final_candles else None
+    min_open_time, max_close_time = _time_bounds(data_list_formatted)
 
     # Добавляем exchanges к data_list_formatted перед возвратом
     exchanges_map = {c['symbol']: c['exchanges'] for c in coins}
@@ -1,25 +1,110 @@
 import asyncio
+import time
 import aiohttp
-from typing import Dict, Any, Tuple, Optional, List
+from contextlib import asynccontextmanager
+from typing import Dict, Any, AsyncIterator, Tuple, Optional, List
 from urllib.parse import urlparse, parse_qs, urlencode, urlunparse
 
 # --- ИЗМЕНЕНИЕ: Убираем oi_fr_error_logger ---
 try:
     from .logging_setup import logger
+    from . import rate_limiter
+    from . import retry_policy
+    from .retry_policy import RetryableFetchError
+    from .http_session import read_json
 except ImportError:
     import logging
+    import rate_limiter
+    import retry_policy
+    from retry_policy import RetryableFetchError
+    from http_session import read_json
     logger = logging.getLogger(__name__)
 
-# (Константы CONCURRENCY_LIMIT, REQUEST_TIMEOUT, REQUEST_HEADERS не изменились)
-CONCURRENCY_LIMIT = 5
+# Общий потолок одновременных запросов одного сбора.
+# Фактическая конкуренция по биржам/эндпоинтам - адаптивные лимитеры (rate_limiter.py).
+CONCURRENCY_LIMIT = 40
 REQUEST_TIMEOUT = 15
 REQUEST_HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
 }
 
+@asynccontextmanager
+async def _request_slot(
+    semaphore: asyncio.Semaphore,
+    limiter: 'rate_limiter.AdaptiveLimiter',
+    weight: float
+) -> AsyncIterator[None]:
+    """
+    Место для одной попытки: слот лимитера семейства, затем общий семафор сбора.
+    Порядок важен: запросы семейства на паузе (429/418, низкий предел AIMD)
+    ждут в своем лимитере и не занимают общие места других бирж.
+    """
+    async with limiter.slot(weight), semaphore:
+        yield
+
+
+async def _get_json_attempt(
+    session: aiohttp.ClientSession,
+    url: str,
+    limiter: 'rate_limiter.AdaptiveLimiter',
+    description: str,
+    log_prefix: str,
+    strategy_name: str,
+    is_oi_fr: bool
+) -> Optional[Any]:
+    """
+    Одна попытка GET-запроса (слот лимитера уже получен, см. _request_slot).
+    Временные ошибки (429/418, 5xx, таймаут, соединение) -> RetryableFetchError,
+    прочие неудачи -> None (без повтора).
+    """
+    try:
+        async with session.get(url, timeout=REQUEST_TIMEOUT, headers=REQUEST_HEADERS) as response:
+            pause = limiter.on_response(response.status, getattr(response, 'headers', None))
+            if response.status == 200:
+                return await read_json(response)
+            elif pause is not None:
+                logger.warning(f"{log_prefix} {strategy_name}: Получен {response.status} Too Many Requests для {url}. Лимитер {limiter.name} на паузе {pause:.1f} сек.")
+                raise RetryableFetchError(f"HTTP {response.status}", retry_after=pause)
+            else:
+                response_text = await response.text()
+                msg = f"{strategy_name}: {description} вернул статус {response.status}. Ответ: {response_text[:150]}. URL: {url}"
+                # --- ИЗМЕНЕНИЕ: Используем logger.warning ---
+                if is_oi_fr:
+                    logger.warning(f"{log_prefix} {msg}") # Логируем как warning
+                else:
+                    logger.warning(f"{log_prefix} {msg}")
+                if response.status >= 500:
+                    raise RetryableFetchError(f"HTTP {response.status}")
+                return None
+
+    except RetryableFetchError:
+        raise
+
+    except asyncio.TimeoutError:
+        msg = f"{strategy_name}: Таймаут запроса {description}. URL: {url}"
+        # --- ИСПРАВЛЕНИЕ: Добавляем корректное логирование ---
+        logger.warning(f"{log_prefix} {msg}")
+        raise RetryableFetchError("таймаут")
+        
+    except aiohttp.ClientConnectorError as e:
+        msg = f"{strategy_name}: Ошибка соединения {description}: {e}. URL: {url}"
+        logger.error(f"{log_prefix} {msg}")
+        raise RetryableFetchError("ошибка соединения")
+
+    except aiohttp.ClientError as e:
+        # (обрыв соединения, ServerDisconnected и т.п.)
+        logger.warning(f"{log_prefix} {strategy_name}: Ошибка запроса {description}: {e}. URL: {url}")
+        raise RetryableFetchError(type(e).__name__)
+    
+    except Exception as e:
+        msg = f"{strategy_name}: Непредвиденная ошибка {description}: {e}. URL: {url}"
+        logger.error(f"{log_prefix} {msg}", exc_info=True)
+        return None
+
+
 async def fetch_simple(session: aiohttp.ClientSession, task_info: Dict[str, Any], semaphore: asyncio.Semaphore) -> Tuple[Dict[str, Any], Optional[List[Dict]]]:
     """
-    Выполняет простой GET-запрос (для Binance).
+    Выполняет простой GET-запрос (для Binance) с повторами (retry_policy).
     """
     url = task_info.get("url")
     symbol = task_info.get("symbol", "N/A")
@@ -31,50 +116,64 @@ async def fetch_simple(session: aiohttp.ClientSession, task_info: Dict[str, Any]
         logger.error(f"{log_prefix} FETCH_SIMPLE: Отсутствует URL в task_info для {symbol} ({data_type}, {exchange})")
         return task_info, None
 
-    async with semaphore:
-        try:
-            async with session.get(url, timeout=REQUEST_TIMEOUT, headers=REQUEST_HEADERS) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    return task_info, data
-                elif response.status == 429:
-                    logger.warning(f"{log_prefix} FETCH_SIMPLE: Получен 429 Too Many Requests для {url}. Повторная попытка не реализована.")
-                    return task_info, None
-                else:
-                    response_text = await response.text()
-                    msg = f"FETCH_SIMPLE: {data_type} для {symbol} ({exchange}) вернул статус {response.status}. Ответ: {response_text[:150]}. URL: {url}"
-                    # --- ИЗМЕНЕНИЕ: Используем logger.warning ---
-                    if data_type in ['oi', 'fr']:
-                        logger.warning(f"{log_prefix} {msg}") # Логируем как warning
-                    else:
-                        logger.warning(f"{log_prefix} {msg}")
-                    return task_info, None
-
-        except asyncio.TimeoutError:
-            msg = f"FETCH_SIMPLE: Таймаут запроса {data_type} для {symbol} ({exchange}). URL: {url}"
-            # --- ИСПРАВЛЕНИЕ: Добавляем корректное логирование ---
-            logger.warning(f"{log_prefix} {msg}")
-            return task_info, None
-            
-        except aiohttp.ClientConnectorError as e:
-            msg = f"FETCH_SIMPLE: Ошибка соединения {data_type} для {symbol} ({exchange}): {e}. URL: {url}"
-            logger.error(f"{log_prefix} {msg}")
-            return task_info, None
-        
-        except Exception as e:
-             msg = f"FETCH_SIMPLE: Непредвиденная ошибка {data_type} для {symbol} ({exchange}): {e}. URL: {url}"
-             logger.error(f"{log_prefix} {msg}", exc_info=True)
-             return task_info, None
+    limiter = rate_limiter.get_limiter(exchange, data_type)
+    weight = rate_limiter.request_weight(exchange, data_type, url)
+    description = f"{data_type} для {symbol} ({exchange})"
+
+    data = await retry_policy.run_with_retry(
+        lambda: _get_json_attempt(
+            session, url, limiter, description, log_prefix,
+            "FETCH_SIMPLE", data_type in ['oi', 'fr']
+        ),
+        exchange, description, log_prefix,
+        slot=lambda: _request_slot(semaphore, limiter, weight)
+    )
+    return task_info, data
             
 
+# Bybit V5 Klines: максимум свечей в одном ответе
+BYBIT_KLINES_PAGE_LIMIT = 200
+
+
+def _bybit_interval_ms(interval: str) -> Optional[int]:
+    """Длительность интервала Bybit ('60', '240', 'D', 'W') в мс."""
+    if interval.isdigit():
+        return int(interval) * 60 * 1000
+    return {'D': 86_400_000, 'W': 7 * 86_400_000}.get(interval)
+
+
+def bybit_kline_windows(
+    requested: int,
+    interval_ms: int,
+    end_ms: int,
+    page_limit: int = BYBIT_KLINES_PAGE_LIMIT
+) -> List[Tuple[int, int, int]]:
+    """
+    Окна (start, end, limit) по page_limit свечей, от новых к старым,
+    покрывающие requested свечей до end_ms (свеча, содержащая end_ms, - последняя).
+    """
+    last_open = end_ms - end_ms % interval_ms
+    windows = []
+    for offset in range(0, requested, page_limit):
+        count = min(page_limit, requested - offset)
+        window_end = last_open - offset * interval_ms
+        window_start = window_end - (count - 1) * interval_ms
+        windows.append((window_start, window_end, count))
+    return windows
+
+
 async def fetch_bybit_paginated(session: aiohttp.ClientSession, task_info: Dict[str, Any], semaphore: asyncio.Semaphore) -> Tuple[Dict[str, Any], Optional[List[Dict]]]:
     """
-    Выполняет запросы к Bybit с учетом пагинации (для получения 2-х страниц, если нужно).
-    (Код не изменен)
+    Выполняет запросы к Bybit с учетом пагинации.
+    Klines: запрошенное количество (limit в URL) делится на окна start/end
+    по 200 свечей (bybit_kline_windows), окна запрашиваются параллельно
+    и склеиваются по времени. OI/FR - один запрос.
+    Каждая страница запрашивается с повторами (retry_policy).
     """
     url = task_info.get("url")
     symbol = task_info.get("symbol", "N/A")
     data_type = task_info.get("data_type", "N/A")
+    exchange = task_info.get("exchange", "bybit")
     log_prefix = f"[{task_info.get('original_timeframe', '?').upper()}]"
     
     if not url:
@@ -84,71 +183,58 @@ async def fetch_bybit_paginated(session: aiohttp.ClientSession, task_info: Dict[
     parsed_url = urlparse(url)
     query_params = parse_qs(parsed_url.query)
     
-    # Bybit API limit
-    limit = int(query_params.get('limit', ['1000'])[0])
-    
-    # 1. Запрос первой страницы
-    async with semaphore:
-        try:
-            async with session.get(url, timeout=REQUEST_TIMEOUT, headers=REQUEST_HEADERS) as response:
-                if response.status != 200:
-                    response_text = await response.text()
-                    msg = f"FETCH_BYBIT_PAGINATED: {data_type} для {symbol} вернул статус {response.status}. Ответ: {response_text[:150]}. URL: {url}"
-                    if data_type in ['oi', 'fr']:
-                        logger.warning(f"{log_prefix} {msg}")
-                    else:
-                         logger.warning(f"{log_prefix} {msg}")
-                    return task_info, None
-
-                data = await response.json()
-                result_list = data.get('result', {}).get('list', [])
-
-                if len(result_list) < limit:
-                    # 1 страница достаточна
-                    return task_info, result_list
-                
-                # 2. Если требуется пагинация
-                
-                # Находим `endTime` последней свечи (которая является самой старой, т.к. Bybit возвращает от новых к старым)
-                cursor = result_list[-1].get('startTime')
-                
-                # Проверяем, что cursor существует и что это не OI/FR (OI/FR не поддерживают пагинацию по `startTime`)
-                if not cursor or data_type in ['oi', 'fr']:
-                    return task_info, result_list
-                
-                # 3. Запрос второй страницы (с пагинацией)
-                query_params['endTime'] = [str(cursor)]
-                next_url = urlunparse(parsed_url._replace(query=urlencode(query_params, doseq=True)))
-
-                async with session.get(next_url, timeout=REQUEST_TIMEOUT, headers=REQUEST_HEADERS) as next_response:
-                    if next_response.status != 200:
-                        logger.warning(f"{log_prefix} FETCH_BYBIT_PAGINATED: Не удалось получить вторую страницу {data_type} для {symbol}. Статус: {next_response.status}")
-                        return task_info, result_list
-                        
-                    next_data = await next_response.json()
-                    next_result_list = next_data.get('result', {}).get('list', [])
-                    
-                    # Объединяем результаты (уникальные, так как start/end time могут пересекаться)
-                    # Используем множество openTime для дедупликации
-                    unique_timestamps = {item[0] for item in result_list if isinstance(item, list) and len(item) > 0}
-                    
-                    for item in next_result_list:
-                         if isinstance(item, list) and len(item) > 0 and item[0] not in unique_timestamps:
-                            result_list.append(item)
-                            
-                    return task_info, result_list
-                        
-        except asyncio.TimeoutError:
-            msg = f"FETCH_BYBIT_PAGINATED: Таймаут запроса {data_type} для {symbol}. URL: {url}"
-            logger.warning(f"{log_prefix} {msg}")
-            return task_info, None
-            
-        except aiohttp.ClientConnectorError as e:
-            msg = f"FETCH_BYBIT_PAGINATED: Ошибка соединения {data_type} для {symbol}: {e}. URL: {url}"
-            logger.error(f"{log_prefix} {msg}")
+    limiter = rate_limiter.get_limiter(exchange, data_type)
+    description = f"{data_type} для {symbol}"
+
+    async def get_page(page_url: str) -> Optional[List[Any]]:
+        data = await retry_policy.run_with_retry(
+            lambda: _get_json_attempt(
+                session, page_url, limiter, description, log_prefix,
+                "FETCH_BYBIT_PAGINATED", data_type in ['oi', 'fr']
+            ),
+            exchange, description, log_prefix,
+            slot=lambda: _request_slot(semaphore, limiter, 1)
+        )
+        if data is None:
+            return None
+        return data.get('result', {}).get('list', [])
+
+    try:
+        requested = int(query_params.get('limit', [str(BYBIT_KLINES_PAGE_LIMIT)])[0])
+        interval_ms = _bybit_interval_ms(query_params.get('interval', [''])[0])
+
+        # 1. Одна страница: OI/FR, инкрементальный запрос (start) или limit <= 200
+        if data_type != 'klines' or 'start' in query_params or requested <= BYBIT_KLINES_PAGE_LIMIT or not interval_ms:
+            return task_info, await get_page(url)
+
+        # 2. Окна start/end по 200 свечей (от новых к старым) - параллельно
+        end_ms = int(query_params['end'][0]) if 'end' in query_params else int(time.time() * 1000)
+        windows = bybit_kline_windows(requested, interval_ms, end_ms)
+        page_urls = []
+        for window_start, window_end, count in windows:
+            params = dict(query_params)
+            params.update({'start': [str(window_start)], 'end': [str(window_end)], 'limit': [str(count)]})
+            page_urls.append(urlunparse(parsed_url._replace(query=urlencode(params, doseq=True))))
+
+        pages = await asyncio.gather(*(get_page(page_url) for page_url in page_urls))
+
+        # 3. Склейка: берем окна от новых к старым до первого неудачного (без дыр в ряду)
+        if pages[0] is None:
             return task_info, None
-        
-        except Exception as e:
-            msg = f"FETCH_BYBIT_PAGINATED: Непредвиденная ошибка {data_type} для {symbol}: {e}. URL: {url}"
-            logger.error(f"{log_prefix} {msg}", exc_info=True)
-            return task_info, None
\ No newline at end of file
+        merged = {}
+        for index, page in enumerate(pages):
+            if page is None:
+                logger.warning(f"{log_prefix} FETCH_BYBIT_PAGINATED: Не удалось получить окно {index + 1}/{len(pages)} {data_type} для {symbol}. Возвращаю {len(merged)} свечей.")
+                break
+            for item in page:
+                if isinstance(item, list) and len(item) > 0:
+                    merged.setdefault(int(item[0]), item)
+
+        # Bybit отдает свечи от новых к старым - сохраняем этот порядок
+        result_list = [merged[open_time] for open_time in sorted(merged, reverse=True)[:requested]]
+        return task_info, result_list
+    
+    except Exception as e:
+        msg = f"FETCH_BYBIT_PAGINATED: Непредвиденная ошибка {data_type} для {symbol}: {e}. URL: {url}"
+        logger.error(f"{log_prefix} {msg}", exc_info=True)
+        return task_info, None
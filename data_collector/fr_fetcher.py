@@ -12,11 +12,15 @@ import aiohttp
 
 # --- Импорты из cache_manager (внешние) ---
 from cache_manager import save_to_cache, get_redis_connection 
+from candle_columns import as_columns
 # ----------------------------------------------------
 
 # --- Импорты из пакета data_collector (внутренние) ---
 try:
     from . import task_builder
+    from .fetch_strategies import CONCURRENCY_LIMIT
+    from .http_session import get_http_session
+    from .rate_limiter import global_semaphore
     from .logging_setup import logger
     
     # --- ИСПРАВЛЕНИЕ: Используем относительный импорт, так как coin_source находится в этом же пакете ---
@@ -26,6 +30,9 @@ try:
 except ImportError:
     # Фоллбэки для standalone запуска
     import task_builder
+    from fetch_strategies import CONCURRENCY_LIMIT
+    from http_session import get_http_session
+    from rate_limiter import global_semaphore
     import logging
     logger = logging.getLogger(__name__)
     async def get_coins_func(): return [] # <-- ФОЛЛБЭК
@@ -34,7 +41,8 @@ except ImportError:
 
 
 # --- Константы (скопированы из worker.py) ---
-FR_CONCURRENCY_LIMIT = 5
+# (фактическая конкуренция - адаптивные лимитеры rate_limiter.py)
+FR_CONCURRENCY_LIMIT = CONCURRENCY_LIMIT
 ERROR_RETRY_DELAY = 10
 
 
@@ -50,25 +58,23 @@ async def fetch_funding_rates(coins_from_api: List[Dict[str, Any]]) -> Optional[
         return None
         
     start_fetch_time = time.time()
-    semaphore = asyncio.Semaphore(FR_CONCURRENCY_LIMIT)
+    semaphore = global_semaphore(FR_CONCURRENCY_LIMIT)
     async_tasks = []
     
-    # --- ИСПРАВЛЕНИЕ УТЕЧКИ: Создаем ОДНУ ClientSession в контекстном менеджере ---
-    async with aiohttp.ClientSession() as session:
+    # Общая долгоживущая сессия процесса (keep-alive, DNS-кэш, см. http_session.py)
+    session = await get_http_session()
+    
+    for task in tasks_to_run:
+        strategy_func = task["fetch_strategy"]
+        task_info = task["task_info"]
+        # Передаем ОДИН ClientSession всем задачам
+        async_tasks.append(strategy_func(session, task_info, semaphore))
         
-        for task in tasks_to_run:
-            strategy_func = task["fetch_strategy"]
-            task_info = task["task_info"]
-            # Передаем ОДИН ClientSession всем задачам
-            async_tasks.append(strategy_func(session, task_info, semaphore))
-            
-        try:
-            results = await asyncio.gather(*async_tasks, return_exceptions=True)
-        except Exception as e:
-            logger.error(f"[GLOBAL_FR_FETCH] Критическая ошибка во время asyncio.gather: {e}", exc_info=True)
-            return None
-
-    # --- КОНЕЦ ИСПРАВЛЕНИЯ УТЕЧКИ ---
+    try:
+        results = await asyncio.gather(*async_tasks, return_exceptions=True)
+    except Exception as e:
+        logger.error(f"[GLOBAL_FR_FETCH] Критическая ошибка во время asyncio.gather: {e}", exc_info=True)
+        return None
     
     end_fetch_time = time.time()
     
@@ -100,7 +106,13 @@ async def fetch_funding_rates(coins_from_api: List[Dict[str, Any]]) -> Optional[
             parsed_result = parser_func(raw_data, timeframe_arg)
 
             if parsed_result:
-                processed_fr_data[symbol].extend(parsed_result)
+                # cache:global_fr хранит список словарей {openTime, fundingRate, closeTime}
+                # (векторные парсеры отдают CandleColumns)
+                fr = as_columns(parsed_result)
+                processed_fr_data[symbol].extend(
+                    {"openTime": t, "fundingRate": rate, "closeTime": c}
+                    for t, rate, c in zip(fr['openTime'].tolist(), fr['fundingRate'].tolist(), fr['closeTime'].tolist())
+                )
                 success_count += 1
             else:
                 error_count += 1
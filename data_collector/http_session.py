@@ -0,0 +1,127 @@
+# data_collector/http_session.py
+"""
+Долгоживущая aiohttp-сессия для запросов к биржам (Binance, Bybit).
+
+Раньше каждый сбор (fetch_market_data, fetch_funding_rates) создавал новую
+ClientSession с настройками по умолчанию - и каждый цикл заново платил
+за DNS и TLS-рукопожатия с fapi.binance.com / api.bybit.com.
+
+Сессия одна на процесс (и event loop):
+    - TCPConnector с общим лимитом и лимитом на хост, кэшем DNS и keep-alive;
+    - Accept-Encoding: gzip/deflate (+ br, если установлен Brotli);
+    - JSON ответов декодируется через orjson (если установлен).
+
+Жизненный цикл: создается лениво (get_http_session), закрывается в lifespan
+FastAPI (main.py) или при остановке воркера (close_http_session).
+"""
+import asyncio
+import json
+from typing import Any, Optional
+
+import aiohttp
+
+try:
+    from .logging_setup import logger
+except ImportError:
+    import logging
+    logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+try:
+    import brotli  # noqa: F401  (aiohttp сам распаковывает br, если модуль есть)
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+try:
+    from config import (
+        HTTP_CONNECTOR_LIMIT,
+        HTTP_LIMIT_PER_HOST,
+        HTTP_DNS_CACHE_TTL,
+        HTTP_KEEPALIVE_TIMEOUT,
+        HTTP_ENABLE_BROTLI,
+    )
+except ImportError:
+    HTTP_CONNECTOR_LIMIT = 100
+    HTTP_LIMIT_PER_HOST = 30
+    HTTP_DNS_CACHE_TTL = 300
+    HTTP_KEEPALIVE_TIMEOUT = 60
+    HTTP_ENABLE_BROTLI = True
+
+
+def accept_encoding() -> str:
+    """Значение Accept-Encoding: br - только если Brotli установлен и разрешен."""
+    return "gzip, deflate, br" if HTTP_ENABLE_BROTLI and BROTLI_AVAILABLE else "gzip, deflate"
+
+
+class HttpSessionManager:
+    """Владелец общей ClientSession (одна на event loop)."""
+
+    def __init__(self):
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    def _is_usable(self, loop: asyncio.AbstractEventLoop) -> bool:
+        return self._session is not None and not self._session.closed and self._loop is loop
+
+    def _create_session(self) -> aiohttp.ClientSession:
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_CONNECTOR_LIMIT,
+            limit_per_host=HTTP_LIMIT_PER_HOST,
+            ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+            keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            headers={"Accept-Encoding": accept_encoding()},
+        )
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        if self._is_usable(loop):
+            return self._session
+
+        if self._lock is None or self._loop is not loop:
+            self._lock = asyncio.Lock()
+            # Сессию другого (уже остановленного) event loop закрыть нельзя - просто забываем
+            self._session = None
+            self._loop = loop
+
+        async with self._lock:
+            if not self._is_usable(loop):
+                self._session = self._create_session()
+                logger.info(
+                    f"[HTTP_SESSION] Создана сессия: limit={HTTP_CONNECTOR_LIMIT}, "
+                    f"per_host={HTTP_LIMIT_PER_HOST}, dns_ttl={HTTP_DNS_CACHE_TTL}, "
+                    f"keepalive={HTTP_KEEPALIVE_TIMEOUT}, Accept-Encoding='{accept_encoding()}'"
+                )
+            return self._session
+
+    async def close(self) -> None:
+        session, self._session = self._session, None
+        if session is not None and not session.closed:
+            await session.close()
+            logger.info("[HTTP_SESSION] Сессия закрыта.")
+
+
+session_manager = HttpSessionManager()
+
+
+async def get_http_session() -> aiohttp.ClientSession:
+    """Общая сессия процесса (создается при первом обращении)."""
+    return await session_manager.get_session()
+
+
+async def close_http_session() -> None:
+    await session_manager.close()
+
+
+async def read_json(response: Any) -> Any:
+    """JSON ответа (orjson, если установлен)."""
+    return await response.json(loads=json_loads)
@@ -0,0 +1,126 @@
+# data_collector/incremental.py
+"""
+Инкрементальное обновление Klines: вместо полной выгрузки (400/800 свечей)
+запрашиваются только свечи начиная с последнего openTime из кэша,
+и новые свечи вклеиваются в уже сохраненный ряд.
+
+Схема:
+    1. plan_incremental - по кэшу решает, какие монеты можно обновить
+       инкрементально (startTime = последний openTime, маленький limit);
+    2. после сбора splice_incremental подменяет processed_data[symbol]
+       на "старый ряд + новые свечи" с обрезкой окна (399/799 + живая свеча);
+    3. монеты с разрывами (ответ не стыкуется с кэшем) возвращаются списком -
+       для них fetch_market_data делает обычный полный сбор.
+"""
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from api_helpers import get_interval_duration_ms
+from candle_columns import CandleColumns, KLINE_FIELDS, MISSING_INT, as_columns
+
+try:
+    from config import INCREMENTAL_MAX_NEW_CANDLES, INCREMENTAL_FR_LIMIT
+except ImportError:
+    INCREMENTAL_MAX_NEW_CANDLES = 48
+    INCREMENTAL_FR_LIMIT = 10
+
+
+def incremental_window(timeframe: str) -> int:
+    """Сколько закрытых свечей хранит кэш таймфрейма (см. format_final_structure)."""
+    return 799 if timeframe == '4h' else 399
+
+
+def plan_incremental(
+    previous_data: Dict[str, CandleColumns],
+    timeframe: str,
+    now_ms: Optional[int] = None
+) -> Dict[str, Dict[str, int]]:
+    """
+    Строит план инкрементального запроса по кэшу {symbol: CandleColumns}.
+    Монета попадает в план, только если в кэше полное окно свечей
+    и с последней свечи прошло не больше INCREMENTAL_MAX_NEW_CANDLES интервалов.
+    """
+    interval_ms = get_interval_duration_ms(timeframe)
+    if not interval_ms or not previous_data:
+        return {}
+
+    now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+    window = incremental_window(timeframe)
+    plan = {}
+
+    for symbol, candles in previous_data.items():
+        if candles is None or len(candles) < window:
+            continue
+        last_open = int(candles['openTime'][-1])
+        if last_open == MISSING_INT or last_open > now_ms:
+            continue
+        # Свеча last_open (перезапрашивается - она могла быть незакрытой) + все новые
+        needed = (now_ms - last_open) // interval_ms + 1
+        if needed > INCREMENTAL_MAX_NEW_CANDLES:
+            continue
+        plan[symbol] = {
+            'start_time': last_open,
+            # +1: полный ответ (len == limit) означает, что новых свечей больше ожидаемого
+            'limit': int(needed) + 1,
+            'fr_limit': INCREMENTAL_FR_LIMIT,
+        }
+    return plan
+
+
+def _points(candles: CandleColumns, field: str) -> CandleColumns:
+    """Точки OI/FR из уже слитого ряда (для повторного as-of join в merge_columns)."""
+    values = candles[field]
+    mask = ~np.isnan(values)
+    open_time = candles['openTime'][mask]
+    return CandleColumns({'openTime': open_time, field: values[mask], 'closeTime': open_time + 1})
+
+
+def _is_contiguous(candles: CandleColumns) -> bool:
+    open_time = candles['openTime']
+    close_time = candles['closeTime']
+    return bool(np.all(open_time[1:] == close_time[:-1] + 1))
+
+
+def splice_incremental(
+    processed_data: Dict[str, Dict[str, Any]],
+    previous_data: Dict[str, CandleColumns],
+    plan: Dict[str, Dict[str, int]],
+    timeframe: str
+) -> List[str]:
+    """
+    Вклеивает новые свечи в ряды из кэша (processed_data изменяется на месте).
+    Возвращает монеты, для которых нужен полный сбор (разрыв или пустой ответ).
+    """
+    window = incremental_window(timeframe)
+    gaps = []
+
+    for symbol, entry in plan.items():
+        data_types = processed_data.get(symbol) or {}
+        new = as_columns(data_types.get('klines'))
+        new = new[new['openTime'] != MISSING_INT].sorted_by_time()
+
+        if (
+            not len(new)
+            or int(new['openTime'][0]) != entry['start_time']
+            or len(new) >= entry['limit']
+            or not _is_contiguous(new)
+        ):
+            gaps.append(symbol)
+            continue
+
+        previous = previous_data[symbol]
+        previous = previous[previous['openTime'] < new['openTime'][0]]
+        previous_klines = CandleColumns({f: previous[f] for f in KLINE_FIELDS})
+
+        # Окно: закрытые свечи + живая (ее отбросит format_final_structure)
+        klines = CandleColumns.concat([previous_klines, new])[-(window + 1):]
+
+        processed_data[symbol] = {
+            'klines': klines,
+            'oi': [_points(previous, 'openInterest'), *[as_columns(p) for p in data_types.get('oi') or []]],
+            'fr': [_points(previous, 'fundingRate'), *[as_columns(p) for p in data_types.get('fr') or []]],
+        }
+
+    return gaps
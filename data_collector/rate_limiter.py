@@ -0,0 +1,316 @@
+# data_collector/rate_limiter.py
+"""
+Адаптивные лимитеры запросов к биржам (по бирже и семейству эндпоинтов).
+
+Каждый лимитер = token bucket по ВЕСУ запросов + адаптивный предел
+одновременных запросов (AIMD):
+    - вес: Binance klines зависит от limit (1/2/5/10), остальные запросы - 1;
+    - заголовки X-MBX-USED-WEIGHT-1M (Binance, только ведро binance:fapi -
+      см. weight_header в RATE_LIMITS) и X-Bapi-Limit-Status (Bybit)
+      синхронизируют bucket с фактическим расходом на стороне биржи;
+    - 429/418 (и Retry-After): пауза всего семейства и деление предела пополам;
+    - серия успешных ответов без давления: предел +1 (до max_concurrency).
+
+Лимиты - config.RATE_LIMITS. Лимитеры живут в рамках event loop
+(asyncio-примитивы нельзя разделять между циклами).
+"""
+import asyncio
+import time
+import weakref
+from collections.abc import Mapping
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Dict, Optional
+from urllib.parse import urlparse, parse_qs
+
+try:
+    from .logging_setup import logger
+except ImportError:
+    import logging
+    logger = logging.getLogger(__name__)
+
+try:
+    from config import (
+        RATE_LIMITS,
+        RATE_LIMIT_SAFETY_FACTOR,
+        RATE_LIMIT_DEFAULT_RETRY_AFTER,
+        BINANCE_WEIGHT_LIMIT_1M,
+    )
+except ImportError:
+    RATE_LIMITS = {
+        'binance:fapi': {'capacity': 2400, 'period': 60, 'max_concurrency': 20, 'weight_header': 'X-MBX-USED-WEIGHT-1M'},
+        'binance:futures_data': {'capacity': 1000, 'period': 300, 'max_concurrency': 10},
+        'binance:funding': {'capacity': 500, 'period': 300, 'max_concurrency': 10},
+        'bybit:market': {'capacity': 600, 'period': 5, 'max_concurrency': 20},
+        'default': {'capacity': 100, 'period': 1, 'max_concurrency': 5},
+    }
+    RATE_LIMIT_SAFETY_FACTOR = 0.8
+    RATE_LIMIT_DEFAULT_RETRY_AFTER = 5
+    BINANCE_WEIGHT_LIMIT_1M = 2400
+
+# Доля использованного лимита (по заголовкам биржи), при которой снижаем конкуренцию
+PRESSURE_THRESHOLD = 0.8
+# Статусы "слишком много запросов" (418 - бан IP у Binance после игнорирования 429)
+THROTTLE_STATUSES = (418, 429)
+
+
+# --- Вес и семейство запроса ---
+
+def endpoint_family(exchange: str, data_type: str) -> str:
+    """Семейство эндпоинтов с общим лимитом на стороне биржи."""
+    if exchange == 'binance':
+        return {
+            'klines': 'binance:fapi',
+            'oi': 'binance:futures_data',
+            'fr': 'binance:funding',
+        }.get(data_type, 'binance:fapi')
+    if exchange == 'bybit':
+        return 'bybit:market'
+    return 'default'
+
+
+def request_weight(exchange: str, data_type: str, url: Optional[str]) -> int:
+    """Вес запроса. Binance klines: limit <100 -> 1, <500 -> 2, <=1000 -> 5, иначе 10."""
+    if exchange != 'binance' or data_type != 'klines' or not url:
+        return 1
+    try:
+        limit = int(parse_qs(urlparse(url).query).get('limit', ['500'])[0])
+    except (TypeError, ValueError):
+        limit = 500
+    if limit < 100:
+        return 1
+    if limit < 500:
+        return 2
+    if limit <= 1000:
+        return 5
+    return 10
+
+
+# --- Заголовки ---
+
+def _header(headers: Any, name: str) -> Optional[str]:
+    """Значение заголовка без учета регистра (CIMultiDictProxy или обычный dict)."""
+    if not isinstance(headers, Mapping):
+        return None
+    value = headers.get(name)
+    if value is None:
+        lowered = name.lower()
+        for key, item in headers.items():
+            if str(key).lower() == lowered:
+                return item
+    return value
+
+
+def parse_retry_after(headers: Any) -> Optional[float]:
+    """Retry-After в секундах (число или HTTP-дата); None, если заголовка нет."""
+    value = _header(headers, 'Retry-After')
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def _header_number(headers: Any, name: str) -> Optional[float]:
+    value = _header(headers, name)
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+# --- Token bucket ---
+
+class TokenBucket:
+    """Ведро токенов: capacity единиц веса, пополняется равномерно за period секунд."""
+
+    def __init__(self, capacity: float, period: float):
+        self.capacity = float(capacity)
+        self.rate = self.capacity / float(period)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, weight: float) -> float:
+        """Списывает вес и возвращает 0 или сколько секунд ждать до следующей попытки."""
+        now = time.monotonic()
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self._refill(now)
+        weight = min(weight, self.capacity)
+        if self.tokens >= weight:
+            self.tokens -= weight
+            return 0.0
+        return (weight - self.tokens) / self.rate
+
+    async def acquire(self, weight: float) -> None:
+        while True:
+            wait = self.try_acquire(weight)
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def sync_used(self, used_ratio: float) -> None:
+        """Подстраивает остаток под фактический расход, сообщенный биржей (0..1)."""
+        self._refill(time.monotonic())
+        self.tokens = min(self.tokens, self.capacity * max(0.0, 1.0 - used_ratio))
+
+    def block(self, seconds: float) -> None:
+        """Пауза: до истечения seconds запросы не выдаются, ведро обнуляется."""
+        now = time.monotonic()
+        self.blocked_until = max(self.blocked_until, now + seconds)
+        self.tokens = 0.0
+        self.updated = max(self.updated, self.blocked_until)
+
+
+# --- Адаптивный лимитер ---
+
+class AdaptiveLimiter:
+    """Token bucket + адаптивный (AIMD) предел одновременных запросов для одного семейства."""
+
+    def __init__(
+        self,
+        name: str,
+        capacity: float,
+        period: float,
+        max_concurrency: int,
+        min_concurrency: int = 1,
+        weight_header: Optional[str] = None
+    ):
+        self.name = name
+        # Заголовок с расходом веса этого лимита (Binance); None - не синхронизируем
+        self.weight_header = weight_header
+        self.bucket = TokenBucket(capacity * RATE_LIMIT_SAFETY_FACTOR, period)
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.min_concurrency = max(1, min(int(min_concurrency), self.max_concurrency))
+        # Стартуем с половины и разгоняемся по успешным ответам
+        self.concurrency = max(self.min_concurrency, self.max_concurrency // 2)
+        self.in_flight = 0
+        self._successes = 0
+        self._condition = asyncio.Condition()
+        self.stats = {'requests': 0, 'throttled': 0, 'decreases': 0, 'increases': 0}
+
+    @asynccontextmanager
+    async def slot(self, weight: float = 1) -> AsyncIterator[None]:
+        """Место для одного запроса: ждет свободный слот конкуренции и вес в ведре."""
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < self.concurrency)
+            self.in_flight += 1
+        try:
+            await self.bucket.acquire(weight)
+            self.stats['requests'] += 1
+            yield
+        finally:
+            async with self._condition:
+                self.in_flight -= 1
+                # Будим столько ожидающих, сколько слотов свободно (предел мог вырасти)
+                self._condition.notify(max(1, self.concurrency - self.in_flight))
+
+    def _decrease(self, reason: str) -> None:
+        new_value = max(self.min_concurrency, self.concurrency // 2)
+        if new_value < self.concurrency:
+            logger.warning(f"[RATE_LIMIT:{self.name}] {reason}: конкуренция {self.concurrency} -> {new_value}")
+            self.concurrency = new_value
+            self.stats['decreases'] += 1
+        self._successes = 0
+
+    def _increase(self) -> None:
+        self._successes += 1
+        if self._successes >= self.concurrency and self.concurrency < self.max_concurrency:
+            self.concurrency += 1
+            self._successes = 0
+            self.stats['increases'] += 1
+
+    def on_response(self, status: int, headers: Any = None) -> Optional[float]:
+        """
+        Учитывает ответ биржи. Возвращает паузу (сек), если биржа попросила подождать.
+        """
+        if status in THROTTLE_STATUSES:
+            pause = parse_retry_after(headers)
+            pause = RATE_LIMIT_DEFAULT_RETRY_AFTER if pause is None else pause
+            self.stats['throttled'] += 1
+            self.bucket.block(pause)
+            self._decrease(f"HTTP {status}, пауза {pause:.1f} сек")
+            return pause
+
+        pressure = False
+
+        # Binance: использованный вес за минуту (общий на IP для своего API) -
+        # только в ведро, к которому этот вес относится
+        used_weight = _header_number(headers, self.weight_header) if self.weight_header else None
+        if used_weight is not None and BINANCE_WEIGHT_LIMIT_1M:
+            used_ratio = used_weight / BINANCE_WEIGHT_LIMIT_1M
+            self.bucket.sync_used(used_ratio)
+            pressure = used_ratio >= PRESSURE_THRESHOLD
+
+        # Bybit: остаток лимита эндпоинта и время его сброса
+        limit = _header_number(headers, 'X-Bapi-Limit')
+        remaining = _header_number(headers, 'X-Bapi-Limit-Status')
+        if limit and remaining is not None:
+            self.bucket.sync_used(1.0 - remaining / limit)
+            pressure = pressure or remaining / limit <= 1.0 - PRESSURE_THRESHOLD
+            reset_ms = _header_number(headers, 'X-Bapi-Limit-Reset-Timestamp')
+            if remaining <= 0 and reset_ms:
+                self.bucket.block(max(reset_ms / 1000 - time.time(), 0.0))
+
+        if pressure:
+            self._decrease("Лимит биржи почти исчерпан")
+        elif status == 200:
+            self._increase()
+        return None
+
+
+# --- Реестр лимитеров (по event loop) ---
+
+_limiters: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, AdaptiveLimiter]]' = weakref.WeakKeyDictionary()
+
+
+def get_limiter(exchange: str, data_type: str) -> AdaptiveLimiter:
+    """Общий лимитер семейства эндпоинтов (один на event loop)."""
+    family = endpoint_family(exchange, data_type)
+    loop_limiters = _limiters.setdefault(asyncio.get_running_loop(), {})
+    limiter = loop_limiters.get(family)
+    if limiter is None:
+        settings = RATE_LIMITS.get(family) or RATE_LIMITS['default']
+        limiter = AdaptiveLimiter(
+            family, settings['capacity'], settings['period'], settings['max_concurrency'],
+            weight_header=settings.get('weight_header')
+        )
+        loop_limiters[family] = limiter
+    return limiter
+
+
+_semaphores: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]' = weakref.WeakKeyDictionary()
+
+
+def global_semaphore(limit: int) -> asyncio.Semaphore:
+    """
+    Общий потолок одновременных запросов процесса (один на event loop):
+    параллельные сборы нескольких таймфреймов делят его, а не умножают.
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _semaphores[loop] = asyncio.Semaphore(limit)
+    return semaphore
+
+
+def limiter_stats() -> Dict[str, Dict[str, Any]]:
+    """Текущее состояние лимитеров этого event loop (для логов)."""
+    try:
+        loop_limiters = _limiters.get(asyncio.get_running_loop(), {})
+    except RuntimeError:
+        return {}
+    return {
+        name: {**limiter.stats, 'concurrency': limiter.concurrency}
+        for name, limiter in loop_limiters.items()
+    }
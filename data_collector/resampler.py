@@ -0,0 +1,184 @@
+# data_collector/resampler.py
+"""
+Этот модуль строит СТАРШИЕ таймфреймы из базового ряда (ресемплинг),
+вместо отдельного запроса к биржам.
+
+Обобщение aggregation_8h на любое целое кратное (2h, 4h, 6h, 8h, 12h, 1d):
+    - корзина = openTime // target_ms (границы UTC, как у бирж);
+    - корзина берется, только если в ней ровно k = target / base свечей,
+      первая начинается на границе, а внутри ряд непрерывен
+      (openTime == closeTime предыдущей + 1);
+    - OHLCV: open первой, max/min, close последней, сумма volume/volumeDelta;
+    - OI: значение последней базовой свечи корзины;
+    - FR: последнее известное значение внутри корзины.
+
+Какие таймфреймы собираются с бирж, а какие выводятся - config.DERIVED_TIMEFRAMES.
+"""
+import time
+from typing import Any, Dict, List, Union
+
+import numpy as np
+
+from api_helpers import get_interval_duration_ms
+from candle_columns import CandleColumns, MISSING_INT, as_columns
+
+try:
+    from cache_manager import save_to_cache, get_redis_connection
+    from data_collector.logging_setup import logger
+    from data_collector.data_processing import merge_columns, format_final_structure
+except ImportError:
+    import logging
+    logger = logging.getLogger(__name__)
+    logging.error("Не удалось импортировать зависимости для resampler.")
+    async def save_to_cache(redis_conn, tf, data): pass
+    async def get_redis_connection(): return None
+    def merge_columns(data): return {}
+    def format_final_structure(data, coins, tf, drop_incomplete=True): return {}
+
+
+def resample_multiple(base_tf: str, target_tf: str) -> int:
+    """Во сколько раз target длиннее base (ValueError, если не целое кратное > 1)."""
+    base_ms = get_interval_duration_ms(base_tf)
+    target_ms = get_interval_duration_ms(target_tf)
+    if not base_ms or not target_ms or target_ms % base_ms or target_ms // base_ms < 2:
+        raise ValueError(f"Таймфрейм {target_tf} нельзя получить из {base_tf}")
+    return target_ms // base_ms
+
+
+def resample_columns(
+    candles: Union[CandleColumns, List[Dict[str, Any]]],
+    base_tf: str,
+    target_tf: str
+) -> Dict[str, CandleColumns]:
+    """
+    Ресемплинг одной монеты. Возвращает {'klines', 'oi', 'fr'}
+    (формат processed_data для merge_columns, как build_8h_columns).
+    """
+    k = resample_multiple(base_tf, target_tf)
+    target_ms = get_interval_duration_ms(target_tf)
+    empty = {'klines': CandleColumns.empty(), 'oi': CandleColumns.empty(), 'fr': CandleColumns.empty()}
+
+    candles = as_columns(candles)
+    candles = candles[candles['openTime'] != MISSING_INT].sorted_by_time()
+    if len(candles) < k:
+        return empty
+
+    open_time = candles['openTime']
+    close_time = candles['closeTime']
+    bucket = open_time // target_ms
+
+    # Границы корзин (ряд отсортирован по времени)
+    starts = np.flatnonzero(np.diff(bucket, prepend=bucket[0] - 1))
+    counts = np.diff(np.append(starts, len(candles)))
+    ends = starts + counts - 1
+
+    # Разрывы внутри корзины (первая свеча корзины связь не проверяет)
+    broken = np.zeros(len(candles), dtype=np.int64)
+    broken[1:] = (open_time[1:] != close_time[:-1] + 1) | (close_time[:-1] == MISSING_INT)
+    broken[starts] = 0
+    complete = (
+        (counts == k)
+        & (open_time[starts] == bucket[starts] * target_ms)
+        & (np.add.reduceat(broken, starts) == 0)
+    )
+    if not complete.any():
+        return empty
+
+    def reduce(ufunc, column: np.ndarray) -> np.ndarray:
+        """Свертка по всем корзинам, результат - только для полных."""
+        return ufunc.reduceat(column, starts)[complete]
+
+    first, last = starts[complete], ends[complete]
+    bucket_open_time = open_time[first]
+    bucket_close_time = close_time[last]
+
+    # --- Klines (корзины с пропусками цен отбрасываются, как в 8h) ---
+    open_price = candles['openPrice'][first]
+    close_price = candles['closePrice'][last]
+    high = reduce(np.maximum, candles['highPrice'])
+    low = reduce(np.minimum, candles['lowPrice'])
+    klines_ok = ~(np.isnan(open_price) | np.isnan(close_price) | np.isnan(high) | np.isnan(low))
+    klines = CandleColumns({
+        'openTime': bucket_open_time,
+        'openPrice': open_price,
+        'highPrice': high,
+        'lowPrice': low,
+        'closePrice': close_price,
+        'volume': np.round(reduce(np.add, np.nan_to_num(candles['volume'])), 2),
+        'closeTime': bucket_close_time,
+        'volumeDelta': np.round(reduce(np.add, np.nan_to_num(candles['volumeDelta'])), 2),
+    })[klines_ok]
+
+    # --- OI: значение последней свечи корзины ---
+    oi_value = candles['openInterest'][last]
+    oi = CandleColumns({'openTime': bucket_open_time, 'openInterest': oi_value, 'closeTime': bucket_close_time})
+    oi = oi[~np.isnan(oi_value)]
+
+    # --- FR: последнее известное значение внутри корзины ---
+    fr_all = candles['fundingRate']
+    last_valid = reduce(np.maximum, np.where(np.isnan(fr_all), -1, np.arange(len(candles))))
+    has_fr = last_valid >= first
+    fr_value = np.where(has_fr, fr_all[np.clip(last_valid, 0, None)], np.nan)
+    fr = CandleColumns({'openTime': bucket_open_time, 'fundingRate': fr_value, 'closeTime': bucket_close_time})
+    fr = fr[has_fr]
+
+    return {'klines': klines, 'oi': oi, 'fr': fr}
+
+
+def resample_market_data(
+    data_list: List[Dict[str, Any]],
+    base_tf: str,
+    target_tf: str
+) -> Dict[str, CandleColumns]:
+    """
+    Ресемплинг всех монет из кэша базового таймфрейма
+    ([{"symbol": ..., "data": [...]}, ...]) с последующим слиянием (merge_columns).
+    """
+    processed_data = {}
+    for coin_data in data_list or []:
+        symbol = coin_data.get('symbol')
+        candles = coin_data.get('data')
+        if not symbol or candles is None or not len(candles):
+            continue
+        aggregated = resample_columns(candles, base_tf, target_tf)
+        if aggregated['klines']:
+            processed_data[symbol] = aggregated
+    return merge_columns(processed_data)
+
+
+async def generate_and_save_resampled_cache(
+    data_list: List[Dict[str, Any]],
+    coins_from_api: List[Dict],
+    base_tf: str,
+    target_tf: str
+):
+    """
+    Строит cache:{target_tf} из данных cache:{base_tf} и сохраняет его.
+    Глубина результата ограничена глубиной базового кэша: len(base) // k свечей.
+    """
+    log_prefix = f"[RESAMPLE:{base_tf}->{target_tf}]"
+    logger.info(f"{log_prefix} Начинаю ресемплинг...")
+    start_time = time.time()
+
+    if not data_list or not isinstance(data_list, list):
+        logger.warning(f"{log_prefix} Нет данных базового таймфрейма. Ресемплинг невозможен.")
+        return
+
+    merged = resample_market_data(data_list, base_tf, target_tf)
+    if not merged:
+        logger.error(f"{log_prefix} Нет данных после ресемплинга. Кэш {target_tf} не будет создан.")
+        return
+
+    depth = min(len(c) for c in merged.values())
+    logger.info(f"{log_prefix} Ресемплинг завершен для {len(merged)} монет (минимум свечей: {depth}).")
+
+    # Корзины уже полные: последнюю свечу не отбрасываем (как для 8h)
+    formatted = format_final_structure(merged, coins_from_api, target_tf, drop_incomplete=False)
+
+    redis_conn = await get_redis_connection()
+    if not redis_conn:
+        logger.error(f"{log_prefix} Не удалось получить Redis соединение. Кэш {target_tf} не сохранен.")
+        return
+
+    await save_to_cache(redis_conn, target_tf, formatted)
+    logger.info(f"{log_prefix} Кэш {target_tf} сохранен за {time.time() - start_time:.2f} сек.")
@@ -0,0 +1,133 @@
+# data_collector/retry_policy.py
+"""
+Политика повторов для запросов Klines/OI/FR (fetch_strategies).
+
+Попытка запроса (корутина) сообщает о временной ошибке исключением
+RetryableFetchError (429/418, 5xx, таймаут, обрыв соединения), остальные
+неудачи возвращают None и не повторяются.
+
+run_with_retry:
+    - не больше RETRY_MAX_ATTEMPTS попыток;
+    - пауза: экспоненциальная с "полным" jitter
+      (random(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2**n))),
+      но не меньше Retry-After, если биржа его прислала;
+    - общий бюджет времени задачи RETRY_TASK_BUDGET_SECONDS: одна медленная
+      монета не держит весь asyncio.gather. Ожидание слота лимитера (slot)
+      в бюджет не входит.
+
+Метрики повторов по биржам - retry_stats().
+"""
+import asyncio
+import random
+import time
+from collections import defaultdict
+from contextlib import nullcontext
+from typing import Any, AsyncContextManager, Awaitable, Callable, Dict, Optional
+
+try:
+    from .logging_setup import logger
+except ImportError:
+    import logging
+    logger = logging.getLogger(__name__)
+
+try:
+    from config import (
+        RETRY_MAX_ATTEMPTS,
+        RETRY_BASE_DELAY,
+        RETRY_MAX_DELAY,
+        RETRY_TASK_BUDGET_SECONDS,
+    )
+except ImportError:
+    RETRY_MAX_ATTEMPTS = 4
+    RETRY_BASE_DELAY = 0.5
+    RETRY_MAX_DELAY = 10.0
+    RETRY_TASK_BUDGET_SECONDS = 45.0
+
+
+class RetryableFetchError(Exception):
+    """Временная ошибка запроса: попытку можно повторить (retry_after - пауза от биржи, сек)."""
+
+    def __init__(self, reason: str, retry_after: Optional[float] = None):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+# {exchange: {'retries', 'recovered', 'exhausted', 'budget_exceeded'}}
+_retry_metrics: Dict[str, Dict[str, int]] = defaultdict(
+    lambda: {'retries': 0, 'recovered': 0, 'exhausted': 0, 'budget_exceeded': 0}
+)
+
+
+def retry_stats() -> Dict[str, Dict[str, int]]:
+    """Счетчики повторов по биржам с момента запуска процесса (или reset_retry_stats)."""
+    return {exchange: dict(counters) for exchange, counters in _retry_metrics.items()}
+
+
+def reset_retry_stats() -> None:
+    _retry_metrics.clear()
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """Пауза перед повтором номер attempt (1, 2, ...): full jitter, не меньше Retry-After."""
+    delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempt - 1)))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+async def run_with_retry(
+    attempt: Callable[[], Awaitable[Any]],
+    exchange: str,
+    description: str,
+    log_prefix: str = "",
+    slot: Optional[Callable[[], AsyncContextManager[Any]]] = None
+) -> Optional[Any]:
+    """
+    Выполняет attempt() с повторами. Возвращает результат попытки
+    или None, если попытки/бюджет времени исчерпаны.
+
+    slot() - место в очереди запросов (семафор + лимитер), берется перед
+    каждой попыткой. Ожидание слота в бюджет НЕ входит: бюджет тратят только
+    сами попытки и паузы между ними, а не локальное ограничение скорости.
+    """
+    metrics = _retry_metrics[exchange]
+    spent = 0.0
+
+    for attempt_number in range(1, RETRY_MAX_ATTEMPTS + 1):
+        error: Optional[RetryableFetchError] = None
+        async with (slot() if slot is not None else nullcontext()):
+            started = time.monotonic()
+            try:
+                result = await asyncio.wait_for(attempt(), timeout=RETRY_TASK_BUDGET_SECONDS - spent)
+            except asyncio.TimeoutError:
+                metrics['budget_exceeded'] += 1
+                logger.warning(f"{log_prefix} RETRY: {description}: бюджет {RETRY_TASK_BUDGET_SECONDS} сек исчерпан.")
+                return None
+            except RetryableFetchError as e:
+                error = e
+            else:
+                if attempt_number > 1:
+                    metrics['recovered'] += 1
+                return result
+            finally:
+                spent += time.monotonic() - started
+
+        # Пауза перед повтором - уже без слота
+        if attempt_number == RETRY_MAX_ATTEMPTS:
+            metrics['exhausted'] += 1
+            logger.warning(f"{log_prefix} RETRY: {description}: {error.reason}, попытки исчерпаны ({RETRY_MAX_ATTEMPTS}).")
+            return None
+
+        delay = backoff_delay(attempt_number, error.retry_after)
+        if spent + delay >= RETRY_TASK_BUDGET_SECONDS:
+            metrics['budget_exceeded'] += 1
+            logger.warning(f"{log_prefix} RETRY: {description}: {error.reason}, повтор не укладывается в бюджет времени.")
+            return None
+
+        metrics['retries'] += 1
+        logger.info(f"{log_prefix} RETRY: {description}: {error.reason}, попытка {attempt_number + 1}/{RETRY_MAX_ATTEMPTS} через {delay:.2f} сек.")
+        await asyncio.sleep(delay)
+        spent += delay
+
+    return None
@@ -95,9 +95,16 @@ def prepare_fr_tasks(coins: List[Dict]) -> List[Dict[str, Any]]:
     return tasks_to_run
 
 
-def prepare_tasks(coins: List[Dict], timeframe: str, prefetched_fr_data: Optional[Dict] = None) -> List[Dict[str, Any]]:
+def prepare_tasks(
+    coins: List[Dict],
+    timeframe: str,
+    prefetched_fr_data: Optional[Dict] = None,
+    incremental_plan: Optional[Dict[str, Dict[str, int]]] = None
+) -> List[Dict[str, Any]]:
     """
     Готовит задачи для сбора Klines, Open Interest и Funding Rate.
+    incremental_plan ({symbol: {'start_time', 'limit', 'fr_limit'}}, см. incremental.py) -
+    для этих монет запрашиваются только новые свечи (startTime + маленький limit).
     """
     tasks_to_run = []
     log_prefix = f"[{timeframe.upper()}_TASK_BUILDER]"
@@ -112,6 +119,11 @@ def prepare_tasks(coins: List[Dict], timeframe: str, prefetched_fr_data: Optiona
         klines_limit = 800 if timeframe in ['4h'] else 400
         # --- ИЗМЕНЕНИЕ: OI limit ДИНАМИЧЕСКИЙ ---
         oi_limit = _calculate_oi_limit(api_timeframe)
+        fr_limit_url = 400
+        incremental = (incremental_plan or {}).get(symbol_path)
+        if incremental:
+            oi_limit = incremental['limit']
+            fr_limit_url = incremental['fr_limit']
         
         base_task_info = { "symbol": symbol_path, "exchange": exchange }
 
@@ -128,7 +140,10 @@ def prepare_tasks(coins: List[Dict], timeframe: str, prefetched_fr_data: Optiona
         
         if klines_url_func and klines_parser_func:
             # --- ИЗМЕНЕНИЕ: Klines URL-билдер ожидает (symbol_api, interval, limit) ---
-            url = klines_url_func(symbol_api, api_timeframe, klines_limit)
+            if incremental:
+                url = klines_url_func(symbol_api, api_timeframe, incremental['limit'], start_time=incremental['start_time'])
+            else:
+                url = klines_url_func(symbol_api, api_timeframe, klines_limit)
             task_info_klines = base_task_info.copy()
             task_info_klines.update({"url": url, "data_type": "klines"})
             tasks_to_run.append({
@@ -168,7 +183,6 @@ def prepare_tasks(coins: List[Dict], timeframe: str, prefetched_fr_data: Optiona
                  # --- ИЗМЕНЕНИЕ: OI URL-билдер ожидает (symbol_api, period, limit) ---
                  url = url_func(symbol_api, api_timeframe, oi_limit)
             elif data_type == 'fr':
-                 fr_limit_url = 400
                  # --- ИЗМЕНЕНИЕ: FR URL-билдер ожидает (symbol_api, limit) ---
                  url = url_func(symbol_api, fr_limit_url)
                  
@@ -61,12 +61,24 @@ async function runCronJobs() {
   );
 
   // (Этот скрипт запускается каждую минуту)
-  // Твой каскадный график (с 2-минутными окнами):
+  // Все таймфреймы, у которых в этот час закрылась свеча, собираются
+  // ОДНОЙ задачей: воркер один раз получает монеты и FR и использует
+  // общую HTTP-сессию и лимиты запросов к биржам.
 
-  // 1. 1h (Высший приоритет)
+  // 1. Свечи (1h каждый час + старшие таймфреймы на их границах)
   if (minute === 1) {
-    console.log("Запускаю: 1h");
-    await postApi("/get-market-data", { timeframe: "1h" });
+    const timeframes = ["1h"];
+    if (hour % 4 === 0) timeframes.push("4h"); // 00, 04, 08...
+    if (hour % 8 === 0) timeframes.push("8h"); // 00, 08, 16 (строится из 4h)
+    if (hour === 0 || hour === 12) timeframes.push("12h");
+    if (hour === 0) timeframes.push("1d");
+
+    console.log(`Запускаю: ${timeframes.join(", ")}`);
+    await postApi(
+      "/api/v1/internal/collect-market-data",
+      { timeframes },
+      SECRET_TOKEN
+    );
   }
 
   // 2. Funding Rate (FR)
@@ -75,27 +87,6 @@ async function runCronJobs() {
     console.log("Запускаю: fr");
     await postApi("/api/v1/internal/update-fr", null, SECRET_TOKEN);
   }
-
-  // 3. 4h / 8h
-  if (minute === 8 && hour % 4 === 0) {
-    // 00:08, 04:08, 08:08...
-    console.log("Запускаю: 4h");
-    await postApi("/get-market-data", { timeframe: "4h" });
-  }
-
-  // 4. 12h
-  if (minute === 11 && (hour === 0 || hour === 12)) {
-    // 00:11, 12:11
-    console.log("Запускаю: 12h");
-    await postApi("/get-market-data", { timeframe: "12h" });
-  }
-
-  // 5. 1d
-  if (minute === 14 && hour === 0) {
-    // 00:14
-    console.log("Запускаю: 1d");
-    await postApi("/get-market-data", { timeframe: "1d" });
-  }
 }
 
 // Deno Deploy вызывает 'default'
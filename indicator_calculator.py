@@ -1,8 +1,11 @@
 import pandas as pd
 import logging
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
 import numpy as np
 
+from api_helpers import get_interval_duration_ms
+from candle_columns import CandleColumns, as_columns
+
 # --- НОВЫЕ ИМПОРТЫ ИЗ ВАШЕГО ПАКЕТА 'indicators' ---
 try:
     from indicators import (
@@ -82,44 +85,173 @@ except ImportError:
         return pd.DataFrame(columns=output_cols)
     # --- КОНЕЦ ПУСТЫШЕК ---
 
+try:
+    from indicators.streaming import IndicatorState, STREAMING_COLUMNS, update_indicators
+except ImportError:
+    update_indicators = None
 
-def add_indicators(market_data: Dict[str, Any]) -> Dict[str, Any]:  # <-- ✅ Исправлено
+try:
+    from indicators.batched import BatchContext, calculate_indicators_batched
+    from indicators.registry import SOURCE_COLUMNS, VOLUME_COLUMNS, resolve_columns
+except ImportError:
+    calculate_indicators_batched = None
+
+# Движки расчета: по монетам (DataFrame на монету) или пакетный (матрица свечи x монеты)
+INDICATOR_ENGINES = ('per_symbol', 'batched')
+
+MIN_CANDLES_FOR_INDICATORS = 200
+
+# Колонки, которые округляются до 6 знаков
+ROUNDED_COLUMNS = [
+    'adx', 'di_plus', 'di_minus', 'openPrice',
+    'w_avwap', 'w_avwap_upper_band', 'w_avwap_lower_band',
+    'm_avwap', 'm_avwap_upper_band', 'm_avwap_lower_band',
+    'atr', 'bb_basis', 'bb_upper', 'bb_lower', 'bb_width',
+    'cmf', 'cmf_ema', 'ema_50', 'ema_100', 'ema_150', 'highest_50', 'lowest_50', 'highest_100', 'lowest_100', 'kama', 'kama_sc',
+    'kc_upper', 'kc_middle', 'kc_lower', 'kc_width',
+    'macd', 'macd_signal', 'macd_hist',
+    'obv', 'obv_ema',
+    'is_doji', 'is_bullish_engulfing', 'is_bearish_engulfing', 'is_hammer', 'is_pinbar',
+    'rvwap',
+    'rvwap_upper_band_1_0', 'rvwap_lower_band_1_0', 'rvwap_width_1_0',
+    'rvwap_upper_band_2_0', 'rvwap_lower_band_2_0', 'rvwap_width_2_0',
+    'rsi',
+    'ema_50_slope', 'ema_100_slope', 'ema_150_slope',
+    'vzo',
+    'closePrice_z_score',
+    'bb_width_z_score',
+    'kc_width_z_score',
+    'rvwap_width_1_0_z_score',
+    'ema_proximity_z_score',
+    'openInterest_z_score',
+    'fundingRate_z_score',
+]
+
+PATTERN_COLUMNS = ['is_doji', 'is_bullish_engulfing', 'is_bearish_engulfing', 'is_hammer', 'is_pinbar']
+
+
+def _prepare_frame(coin_data: Dict[str, Any]) -> pd.DataFrame:
+    """
+    DataFrame свечей монеты с числовыми OHLCV или None, если свечей
+    меньше MIN_CANDLES_FOR_INDICATORS.
+    """
+    symbol = coin_data.get('symbol', 'Unknown')
+    candles = coin_data.get('data', [])
+
+    if not candles or len(candles) < MIN_CANDLES_FOR_INDICATORS:
+        logging.warning(f"Недостаточно данных для {symbol} (нужно > 200, получено {len(candles)}), расчет индикаторов пропущен.")
+        return None
+
+    df = candles.to_frame() if isinstance(candles, CandleColumns) else pd.DataFrame(candles)
+
+    df['closePrice'] = pd.to_numeric(df['closePrice'])
+    df['highPrice'] = pd.to_numeric(df['highPrice'])
+    df['lowPrice'] = pd.to_numeric(df['lowPrice'])
+    df['openPrice'] = pd.to_numeric(df['openPrice'])  # <-- Добавить эту строку
+
+    volume_key = 'volume'
+    if volume_key not in df.columns:
+        logging.warning(f"Колонка '{volume_key}' отсутствует для {symbol}. Индикаторы, требующие объем, будут пропущены.")
+        df[volume_key] = 0.0
+    else:
+        df[volume_key] = pd.to_numeric(df[volume_key])
+    return df
+
+
+def _finalize_candles(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Округление, очистка (NaN/inf -> None) и перевод в список свечей."""
+    for col in ROUNDED_COLUMNS:
+        if col in df.columns and pd.api.types.is_numeric_dtype(df[col]):
+            df[col] = df[col].round(6)
+
+    df.replace([np.nan, np.inf, -np.inf], None, inplace=True)
+
+    for col in PATTERN_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].fillna(False)
+
+    return df.to_dict(orient='records')
+
+
+def _candles_from_columns(columns: Dict[str, np.ndarray]) -> List[Dict[str, Any]]:
+    """
+    То же, что _finalize_candles, но сразу из колонок-массивов, без
+    DataFrame на монету (пакетный движок): округление ROUNDED_COLUMNS,
+    NaN/inf -> None, значения - типы Python.
+    """
+    rounded = set(ROUNDED_COLUMNS)
+    lists = {}
+    for name, column in columns.items():
+        column = np.asarray(column)
+        if column.dtype.kind == 'f':
+            if name in rounded:
+                column = column.round(6)
+            values = column.tolist()
+            for i in np.flatnonzero(~np.isfinite(column)):
+                values[i] = None
+        elif column.dtype == object:
+            values = [None if isinstance(v, float) and not np.isfinite(v) else v for v in column.tolist()]
+        else:
+            values = column.tolist()
+        lists[name] = values
+    names = list(lists)
+    return [dict(zip(names, row)) for row in zip(*lists.values())]
+
+
+def add_indicators(
+    market_data: Dict[str, Any],
+    engine: str = 'per_symbol',
+    indicators: Optional[List[str]] = None
+) -> Dict[str, Any]:  # <-- ✅ Исправлено
     """
     Принимает структуру данных, рассчитывает для каждой монеты технические индикаторы
     с использованием кастомного пакета 'indicators' и возвращает обогащенную структуру данных.
+
+    engine:
+        'per_symbol' - DataFrame и ~20 вызовов индикаторов на каждую монету;
+        'batched'    - все монеты одной матрицей (indicators/batched.py),
+                       результат тот же.
+    indicators:
+        Группы и/или колонки (indicators/registry.py, INDICATOR_GROUPS), None - все.
+        Подмножество считает только пакетный движок - и только нужные ему узлы.
     """
+    if engine not in INDICATOR_ENGINES:
+        raise ValueError(f"Неизвестный движок индикаторов '{engine}'. Допустимые: {INDICATOR_ENGINES}")
+    if indicators is not None:
+        if engine != 'batched' or calculate_indicators_batched is None:
+            raise ValueError("Подмножество индикаторов считается только движком 'batched'.")
+        resolve_columns(indicators)
+
     if not market_data or not market_data.get('data'):
         logging.warning("Получены пустые данные, расчет индикаторов пропущен.")
         return market_data
 
+    if indicators is not None:
+        _add_indicators_batched(market_data['data'], indicators)
+        logging.info(f"Расчет индикаторов {indicators} завершен (пакетный движок).")
+        return market_data
+
+    if engine == 'batched' and calculate_indicators_batched is not None:
+        try:
+            _add_indicators_batched(market_data['data'])
+            logging.info("Расчет всех индикаторов завершен (пакетный движок).")
+            return market_data
+        except Exception as e:
+            logging.error(f"Ошибка пакетного расчета индикаторов, считаю по монетам: {e}", exc_info=True)
+
     for coin_data in market_data['data']:
         symbol = coin_data.get('symbol', 'Unknown')
-        candles = coin_data.get('data', [])
         timeframe = coin_data.get('timeframe', '1h')
 
-        if not candles or len(candles) < 200:
-            logging.warning(f"Недостаточно данных для {symbol} (нужно > 200, получено {len(candles)}), расчет индикаторов пропущен.")
-            continue
-
         try:
-            df = pd.DataFrame(candles)
-
-            df['closePrice'] = pd.to_numeric(df['closePrice'])
-            df['highPrice'] = pd.to_numeric(df['highPrice'])
-            df['lowPrice'] = pd.to_numeric(df['lowPrice'])
-            df['openPrice'] = pd.to_numeric(df['openPrice'])  # <-- Добавить эту строку
-
-            volume_key = 'volume'
-            if volume_key not in df.columns:
-                logging.warning(f"Колонка '{volume_key}' отсутствует для {symbol}. Индикаторы, требующие объем, будут пропущены.")
-                df[volume_key] = 0.0
-            else:
-                df[volume_key] = pd.to_numeric(df[volume_key])
+            df = _prepare_frame(coin_data)
+            if df is None:
+                continue
 
             close = df['closePrice']
             high = df['highPrice']
             low = df['lowPrice']
-            volume = df[volume_key]
+            volume = df['volume']
 
             has_volume = volume.sum() > 0
 
@@ -205,42 +337,7 @@ def add_indicators(market_data: Dict[str, Any]) -> Dict[str, Any]:  # <-- ✅ И
             # --- КОНЕЦ НОВОГО БЛОКА ---
 
             # --- Округление и очистка ---
-            indicator_cols = [
-                'adx', 'di_plus', 'di_minus', 'openPrice',
-                'w_avwap', 'w_avwap_upper_band', 'w_avwap_lower_band',
-                'm_avwap', 'm_avwap_upper_band', 'm_avwap_lower_band',
-                'atr', 'bb_basis', 'bb_upper', 'bb_lower', 'bb_width',
-                'cmf', 'cmf_ema', 'ema_50', 'ema_100', 'ema_150', 'highest_50', 'lowest_50', 'highest_100', 'lowest_100', 'kama', 'kama_sc',
-                'kc_upper', 'kc_middle', 'kc_lower', 'kc_width',
-                'macd', 'macd_signal', 'macd_hist',
-                'obv', 'obv_ema',
-                'is_doji', 'is_bullish_engulfing', 'is_bearish_engulfing', 'is_hammer', 'is_pinbar',
-                'rvwap',
-                'rvwap_upper_band_1_0', 'rvwap_lower_band_1_0', 'rvwap_width_1_0',
-                'rvwap_upper_band_2_0', 'rvwap_lower_band_2_0', 'rvwap_width_2_0',
-                'rsi',
-                'ema_50_slope', 'ema_100_slope', 'ema_150_slope',
-                'vzo',
-                'closePrice_z_score',
-                'bb_width_z_score',
-                'kc_width_z_score',
-                'rvwap_width_1_0_z_score',
-                'ema_proximity_z_score',
-                'openInterest_z_score',
-                'fundingRate_z_score',
-            ]
-
-            for col in indicator_cols:
-                if col in df.columns and pd.api.types.is_numeric_dtype(df[col]):
-                    df[col] = df[col].round(6)
-
-            df.replace([np.nan, np.inf, -np.inf], None, inplace=True)
-
-            for col in ['is_doji', 'is_bullish_engulfing', 'is_bearish_engulfing', 'is_hammer', 'is_pinbar']:
-                if col in df.columns:
-                    df[col] = df[col].fillna(False)
-
-            updated_candles = df.to_dict(orient='records')
+            updated_candles = _finalize_candles(df)
             coin_data['data'] = updated_candles
 
         except Exception as e:
@@ -248,4 +345,145 @@ def add_indicators(market_data: Dict[str, Any]) -> Dict[str, Any]:  # <-- ✅ И
             continue
 
     logging.info("Расчет всех индикаторов завершен.")
-    return market_data
\ No newline at end of file
+    return market_data
+
+
+def _add_indicators_batched(
+    coins_data: List[Dict[str, Any]],
+    indicators: Optional[List[str]] = None,
+    states: Optional[Dict[str, Dict[str, Any]]] = None
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Пакетный движок add_indicators: OHLCV всех монет складываются в
+    матрицы (свечи x монеты), реестр (indicators/registry.py) планирует
+    только нужные запрошенным колонкам узлы, результат раскладывается
+    обратно по монетам. Колонки и их порядок - как у 'per_symbol'.
+
+    states - сохраненные состояния {symbol: {'state', 'columns'}}
+    (см. add_indicators_resumable): тогда запрошенные STREAMING_COLUMNS
+    считаются update_streaming_indicators, а не матрицей.
+    Возвращает новые состояния посчитанных монет (без states - {}).
+    """
+    columns = resolve_columns(indicators)
+    streamed_columns = [col for col in columns if col in STREAMING_COLUMNS] if states is not None else []
+
+    frames: List[pd.DataFrame] = []
+    coins: List[Dict[str, Any]] = []
+    streamed: List[Dict[str, np.ndarray]] = []
+    new_states: Dict[str, Dict[str, Any]] = {}
+    for coin_data in coins_data:
+        symbol = coin_data.get('symbol', 'Unknown')
+        try:
+            df = _prepare_frame(coin_data)
+            if df is not None and streamed_columns:
+                entry = states.get(symbol) or {}
+                coin_streamed, state = update_streaming_indicators(
+                    coin_data['data'], coin_data.get('timeframe', '1h'), entry.get('state'), entry.get('columns')
+                )
+                streamed.append(coin_streamed)
+                new_states[symbol] = {'state': state, 'columns': {name: column.tolist() for name, column in coin_streamed.items()}}
+        except Exception as e:
+            logging.error(f"Ошибка при расчете кастомных индикаторов для {symbol}: {e}", exc_info=True)
+            continue
+        if df is not None:
+            frames.append(df)
+            coins.append(coin_data)
+    if not frames:
+        return new_states
+
+    context = BatchContext(frames, [coin_data.get('timeframe', '1h') for coin_data in coins])
+    batch = calculate_indicators_batched(context, [col for col in columns if col not in streamed_columns])
+    values = {name: frame.to_numpy() for name, frame in batch.items()}
+
+    volume_columns = [col for col in columns if col in VOLUME_COLUMNS]
+    for j, (df, coin_data) in enumerate(zip(frames, coins)):
+        n = len(df)
+        try:
+            if volume_columns and not context.has_volume[j]:
+                logging.warning(f"Пропущены {volume_columns} для {coin_data.get('symbol', 'Unknown')} - нет данных об объеме.")
+            coin_columns = {
+                col: streamed[j][col] if col in streamed_columns else values[col][:n, j] for col in columns
+                if (context.has_volume[j] or col not in VOLUME_COLUMNS)
+                and (col not in SOURCE_COLUMNS or SOURCE_COLUMNS[col] in df.columns)
+            }
+            coin_data['data'] = _candles_from_columns({**{col: df[col].to_numpy() for col in df.columns}, **coin_columns})
+        except Exception as e:
+            logging.error(f"Ошибка при расчете кастомных индикаторов для {coin_data.get('symbol', 'Unknown')}: {e}", exc_info=True)
+            continue
+    return new_states
+
+
+def add_indicators_resumable(
+    market_data: Dict[str, Any],
+    indicators: Optional[List[str]] = None,
+    states: Optional[Dict[str, Dict[str, Any]]] = None
+) -> Dict[str, Dict[str, Any]]:
+    """
+    add_indicators(engine='batched') для повторяющихся расчетов по одному
+    ряду (GET /indicators): рекурсивные индикаторы (STREAMING_COLUMNS)
+    продолжаются с сохраненного состояния - считаются только новые свечи,
+    остальные колонки - пакетным движком.
+
+    states - {symbol: {'state', 'columns'}} из cache_manager.load_indicator_states
+    (нет состояния - полный расчет). Возвращает новые состояния для
+    cache_manager.save_indicator_states.
+    """
+    resolve_columns(indicators)
+    if calculate_indicators_batched is None or update_indicators is None:
+        add_indicators(market_data, engine='batched', indicators=indicators)
+        return {}
+
+    if not market_data or not market_data.get('data'):
+        logging.warning("Получены пустые данные, расчет индикаторов пропущен.")
+        return {}
+
+    new_states = _add_indicators_batched(market_data['data'], indicators, states or {})
+    logging.info(f"Расчет индикаторов {indicators or 'все'} завершен (пакетный движок, рекурсивные - с сохраненного состояния).")
+    return new_states
+
+
+def update_streaming_indicators(
+    candles: Any,
+    timeframe: str,
+    state: Optional[Dict[str, Any]] = None,
+    previous: Optional[Dict[str, np.ndarray]] = None
+) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+    """
+    Рекурсивные индикаторы монеты (STREAMING_COLUMNS) с сохраненного состояния.
+
+    state    - состояние с прошлого вызова (IndicatorState.to_dict, см.
+               cache_manager.load_indicator_states);
+    previous - колонки с прошлого вызова (с 'openTime'): значения старых
+               свечей берутся из них, считаются только новые свечи - O(N).
+    Если состояния нет, оно устарело (разрыв, другие параметры) или previous
+    не покрывает старые свечи - полный пересчет по всему ряду.
+
+    Returns:
+        (колонки для всех свечей + 'openTime', новое состояние для сохранения).
+    """
+    candles = as_columns(candles)
+    open_time = candles['openTime']
+    interval_ms = get_interval_duration_ms(timeframe)
+    args = (open_time, candles['highPrice'], candles['lowPrice'], candles['closePrice'], candles['volume'])
+
+    resumed = IndicatorState.from_dict(state) if state else None
+    start, new_columns, new_state = update_indicators(*args, resumed, interval_ms)
+
+    old_rows = None
+    if start > 0 and previous is not None:
+        # Старые свечи [0:start] должны идти в previous подряд
+        prev_time = np.asarray(previous['openTime'], dtype=np.int64)
+        pos = int(np.searchsorted(prev_time, open_time[0]))
+        if np.array_equal(prev_time[pos:pos + start], open_time[:start]):
+            old_rows = slice(pos, pos + start)
+    if start > 0 and old_rows is None:
+        logging.info(f"[INDICATORS] Нет прошлых значений для {start} свечей - полный пересчет.")
+        start, new_columns, new_state = update_indicators(*args, None, interval_ms)
+
+    columns = {'openTime': open_time.copy()}
+    for column in STREAMING_COLUMNS:
+        if start > 0:
+            columns[column] = np.concatenate((np.asarray(previous[column], dtype=np.float64)[old_rows], new_columns[column]))
+        else:
+            columns[column] = new_columns[column]
+    return columns, new_state.to_dict()
@@ -1,7 +1,9 @@
 import pandas as pd
 import numpy as np
+from typing import Optional
 
-def calculate_anchored_vwap(df: pd.DataFrame, anchor: str, stdev_mult: float = 1.0) -> pd.DataFrame:
+def calculate_anchored_vwap(df: pd.DataFrame, anchor: str, stdev_mult: float = 1.0,
+                            src: Optional[np.ndarray] = None) -> pd.DataFrame:
     """
     Рассчитывает Anchored VWAP с привязкой к началу недели или месяца.
 
@@ -10,6 +12,8 @@ def calculate_anchored_vwap(df: pd.DataFrame, anchor: str, stdev_mult: float = 1
                            'lowPrice', 'closePrice', 'volume'.
         anchor (str): Период привязки. 'W' для недели, 'M' для месяца.
         stdev_mult (float): Множитель для полос стандартного отклонения.
+        src (np.ndarray, optional): Уже посчитанная типичная цена (H+L+C)/3
+                                    по свечам df (общий узел реестра индикаторов).
 
     Returns:
         pd.DataFrame: DataFrame с рассчитанными значениями.
@@ -29,7 +33,10 @@ def calculate_anchored_vwap(df: pd.DataFrame, anchor: str, stdev_mult: float = 1
     df_copy.set_index('timestamp', inplace=True)
     
     # 2. Расчет базовых величин для каждой свечи
-    src = (df_copy['highPrice'] + df_copy['lowPrice'] + df_copy['closePrice']) / 3
+    if src is None:
+        src = (df_copy['highPrice'] + df_copy['lowPrice'] + df_copy['closePrice']) / 3
+    else:
+        src = pd.Series(src, index=df_copy.index)
     vol = df_copy['volume']
     
     df_copy['src_vol'] = src * vol
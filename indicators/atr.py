@@ -1,5 +1,7 @@
 import pandas as pd
 
+from .kernels import as_float_array, wilder_rma_kernel
+
 def calculate_atr(high: pd.Series, low: pd.Series, close: pd.Series, length: int = 14) -> pd.Series:
     """
     Рассчитывает Average True Range (ATR) с использованием сглаживания Уайлдера.
@@ -22,11 +24,7 @@ def calculate_atr(high: pd.Series, low: pd.Series, close: pd.Series, length: int
     tr = pd.concat([high_low, high_close_prev, low_close_prev], axis=1).max(axis=1)
     
     # 2. Рассчитываем ATR, используя сглаживание Уайлдера (RMA)
-    # Первый ATR - это простое среднее первых 'length' значений TR
-    atr = tr.rolling(window=length).mean()
-    
-    # Последующие значения сглаживаются по формуле
-    for i in range(length, len(tr)):
-        atr.iloc[i] = (atr.iloc[i-1] * (length - 1) + tr.iloc[i]) / length
-        
-    return atr
+    # Первый ATR - это простое среднее первых 'length' значений TR,
+    # последующие значения сглаживаются по формуле (ядро numba)
+    atr = wilder_rma_kernel(as_float_array(tr), length)
+    return pd.Series(atr, index=tr.index)
@@ -0,0 +1,73 @@
+"""
+Пакетный расчет индикаторов сразу для всех монет.
+
+Свечи всех монет складываются в матрицу (свечи x монеты): монета - колонка
+DataFrame, короткая история дополняется NaN В КОНЦЕ колонки. Все индикаторы
+здесь причинные (rolling, shift, diff, ewm, рекурсии смотрят только назад),
+поэтому NaN-хвост не влияет на значения монеты в пределах ее длины, и
+каждый индикатор считается одним вызовом pandas/numba по всем колонкам
+вместо ~20 вызовов на каждую монету.
+
+Что и в каком порядке считать, решает реестр (indicators/registry.py):
+считаются только узлы, нужные запрошенным колонкам. Индикаторы, привязанные
+ко времени (anchored_vwap, rvwap), считаются по монетам из BatchContext.frames.
+"""
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .registry import evaluate, plan, OUTPUTS, resolve_columns
+
+
+def stack_columns(columns: List[np.ndarray]) -> pd.DataFrame:
+    """Матрица (свечи x монеты) из колонок разной длины; хвост - NaN."""
+    length = max((len(column) for column in columns), default=0)
+    matrix = np.full((length, len(columns)), np.nan)
+    for j, column in enumerate(columns):
+        matrix[:len(column), j] = column
+    return pd.DataFrame(matrix)
+
+
+class BatchContext:
+    """
+    Входные данные пакетного расчета: подготовленные DataFrame монет
+    (openTime, OHLCV, ...) и их таймфреймы. Поля свечей складываются
+    в матрицы по требованию.
+    """
+
+    def __init__(self, frames: List[pd.DataFrame], timeframes: Optional[List[str]] = None):
+        self.frames = frames
+        self.timeframes = timeframes or ['1h'] * len(frames)
+        self.has_volume = [bool(df['volume'].sum() > 0) if 'volume' in df.columns else False for df in frames]
+        self._sources: Dict[str, pd.DataFrame] = {}
+
+    def source(self, field: str) -> pd.DataFrame:
+        # Нет колонки у монеты (OI/FR) - колонка матрицы из NaN
+        if field not in self._sources:
+            self._sources[field] = stack_columns([
+                df[field].to_numpy(dtype=np.float64) if field in df.columns else np.full(len(df), np.nan)
+                for df in self.frames
+            ])
+        return self._sources[field]
+
+
+def calculate_indicators_batched(
+    context: BatchContext,
+    indicators: Optional[Iterable[str]] = None
+) -> Dict[str, pd.DataFrame]:
+    """
+    Рассчитывает колонки add_indicators для всех монет контекста.
+
+    Args:
+        context (BatchContext): Монеты для расчета.
+        indicators (Iterable[str], optional): Группы и/или колонки
+            (см. registry.INDICATOR_GROUPS). None - все.
+
+    Returns:
+        Dict[str, pd.DataFrame]: {имя колонки индикатора: матрица значений}
+                                 в порядке registry.OUTPUT_COLUMNS.
+    """
+    columns = resolve_columns(indicators)
+    values = evaluate(plan(columns), context)
+    return {column: values[OUTPUTS[column]] for column in columns}
@@ -1,5 +1,6 @@
 import pandas as pd
-import numpy as np
+
+from .kernels import as_float_array, ema_kernel
 
 def calculate_ema(close: pd.Series, length: int) -> pd.Series:
     """
@@ -12,18 +13,6 @@ def calculate_ema(close: pd.Series, length: int) -> pd.Series:
     Returns:
         pd.Series: Серия со значениями EMA.
     """
-    # Создаем пустую серию для результатов
-    ema = pd.Series(np.nan, index=close.index)
-    
-    # Первое значение EMA равно SMA за тот же период
-    sma = close.rolling(window=length, min_periods=length).mean().iloc[length-1]
-    ema.iloc[length-1] = sma
-
-    # Множитель сглаживания
-    k = 2 / (length + 1)
-
-    # Рассчитываем остальные значения
-    for i in range(length, len(close)):
-        ema.iloc[i] = (close.iloc[i] * k) + (ema.iloc[i-1] * (1 - k))
-        
-    return ema
+    # Первое значение EMA равно SMA за тот же период, далее рекурсия (ядро numba)
+    ema = ema_kernel(as_float_array(close), length)
+    return pd.Series(ema, index=close.index)
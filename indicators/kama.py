@@ -2,6 +2,8 @@ import pandas as pd
 import numpy as np
 from typing import Tuple
 
+from .kernels import as_float_array, kama_kernel
+
 def calculate_kama(close: pd.Series, length: int = 14, fast_length: int = 2, slow_length: int = 30) -> Tuple[pd.Series, pd.Series]:
     """
     Рассчитывает Адаптивную Скользящую Среднюю Кауфмана (KAMA) и её
@@ -36,17 +38,8 @@ def calculate_kama(close: pd.Series, length: int = 14, fast_length: int = 2, slo
     # 4. Рассчитываем динамический альфа (Smoothing Constant)
     smoothing_constant = (er * (fast_alpha - slow_alpha) + slow_alpha) ** 2
 
-    # 5. Итеративно рассчитываем KAMA
-    kama_values = np.zeros(len(close))
-    kama_values[0] = close.iloc[0]
-
-    for i in range(1, len(close)):
-        sc = smoothing_constant.iloc[i]
-        if np.isnan(sc):
-            kama_values[i] = kama_values[i-1]
-        else:
-            kama_values[i] = kama_values[i-1] + sc * (close.iloc[i] - kama_values[i-1])
-            
+    # 5. Итеративно рассчитываем KAMA (ядро numba)
+    kama_values = kama_kernel(as_float_array(close), as_float_array(smoothing_constant))
     kama_series = pd.Series(kama_values, index=close.index)
 
     return kama_series, smoothing_constant
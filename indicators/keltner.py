@@ -1,29 +1,17 @@
 import pandas as pd
 import numpy as np
 
+from .kernels import as_float_array, wilder_rma_kernel
+
 
 def _wilder_smooth(series: pd.Series, length: int) -> pd.Series:
     """
     Применяет сглаживание Уайлдера (RMA - Running Moving Average).
     Это специфический вид EMA с alpha = 1 / length.
-    Скопировано из adx.py для консистентности расчета ATR.
+    Тот же расчет, что в adx.py (общее ядро indicators/kernels.py).
+    Если данных меньше 'length' - все значения NaN.
     """
-    # Создаем пустую серию для результатов, заполненную NaN
-    smoothed = pd.Series(np.nan, index=series.index)
-   
-    # Первое значение - это простое среднее за 'length' периодов
-    # Убедимся, что у нас достаточно данных для SMA
-    if len(series) < length:
-        return smoothed # Возвращаем NaN, если данных не хватает
-
-    sma = series.rolling(window=length).mean().iloc[length-1]
-    smoothed.iloc[length-1] = sma
-   
-    # Рассчитываем остальные значения по формуле Уайлдера
-    for i in range(length, len(series)):
-        smoothed.iloc[i] = (smoothed.iloc[i-1] * (length - 1) + series.iloc[i]) / length
-       
-    return smoothed
+    return pd.Series(wilder_rma_kernel(as_float_array(series), length), index=series.index)
 
 
 def calculate_keltner_channel(
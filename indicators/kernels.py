@@ -0,0 +1,158 @@
+"""
+Рекурсивные сглаживания индикаторов (ядра numba).
+
+Раньше EMA, RSI, ATR, KAMA, ADX и Keltner считали рекурсию циклом
+Python по `.iloc` - для каждого бара и каждой монеты. Здесь те же
+формулы на массивах float64, скомпилированные @njit; публичные
+функции индикаторов остаются прежними и лишь оборачивают ядра.
+
+Правила затравки повторяют прежние расчеты:
+    - первое значение (индекс length-1) - простое среднее первых length
+      значений; если среди них есть NaN - NaN (как rolling(...).mean());
+    - до индекса length-1 - NaN; при len < length - все NaN.
+"""
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    # Без numba ядра работают как обычные функции Python (медленнее, но тот же результат)
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
+
+@njit(cache=True)
+def _seed_mean(values, length):
+    """Простое среднее первых length значений (NaN, если среди них есть NaN)."""
+    total = 0.0
+    for i in range(length):
+        if np.isnan(values[i]):
+            return np.nan
+        total += values[i]
+    return total / length
+
+
+@njit(cache=True)
+def ema_kernel(close, length):
+    """EMA: затравка SMA, далее close * k + prev * (1 - k), k = 2 / (length + 1)."""
+    n = close.shape[0]
+    out = np.full(n, np.nan)
+    if length < 1 or n < length:
+        return out
+    out[length - 1] = _seed_mean(close, length)
+    k = 2.0 / (length + 1)
+    for i in range(length, n):
+        out[i] = (close[i] * k) + (out[i - 1] * (1 - k))
+    return out
+
+
+@njit(cache=True)
+def wilder_rma_kernel(values, length):
+    """Сглаживание Уайлдера (RMA): затравка SMA, далее (prev * (length - 1) + x) / length."""
+    n = values.shape[0]
+    out = np.full(n, np.nan)
+    if length < 1 or n < length:
+        return out
+    out[length - 1] = _seed_mean(values, length)
+    for i in range(length, n):
+        out[i] = (out[i - 1] * (length - 1) + values[i]) / length
+    return out
+
+
+@njit(cache=True)
+def kama_kernel(close, smoothing_constant):
+    """KAMA: kama[0] = close[0], далее prev + sc * (close - prev); sc = NaN - значение переносится."""
+    n = close.shape[0]
+    out = np.zeros(n)
+    if n == 0:
+        return out
+    out[0] = close[0]
+    for i in range(1, n):
+        sc = smoothing_constant[i]
+        if np.isnan(sc):
+            out[i] = out[i - 1]
+        else:
+            out[i] = out[i - 1] + sc * (close[i] - out[i - 1])
+    return out
+
+
+# --- Продолжение рекурсии с сохраненного состояния (indicators/streaming.py) ---
+
+@njit(cache=True)
+def smooth_resume_kernel(values, length, wilder, count, seed_sum, last):
+    """
+    EMA (wilder=False) или RMA (wilder=True) с состояния (count, seed_sum, last):
+    пока count < length копится затравка, затем рекурсия. С пустого состояния
+    результат совпадает с ema_kernel / wilder_rma_kernel.
+    Возвращает (значения, count, seed_sum, last).
+    """
+    n = values.shape[0]
+    out = np.full(n, np.nan)
+    k = 2.0 / (length + 1)
+    for i in range(n):
+        if count < length:
+            seed_sum += values[i]
+            count += 1
+            if count == length:
+                last = seed_sum / length
+                out[i] = last
+        else:
+            if wilder:
+                last = (last * (length - 1) + values[i]) / length
+            else:
+                last = (values[i] * k) + (last * (1 - k))
+            out[i] = last
+    return out, count, seed_sum, last
+
+
+@njit(cache=True)
+def kama_resume_kernel(close, smoothing_constant, started, last):
+    """kama_kernel с состояния: started=False - первой свечой будет close[0]."""
+    n = close.shape[0]
+    out = np.zeros(n)
+    for i in range(n):
+        if not started:
+            last = close[i]
+            started = True
+        elif not np.isnan(smoothing_constant[i]):
+            last = last + smoothing_constant[i] * (close[i] - last)
+        out[i] = last
+    return out, started, last
+
+
+# --- Те же ядра по колонкам матрицы (свечи x монеты), см. indicators/batched.py ---
+
+@njit(cache=True)
+def ema_columns(matrix, length):
+    out = np.empty_like(matrix)
+    for j in range(matrix.shape[1]):
+        out[:, j] = ema_kernel(matrix[:, j], length)
+    return out
+
+
+@njit(cache=True)
+def wilder_rma_columns(matrix, length):
+    out = np.empty_like(matrix)
+    for j in range(matrix.shape[1]):
+        out[:, j] = wilder_rma_kernel(matrix[:, j], length)
+    return out
+
+
+@njit(cache=True)
+def kama_columns(close, smoothing_constant):
+    out = np.empty_like(close)
+    for j in range(close.shape[1]):
+        out[:, j] = kama_kernel(close[:, j], smoothing_constant[:, j])
+    return out
+
+
+def as_float_array(series) -> np.ndarray:
+    """Значения серии как непрерывный массив float64 (вход ядер)."""
+    return np.ascontiguousarray(np.asarray(series, dtype=np.float64))
+
+
+def as_float_matrix(frame) -> np.ndarray:
+    """Матрица float64 по колонкам (Fortran-порядок: колонка непрерывна)."""
+    return np.asfortranarray(np.asarray(frame, dtype=np.float64))
@@ -0,0 +1,561 @@
+"""
+Декларативный реестр индикаторов и планировщик расчета.
+
+Каждая выходная колонка add_indicators - узел графа, который объявляет
+свои входы (другие узлы) и параметры. Промежуточные узлы (TR, EMA(n),
+типичная цена, скользящие суммы, diff) - общие: ключ узла - кортеж
+(вид, входы..., параметры...), поэтому ATR(14) для колонки 'atr',
+паттернов и ADX, EMA(50) для наклона и ema_proximity и т.д. считаются
+один раз.
+
+    plan(['rsi', 'kc_width'])  -> узлы в порядке расчета (только нужные)
+    evaluate(nodes, context)   -> {ключ узла: значение}
+
+Значения узлов - матрицы (свечи x монеты) pandas, см. indicators/batched.py.
+Формулы 1-в-1 как в модулях индикаторов (adx.py, cmf.py, ...).
+"""
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .anchored_vwap import calculate_anchored_vwap
+from .kernels import as_float_matrix, ema_columns, kama_columns, wilder_rma_columns
+from .rvwap import calculate_rvwap
+
+NodeKey = Tuple[Any, ...]
+
+# вид узла -> (входы(параметры) -> ключи, расчет(context, значения входов..., параметры...))
+_KINDS: Dict[str, Tuple[Callable[..., Tuple[NodeKey, ...]], Callable[..., Any]]] = {}
+# выходная колонка -> ключ узла
+OUTPUTS: Dict[str, NodeKey] = {}
+
+
+def node_kind(name: str, inputs: Callable[..., Tuple[NodeKey, ...]] = lambda *params: ()):
+    """Регистрирует вид узла: inputs(*params) - ключи входов."""
+    def register(func: Callable[..., Any]) -> Callable[..., Any]:
+        _KINDS[name] = (inputs, func)
+        return func
+    return register
+
+
+def _like(frame: pd.DataFrame, values: np.ndarray) -> pd.DataFrame:
+    return pd.DataFrame(values, index=frame.index, columns=frame.columns)
+
+
+# ============================================================================
+# === Базовые узлы ===
+# ============================================================================
+
+def src(field: str) -> NodeKey:
+    """Поле свечей (closePrice, volume, openInterest, ...)."""
+    return ('src', field)
+
+
+O, H, L, C, V = (src(f) for f in ('openPrice', 'highPrice', 'lowPrice', 'closePrice', 'volume'))
+
+
+def shift(key: NodeKey, periods: int = 1) -> NodeKey:
+    return ('shift', key, periods)
+
+
+def diff(key: NodeKey, periods: int = 1) -> NodeKey:
+    return ('diff', key, periods)
+
+
+def sma(key: NodeKey, length: int) -> NodeKey:
+    return ('sma', key, length)
+
+
+def rolling_std(key: NodeKey, length: int) -> NodeKey:
+    return ('std', key, length)
+
+
+def rolling_sum(key: NodeKey, length: int) -> NodeKey:
+    return ('sum', key, length)
+
+
+def ema(key: NodeKey, length: int) -> NodeKey:
+    """EMA с затравкой SMA (ema.py)."""
+    return ('ema', key, length)
+
+
+def ewm(key: NodeKey, span: int) -> NodeKey:
+    """ewm(span, adjust=False) pandas (keltner.py, vzo.py)."""
+    return ('ewm', key, span)
+
+
+def rma(key: NodeKey, length: int) -> NodeKey:
+    """Сглаживание Уайлдера."""
+    return ('rma', key, length)
+
+
+def nonzero(key: NodeKey) -> NodeKey:
+    """0 -> NaN (защита от деления на ноль)."""
+    return ('nonzero', key)
+
+
+TR: NodeKey = ('tr',)
+TYPICAL_PRICE: NodeKey = ('typical_price',)
+
+
+@node_kind('src')
+def _src(context, field):
+    return context.source(field)
+
+
+@node_kind('shift', lambda key, periods: (key,))
+def _shift(context, value, key, periods):
+    return value.shift(periods)
+
+
+@node_kind('diff', lambda key, periods: (key,))
+def _diff(context, value, key, periods):
+    return value.diff(periods)
+
+
+@node_kind('sma', lambda key, length: (key,))
+def _sma(context, value, key, length):
+    return value.rolling(window=length).mean()
+
+
+@node_kind('std', lambda key, length: (key,))
+def _std(context, value, key, length):
+    return value.rolling(window=length).std()
+
+
+@node_kind('sum', lambda key, length: (key,))
+def _sum(context, value, key, length):
+    return value.rolling(window=length).sum()
+
+
+@node_kind('ema', lambda key, length: (key,))
+def _ema(context, value, key, length):
+    return _like(value, ema_columns(as_float_matrix(value), length))
+
+
+@node_kind('ewm', lambda key, span: (key,))
+def _ewm(context, value, key, span):
+    return value.ewm(span=span, adjust=False).mean()
+
+
+@node_kind('rma', lambda key, length: (key,))
+def _rma(context, value, key, length):
+    return _like(value, wilder_rma_columns(as_float_matrix(value), length))
+
+
+@node_kind('nonzero', lambda key: (key,))
+def _nonzero(context, value, key):
+    return value.replace(0, np.nan)
+
+
+@node_kind('tr', lambda: (H, L, shift(C)))
+def _true_range(context, high, low, prev_close):
+    # fmax пропускает NaN, как concat(...).max(axis=1)
+    tr = np.fmax(np.fmax((high - low).to_numpy(), abs(high - prev_close).to_numpy()), abs(low - prev_close).to_numpy())
+    return _like(high, tr)
+
+
+@node_kind('typical_price', lambda: (H, L, C))
+def _typical_price(context, high, low, close):
+    return (high + low + close) / 3
+
+
+# ============================================================================
+# === Выходные колонки ===
+# ============================================================================
+
+def indicator(*columns: str, inputs: Iterable[NodeKey] = ()):
+    """
+    Регистрирует выходную колонку (или несколько колонок одного узла -
+    тогда расчет возвращает {колонка: значение}).
+    """
+    inputs = tuple(inputs)
+
+    def register(func: Callable[..., Any]) -> Callable[..., Any]:
+        kind = f'out:{columns[0]}'
+        node_kind(kind, lambda: inputs)(lambda context, *values: func(*values))
+        for column in columns:
+            OUTPUTS[column] = (kind,) if len(columns) == 1 else ('pick', (kind,), column)
+        return func
+    return register
+
+
+@node_kind('pick', lambda key, column: (key,))
+def _pick(context, value, key, column):
+    return value[column]
+
+
+# --- ADX, ATR (adx.py, atr.py) ---
+ATR_14 = rma(TR, 14)
+PLUS_DM: NodeKey = ('plus_dm',)
+MINUS_DM: NodeKey = ('minus_dm',)
+
+
+@node_kind('plus_dm', lambda: (diff(H), diff(L)))
+def _plus_dm(context, move_up, low_diff):
+    move_down = -low_diff
+    return _like(move_up, np.where((move_up > move_down) & (move_up > 0), move_up, 0.0))
+
+
+@node_kind('minus_dm', lambda: (diff(H), diff(L)))
+def _minus_dm(context, move_up, low_diff):
+    move_down = -low_diff
+    return _like(move_up, np.where((move_down > move_up) & (move_down > 0), move_down, 0.0))
+
+
+DI_PLUS: NodeKey = ('di', PLUS_DM)
+DI_MINUS: NodeKey = ('di', MINUS_DM)
+
+
+@node_kind('di', lambda dm: (rma(dm, 14), nonzero(ATR_14)))
+def _di(context, dm_smooth, atr_safe, dm):
+    return 100 * (dm_smooth / atr_safe)
+
+
+@node_kind('dx', lambda: (DI_PLUS, DI_MINUS))
+def _dx(context, plus_di, minus_di):
+    return 100 * (abs(plus_di - minus_di) / (plus_di + minus_di).replace(0, np.nan))
+
+
+OUTPUTS['adx'] = rma(('dx',), 14)
+OUTPUTS['di_plus'] = DI_PLUS
+OUTPUTS['di_minus'] = DI_MINUS
+
+
+# --- Привязанные ко времени (по монетам, с общей типичной ценой) ---
+
+def _per_coin(context, typical_price, columns: List[str], calculate) -> Dict[str, pd.DataFrame]:
+    """Считает индикатор по монетам с объемом; хвост и монеты без объема - NaN."""
+    out = {column: np.full(typical_price.shape, np.nan) for column in columns}
+    tp = typical_price.to_numpy()
+    for j, df in enumerate(context.frames):
+        if not context.has_volume[j]:
+            continue
+        result = calculate(df, j, tp[:len(df), j])
+        for column in columns:
+            if column in result.columns:
+                out[column][:len(df), j] = result[column].reindex(df.index).to_numpy(dtype=np.float64)
+    return {column: _like(typical_price, values) for column, values in out.items()}
+
+
+def _avwap_columns(prefix: str) -> List[str]:
+    return [f'{prefix}_avwap', f'{prefix}_avwap_upper_band', f'{prefix}_avwap_lower_band']
+
+
+RVWAP_MULTS = [1.0, 2.0]
+RVWAP_COLUMNS = ['rvwap'] + [
+    f'rvwap_{part}_{str(mult).replace(".", "_")}' for mult in RVWAP_MULTS for part in ('upper_band', 'lower_band', 'width')
+]
+
+
+@node_kind('avwap', lambda anchor: (TYPICAL_PRICE,))
+def _avwap(context, typical_price, anchor):
+    prefix = 'w' if anchor == 'W' else 'm'
+    return _per_coin(
+        context, typical_price, _avwap_columns(prefix),
+        lambda df, j, tp: calculate_anchored_vwap(df, anchor=anchor, stdev_mult=1.0, src=tp)
+    )
+
+
+@node_kind('rvwap', lambda: (TYPICAL_PRICE,))
+def _rvwap(context, typical_price):
+    return _per_coin(
+        context, typical_price, RVWAP_COLUMNS,
+        lambda df, j, tp: calculate_rvwap(df, timeframe=context.timeframes[j], stdev_mults=RVWAP_MULTS, src=tp)
+    )
+
+
+for _anchor in ('W', 'M'):
+    for _column in _avwap_columns('w' if _anchor == 'W' else 'm'):
+        OUTPUTS[_column] = ('pick', ('avwap', _anchor), _column)
+for _column in RVWAP_COLUMNS:
+    OUTPUTS[_column] = ('pick', ('rvwap',), _column)
+
+OUTPUTS['atr'] = ATR_14
+
+
+# --- Bollinger Bands (bollinger_bands.py) ---
+
+@indicator('bb_basis', 'bb_upper', 'bb_lower', 'bb_width', inputs=(sma(C, 20), rolling_std(C, 20)))
+def _bollinger(basis, std):
+    upper = basis + 2.0 * std
+    lower = basis - 2.0 * std
+    return {'bb_basis': basis, 'bb_upper': upper, 'bb_lower': lower, 'bb_width': (upper - lower) / basis.replace(0, np.nan)}
+
+
+# --- CMF (cmf.py) ---
+CMF: NodeKey = ('cmf',)
+
+
+@node_kind('cmf', lambda: (C, H, L, V, rolling_sum(V, 20)))
+def _cmf(context, close, high, low, volume, volume_sum):
+    mfm = (((close - low) - (high - close)) / (high - low).replace(0, np.nan)).fillna(0)
+    return (mfm * volume).rolling(window=20).sum() / volume_sum.replace(0, np.nan)
+
+
+OUTPUTS['cmf'] = CMF
+OUTPUTS['cmf_ema'] = ema(CMF, 10)
+
+# --- EMA, Highest/Lowest (ema.py, highest_lowest.py) ---
+for _length in (50, 100, 150):
+    OUTPUTS[f'ema_{_length}'] = ema(C, _length)
+for _period in (50, 100):
+    OUTPUTS[f'highest_{_period}'] = ('rolling_max', H, _period)
+for _period in (50, 100):
+    OUTPUTS[f'lowest_{_period}'] = ('rolling_min', L, _period)
+
+
+@node_kind('rolling_max', lambda key, length: (key,))
+def _rolling_max(context, value, key, length):
+    return value.rolling(window=length).max()
+
+
+@node_kind('rolling_min', lambda key, length: (key,))
+def _rolling_min(context, value, key, length):
+    return value.rolling(window=length).min()
+
+
+# --- KAMA (kama.py) ---
+KAMA_SC: NodeKey = ('kama_sc', 10, 2, 30)
+
+
+@node_kind('kama_sc', lambda length, fast, slow: (diff(C, length), rolling_sum(('abs', diff(C)), length)))
+def _kama_sc(context, close_diff_n, volatility, length, fast, slow):
+    er = (abs(close_diff_n) / volatility.replace(0, np.nan)).fillna(0)
+    fast_alpha, slow_alpha = 2 / (fast + 1), 2 / (slow + 1)
+    return (er * (fast_alpha - slow_alpha) + slow_alpha) ** 2
+
+
+@node_kind('abs', lambda key: (key,))
+def _abs(context, value, key):
+    return abs(value)
+
+
+@node_kind('kama', lambda: (C, KAMA_SC))
+def _kama(context, close, smoothing_constant):
+    return _like(close, kama_columns(as_float_matrix(close), as_float_matrix(smoothing_constant)))
+
+
+OUTPUTS['kama'] = ('kama',)
+OUTPUTS['kama_sc'] = KAMA_SC
+
+
+# --- Keltner Channel (keltner.py) ---
+
+@indicator('kc_upper', 'kc_middle', 'kc_lower', 'kc_width', inputs=(ewm(C, 20), rma(TR, 10)))
+def _keltner(middle, range_ma):
+    upper = middle + (range_ma * 2.0)
+    lower = middle - (range_ma * 2.0)
+    return {'kc_upper': upper, 'kc_middle': middle, 'kc_lower': lower, 'kc_width': (upper - lower) / middle.replace(0, np.nan)}
+
+
+# --- MACD (macd.py) ---
+MACD_LINE: NodeKey = ('macd_line',)
+
+
+@node_kind('macd_line', lambda: (ema(C, 12), ema(C, 26)))
+def _macd_line(context, fast, slow):
+    return fast - slow
+
+
+OUTPUTS['macd'] = MACD_LINE
+OUTPUTS['macd_signal'] = ema(MACD_LINE, 9)
+
+
+@indicator('macd_hist', inputs=(MACD_LINE, ema(MACD_LINE, 9)))
+def _macd_hist(macd_line, signal_line):
+    return macd_line - signal_line
+
+
+# --- OBV (obv.py) ---
+OBV: NodeKey = ('obv',)
+
+
+@node_kind('obv', lambda: (diff(C), V))
+def _obv(context, close_diff, volume):
+    return (np.sign(close_diff).fillna(0) * volume).cumsum()
+
+
+OUTPUTS['obv'] = OBV
+OUTPUTS['obv_ema'] = ema(OBV, 10)
+
+
+# --- Паттерны (patterns.py) ---
+
+@indicator(
+    'is_doji', 'is_bullish_engulfing', 'is_bearish_engulfing', 'is_hammer', 'is_pinbar',
+    inputs=(O, H, L, C, shift(O), shift(C), ATR_14)
+)
+def _patterns(open_price, high, low, close, prev_open, prev_close, atr):
+    body_abs = (close - open_price).abs()
+    upper_shadow = high - _like(close, np.fmax(open_price.to_numpy(), close.to_numpy()))
+    lower_shadow = _like(close, np.fmin(open_price.to_numpy(), close.to_numpy())) - low
+    return {
+        'is_doji': body_abs < ((high - low) * 0.1),
+        'is_bullish_engulfing': (prev_open > prev_close) & (close > open_price) & (close > prev_open) & (open_price < prev_close),
+        'is_bearish_engulfing': (prev_close > prev_open) & (open_price > close) & (open_price > prev_close) & (close < prev_open),
+        'is_hammer': (lower_shadow > body_abs * 2) & (upper_shadow < body_abs) & (body_abs > atr * 0.1),
+        'is_pinbar': (upper_shadow > body_abs * 2) & (lower_shadow < body_abs) & (body_abs > atr * 0.1),
+    }
+
+
+# --- RSI (rsi.py) ---
+
+@node_kind('gain', lambda: (diff(C),))
+def _gain(context, delta):
+    return delta.where(delta > 0, 0)
+
+
+@node_kind('loss', lambda: (diff(C),))
+def _loss(context, delta):
+    return -delta.where(delta < 0, 0)
+
+
+@indicator('rsi', inputs=(rma(('gain',), 14), rma(('loss',), 14)))
+def _rsi(avg_gain, avg_loss):
+    return 100 - (100 / (1 + avg_gain / avg_loss))
+
+
+# --- Наклон EMA (slope.py), VZO (vzo.py), ema_proximity ---
+for _length in (50, 100, 150):
+    OUTPUTS[f'ema_{_length}_slope'] = ('slope', ema(C, _length), 5)
+
+
+@node_kind('slope', lambda key, period: (key,))
+def _slope(context, value, key, period):
+    return value.diff(period) / period * 10000
+
+
+@node_kind('directed_volume', lambda: (V, diff(C)))
+def _directed_volume(context, volume, close_diff):
+    return volume * np.sign(close_diff)
+
+
+@indicator('vzo', inputs=(ewm(('directed_volume',), 14), ewm(V, 14)))
+def _vzo(ema_directed_volume, ema_volume):
+    return 100 * (ema_directed_volume / ema_volume.replace(0, np.nan))
+
+
+@indicator('ema_proximity', inputs=(ema(C, 50), ema(C, 100), ema(C, 150)))
+def _ema_proximity(ema_50, ema_100, ema_150):
+    return (abs(ema_50 - ema_100) + abs(ema_100 - ema_150) + abs(ema_50 - ema_150)) / 3
+
+
+# --- Z-score (z_score.py) ---
+
+@node_kind('z_score', lambda key, window: (key,))
+def _z_score(context, value, key, window):
+    rolling_mean = value.rolling(window=window, min_periods=1).mean()
+    rolling_std = value.rolling(window=window, min_periods=1).std()
+    return (value - rolling_mean) / rolling_std.replace(0, np.nan)
+
+
+for _column, _key in (
+    ('closePrice', C), ('bb_width', OUTPUTS['bb_width']), ('kc_width', OUTPUTS['kc_width']),
+    ('rvwap_width_1_0', OUTPUTS['rvwap_width_1_0']), ('ema_proximity', OUTPUTS['ema_proximity']),
+    ('openInterest', src('openInterest')), ('fundingRate', src('fundingRate')),
+):
+    OUTPUTS[f'{_column}_z_score'] = ('z_score', _key, 50)
+
+
+# ============================================================================
+# === Порядок, условия и группы колонок ===
+# ============================================================================
+
+# Порядок колонок - как в add_indicators по монетам
+OUTPUT_COLUMNS: List[str] = (
+    ['adx', 'di_plus', 'di_minus'] + _avwap_columns('w') + _avwap_columns('m') +
+    ['atr', 'bb_basis', 'bb_upper', 'bb_lower', 'bb_width', 'cmf', 'cmf_ema',
+     'ema_50', 'ema_100', 'ema_150', 'highest_50', 'highest_100', 'lowest_50', 'lowest_100',
+     'kama', 'kama_sc', 'kc_upper', 'kc_middle', 'kc_lower', 'kc_width',
+     'macd', 'macd_signal', 'macd_hist', 'obv', 'obv_ema',
+     'is_doji', 'is_bullish_engulfing', 'is_bearish_engulfing', 'is_hammer', 'is_pinbar', 'rsi'] +
+    RVWAP_COLUMNS +
+    ['ema_50_slope', 'ema_100_slope', 'ema_150_slope', 'vzo', 'ema_proximity',
+     'closePrice_z_score', 'bb_width_z_score', 'kc_width_z_score', 'rvwap_width_1_0_z_score',
+     'openInterest_z_score', 'fundingRate_z_score', 'ema_proximity_z_score']
+)
+
+# Колонки, которые есть только у монет с объемом
+VOLUME_COLUMNS = set(
+    _avwap_columns('w') + _avwap_columns('m') + RVWAP_COLUMNS +
+    ['cmf', 'cmf_ema', 'obv', 'obv_ema', 'vzo', 'rvwap_width_1_0_z_score']
+)
+
+# Колонки, которые есть только у монет с этим полем свечей
+SOURCE_COLUMNS = {'openInterest_z_score': 'openInterest', 'fundingRate_z_score': 'fundingRate'}
+
+INDICATOR_GROUPS: Dict[str, List[str]] = {
+    'adx': ['adx', 'di_plus', 'di_minus'],
+    'avwap': _avwap_columns('w') + _avwap_columns('m'),
+    'atr': ['atr'],
+    'bb': ['bb_basis', 'bb_upper', 'bb_lower', 'bb_width'],
+    'cmf': ['cmf', 'cmf_ema'],
+    'ema': ['ema_50', 'ema_100', 'ema_150'],
+    'highest_lowest': ['highest_50', 'highest_100', 'lowest_50', 'lowest_100'],
+    'kama': ['kama', 'kama_sc'],
+    'keltner': ['kc_upper', 'kc_middle', 'kc_lower', 'kc_width'],
+    'macd': ['macd', 'macd_signal', 'macd_hist'],
+    'obv': ['obv', 'obv_ema'],
+    'patterns': ['is_doji', 'is_bullish_engulfing', 'is_bearish_engulfing', 'is_hammer', 'is_pinbar'],
+    'rsi': ['rsi'],
+    'rvwap': RVWAP_COLUMNS,
+    'slope': ['ema_50_slope', 'ema_100_slope', 'ema_150_slope'],
+    'vzo': ['vzo'],
+    'ema_proximity': ['ema_proximity'],
+    'z_score': [column for column in OUTPUT_COLUMNS if column.endswith('_z_score')],
+}
+
+
+def resolve_columns(names: Optional[Iterable[str]] = None) -> List[str]:
+    """
+    Имена групп (INDICATOR_GROUPS) и/или колонок -> колонки в порядке OUTPUT_COLUMNS.
+    None - все колонки. Неизвестное имя - ValueError.
+    """
+    if names is None:
+        return list(OUTPUT_COLUMNS)
+    requested = set()
+    for name in names:
+        if name in INDICATOR_GROUPS:
+            requested.update(INDICATOR_GROUPS[name])
+        elif name in OUTPUTS:
+            requested.add(name)
+        else:
+            raise ValueError(f"Неизвестный индикатор '{name}'. Группы: {sorted(INDICATOR_GROUPS)}")
+    return [column for column in OUTPUT_COLUMNS if column in requested]
+
+
+# ============================================================================
+# === Планировщик ===
+# ============================================================================
+
+def _inputs(key: NodeKey) -> Tuple[NodeKey, ...]:
+    return _KINDS[key[0]][0](*key[1:])
+
+
+def plan(columns: Iterable[str]) -> List[NodeKey]:
+    """Узлы, нужные для колонок, в порядке расчета (каждый общий узел - один раз)."""
+    order: List[NodeKey] = []
+    seen = set()
+
+    def visit(key: NodeKey) -> None:
+        if key in seen:
+            return
+        seen.add(key)
+        for dependency in _inputs(key):
+            visit(dependency)
+        order.append(key)
+
+    for column in columns:
+        visit(OUTPUTS[column])
+    return order
+
+
+def evaluate(nodes: List[NodeKey], context: Any) -> Dict[NodeKey, Any]:
+    """Считает узлы плана по порядку; значения общих узлов переиспользуются."""
+    values: Dict[NodeKey, Any] = {}
+    for key in nodes:
+        func = _KINDS[key[0]][1]
+        values[key] = func(context, *(values[dependency] for dependency in _inputs(key)), *key[1:])
+    return values
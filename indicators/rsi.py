@@ -1,5 +1,7 @@
 import pandas as pd
 
+from .kernels import as_float_array, wilder_rma_kernel
+
 def calculate_rsi(close: pd.Series, length: int = 14) -> pd.Series:
     """
     Рассчитывает Relative Strength Index (RSI).
@@ -16,13 +18,9 @@ def calculate_rsi(close: pd.Series, length: int = 14) -> pd.Series:
     gain = delta.where(delta > 0, 0)
     loss = -delta.where(delta < 0, 0)
 
-    avg_gain = gain.rolling(window=length, min_periods=length).mean()
-    avg_loss = loss.rolling(window=length, min_periods=length).mean()
-
-    # Сглаживание по методу Уайлдера
-    for i in range(length, len(close)):
-        avg_gain.iloc[i] = (avg_gain.iloc[i - 1] * (length - 1) + gain.iloc[i]) / length
-        avg_loss.iloc[i] = (avg_loss.iloc[i - 1] * (length - 1) + loss.iloc[i]) / length
+    # Сглаживание по методу Уайлдера (затравка - SMA первых length значений)
+    avg_gain = pd.Series(wilder_rma_kernel(as_float_array(gain), length), index=close.index)
+    avg_loss = pd.Series(wilder_rma_kernel(as_float_array(loss), length), index=close.index)
 
     rs = avg_gain / avg_loss
     rsi = 100 - (100 / (1 + rs))
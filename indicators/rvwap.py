@@ -1,6 +1,6 @@
 import pandas as pd
 import numpy as np
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 # Карта для перевода таймфреймов в миллисекунды.
 # Взято из api_helpers.py для изоляции модуля.
@@ -35,7 +35,8 @@ def _get_time_window_str(timeframe: str) -> str:
     else:                           # > 1d (на всякий случай)
         return '90D'
 
-def calculate_rvwap(df: pd.DataFrame, timeframe: str, stdev_mults: List[float] = [1.0, 2.0]) -> pd.DataFrame:
+def calculate_rvwap(df: pd.DataFrame, timeframe: str, stdev_mults: List[float] = [1.0, 2.0],
+                    src: Optional[np.ndarray] = None) -> pd.DataFrame:
     """
     Рассчитывает Rolling VWAP и его полосы стандартного отклонения для нескольких множителей.
     Логика полностью повторяет индикатор из TradingView.
@@ -45,6 +46,8 @@ def calculate_rvwap(df: pd.DataFrame, timeframe: str, stdev_mults: List[float] =
                            'lowPrice', 'closePrice', 'quoteVolume'.
         timeframe (str): Текущий таймфрейм ('1h', '4h', etc.).
         stdev_mults (List[float]): Список множителей для полос стандартного отклонения.
+        src (np.ndarray, optional): Уже посчитанная типичная цена (H+L+C)/3
+                                    по свечам df (общий узел реестра индикаторов).
 
     Returns:
         pd.DataFrame: DataFrame с рассчитанными колонками RVWAP и его полос.
@@ -69,7 +72,10 @@ def calculate_rvwap(df: pd.DataFrame, timeframe: str, stdev_mults: List[float] =
     df_copy['openTime'] = pd.to_datetime(df_copy['openTime'], unit='ms')
     df_copy.set_index('openTime', inplace=True)
     
-    src = (df_copy['highPrice'] + df_copy['lowPrice'] + df_copy['closePrice']) / 3
+    if src is None:
+        src = (df_copy['highPrice'] + df_copy['lowPrice'] + df_copy['closePrice']) / 3
+    else:
+        src = pd.Series(src, index=df_copy.index)
     volume = df_copy['quoteVolume']
 
     # 2. Вычисляем компоненты для RVWAP и StDev
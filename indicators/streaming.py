@@ -0,0 +1,289 @@
+"""
+Инкрементальный (потоковый) расчет рекурсивных индикаторов.
+
+Когда к ряду добавляется одна свеча, add_indicators пересчитывает
+EMA, RSI, ATR, MACD, KAMA, OBV и ADX по всем 400 свечам. Но эти
+индикаторы рекурсивны: следующее значение зависит только от предыдущего
+(последняя EMA, средние Уайлдера, накопленный OBV, последние 10 цен для KAMA).
+
+IndicatorState хранит это состояние монеты на последнюю ЗАКРЫТУЮ свечу.
+update_indicators продолжает расчет только по новым свечам (O(N)):
+    - состояние фиксируется по предпоследнюю свечу ряда; последняя может
+      быть незакрытой, поэтому ее значения считаются с копии состояния
+      и при следующем обновлении пересчитываются;
+    - разрыв (нет свечи состояния или ряд после нее не подряд) или другие
+      параметры (STREAMING_PARAMS) - полный пересчет с пустого состояния.
+
+С пустого состояния результат совпадает с функциями calculate_*
+(те же ядра numba). Продолженный расчет соответствует расчету по всей
+истории с момента первого расчета, а не по текущему окну кэша.
+"""
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from .kernels import as_float_array, kama_resume_kernel, smooth_resume_kernel
+
+# Параметры индикаторов - как в add_indicators. Их смена сбрасывает состояния.
+STREAMING_PARAMS: Dict[str, Any] = {
+    'version': 1,
+    'ema': [50, 100, 150],
+    'macd': [12, 26, 9],
+    'rsi': 14,
+    'atr': 14,
+    'adx': 14,
+    'kama': [10, 2, 30],
+    'obv_ema': 10,
+}
+
+STREAMING_COLUMNS = [
+    'adx', 'di_plus', 'di_minus', 'atr', 'ema_50', 'ema_100', 'ema_150',
+    'kama', 'kama_sc', 'macd', 'macd_signal', 'macd_hist', 'obv', 'obv_ema', 'rsi',
+]
+
+
+def _nan_to_none(value: float) -> Optional[float]:
+    # orjson пишет NaN как null
+    return None if value != value else float(value)
+
+
+def _none_to_nan(value: Optional[float]) -> float:
+    return np.nan if value is None else float(value)
+
+
+class SmootherState:
+    """Состояние EMA (wilder=False) или сглаживания Уайлдера (wilder=True)."""
+
+    __slots__ = ('length', 'wilder', 'count', 'seed_sum', 'last')
+
+    def __init__(self, length: int, wilder: bool = False, count: int = 0, seed_sum: float = 0.0, last: float = np.nan):
+        self.length = length
+        self.wilder = wilder
+        self.count = count
+        self.seed_sum = seed_sum
+        self.last = last
+
+    def update(self, values: np.ndarray) -> np.ndarray:
+        out, self.count, self.seed_sum, self.last = smooth_resume_kernel(
+            as_float_array(values), self.length, self.wilder, self.count, self.seed_sum, self.last
+        )
+        return out
+
+    def copy(self) -> 'SmootherState':
+        return SmootherState(self.length, self.wilder, self.count, self.seed_sum, self.last)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'length': self.length, 'wilder': self.wilder, 'count': self.count,
+            'seed_sum': _nan_to_none(self.seed_sum), 'last': _nan_to_none(self.last),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'SmootherState':
+        return cls(
+            int(data['length']), bool(data['wilder']), int(data['count']),
+            _none_to_nan(data['seed_sum']), _none_to_nan(data['last']),
+        )
+
+
+class IndicatorState:
+    """Состояние рекурсивных индикаторов одной монеты."""
+
+    __slots__ = (
+        'params', 'last_open_time', 'prev_high', 'prev_low', 'prev_close',
+        'obv', 'kama_started', 'kama', 'kama_closes', 'smoothers',
+    )
+
+    def __init__(self):
+        fast, slow, signal = STREAMING_PARAMS['macd']
+        self.params = dict(STREAMING_PARAMS)
+        self.last_open_time: Optional[int] = None
+        self.prev_high = np.nan
+        self.prev_low = np.nan
+        self.prev_close = np.nan
+        self.obv = 0.0
+        self.kama_started = False
+        self.kama = np.nan
+        # Последние KAMA-length цен закрытия (для direction и volatility)
+        self.kama_closes = np.full(STREAMING_PARAMS['kama'][0], np.nan)
+        self.smoothers: Dict[str, SmootherState] = {
+            **{f'ema_{length}': SmootherState(length) for length in STREAMING_PARAMS['ema']},
+            'macd_fast': SmootherState(fast),
+            'macd_slow': SmootherState(slow),
+            'macd_signal': SmootherState(signal),
+            'rsi_gain': SmootherState(STREAMING_PARAMS['rsi'], wilder=True),
+            'rsi_loss': SmootherState(STREAMING_PARAMS['rsi'], wilder=True),
+            # ATR(14) - и колонка 'atr', и знаменатель DI в ADX
+            'atr': SmootherState(STREAMING_PARAMS['atr'], wilder=True),
+            'plus_dm': SmootherState(STREAMING_PARAMS['adx'], wilder=True),
+            'minus_dm': SmootherState(STREAMING_PARAMS['adx'], wilder=True),
+            'adx': SmootherState(STREAMING_PARAMS['adx'], wilder=True),
+            'obv_ema': SmootherState(STREAMING_PARAMS['obv_ema']),
+        }
+
+    def copy(self) -> 'IndicatorState':
+        state = IndicatorState.__new__(IndicatorState)
+        for name in ('params', 'last_open_time', 'prev_high', 'prev_low', 'prev_close', 'obv', 'kama_started', 'kama'):
+            setattr(state, name, getattr(self, name))
+        state.kama_closes = self.kama_closes.copy()
+        state.smoothers = {name: smoother.copy() for name, smoother in self.smoothers.items()}
+        return state
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'params': self.params,
+            'last_open_time': self.last_open_time,
+            'prev': [_nan_to_none(v) for v in (self.prev_high, self.prev_low, self.prev_close)],
+            'obv': _nan_to_none(self.obv),
+            'kama_started': self.kama_started,
+            'kama': _nan_to_none(self.kama),
+            'kama_closes': [_nan_to_none(v) for v in self.kama_closes],
+            'smoothers': {name: smoother.to_dict() for name, smoother in self.smoothers.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'IndicatorState':
+        state = cls()
+        state.params = data['params']
+        state.last_open_time = data['last_open_time']
+        state.prev_high, state.prev_low, state.prev_close = (_none_to_nan(v) for v in data['prev'])
+        state.obv = _none_to_nan(data['obv'])
+        state.kama_started = bool(data['kama_started'])
+        state.kama = _none_to_nan(data['kama'])
+        state.kama_closes = np.array([_none_to_nan(v) for v in data['kama_closes']])
+        state.smoothers = {name: SmootherState.from_dict(item) for name, item in data['smoothers'].items()}
+        return state
+
+
+def _shifted(previous: float, values: np.ndarray) -> np.ndarray:
+    """values, сдвинутые на одну свечу назад (как shift(1)), с предыдущим значением из состояния."""
+    return np.concatenate(([previous], values[:-1]))
+
+
+def _advance(state: IndicatorState, high: np.ndarray, low: np.ndarray, close: np.ndarray, volume: np.ndarray) -> Dict[str, np.ndarray]:
+    """Считает индикаторы для новых свечей и сдвигает состояние на последнюю из них."""
+    s = state.smoothers
+    prev_close = _shifted(state.prev_close, close)
+    out: Dict[str, np.ndarray] = {}
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # ATR / ADX (atr.py, adx.py)
+        tr = np.fmax(np.fmax(high - low, np.abs(high - prev_close)), np.abs(low - prev_close))
+        atr = s['atr'].update(tr)
+        move_up = high - _shifted(state.prev_high, high)
+        move_down = -(low - _shifted(state.prev_low, low))
+        plus_dm = np.where((move_up > move_down) & (move_up > 0), move_up, 0.0)
+        minus_dm = np.where((move_down > move_up) & (move_down > 0), move_down, 0.0)
+        atr_safe = np.where(atr == 0, np.nan, atr)
+        plus_di = 100 * (s['plus_dm'].update(plus_dm) / atr_safe)
+        minus_di = 100 * (s['minus_dm'].update(minus_dm) / atr_safe)
+        di_sum = plus_di + minus_di
+        dx = 100 * (np.abs(plus_di - minus_di) / np.where(di_sum == 0, np.nan, di_sum))
+        out['adx'] = s['adx'].update(dx)
+        out['di_plus'] = plus_di
+        out['di_minus'] = minus_di
+        out['atr'] = atr
+
+        # EMA (ema.py)
+        for length in STREAMING_PARAMS['ema']:
+            out[f'ema_{length}'] = s[f'ema_{length}'].update(close)
+
+        # KAMA (kama.py)
+        length, fast_length, slow_length = STREAMING_PARAMS['kama']
+        extended = np.concatenate((state.kama_closes, close))
+        direction = np.abs(extended[length:] - extended[:-length])
+        abs_diff = np.abs(np.diff(extended))
+        volatility = np.lib.stride_tricks.sliding_window_view(abs_diff, length).sum(axis=1)
+        er = direction / np.where(volatility == 0, np.nan, volatility)
+        er[np.isnan(er)] = 0
+        fast_alpha, slow_alpha = 2 / (fast_length + 1), 2 / (slow_length + 1)
+        kama_sc = (er * (fast_alpha - slow_alpha) + slow_alpha) ** 2
+        out['kama'], state.kama_started, state.kama = kama_resume_kernel(
+            as_float_array(close), kama_sc, state.kama_started, state.kama
+        )
+        out['kama_sc'] = kama_sc
+        state.kama_closes = extended[-length:].copy()
+
+        # MACD (macd.py)
+        macd_line = s['macd_fast'].update(close) - s['macd_slow'].update(close)
+        signal_line = s['macd_signal'].update(macd_line)
+        out['macd'] = macd_line
+        out['macd_signal'] = signal_line
+        out['macd_hist'] = macd_line - signal_line
+
+        # OBV (obv.py): cumsum пропускает NaN, но накопление продолжается
+        delta = close - prev_close
+        direction_sign = np.sign(delta)
+        direction_sign[np.isnan(direction_sign)] = 0
+        directional_volume = direction_sign * volume
+        missing = np.isnan(directional_volume)
+        obv = state.obv + np.cumsum(np.where(missing, 0.0, directional_volume))
+        state.obv = obv[-1]
+        obv[missing] = np.nan
+        out['obv'] = obv
+        out['obv_ema'] = s['obv_ema'].update(obv)
+
+        # RSI (rsi.py)
+        gain = np.where(delta > 0, delta, 0.0)
+        loss = -np.where(delta < 0, delta, 0.0)
+        rs = s['rsi_gain'].update(gain) / s['rsi_loss'].update(loss)
+        out['rsi'] = 100 - (100 / (1 + rs))
+
+    state.prev_high, state.prev_low, state.prev_close = high[-1], low[-1], close[-1]
+    return {column: out[column] for column in STREAMING_COLUMNS}
+
+
+def _resume_index(state: Optional[IndicatorState], open_time: np.ndarray, interval_ms: int) -> Optional[int]:
+    """Индекс первой свечи после свечи состояния или None (нужен полный пересчет)."""
+    if state is None or state.params != STREAMING_PARAMS or state.last_open_time is None:
+        return None
+    idx = int(np.searchsorted(open_time, state.last_open_time))
+    if idx >= len(open_time) or open_time[idx] != state.last_open_time:
+        return None
+    if interval_ms and np.any(np.diff(open_time[idx:]) != interval_ms):
+        return None
+    return idx + 1
+
+
+def update_indicators(
+    open_time: np.ndarray,
+    high: np.ndarray,
+    low: np.ndarray,
+    close: np.ndarray,
+    volume: np.ndarray,
+    state: Optional[IndicatorState],
+    interval_ms: int
+) -> Tuple[int, Dict[str, np.ndarray], IndicatorState]:
+    """
+    Продолжает расчет STREAMING_COLUMNS по ряду свечей монеты (по возрастанию openTime).
+
+    Returns:
+        (start, columns, state): columns - значения для свечей [start:]
+        (start = 0 - полный пересчет), state - новое состояние
+        (зафиксировано по предпоследнюю свечу).
+    """
+    open_time = np.asarray(open_time, dtype=np.int64)
+    high, low, close, volume = (as_float_array(v) for v in (high, low, close, volume))
+    n = len(open_time)
+
+    start = _resume_index(state, open_time, interval_ms)
+    if start is None:
+        state, start = IndicatorState(), 0
+    else:
+        state = state.copy()
+    if start >= n:
+        return n, {column: np.empty(0) for column in STREAMING_COLUMNS}, state
+
+    # Закрытые свечи сдвигают состояние...
+    committed = {}
+    if start < n - 1:
+        committed = _advance(state, high[start:n - 1], low[start:n - 1], close[start:n - 1], volume[start:n - 1])
+        state.last_open_time = int(open_time[n - 2])
+    # ...последняя (возможно, незакрытая) считается с копии
+    provisional = _advance(state.copy(), high[n - 1:], low[n - 1:], close[n - 1:], volume[n - 1:])
+
+    columns = {
+        column: np.concatenate((committed[column], provisional[column])) if committed else provisional[column]
+        for column in STREAMING_COLUMNS
+    }
+    return start, columns, state
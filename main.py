@@ -19,6 +19,13 @@ logger = logging.getLogger(__name__)
 # --- 2. Импорт Воркера и Роутера ---
 from worker import main 
 from api_routes import router as api_router
+from data_collector.http_session import close_http_session
+from data_collector.cpu_pool import cpu_pool
+
+try:
+    from config import SERVICE_MODE
+except ImportError:
+    SERVICE_MODE = "combined"
 
  
 
@@ -33,11 +40,17 @@ async def lifespan(app: FastAPI):
     logger.info("=======================================================")
     logger.info("🚀 [STARTUP] FastAPI запущен.")
     
+    worker_task = None
     try:
         # --- Startup Logic ---
-        logger.info("[STARTUP 1/2] Запускаю фоновый воркер (data_collector) для Klines/OI...")
-        asyncio.create_task(main()) 
-        logger.info("[STARTUP 1/2] ✅ Фоновый воркер (data_collector) успешно запущен.")
+        # SERVICE_MODE=api: процесс только отвечает на запросы, сбор данных
+        # выполняет отдельный процесс (python -m worker)
+        if SERVICE_MODE == "api":
+            logger.info("[STARTUP 1/2] Режим API (SERVICE_MODE=api): фоновый воркер в этом процессе НЕ запускается.")
+        else:
+            logger.info("[STARTUP 1/2] Запускаю фоновый воркер (data_collector) для Klines/OI...")
+            worker_task = asyncio.create_task(main()) 
+            logger.info("[STARTUP 1/2] ✅ Фоновый воркер (data_collector) успешно запущен.")
 
         # Проверка SECRET_TOKEN
         if not os.environ.get("SECRET_TOKEN"):
@@ -54,6 +67,16 @@ async def lifespan(app: FastAPI):
     
     # --- Shutdown Logic ---
     logger.info("--- 🛑 FastAPI завершает работу. ---")
+    if worker_task is not None and not worker_task.done():
+        worker_task.cancel()
+        try:
+            await worker_task
+        except asyncio.CancelledError:
+            pass
+    # Общая HTTP-сессия к биржам (keep-alive соединения) закрывается вместе с приложением
+    await close_http_session()
+    # Процессы пула (парсинг/слияние/индикаторы) - тоже
+    cpu_pool.shutdown()
     # --- КОНЕЦ ИЗМЕНЕНИЯ №2 ---
 
 
@@ -0,0 +1,196 @@
+# task_locks.py
+"""
+Блокировки задач воркера по типу задачи (таймфрейму) с продлеваемой арендой.
+
+Раньше была одна глобальная блокировка WORKER_LOCK_KEY на 30 минут:
+сбор 4h блокировал 1h, хотя они пишут в разные ключи кэша.
+
+Теперь:
+    - ключ на тип задачи: {WORKER_LOCK_KEY}:{1h|4h|8h|...|global_fr};
+    - значение - токен владельца, TTL - короткая аренда (WORKER_LOCK_LEASE_SECONDS),
+      которую продлевает heartbeat, пока задача выполняется; упавший воркер
+      освобождает блокировку через TTL, а не через 30 минут;
+    - продление и снятие - только своим токеном (WATCH/MULTI);
+    - многотаймфреймовая задача берет все свои ключи сразу (все или ничего);
+    - аренда потеряна (истекла или перехвачена) - блок held() отменяется
+      и завершается LeaseLostError: задачу уже выполняет другой воркер,
+      продолжать (и писать тот же кэш) нельзя;
+    - ожидание занятых блокировок - с нарастающей паузой (poll_delays),
+      а не опрос Redis каждые 2 секунды.
+
+Зависимости задач (8h строится из 4h) - TASK_DEPENDENCIES.
+"""
+import asyncio
+import logging
+import random
+import uuid
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Optional
+
+from redis.asyncio import Redis as AsyncRedis
+from redis.exceptions import WatchError
+
+try:
+    from config import (
+        WORKER_LOCK_KEY,
+        WORKER_LOCK_VALUE,
+        WORKER_LOCK_LEASE_SECONDS,
+        WORKER_LOCK_POLL_MAX_SECONDS,
+        DERIVED_TIMEFRAMES,
+    )
+except ImportError:
+    WORKER_LOCK_KEY = "data_collector_lock"
+    WORKER_LOCK_VALUE = "processing"
+    WORKER_LOCK_LEASE_SECONDS = 60
+    WORKER_LOCK_POLL_MAX_SECONDS = 15
+    DERIVED_TIMEFRAMES = {'8h': '4h'}
+
+logger = logging.getLogger(__name__)
+
+# {тип задачи: [от каких типов зависит]} - производный таймфрейм ждет базовый
+TASK_DEPENDENCIES: Dict[str, List[str]] = {tf: [base] for tf, base in DERIVED_TIMEFRAMES.items()}
+
+
+def task_lock_key(task_type: str) -> str:
+    """Ключ блокировки типа задачи."""
+    return f"{WORKER_LOCK_KEY}:{task_type}"
+
+
+def task_types(task_payload: Dict) -> List[str]:
+    """Типы задач (таймфреймы), которые затрагивает задача из очереди."""
+    if task_payload.get("timeframes"):
+        return list(dict.fromkeys(task_payload["timeframes"]))
+    return [task_payload["timeframe"]] if task_payload.get("timeframe") else []
+
+
+def task_dependencies(types: Iterable[str]) -> List[str]:
+    """Зависимости, которые НЕ входят в саму задачу (их нужно дождаться)."""
+    types = list(types)
+    return [dep for tf in types for dep in TASK_DEPENDENCIES.get(tf, []) if dep not in types]
+
+
+async def running_task_types(redis_conn: AsyncRedis, types: Iterable[str]) -> List[str]:
+    """Какие из типов задач сейчас выполняются (блокировка занята)."""
+    types = list(types)
+    if not types:
+        return []
+    values = await redis_conn.mget([task_lock_key(tf) for tf in types])
+    return [tf for tf, value in zip(types, values) if value]
+
+
+def poll_delays(initial: float, maximum: float = WORKER_LOCK_POLL_MAX_SECONDS) -> Iterator[float]:
+    """Паузы ожидания блокировки: удвоение от initial до maximum, с jitter +-20%."""
+    delay = initial
+    while True:
+        yield delay * random.uniform(0.8, 1.2)
+        delay = min(delay * 2, max(maximum, initial))
+
+
+class LeaseLostError(Exception):
+    """Аренда блокировки потеряна во время выполнения задачи."""
+
+
+def _decode(value) -> Optional[str]:
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
+
+class TaskLease:
+    """Аренда блокировок нескольких типов задач одним владельцем."""
+
+    def __init__(
+        self,
+        redis_conn: AsyncRedis,
+        types: Iterable[str],
+        lease_seconds: int = WORKER_LOCK_LEASE_SECONDS,
+        owner: str = ""
+    ):
+        self.redis = redis_conn
+        # Сортировка: ключи всегда берутся в одном порядке
+        self.types = sorted(set(types))
+        self.lease_seconds = lease_seconds
+        self.token = f"{WORKER_LOCK_VALUE}:{owner or uuid.uuid4().hex[:8]}:{uuid.uuid4().hex[:8]}"
+        self._held: List[str] = []
+        self.lost = False
+
+    async def try_acquire(self) -> bool:
+        """Берет все блокировки или ни одной."""
+        for tf in self.types:
+            if not await self.redis.set(task_lock_key(tf), self.token, ex=self.lease_seconds, nx=True):
+                await self.release()
+                return False
+            self._held.append(tf)
+        return True
+
+    async def acquire(self, poll_seconds: float) -> None:
+        """Ждет, пока все блокировки не освободятся, и берет их (пауза растет, см. poll_delays)."""
+        delays = poll_delays(poll_seconds)
+        while not await self.try_acquire():
+            await asyncio.sleep(next(delays))
+
+    async def _if_owner(self, tf: str, renew: bool) -> bool:
+        """EXPIRE (renew) или DEL ключа, только если он все еще наш."""
+        key = task_lock_key(tf)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            try:
+                await pipe.watch(key)
+                if _decode(await pipe.get(key)) != self.token:
+                    await pipe.unwatch()
+                    return False
+                pipe.multi()
+                if renew:
+                    pipe.expire(key, self.lease_seconds)
+                else:
+                    pipe.delete(key)
+                await pipe.execute()
+                return True
+            except WatchError:
+                return False
+
+    async def renew(self) -> bool:
+        """Продлевает аренду. False - хотя бы одна блокировка уже не наша."""
+        results = [await self._if_owner(tf, renew=True) for tf in self._held]
+        return all(results)
+
+    async def renew_forever(self, holder: Optional[asyncio.Task] = None) -> None:
+        """
+        Heartbeat: продление каждую треть аренды, пока задача не отменена.
+        Аренда потеряна - отменяет holder (задачу, выполняющую работу под блокировкой).
+        """
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                renewed = await self.renew()
+            except Exception as e:
+                logger.warning(f"[LOCK] Не удалось продлить аренду {self.types}: {e}")
+                continue
+            if not renewed:
+                logger.error(f"[LOCK] Аренда {self.types} потеряна (истекла или перехвачена), задача останавливается.")
+                self.lost = True
+                if holder is not None:
+                    holder.cancel()
+                return
+
+    async def release(self) -> None:
+        held, self._held = self._held, []
+        for tf in held:
+            await self._if_owner(tf, renew=False)
+
+    @asynccontextmanager
+    async def held(self, poll_seconds: float) -> AsyncIterator['TaskLease']:
+        """
+        acquire + heartbeat на время блока + release.
+        Потеря аренды отменяет блок и превращается в LeaseLostError.
+        """
+        await self.acquire(poll_seconds)
+        holder = asyncio.current_task()
+        heartbeat = asyncio.create_task(self.renew_forever(holder))
+        try:
+            yield self
+        except asyncio.CancelledError:
+            # Отмена от heartbeat (а не внешняя) - снимаем ее и сообщаем ошибкой
+            if self.lost and holder.uncancel() == 0:
+                raise LeaseLostError(f"Аренда {self.types} потеряна") from None
+            raise
+        finally:
+            heartbeat.cancel()
+            await self.release()
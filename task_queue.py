@@ -0,0 +1,133 @@
+# task_queue.py
+"""
+Надежная очередь задач воркера поверх Redis-списка REDIS_TASK_QUEUE_KEY.
+
+Раньше воркер каждые 2 секунды делал GET/SET NX/LPOP/DEL даже при пустой
+очереди, а задача, вынутая LPOP, терялась при падении процесса.
+
+Теперь (паттерн "reliable queue"):
+    - BLMOVE queue -> processing-список потребителя с таймаутом:
+      пока задач нет, воркер ждет на одной блокирующей команде;
+    - задача остается в processing-списке, пока ее не подтвердят (ack);
+    - у каждого потребителя (процесса воркера) есть ключ жизни с TTL,
+      который продлевается heartbeat-ом; processing-списки потребителей
+      с истекшим ключом возвращаются в начало очереди (recover_orphans).
+
+Ключи:
+    {queue}:consumers              -> SET идентификаторов потребителей
+    {queue}:consumer:{id}          -> ключ жизни (TTL)
+    {queue}:processing:{id}        -> задачи, взятые потребителем
+"""
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from typing import List, Optional
+
+from redis.asyncio import Redis as AsyncRedis
+
+try:
+    from config import REDIS_TASK_QUEUE_KEY, WORKER_CONSUMER_TTL_SECONDS
+except ImportError:
+    REDIS_TASK_QUEUE_KEY = "data_collector_task_queue"
+    WORKER_CONSUMER_TTL_SECONDS = 60
+
+logger = logging.getLogger(__name__)
+
+
+def _decode(value) -> Optional[str]:
+    if isinstance(value, bytes):
+        return value.decode('utf-8')
+    return value
+
+
+class ReliableTaskQueue:
+    """Потребитель очереди задач с processing-списком и heartbeat."""
+
+    def __init__(
+        self,
+        redis_conn: AsyncRedis,
+        queue_key: str = REDIS_TASK_QUEUE_KEY,
+        consumer_id: Optional[str] = None,
+        consumer_ttl: int = WORKER_CONSUMER_TTL_SECONDS
+    ):
+        self.redis = redis_conn
+        self.queue_key = queue_key
+        self.consumer_id = consumer_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.consumer_ttl = consumer_ttl
+        self.consumers_key = f"{queue_key}:consumers"
+
+    def consumer_key(self, consumer_id: Optional[str] = None) -> str:
+        return f"{self.queue_key}:consumer:{consumer_id or self.consumer_id}"
+
+    def processing_key(self, consumer_id: Optional[str] = None) -> str:
+        return f"{self.queue_key}:processing:{consumer_id or self.consumer_id}"
+
+    # --- Регистрация потребителя ---
+
+    async def register(self) -> None:
+        await self.redis.sadd(self.consumers_key, self.consumer_id)
+        await self.heartbeat()
+        logger.info(f"[QUEUE] Потребитель '{self.consumer_id}' зарегистрирован.")
+
+    async def heartbeat(self) -> None:
+        """Продлевает ключ жизни потребителя."""
+        await self.redis.set(self.consumer_key(), 1, ex=self.consumer_ttl)
+
+    async def heartbeat_forever(self) -> None:
+        """Фоновый heartbeat (каждую треть TTL), пока задача не отменена."""
+        while True:
+            await asyncio.sleep(self.consumer_ttl / 3)
+            try:
+                await self.heartbeat()
+            except Exception as e:
+                logger.warning(f"[QUEUE] Не удалось продлить ключ жизни '{self.consumer_id}': {e}")
+
+    async def unregister(self) -> None:
+        """Возвращает свои неподтвержденные задачи в очередь и удаляет потребителя."""
+        returned = await self._return_to_queue(self.consumer_id)
+        await self.redis.delete(self.consumer_key())
+        await self.redis.srem(self.consumers_key, self.consumer_id)
+        logger.info(f"[QUEUE] Потребитель '{self.consumer_id}' снят с учета (возвращено задач: {returned}).")
+
+    # --- Задачи ---
+
+    async def take(self, timeout: float) -> Optional[str]:
+        """Ждет задачу до timeout сек (BLMOVE). None - задач не было."""
+        task_json = await self.redis.blmove(self.queue_key, self.processing_key(), timeout, 'LEFT', 'RIGHT')
+        return _decode(task_json)
+
+    async def ack(self, task_json: str) -> None:
+        """Задача обработана - убираем из processing-списка."""
+        await self.redis.lrem(self.processing_key(), 1, task_json)
+
+    async def pending(self) -> List[str]:
+        """Неподтвержденные задачи этого потребителя."""
+        return [_decode(item) for item in await self.redis.lrange(self.processing_key(), 0, -1)]
+
+    # --- Восстановление ---
+
+    async def _return_to_queue(self, consumer_id: str) -> int:
+        """Переносит processing-список потребителя в начало очереди (порядок сохраняется)."""
+        returned = 0
+        while await self.redis.lmove(self.processing_key(consumer_id), self.queue_key, 'RIGHT', 'LEFT'):
+            returned += 1
+        return returned
+
+    async def recover_orphans(self) -> int:
+        """
+        Возвращает в очередь задачи потребителей, чей ключ жизни истек
+        (процесс упал во время обработки). Возвращает число задач.
+        """
+        recovered = 0
+        for consumer_id in await self.redis.smembers(self.consumers_key):
+            consumer_id = _decode(consumer_id)
+            if consumer_id == self.consumer_id or await self.redis.exists(self.consumer_key(consumer_id)):
+                continue
+            count = await self._return_to_queue(consumer_id)
+            await self.redis.srem(self.consumers_key, consumer_id)
+            if count:
+                logger.warning(f"[QUEUE] Потребитель '{consumer_id}' не отвечает: {count} задач возвращено в очередь.")
+            recovered += count
+        return recovered
@@ -507,4 +507,70 @@ class TestGenerateAndSave8hCache:
         # Проверяем, что downstream не вызывались
         assert not mock_merge.called
         assert not mock_format.called
-        assert not mock_save.called
\ No newline at end of file
+        assert not mock_save.called
+
+class TestBuild8hColumns:
+    """Векторная агрегация build_8h_columns против построчной _build_8h_candles_from_end"""
+
+    FOUR_H = 4 * 3600 * 1000
+
+    def _candles_4h(self, rnd, count, start_offset):
+        start = 1_704_067_200_000 + start_offset * self.FOUR_H
+        candles, open_time = [], start
+        for _ in range(count):
+            if rnd.random() < 0.05:
+                open_time += self.FOUR_H * rnd.randint(1, 3)  # разрыв непрерывности
+            candle = {
+                "openTime": open_time, "openPrice": rnd.uniform(90, 110), "highPrice": rnd.uniform(110, 120),
+                "lowPrice": rnd.uniform(80, 90), "closePrice": rnd.uniform(90, 110),
+                "volume": rnd.uniform(0, 1000), "closeTime": open_time + self.FOUR_H - 1,
+                "volumeDelta": rnd.choice([None, rnd.uniform(-100, 100)]),
+            }
+            if rnd.random() < 0.05:
+                candle["highPrice"] = None
+            if rnd.random() < 0.8:
+                candle["openInterest"] = rnd.uniform(1e5, 1e6)
+            if rnd.random() < 0.5:
+                candle["fundingRate"] = rnd.uniform(-0.001, 0.001)
+            candles.append(candle)
+            open_time += self.FOUR_H
+        return candles
+
+    def test_golden_matches_row_walk(self):
+        import random
+        from candle_columns import CandleColumns
+        from data_collector.data_processing import merge_data_rows, merge_columns
+
+        rnd = random.Random(11)
+        for case in range(40):
+            candles = self._candles_4h(rnd, rnd.randint(0, 60), start_offset=case % 2)
+
+            expected = merge_data_rows({"S": {
+                "klines": aggregation_8h._build_8h_candles_from_end(candles, 'klines', 'S'),
+                "oi": aggregation_8h._build_8h_candles_from_end(candles, 'oi', 'S'),
+                "fr": aggregation_8h._build_8h_candles_from_end(candles, 'fr', 'S'),
+            }}).get("S", [])
+
+            aggregated = aggregation_8h.build_8h_columns(CandleColumns.from_records(candles), 'S')
+            result = merge_columns({"S": aggregated}).get("S")
+            result = result.to_records() if result is not None else []
+
+            assert len(result) == len(expected), case
+            for got, want in zip(result, expected):
+                assert got == pytest.approx(want), case
+
+    def test_gap_shifts_pairing_like_row_walk(self):
+        """После разрыва пары строятся от конца предыдущего непрерывного участка."""
+        t0 = 1_704_067_200_000  # 00:00 UTC
+        times = [t0, t0 + self.FOUR_H, t0 + 3 * self.FOUR_H, t0 + 4 * self.FOUR_H, t0 + 5 * self.FOUR_H]
+        candles = [
+            {"openTime": t, "openPrice": 1.0, "highPrice": 2.0, "lowPrice": 0.5, "closePrice": 1.5,
+             "volume": 1.0, "closeTime": t + self.FOUR_H - 1}
+            for t in times
+        ]
+
+        klines = aggregation_8h.build_8h_columns(candles, 'S')['klines']
+        expected = aggregation_8h._build_8h_candles_from_end(candles, 'klines', 'S')
+
+        assert klines['openTime'].tolist() == [c['openTime'] for c in expected]
+        assert klines['closeTime'].tolist() == [c['closeTime'] for c in expected]
@@ -0,0 +1,87 @@
+# tests/test_api_parser_unit.py
+"""
+Unit tests for api_parser: векторные парсеры (CandleColumns) должны давать
+те же свечи, что и построчные (parse_*_rows), с теми же правилами валидации.
+"""
+import math
+
+import api_parser
+from candle_columns import CandleColumns
+
+HOUR_MS = 60 * 60 * 1000
+
+
+def _binance_kline(open_time, price, taker_buy="4.0"):
+    return [open_time, str(price), str(price + 1), str(price - 1), str(price + 0.5), "10.0",
+            open_time + HOUR_MS - 1, "100.0", 42, taker_buy, "50.0", "0"]
+
+
+def _bybit_kline(open_time, price):
+    return [str(open_time), str(price), str(price + 1), str(price - 1), str(price + 0.5), "10.0", "100.0"]
+
+
+class TestBinanceParsers:
+    def test_klines_match_rows_parser(self):
+        raw = [_binance_kline(0, 1.0), _binance_kline(HOUR_MS, 2.0, taker_buy="7.5")]
+        result = api_parser.parse_binance_klines(raw, "1h")
+
+        assert isinstance(result, CandleColumns)
+        assert result.to_records() == api_parser.parse_binance_klines_rows(raw, "1h")
+        assert result["volumeDelta"].tolist() == [-2.0, 5.0]
+
+    def test_klines_skip_short_rows_and_bad_volume_delta(self):
+        raw = [_binance_kline(0, 1.0), [1, "2"], _binance_kline(HOUR_MS, 2.0, taker_buy="bad")]
+        result = api_parser.parse_binance_klines(raw, "1h")
+
+        assert len(result) == 2
+        assert result.to_records() == api_parser.parse_binance_klines_rows(raw, "1h")
+        assert math.isnan(result["volumeDelta"][1])
+
+    def test_klines_reject_oi_fr_payload(self):
+        assert not api_parser.parse_binance_klines([{"sumOpenInterest": "1", "timestamp": 1}], "1h")
+        assert not api_parser.parse_binance_klines([{"fundingRate": "0.1", "fundingTime": 1}], "1h")
+
+    def test_oi_skips_incomplete_items(self):
+        raw = [{"timestamp": 1000, "sumOpenInterest": "5.5"}, {"timestamp": 2000}, {"fundingTime": 3000, "sumOpenInterest": "6"}]
+        result = api_parser.parse_binance_oi(raw, "1h")
+
+        assert result.to_records() == [
+            {**r, "openPrice": None, "highPrice": None, "lowPrice": None, "closePrice": None,
+             "volume": None, "volumeDelta": None}
+            for r in api_parser.parse_binance_oi_rows(raw, "1h")
+        ]
+
+    def test_fr_rejects_oi_payload(self):
+        assert not api_parser.parse_binance_fr([{"sumOpenInterest": "1", "timestamp": 1}], "1h")
+
+    def test_fr_values(self):
+        result = api_parser.parse_binance_fr([{"fundingTime": 1000, "fundingRate": "0.0001"}], "1h")
+        assert result["openTime"].tolist() == [1000]
+        assert result["closeTime"].tolist() == [1001]
+        assert result["fundingRate"].tolist() == [0.0001]
+
+
+class TestBybitParsers:
+    def test_klines_are_reversed_and_match_rows_parser(self):
+        raw = [_bybit_kline(2 * HOUR_MS, 3.0), _bybit_kline(HOUR_MS, 2.0), ["1", "2"], _bybit_kline(0, 1.0)]
+        result = api_parser.parse_bybit_klines(raw, "1h")
+
+        assert result["openTime"].tolist() == [0, HOUR_MS, 2 * HOUR_MS]
+        assert result["closeTime"].tolist() == [HOUR_MS - 1, 2 * HOUR_MS - 1, 3 * HOUR_MS - 1]
+        # volumeDelta у Bybit нет: в колонках это NaN, в merge_data - None
+        expected = [{**r, "volumeDelta": None} for r in api_parser.parse_bybit_klines_rows(raw, "1h")]
+        assert result.to_records() == expected
+
+    def test_oi_and_fr_are_reversed(self):
+        oi = api_parser.parse_bybit_oi(
+            [{"timestamp": "2000", "openInterest": "2"}, {"timestamp": "1000", "openInterest": "1"}], "1h")
+        fr = api_parser.parse_bybit_fr(
+            [{"fundingRateTimestamp": "2000", "fundingRate": "0.2"}, {"fundingRateTimestamp": "1000", "fundingRate": "0.1"}], "1h")
+
+        assert oi["openTime"].tolist() == [1000, 2000]
+        assert oi["openInterest"].tolist() == [1.0, 2.0]
+        assert fr["fundingRate"].tolist() == [0.1, 0.2]
+
+    def test_broken_payload_returns_empty(self):
+        assert not api_parser.parse_bybit_oi([{"timestamp": "x", "openInterest": "1"}], "1h")
+        assert not api_parser.parse_bybit_fr([{"fundingRate": "0.1"}], "1h")
@@ -0,0 +1,68 @@
+# tests/test_cache_codec_unit.py
+"""
+Unit tests for cache_codec (самоописывающий формат payload кэша).
+"""
+import gzip
+import json
+import math
+
+import numpy as np
+import pytest
+
+import cache_codec
+
+
+PAYLOAD = {
+    "timeframe": "4h",
+    "data": [
+        {
+            "symbol": "BTCUSDT",
+            "exchanges": ["binance", "bybit"],
+            "data": [
+                {"openTime": 1700000000000, "openPrice": 35000.5, "volumeDelta": None, "fundingRate": -0.0001},
+            ],
+        }
+    ],
+}
+
+
+@pytest.mark.parametrize("codec", cache_codec.available_codecs())
+def test_roundtrip_for_every_available_codec(codec):
+    encoded = cache_codec.encode(PAYLOAD, codec)
+    assert cache_codec.decode(encoded) == PAYLOAD
+
+
+@pytest.mark.parametrize("codec", [c for c in cache_codec.available_codecs() if c != "gzip-json"])
+def test_new_codecs_write_magic_header(codec):
+    encoded = cache_codec.encode(PAYLOAD, codec)
+    assert encoded.startswith(cache_codec.MAGIC)
+
+
+def test_gzip_json_stays_backward_compatible():
+    """gzip-json пишется без заголовка - его читают и старые версии сервиса."""
+    encoded = cache_codec.encode(PAYLOAD, "gzip-json")
+    assert json.loads(gzip.decompress(encoded)) == PAYLOAD
+
+
+def test_decode_legacy_plain_json():
+    assert cache_codec.decode(json.dumps(PAYLOAD).encode("utf-8")) == PAYLOAD
+
+
+def test_unknown_codec_falls_back_to_gzip_json():
+    assert cache_codec.resolve_codec("brotli-xml") == "gzip-json"
+    assert cache_codec.encode(PAYLOAD, "brotli-xml").startswith(cache_codec.GZIP_MAGIC)
+
+
+def test_unknown_codec_id_in_header_raises():
+    with pytest.raises(ValueError):
+        cache_codec.decode(cache_codec.MAGIC + bytes([250]) + b"payload")
+
+
+@pytest.mark.parametrize("codec", cache_codec.available_codecs())
+def test_numpy_scalars_are_serialized(codec):
+    payload = {"openTime": np.int64(1), "closePrice": np.float64(2.5), "nan": float("nan")}
+    decoded = cache_codec.decode(cache_codec.encode(payload, codec))
+    assert decoded["openTime"] == 1
+    assert decoded["closePrice"] == 2.5
+    # NaN: json/msgpack сохраняют NaN, orjson пишет null
+    assert decoded["nan"] is None or math.isnan(decoded["nan"])
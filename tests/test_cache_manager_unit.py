@@ -0,0 +1,191 @@
+# tests/test_cache_manager_unit.py
+"""
+Unit tests for cache_manager (шардированный кэш: манифест + шард на монету).
+"""
+import gzip
+import json
+
+import pytest
+from fakeredis import FakeAsyncRedis
+
+import cache_codec
+import cache_manager
+
+
+def _make_market_data(symbols):
+    return {
+        "timeframe": "4h",
+        "openTime": 1000,
+        "closeTime": 2000,
+        "audit_report": {"missing_klines": [], "missing_oi": [], "missing_fr": []},
+        "data": [
+            {"symbol": s, "exchanges": ["binance"], "data": [{"openTime": 1000, "closePrice": float(i)}]}
+            for i, s in enumerate(symbols)
+        ],
+    }
+
+
+@pytest.fixture
+async def redis_conn():
+    conn = FakeAsyncRedis()
+    cache_manager._local_cache.clear()
+    yield conn
+    await conn.flushall()
+    await conn.aclose()
+
+
+@pytest.mark.asyncio
+async def test_save_writes_manifest_and_shards(redis_conn):
+    """Таймфрейм сохраняется как манифест + отдельный ключ на каждую монету."""
+    data = _make_market_data(["BTCUSDT", "ETHUSDT"])
+    assert await cache_manager.save_to_cache(redis_conn, "4h", data)
+
+    manifest = cache_codec.decode(await redis_conn.get("cache:4h:manifest"))
+    assert manifest["symbols"] == ["BTCUSDT", "ETHUSDT"]
+    assert manifest["meta"]["timeframe"] == "4h"
+    assert "data" not in manifest["meta"]
+
+    version = manifest["version"]
+    assert await redis_conn.exists(f"cache:4h:v{version}:BTCUSDT")
+    assert await redis_conn.exists(f"cache:4h:v{version}:ETHUSDT")
+    assert not await redis_conn.exists("cache:4h")
+
+
+@pytest.mark.asyncio
+async def test_load_full_roundtrip(redis_conn):
+    """Без фильтра собирается полный ответ в исходном порядке монет."""
+    data = _make_market_data(["BTCUSDT", "ETHUSDT", "SOLUSDT"])
+    await cache_manager.save_to_cache(redis_conn, "4h", data)
+
+    loaded = await cache_manager.load_from_cache("4h", redis_conn)
+    assert [item["symbol"] for item in loaded["data"]] == ["BTCUSDT", "ETHUSDT", "SOLUSDT"]
+    assert loaded["timeframe"] == "4h"
+    assert loaded["audit"]["count"] == 3
+
+
+@pytest.mark.asyncio
+async def test_load_filtered_reads_only_requested_shards(redis_conn):
+    """С фильтром symbols возвращаются только запрошенные монеты."""
+    await cache_manager.save_to_cache(redis_conn, "1h", _make_market_data(["BTCUSDT", "ETHUSDT"]))
+
+    loaded = await cache_manager.load_from_cache("1h", redis_conn, symbols=["ETHUSDT", "UNKNOWN"])
+    assert [item["symbol"] for item in loaded["data"]] == ["ETHUSDT"]
+    assert loaded["audit"]["count"] == 2
+
+
+@pytest.mark.asyncio
+async def test_new_version_swaps_manifest_and_expires_old_shards(redis_conn):
+    """Повторная публикация переключает манифест, старые шарды получают TTL."""
+    await cache_manager.save_to_cache(redis_conn, "1h", _make_market_data(["BTCUSDT"]))
+    old_version = cache_codec.decode(await redis_conn.get("cache:1h:manifest"))["version"]
+
+    await cache_manager.save_to_cache(redis_conn, "1h", _make_market_data(["ETHUSDT"]))
+    new_version = cache_codec.decode(await redis_conn.get("cache:1h:manifest"))["version"]
+
+    assert new_version > old_version
+    assert 0 < await redis_conn.ttl(f"cache:1h:v{old_version}:BTCUSDT") <= cache_manager.CACHE_SHARD_GRACE_SECONDS
+
+    loaded = await cache_manager.load_from_cache("1h", redis_conn)
+    assert [item["symbol"] for item in loaded["data"]] == ["ETHUSDT"]
+
+
+@pytest.mark.asyncio
+async def test_legacy_blob_is_still_readable(redis_conn):
+    """Старый монолитный ключ cache:{tf} читается (и фильтруется), если манифеста нет."""
+    legacy = _make_market_data(["BTCUSDT", "ETHUSDT"])
+    await redis_conn.set("cache:12h", gzip.compress(json.dumps(legacy).encode("utf-8")))
+
+    loaded = await cache_manager.load_from_cache("12h", redis_conn, symbols=["BTCUSDT"])
+    assert [item["symbol"] for item in loaded["data"]] == ["BTCUSDT"]
+
+
+@pytest.mark.asyncio
+async def test_non_timeframe_key_stays_single_blob(redis_conn):
+    """global_fr (dict по символам) хранится одним ключом, как раньше."""
+    data = {"data": {"BTCUSDT": [{"openTime": 1, "fundingRate": 0.0001}]}, "timeframe": "global_fr"}
+    await cache_manager.save_to_cache(redis_conn, "global_fr", data)
+
+    assert await redis_conn.exists("cache:global_fr")
+    assert not await redis_conn.exists("cache:global_fr:manifest")
+    loaded = await cache_manager.load_from_cache("global_fr", redis_conn)
+    assert loaded["data"]["BTCUSDT"][0]["fundingRate"] == 0.0001
+
+
+@pytest.mark.asyncio
+async def test_publish_sets_version_key(redis_conn):
+    """Публикация (шардированная и одним ключом) обновляет cache:{key}:ver."""
+    await cache_manager.save_to_cache(redis_conn, "1h", _make_market_data(["BTCUSDT"]))
+    manifest = cache_codec.decode(await redis_conn.get("cache:1h:manifest"))
+    assert await cache_manager.get_cache_version("1h", redis_conn) == str(manifest["version"])
+
+    fr = {"data": {}, "audit": {"timestamp": 42, "source": "test", "count": 0}}
+    await cache_manager.save_to_cache(redis_conn, "global_fr", fr)
+    assert await cache_manager.get_cache_version("global_fr", redis_conn) == "42"
+
+
+@pytest.mark.asyncio
+async def test_local_cache_serves_repeated_reads_until_version_changes(redis_conn):
+    """Пока версия не изменилась, данные отдаются из LRU без чтения шардов."""
+    await cache_manager.save_to_cache(redis_conn, "1h", _make_market_data(["BTCUSDT"]))
+    first = await cache_manager.load_serializable_from_cache("1h", redis_conn)
+
+    # Портим манифест: если бы чтение шло в Redis, результат изменился бы
+    await redis_conn.delete("cache:1h:manifest")
+    second = await cache_manager.load_serializable_from_cache("1h", redis_conn)
+    assert second is first
+
+    # Новая публикация меняет версию -> LRU промахивается и читает свежие данные
+    await cache_manager.save_to_cache(redis_conn, "1h", _make_market_data(["ETHUSDT"]))
+    third = await cache_manager.load_serializable_from_cache("1h", redis_conn)
+    assert [item["symbol"] for item in third["data"]] == ["ETHUSDT"]
+
+
+@pytest.mark.asyncio
+async def test_local_cache_keys_by_symbol_filter(redis_conn):
+    """Отфильтрованные и полные ответы кэшируются раздельно."""
+    await cache_manager.save_to_cache(redis_conn, "4h", _make_market_data(["BTCUSDT", "ETHUSDT"]))
+
+    filtered = await cache_manager.load_serializable_from_cache("4h", redis_conn, symbols=["BTCUSDT"])
+    full = await cache_manager.load_serializable_from_cache("4h", redis_conn)
+
+    assert [item["symbol"] for item in filtered["data"]] == ["BTCUSDT"]
+    assert [item["symbol"] for item in full["data"]] == ["BTCUSDT", "ETHUSDT"]
+
+
+def test_versioned_lru_evicts_least_recently_used():
+    lru = cache_manager._VersionedLRU(max_entries=2)
+    lru.put(("a",), 1)
+    lru.put(("b",), 2)
+    assert lru.get(("a",)) == 1
+    lru.put(("c",), 3)
+
+    assert lru.get(("b",)) is None
+    assert lru.get(("a",)) == 1
+    assert lru.get(("c",)) == 3
+
+
+@pytest.mark.asyncio
+async def test_response_body_is_stored_at_write_time(redis_conn):
+    """Готовое тело ответа совпадает с тем, что отрендерил бы JSONResponse."""
+    from fastapi.responses import JSONResponse
+
+    data = _make_market_data(["BTCUSDT"])
+    data["data"][0]["data"][0]["fundingRate"] = float("nan")
+    await cache_manager.save_to_cache(redis_conn, "1h", data)
+
+    body_gz = await cache_manager.load_response_body("1h", redis_conn, gzip_encoded=True)
+    body = await cache_manager.load_response_body("1h", redis_conn, gzip_encoded=False)
+
+    assert gzip.decompress(body_gz) == body
+    expected = JSONResponse(content=cache_manager.make_serializable(data)).body
+    assert body == expected
+    assert json.loads(body)["data"][0]["data"][0]["fundingRate"] is None
+
+
+@pytest.mark.asyncio
+async def test_response_body_missing_for_legacy_cache(redis_conn):
+    """Для старого кэша без cache:{key}:body быстрый путь возвращает None."""
+    legacy = _make_market_data(["BTCUSDT"])
+    await redis_conn.set("cache:1d", gzip.compress(json.dumps(legacy).encode("utf-8")))
+
+    assert await cache_manager.load_response_body("1d", redis_conn) is None
@@ -0,0 +1,139 @@
+# tests/test_candle_columns_unit.py
+"""
+Unit tests for candle_columns (колоночное представление свечей)
+и колоночного пайплайна merge_columns / format_final_structure / кэша.
+"""
+import math
+
+import numpy as np
+import pytest
+from fakeredis import FakeAsyncRedis
+
+import cache_manager
+from api_utils import make_serializable
+from candle_columns import CandleColumns, MISSING_INT, as_columns, as_records
+from data_collector.data_processing import merge_data, merge_data_rows, merge_columns, format_final_structure
+
+
+def _klines(times):
+    return [
+        {
+            "openTime": t, "openPrice": 1.0 + i, "highPrice": 2.0 + i, "lowPrice": 0.5 + i,
+            "closePrice": 1.5 + i, "volume": 10.0 * (i + 1), "closeTime": t + 99, "volumeDelta": -1.0 * i,
+        }
+        for i, t in enumerate(times)
+    ]
+
+
+class TestCandleColumns:
+    def test_records_roundtrip(self):
+        records = _klines([100, 200, 300])
+        records[1]["openInterest"] = 5.5
+        cc = CandleColumns.from_records(records)
+
+        assert len(cc) == 3
+        assert cc["openTime"].dtype == np.int64
+        assert cc.to_records() == records
+
+    def test_missing_values(self):
+        cc = CandleColumns.from_records([{"openTime": None, "closePrice": None}])
+
+        assert cc["openTime"][0] == MISSING_INT
+        assert math.isnan(cc["closePrice"][0])
+        record = cc.to_records()[0]
+        assert record["openTime"] is None and record["closePrice"] is None
+        assert "openInterest" not in record
+
+    def test_slicing_and_has_value(self):
+        records = _klines([100, 200, 300])
+        records[-1]["fundingRate"] = 0.01
+        cc = CandleColumns.from_records(records)
+
+        assert cc[:-1].to_records() == records[:-1]
+        assert cc[-2:].to_records() == records[-2:]
+        assert cc[-1].to_records() == records[-1:]
+        assert cc.has_value("fundingRate")
+        assert not cc[:-1].has_value("fundingRate")
+        assert not CandleColumns.empty()
+
+    def test_dict_roundtrip(self):
+        records = _klines([100, 200])
+        records[0]["openInterest"] = 7.0
+        cc = CandleColumns.from_records(records)
+
+        restored = CandleColumns.from_dict(cc.to_dict())
+        assert restored.to_records() == records
+
+    def test_as_helpers(self):
+        records = _klines([100])
+        cc = as_columns(records)
+        assert as_columns(cc) is cc
+        assert as_records(cc) == records
+        assert as_records(None) == []
+
+    def test_make_serializable_converts_columns(self):
+        cc = CandleColumns.from_records(_klines([100]))
+        assert make_serializable({"data": cc}) == {"data": _klines([100])}
+
+
+class TestMergeColumns:
+    def test_matches_merge_data(self):
+        """Колоночное объединение дает те же свечи, что и построчное."""
+        processed = {
+            "BTCUSDT": {
+                "klines": _klines([300, 100, 200, 400]),
+                "oi": [{"openTime": 150, "openInterest": 1.0}, {"openTime": 300, "openInterest": 3.0}],
+                "fr": [{"openTime": 50, "fundingRate": 0.001}],
+            },
+            "ETHUSDT": {"klines": _klines([100, 200]), "oi": [], "fr": []},
+            "EMPTY": {"klines": [], "oi": [], "fr": []},
+        }
+
+        expected = merge_data_rows(processed)
+        result = merge_columns(processed)
+
+        assert set(result) == set(expected)
+        for symbol, candles in expected.items():
+            assert result[symbol].to_records() == candles
+
+    def test_format_final_structure_keeps_columns(self):
+        processed = {"BTCUSDT": {"klines": _klines([100, 200, 300]), "oi": [], "fr": []}}
+        coins = [{"symbol": "BTCUSDT", "exchanges": ["binance"]}, {"symbol": "ETHUSDT", "exchanges": ["bybit"]}]
+
+        columns_result = format_final_structure(merge_columns(processed), coins, "1h")
+        lists_result = format_final_structure(merge_data(processed), coins, "1h")
+
+        assert isinstance(columns_result["data"][0]["data"], CandleColumns)
+        assert make_serializable(columns_result) == lists_result
+        assert columns_result["audit_report"]["missing_oi"] == ["BTCUSDT"]
+
+
+@pytest.fixture
+async def redis_conn():
+    conn = FakeAsyncRedis()
+    cache_manager._local_cache.clear()
+    yield conn
+    await conn.flushall()
+    await conn.aclose()
+
+
+@pytest.mark.asyncio
+async def test_cache_stores_columns_and_returns_records(redis_conn):
+    """Шард хранит колонки; load_from_cache отдает записи или CandleColumns."""
+    records = _klines([100, 200])
+    data = {
+        "timeframe": "1h",
+        "data": [{"symbol": "BTCUSDT", "exchanges": ["binance"], "data": CandleColumns.from_records(records)}],
+    }
+    await cache_manager.save_to_cache(redis_conn, "1h", data)
+
+    loaded = await cache_manager.load_from_cache("1h", redis_conn)
+    assert loaded["data"][0]["data"] == records
+    assert "columns" not in loaded["data"][0]
+
+    loaded_columns = await cache_manager.load_from_cache("1h", redis_conn, as_columns=True)
+    assert isinstance(loaded_columns["data"][0]["data"], CandleColumns)
+    assert loaded_columns["data"][0]["data"].to_records() == records
+
+    body = await cache_manager.load_response_body("1h", redis_conn, gzip_encoded=False)
+    assert b'"closePrice":1.5' in body
@@ -0,0 +1,87 @@
+# tests/test_cpu_pool_unit.py
+"""
+Unit tests for data_collector.cpu_pool (парсинг/слияние по шардам в пуле процессов).
+"""
+from unittest.mock import patch
+
+import pytest
+
+import api_parser
+from data_collector import cpu_pool
+from data_collector.cpu_pool import CpuPool, shard_symbols
+
+HOUR = 60 * 60 * 1000
+START = 1_704_067_200_000
+
+
+def _binance_klines(count, base=1.0):
+    return [
+        [START + i * HOUR, str(base + i), str(base + i + 1), str(base + i - 0.5), str(base + i + 0.5),
+         "10", START + (i + 1) * HOUR - 1, "0", 0, "6"]
+        for i in range(count)
+    ]
+
+
+def _binance_oi(count):
+    return [{"timestamp": START + i * HOUR, "sumOpenInterest": str(100 + i)} for i in range(count)]
+
+
+def _items():
+    items = []
+    for n, symbol in enumerate(["BTCUSDT", "ETHUSDT", "SOLUSDT"]):
+        items.append((symbol, "klines", api_parser.parse_binance_klines, _binance_klines(5, base=n * 10.0), "1h"))
+        items.append((symbol, "oi", api_parser.parse_binance_oi, _binance_oi(5), "1h"))
+    return items
+
+
+@pytest.fixture
+def pool():
+    real_pool = CpuPool(workers=2)
+    original, cpu_pool.cpu_pool = cpu_pool.cpu_pool, real_pool
+    yield real_pool
+    real_pool.shutdown()
+    cpu_pool.cpu_pool = original
+
+
+def test_shard_symbols_round_robin():
+    assert shard_symbols(["a", "b", "c", "d", "e"], 2) == [["a", "c", "e"], ["b", "d"]]
+    assert shard_symbols(["a"], 4) == [["a"]]
+    assert shard_symbols([], 4) == []
+
+
+@pytest.mark.asyncio
+async def test_pool_results_match_inline(pool):
+    fr = {"ETHUSDT": [{"openTime": START, "fundingRate": 0.0002, "closeTime": START}]}
+    expected = cpu_pool.parse_merge_shard(_items(), fr)
+
+    processed = await cpu_pool.parse_in_pool(_items(), fr)
+    merged = await cpu_pool.merge_in_pool(processed)
+
+    assert pool._executor is not None
+    assert set(merged) == set(expected) == {"BTCUSDT", "ETHUSDT", "SOLUSDT"}
+    for symbol in expected:
+        assert merged[symbol].to_records() == expected[symbol].to_records()
+    assert merged["ETHUSDT"].to_records()[-1]["fundingRate"] == 0.0002
+    assert merged["SOLUSDT"].to_records()[-1]["openInterest"] == 104.0
+
+
+@pytest.mark.asyncio
+async def test_unpicklable_work_falls_back_to_current_process(pool):
+    def local_parser(raw_data, timeframe):
+        return api_parser.parse_binance_klines(raw_data, timeframe)
+
+    items = [("BTCUSDT", "klines", local_parser, _binance_klines(3), "1h")]
+    processed = await cpu_pool.parse_in_pool(items)
+
+    assert len(processed["BTCUSDT"]["klines"][0]) == 3
+
+
+@pytest.mark.asyncio
+async def test_task_error_is_raised_not_rerun_in_current_process(pool):
+    # AttributeError самой функции (битые данные), а не ошибка pickle
+    with patch.object(cpu_pool.logger, 'warning') as warning:
+        with pytest.raises(AttributeError):
+            await pool.run(cpu_pool.merge_shard, {"BTCUSDT": "not a dict"})
+
+    warning.assert_not_called()
+    assert pool._executor is not None
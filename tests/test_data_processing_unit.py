@@ -1,5 +1,7 @@
+import random
+
 import pytest
-from data_collector.data_processing import merge_data, format_final_structure
+from data_collector.data_processing import merge_data, merge_data_rows, format_final_structure
 
 
 class TestMergeData:
@@ -80,6 +82,39 @@ class TestMergeData:
         assert candles[1]["volumeDelta"] == 2 # <-- ПРОВЕРКА
 
 
+    def test_merge_data_golden_matches_rows_implementation(self):
+        """
+        Golden-тест: векторный merge_data (searchsorted по всем монетам сразу)
+        дает тот же результат, что и построчный merge_data_rows.
+        """
+        rnd = random.Random(7)
+        processed_data = {}
+        for i in range(30):
+            times = [1_000_000 + j * 3600 for j in range(rnd.randint(0, 60))]
+            rnd.shuffle(times)
+            klines = [
+                {"openTime": t, "openPrice": rnd.random(), "highPrice": rnd.random(), "lowPrice": rnd.random(),
+                 "closePrice": rnd.random(), "volume": rnd.random() * 100, "closeTime": t + 3599,
+                 "volumeDelta": rnd.choice([None, rnd.random() - 0.5])}
+                for t in times
+            ]
+            if klines and i % 7 == 0:
+                klines.append({"openPrice": 1.0})  # без openTime - пропускается
+            ois = [{"openTime": 1_000_000 + rnd.randint(-5, 60) * 3600 + rnd.choice([0, 900]),
+                    "openInterest": rnd.random() * 1e6, "closeTime": 0}
+                   for _ in range(rnd.randint(0, 40))]
+            frs = [{"openTime": 1_000_000 + rnd.randint(-20, 60) * 3600, "fundingRate": rnd.random() / 1000}
+                   for _ in range(rnd.randint(0, 10))]
+            processed_data[f"COIN{i}USDT"] = {"klines": klines, "oi": ois, "fr": frs}
+
+        expected = merge_data_rows(processed_data)
+        result = merge_data(processed_data)
+
+        assert result.keys() == expected.keys()
+        for symbol in expected:
+            assert result[symbol] == expected[symbol], symbol
+
+
 class TestFormatFinalStructure:
     # (Тесты для format_final_structure не требуют изменений,
     # так как эта функция просто передает 'data', а не анализирует
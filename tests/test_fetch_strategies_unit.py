@@ -72,7 +72,8 @@ class TestFetchSimple:
             'original_timeframe': '4h'
         }
 
-        with patch('data_collector.fetch_strategies.logger') as mock_logger:
+        with patch('data_collector.fetch_strategies.logger') as mock_logger, \
+             patch('data_collector.retry_policy.RETRY_MAX_ATTEMPTS', 1):
             result_task_info, result_data = await fetch_strategies.fetch_simple(
                 session, task_info, semaphore)
 
@@ -100,7 +101,8 @@ class TestFetchSimple:
             'original_timeframe': '4h'
         }
 
-        with patch('data_collector.fetch_strategies.logger') as mock_logger:
+        with patch('data_collector.fetch_strategies.logger') as mock_logger, \
+             patch('data_collector.retry_policy.RETRY_MAX_ATTEMPTS', 1):
             result_task_info, result_data = await fetch_strategies.fetch_simple(
                 session, task_info, semaphore)
 
@@ -237,6 +239,146 @@ class TestFetchSimple:
         assert call_args.kwargs['timeout'] == fetch_strategies.REQUEST_TIMEOUT
 
 
+class TestRetries:
+    """Tests for retries of transient errors (retry_policy)"""
+
+    @pytest.mark.asyncio
+    async def test_5xx_is_retried_until_success(self):
+        """Test HTTP 503 is retried and the later 200 response is returned"""
+        failed = AsyncMock()
+        failed.status = 503
+        failed.text = AsyncMock(return_value='Service Unavailable')
+        ok = AsyncMock()
+        ok.status = 200
+        ok.json = AsyncMock(return_value=[1, 2])
+
+        session = MagicMock()
+        session.get = MagicMock(side_effect=[MockAsyncContextManager(failed), MockAsyncContextManager(ok)])
+        task_info = {'url': 'https://fapi.binance.com/fapi/v1/klines?limit=10', 'symbol': 'BTCUSDT',
+                     'data_type': 'klines', 'exchange': 'binance', 'original_timeframe': '1h'}
+
+        fetch_strategies.retry_policy.reset_retry_stats()
+        with patch('data_collector.retry_policy.RETRY_BASE_DELAY', 0.01):
+            _, data = await fetch_strategies.fetch_simple(session, task_info, asyncio.Semaphore(10))
+
+        assert data == [1, 2]
+        assert session.get.call_count == 2
+        assert fetch_strategies.retry_policy.retry_stats()['binance'] == {
+            'retries': 1, 'recovered': 1, 'exhausted': 0, 'budget_exceeded': 0
+        }
+
+    @pytest.mark.asyncio
+    async def test_4xx_is_not_retried(self):
+        """Test HTTP 400 returns None after a single attempt"""
+        failed = AsyncMock()
+        failed.status = 400
+        failed.text = AsyncMock(return_value='Bad Request')
+
+        session = MagicMock()
+        session.get = MagicMock(return_value=MockAsyncContextManager(failed))
+        task_info = {'url': 'https://api.bybit.com/v5/market/kline?limit=200', 'symbol': 'BTCUSDT',
+                     'data_type': 'klines', 'exchange': 'bybit', 'original_timeframe': '1h'}
+
+        _, data = await fetch_strategies.fetch_bybit_paginated(session, task_info, asyncio.Semaphore(10))
+
+        assert data is None
+        assert session.get.call_count == 1
+
+
+    @pytest.mark.asyncio
+    async def test_waiting_for_limiter_slot_does_not_count_against_budget(self):
+        """Test a request throttled locally longer than the task budget is still sent"""
+        ok = AsyncMock()
+        ok.status = 200
+        ok.json = AsyncMock(return_value=[1, 2])
+        session = MagicMock()
+        session.get = MagicMock(return_value=MockAsyncContextManager(ok))
+        task_info = {'url': 'https://fapi.binance.com/futures/data/openInterestHist', 'symbol': 'BTCUSDT',
+                     'data_type': 'oi', 'exchange': 'binance', 'original_timeframe': '1h'}
+
+        # Ведро лимитера пусто: слот выдается только через 0.2 сек (бюджет - 0.05 сек)
+        limiter = fetch_strategies.rate_limiter.get_limiter('binance', 'oi')
+        limiter.bucket.block(0.2)
+
+        fetch_strategies.retry_policy.reset_retry_stats()
+        with patch('data_collector.retry_policy.RETRY_TASK_BUDGET_SECONDS', 0.05):
+            _, data = await fetch_strategies.fetch_simple(session, task_info, asyncio.Semaphore(10))
+
+        assert data == [1, 2]
+        assert fetch_strategies.retry_policy.retry_stats().get('binance', {}).get('budget_exceeded', 0) == 0
+
+
+    @pytest.mark.asyncio
+    async def test_paused_family_does_not_hold_global_slots(self):
+        """Test requests waiting on a paused limiter do not block another family"""
+        ok = AsyncMock()
+        ok.status = 200
+        ok.json = AsyncMock(return_value=[1])
+        session = MagicMock()
+        session.get = MagicMock(side_effect=lambda *args, **kwargs: MockAsyncContextManager(ok))
+        paused = {'url': 'https://fapi.binance.com/futures/data/openInterestHist', 'symbol': 'BTCUSDT',
+                  'data_type': 'oi', 'exchange': 'binance', 'original_timeframe': '1h'}
+        other = {'url': 'https://api.bybit.com/v5/market/open-interest', 'symbol': 'BTCUSDT',
+                 'data_type': 'oi', 'exchange': 'bybit', 'original_timeframe': '1h'}
+
+        # binance:futures_data на паузе 0.5 сек; общий семафор - одно место
+        fetch_strategies.rate_limiter.get_limiter('binance', 'oi').bucket.block(0.5)
+        semaphore = asyncio.Semaphore(1)
+
+        waiting = asyncio.create_task(fetch_strategies.fetch_simple(session, paused, semaphore))
+        await asyncio.sleep(0)
+        started = asyncio.get_running_loop().time()
+        _, data = await fetch_strategies.fetch_simple(session, other, semaphore)
+
+        assert data == [1]
+        assert asyncio.get_running_loop().time() - started < 0.3
+        assert not waiting.done()
+        assert (await waiting)[1] == [1]
+
+class TestBybitPagination:
+    """Tests for Bybit kline windows (start/end по 200 свечей)"""
+
+    HOUR = 60 * 60 * 1000
+
+    def test_windows_cover_requested_count(self):
+        end_ms = 1000 * self.HOUR + 123
+        windows = fetch_strategies.bybit_kline_windows(450, self.HOUR, end_ms)
+
+        assert windows == [
+            (801 * self.HOUR, 1000 * self.HOUR, 200),
+            (601 * self.HOUR, 800 * self.HOUR, 200),
+            (551 * self.HOUR, 600 * self.HOUR, 50),
+        ]
+
+    @pytest.mark.asyncio
+    async def test_windows_fetched_concurrently_and_merged(self):
+        """Test 450 candles are fetched as 3 windows and merged newest-first without duplicates"""
+        from urllib.parse import urlparse, parse_qs
+
+        def respond(url, **kwargs):
+            params = parse_qs(urlparse(url).query)
+            start, end = int(params['start'][0]), int(params['end'][0])
+            # Окно + одна лишняя свеча на стыке (дубликат)
+            items = [[str(t), "1", "2", "0.5", "1.5", "10", "15"] for t in range(end, start - 2 * self.HOUR, -self.HOUR)]
+            response = AsyncMock()
+            response.status = 200
+            response.json = AsyncMock(return_value={'result': {'list': items}})
+            return MockAsyncContextManager(response)
+
+        session = MagicMock()
+        session.get = MagicMock(side_effect=respond)
+        url = ('https://api.bybit.com/v5/market/kline?category=linear&symbol=BTCUSDT'
+               f'&interval=60&limit=450&end={1000 * self.HOUR}')
+        task_info = {'url': url, 'symbol': 'BTCUSDT', 'data_type': 'klines', 'exchange': 'bybit'}
+
+        _, data = await fetch_strategies.fetch_bybit_paginated(session, task_info, asyncio.Semaphore(10))
+
+        assert session.get.call_count == 3
+        assert len(data) == 450
+        times = [int(item[0]) for item in data]
+        assert times == list(range(1000 * self.HOUR, 550 * self.HOUR, -self.HOUR))
+
+
 class TestConcurrencyConstants:
     """Tests for module-level constants"""
 
@@ -94,4 +94,28 @@ async def test_run_fr_update_fetch_empty(mock_get_coins, mock_fetch_rates, mock_
     mock_get_coins.assert_called_once()
     mock_fetch_rates.assert_called_once_with(mock_coins)
     mock_save_cache.assert_not_called()
-    assert "Сбор FR вернул пустой словарь" in caplog.text
\ No newline at end of file
+    assert "Сбор FR вернул пустой словарь" in caplog.text
+
+@pytest.mark.asyncio
+async def test_fetch_funding_rates_returns_records():
+    """
+    Тест: Векторный парсер FR отдает CandleColumns, а в cache:global_fr попадает список словарей.
+    """
+    from data_collector import fr_fetcher
+    from candle_columns import CandleColumns
+
+    async def fake_strategy(session, task_info, semaphore):
+        return task_info, ["raw"]
+
+    parsed = CandleColumns.from_records([{'openTime': 123, 'fundingRate': 0.01, 'closeTime': 124}])
+    tasks = [{
+        "task_info": {"symbol": "BTCUSDT", "data_type": "fr"},
+        "fetch_strategy": fake_strategy,
+        "parser": lambda raw, tf: parsed,
+        "timeframe": "1h",
+    }]
+
+    with patch('data_collector.fr_fetcher.task_builder.prepare_fr_tasks', return_value=tasks):
+        result = await fr_fetcher.fetch_funding_rates([{'symbol': 'BTCUSDT', 'exchanges': ['binance']}])
+
+    assert result == {'BTCUSDT': [{'openTime': 123, 'fundingRate': 0.01, 'closeTime': 124}]}
@@ -0,0 +1,48 @@
+# tests/test_http_session_unit.py
+"""
+Unit tests for data_collector.http_session (общая aiohttp-сессия процесса).
+"""
+import pytest
+
+from data_collector import http_session
+from data_collector.http_session import HttpSessionManager
+
+
+@pytest.mark.asyncio
+async def test_session_is_reused_and_tuned():
+    manager = HttpSessionManager()
+    try:
+        session = await manager.get_session()
+        assert await manager.get_session() is session
+
+        connector = session.connector
+        assert connector.limit == http_session.HTTP_CONNECTOR_LIMIT
+        assert connector.limit_per_host == http_session.HTTP_LIMIT_PER_HOST
+        assert connector.use_dns_cache
+        assert session.headers["Accept-Encoding"].startswith("gzip, deflate")
+    finally:
+        await manager.close()
+
+    assert session.closed
+
+
+@pytest.mark.asyncio
+async def test_closed_session_is_recreated():
+    manager = HttpSessionManager()
+    first = await manager.get_session()
+    await manager.close()
+
+    second = await manager.get_session()
+    try:
+        assert second is not first
+        assert not second.closed
+    finally:
+        await manager.close()
+
+
+def test_brotli_only_when_available(monkeypatch):
+    monkeypatch.setattr(http_session, "BROTLI_AVAILABLE", False)
+    assert http_session.accept_encoding() == "gzip, deflate"
+
+    monkeypatch.setattr(http_session, "BROTLI_AVAILABLE", True)
+    assert http_session.accept_encoding() == "gzip, deflate, br"
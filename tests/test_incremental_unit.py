@@ -0,0 +1,117 @@
+# tests/test_incremental_unit.py
+"""
+Unit tests for data_collector.incremental (инкрементальное обновление Klines).
+"""
+from unittest.mock import patch, AsyncMock
+
+import pytest
+
+import url_builder
+from candle_columns import CandleColumns
+from data_collector import fetch_market_data, task_builder
+from data_collector.data_processing import merge_columns
+from data_collector.incremental import plan_incremental, splice_incremental
+
+HOUR = 60 * 60 * 1000
+START = 1_704_067_200_000  # 2024-01-01 00:00 UTC
+
+
+def _candles(start_index, count, oi=True):
+    records = []
+    for i in range(start_index, start_index + count):
+        t = START + i * HOUR
+        record = {
+            "openTime": t, "openPrice": 1.0 + i, "highPrice": 2.0 + i, "lowPrice": 0.5 + i,
+            "closePrice": 1.5 + i, "volume": 10.0, "closeTime": t + HOUR - 1, "volumeDelta": 1.0,
+        }
+        if oi:
+            record["openInterest"] = 100.0 + i
+        records.append(record)
+    return CandleColumns.from_records(records)
+
+
+def _oi_points(start_index, count):
+    return CandleColumns.from_records([
+        {"openTime": START + i * HOUR, "openInterest": 100.0 + i, "closeTime": START + i * HOUR + 1}
+        for i in range(start_index, start_index + count)
+    ])
+
+
+def _now(candle_index):
+    """Момент внутри свечи candle_index."""
+    return START + candle_index * HOUR + HOUR // 2
+
+
+class TestPlan:
+    def test_plan_for_fresh_full_window(self):
+        previous = {"BTCUSDT": _candles(0, 399)}
+        plan = plan_incremental(previous, "1h", now_ms=_now(400))
+
+        # Перезапрос 398-й свечи + 399 и живая 400 -> 3 свечи, limit на одну больше
+        assert plan == {"BTCUSDT": {"start_time": START + 398 * HOUR, "limit": 4, "fr_limit": 10}}
+
+    def test_short_or_stale_series_are_skipped(self):
+        previous = {"SHORT": _candles(0, 100), "STALE": _candles(0, 399)}
+        assert plan_incremental(previous, "1h", now_ms=_now(398 + 100)) == {}
+        assert plan_incremental({"SHORT": _candles(0, 100)}, "1h", now_ms=_now(101)) == {}
+
+
+class TestSplice:
+    def test_new_candles_are_spliced_and_window_trimmed(self):
+        previous = {"BTCUSDT": _candles(0, 399)}
+        plan = plan_incremental(previous, "1h", now_ms=_now(400))
+        processed = {"BTCUSDT": {"klines": [_candles(398, 3, oi=False)], "oi": [_oi_points(398, 3)], "fr": []}}
+
+        gaps = splice_incremental(processed, previous, plan, "1h")
+        merged = merge_columns(processed)["BTCUSDT"]
+
+        assert gaps == []
+        assert len(merged) == 400
+        assert merged.to_records() == _candles(1, 400).to_records()
+
+    def test_gap_is_reported_for_full_fetch(self):
+        previous = {"BTCUSDT": _candles(0, 399), "ETHUSDT": _candles(0, 399)}
+        plan = plan_incremental(previous, "1h", now_ms=_now(400))
+        processed = {
+            # Ответ начинается не с последней свечи кэша
+            "BTCUSDT": {"klines": [_candles(399, 2)], "oi": [], "fr": []},
+            # Ответ полный (len == limit) - новых свечей больше, чем ожидалось
+            "ETHUSDT": {"klines": [_candles(398, 4)], "oi": [], "fr": []},
+        }
+
+        assert sorted(splice_incremental(processed, previous, plan, "1h")) == ["BTCUSDT", "ETHUSDT"]
+
+
+def test_klines_urls_with_start_time():
+    assert url_builder.get_binance_klines_url("BTCUSDT", "1h", 3, start_time=123).endswith("&limit=3&startTime=123")
+    assert url_builder.get_bybit_klines_url("BTCUSDT", "1h", 3, start_time=123).endswith("&start=123&limit=3")
+    assert "start" not in url_builder.get_bybit_klines_url("BTCUSDT", "1h", 400)
+
+
+def test_prepare_tasks_uses_incremental_plan():
+    coins = [{"symbol": "BTC/USDT:USDT", "exchanges": ["binance"]}]
+    plan = {"BTC/USDT": {"start_time": 123, "limit": 3, "fr_limit": 10}}
+
+    urls = {t["task_info"]["data_type"]: t["task_info"]["url"] for t in task_builder.prepare_tasks(coins, "1h", incremental_plan=plan)}
+
+    assert urls["klines"].endswith("&limit=3&startTime=123")
+    assert urls["oi"].endswith("&limit=3")
+    assert urls["fr"].endswith("&limit=10")
+
+
+@pytest.mark.asyncio
+async def test_fetch_market_data_falls_back_to_full_fetch_on_gap():
+    coins = [{"symbol": "BTCUSDT", "exchanges": ["binance"]}]
+    previous = {"BTCUSDT": _candles(0, 399)}
+    incremental_result = {"BTCUSDT": {"klines": [_candles(399, 2)], "oi": [], "fr": []}}
+    full_result = {"BTCUSDT": {"klines": [_candles(2, 399)], "oi": [], "fr": []}}
+
+    with patch("data_collector.incremental.time.time", return_value=_now(400) / 1000), \
+         patch("data_collector.task_builder.prepare_tasks", return_value=[{}]) as mock_prepare, \
+         patch("data_collector._fetch_and_parse", AsyncMock(side_effect=[incremental_result, full_result])):
+        result = await fetch_market_data(coins, "1h", previous_data=previous)
+
+    assert "incremental_plan" in mock_prepare.call_args_list[0].kwargs
+    assert mock_prepare.call_args_list[1].args == (coins, "1h", None)
+    # Полный сбор: 399 свечей, последняя (живая) отброшена
+    assert len(result["data"][0]["data"]) == 398
@@ -0,0 +1,70 @@
+# tests/test_indicator_engines_unit.py
+"""
+Unit tests for add_indicators(engine=...): пакетный движок (матрица свечи x монеты)
+дает тот же результат, что и расчет по монетам.
+"""
+import copy
+
+import numpy as np
+import pytest
+
+from candle_columns import CandleColumns
+from indicator_calculator import add_indicators
+from indicators.batched import stack_columns
+
+HOUR_MS = 3600000
+
+
+def _candles(rng, n, volume=True, open_interest=False, funding=False):
+    close = 100 + rng.standard_normal(n).cumsum()
+    candles = []
+    for i, price in enumerate(close):
+        candle = {
+            'openTime': 1700000000000 + i * HOUR_MS, 'openPrice': price - 0.1, 'highPrice': price + 1,
+            'lowPrice': price - 1, 'closePrice': price, 'volume': float(rng.uniform(1, 10)) if volume else 0.0,
+            'closeTime': 1700000000000 + (i + 1) * HOUR_MS - 1, 'volumeDelta': 0.5,
+        }
+        if open_interest:
+            candle['openInterest'] = 1000 + float(rng.uniform())
+        if funding and i % 8 == 0:
+            candle['fundingRate'] = 0.0001
+        candles.append(candle)
+    return candles
+
+
+@pytest.fixture
+def market_data():
+    rng = np.random.default_rng(7)
+    return {'data': [
+        {'symbol': 'AAAUSDT', 'timeframe': '1h', 'data': _candles(rng, 300, open_interest=True)},
+        # Короткая история - NaN-хвост в матрице
+        {'symbol': 'BBBUSDT', 'timeframe': '4h', 'data': CandleColumns.from_records(_candles(rng, 220, funding=True))},
+        {'symbol': 'CCCUSDT', 'timeframe': '1h', 'data': _candles(rng, 400, volume=False)},
+        {'symbol': 'DDDUSDT', 'timeframe': '1h', 'data': _candles(rng, 50)},
+    ]}
+
+
+def test_batched_engine_matches_per_symbol(market_data):
+    per_symbol = add_indicators(copy.deepcopy(market_data))
+    batched = add_indicators(copy.deepcopy(market_data), engine='batched')
+
+    assert batched == per_symbol
+    by_symbol = {coin['symbol']: coin['data'] for coin in batched['data']}
+    # Без объема - без объемных индикаторов; меньше 200 свечей - без расчета
+    assert 'cmf' in by_symbol['AAAUSDT'][-1] and 'cmf' not in by_symbol['CCCUSDT'][-1]
+    assert 'openInterest_z_score' in by_symbol['AAAUSDT'][-1]
+    assert 'fundingRate_z_score' in by_symbol['BBBUSDT'][-1]
+    assert 'adx' not in by_symbol['DDDUSDT'][-1]
+
+
+def test_stack_columns_pads_tail_with_nan():
+    matrix = stack_columns([np.array([1.0, 2.0, 3.0]), np.array([4.0])])
+
+    assert matrix.shape == (3, 2)
+    assert matrix[0].tolist() == [1.0, 2.0, 3.0]
+    assert matrix[1].iloc[0] == 4.0 and matrix[1].iloc[1:].isna().all()
+
+
+def test_unknown_engine_is_rejected(market_data):
+    with pytest.raises(ValueError):
+        add_indicators(market_data, engine='gpu')
@@ -0,0 +1,125 @@
+# tests/test_indicator_kernels_unit.py
+"""
+Unit tests for indicators/kernels (ядра numba): результаты публичных функций
+индикаторов совпадают с прежними циклами по .iloc с точностью 1e-9.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from indicators import calculate_adx, calculate_atr, calculate_ema, calculate_kama, calculate_keltner_channel, calculate_rsi
+from indicators.keltner import _wilder_smooth
+from indicators.kernels import wilder_rma_kernel
+
+TOL = dict(rtol=1e-9, atol=1e-9, equal_nan=True)
+
+
+# --- Прежние реализации (эталон) ---
+
+def _reference_wilder_smooth(series, length):
+    smoothed = pd.Series(np.nan, index=series.index)
+    if len(series) < length:
+        return smoothed
+    smoothed.iloc[length-1] = series.rolling(window=length).mean().iloc[length-1]
+    for i in range(length, len(series)):
+        smoothed.iloc[i] = (smoothed.iloc[i-1] * (length - 1) + series.iloc[i]) / length
+    return smoothed
+
+
+def _reference_ema(close, length):
+    ema = pd.Series(np.nan, index=close.index)
+    ema.iloc[length-1] = close.rolling(window=length, min_periods=length).mean().iloc[length-1]
+    k = 2 / (length + 1)
+    for i in range(length, len(close)):
+        ema.iloc[i] = (close.iloc[i] * k) + (ema.iloc[i-1] * (1 - k))
+    return ema
+
+
+def _reference_rsi(close, length):
+    delta = close.diff()
+    gain = delta.where(delta > 0, 0)
+    loss = -delta.where(delta < 0, 0)
+    avg_gain = gain.rolling(window=length, min_periods=length).mean()
+    avg_loss = loss.rolling(window=length, min_periods=length).mean()
+    for i in range(length, len(close)):
+        avg_gain.iloc[i] = (avg_gain.iloc[i - 1] * (length - 1) + gain.iloc[i]) / length
+        avg_loss.iloc[i] = (avg_loss.iloc[i - 1] * (length - 1) + loss.iloc[i]) / length
+    return 100 - (100 / (1 + avg_gain / avg_loss))
+
+
+def _true_range(high, low, close):
+    return pd.concat([high - low, (high - close.shift(1)).abs(), (low - close.shift(1)).abs()], axis=1).max(axis=1)
+
+
+def _reference_atr(high, low, close, length):
+    tr = _true_range(high, low, close)
+    atr = tr.rolling(window=length).mean()
+    for i in range(length, len(tr)):
+        atr.iloc[i] = (atr.iloc[i-1] * (length - 1) + tr.iloc[i]) / length
+    return atr
+
+
+def _reference_adx(high, low, close, length):
+    tr = _true_range(high, low, close)
+    move_up, move_down = high.diff(1), -low.diff(1)
+    plus_dm = pd.Series(np.where((move_up > move_down) & (move_up > 0), move_up, 0.0), index=high.index)
+    minus_dm = pd.Series(np.where((move_down > move_up) & (move_down > 0), move_down, 0.0), index=low.index)
+    atr = _reference_wilder_smooth(tr, length).replace(0, np.nan)
+    plus_di = 100 * (_reference_wilder_smooth(plus_dm, length) / atr)
+    minus_di = 100 * (_reference_wilder_smooth(minus_dm, length) / atr)
+    dx = 100 * (abs(plus_di - minus_di) / (plus_di + minus_di).replace(0, np.nan))
+    return pd.DataFrame({'adx': _reference_wilder_smooth(dx, length), 'di_plus': plus_di, 'di_minus': minus_di})
+
+
+def _reference_kama(close, smoothing_constant):
+    kama_values = np.zeros(len(close))
+    kama_values[0] = close.iloc[0]
+    for i in range(1, len(close)):
+        sc = smoothing_constant.iloc[i]
+        if np.isnan(sc):
+            kama_values[i] = kama_values[i-1]
+        else:
+            kama_values[i] = kama_values[i-1] + sc * (close.iloc[i] - kama_values[i-1])
+    return pd.Series(kama_values, index=close.index)
+
+
+@pytest.fixture
+def ohlc():
+    rng = np.random.default_rng(42)
+    close = pd.Series(100 + rng.standard_normal(400).cumsum())
+    high = close + rng.uniform(0.1, 2.0, len(close))
+    low = close - rng.uniform(0.1, 2.0, len(close))
+    return high, low, close
+
+
+@pytest.mark.parametrize("length", [1, 14, 50, 150])
+def test_ema_and_rsi_match_reference(ohlc, length):
+    _, _, close = ohlc
+    np.testing.assert_allclose(calculate_ema(close, length), _reference_ema(close, length), **TOL)
+    np.testing.assert_allclose(calculate_rsi(close, length), _reference_rsi(close, length), **TOL)
+
+
+def test_wilder_based_indicators_match_reference(ohlc):
+    high, low, close = ohlc
+    np.testing.assert_allclose(calculate_atr(high, low, close, 14), _reference_atr(high, low, close, 14), **TOL)
+
+    tr = _true_range(high, low, close)
+    np.testing.assert_allclose(_wilder_smooth(tr, 10), _reference_wilder_smooth(tr, 10), **TOL)
+    kc = calculate_keltner_channel(high, low, close, length=20, atr_length=10)
+    np.testing.assert_allclose(kc['kc_upper'] - kc['kc_middle'], 2.0 * _reference_wilder_smooth(tr, 10), **TOL)
+
+    adx = calculate_adx(high, low, close, 14)
+    pd.testing.assert_frame_equal(adx, _reference_adx(high, low, close, 14), check_exact=False, rtol=1e-9, atol=1e-9)
+
+
+def test_kama_and_nan_handling_match_reference(ohlc):
+    _, _, close = ohlc
+    kama, sc = calculate_kama(close, length=10, fast_length=2, slow_length=30)
+    np.testing.assert_allclose(kama, _reference_kama(close, sc), **TOL)
+
+    gappy = close.copy()
+    gappy.iloc[[3, 200]] = np.nan
+    np.testing.assert_allclose(calculate_ema(gappy, 20), _reference_ema(gappy, 20), **TOL)
+    np.testing.assert_allclose(calculate_ema(close.iloc[5:], 20), _reference_ema(close.iloc[5:], 20), **TOL)
+    # Данных меньше length - все NaN
+    assert np.isnan(wilder_rma_kernel(np.ones(5), 10)).all()
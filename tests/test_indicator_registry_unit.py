@@ -0,0 +1,65 @@
+# tests/test_indicator_registry_unit.py
+"""
+Unit tests for indicators/registry (декларативный реестр и планировщик)
+и add_indicators(indicators=...) - расчета подмножества индикаторов.
+"""
+import copy
+
+import numpy as np
+import pytest
+
+from indicator_calculator import add_indicators
+from indicators.registry import C, OUTPUT_COLUMNS, TR, TYPICAL_PRICE, ema, plan, resolve_columns
+
+HOUR_MS = 3600000
+
+
+@pytest.fixture
+def market_data():
+    rng = np.random.default_rng(11)
+    close = 100 + rng.standard_normal(250).cumsum()
+    candles = [
+        {'openTime': 1700000000000 + i * HOUR_MS, 'openPrice': price - 0.1, 'highPrice': price + 1,
+         'lowPrice': price - 1, 'closePrice': price, 'volume': float(rng.uniform(1, 10)),
+         'quoteVolume': float(rng.uniform(100, 1000))}
+        for i, price in enumerate(close)
+    ]
+    return {'data': [{'symbol': 'AAAUSDT', 'timeframe': '1h', 'data': candles}]}
+
+
+def test_plan_dedupes_shared_nodes():
+    nodes = plan(OUTPUT_COLUMNS)
+
+    assert len(nodes) == len(set(nodes))
+    # TR - для ATR, ADX, Keltner и паттернов; EMA(50) - для колонки, наклона и ema_proximity
+    assert nodes.count(TR) == 1 and nodes.count(ema(C, 50)) == 1
+    assert TYPICAL_PRICE in nodes
+    # Узлы идут после своих входов
+    assert nodes.index(('src', 'closePrice')) < nodes.index(ema(C, 50)) < nodes.index(('out:ema_proximity',))
+
+
+def test_plan_contains_only_required_nodes():
+    nodes = plan(resolve_columns(['rsi']))
+
+    assert TR not in nodes and TYPICAL_PRICE not in nodes
+    assert all(key[0] != 'ema' for key in nodes)
+
+
+def test_subset_outputs_only_requested_columns(market_data):
+    full = add_indicators(copy.deepcopy(market_data), engine='batched')['data'][0]['data']
+    subset = add_indicators(copy.deepcopy(market_data), engine='batched', indicators=['macd', 'atr', 'rvwap_width_1_0_z_score'])
+    candles = subset['data'][0]['data']
+
+    expected = ['atr', 'macd', 'macd_signal', 'macd_hist', 'rvwap_width_1_0_z_score']
+    assert [key for key in candles[-1] if key not in market_data['data'][0]['data'][-1]] == expected
+    for key in expected:
+        assert [candle[key] for candle in candles] == [candle[key] for candle in full]
+
+
+def test_unknown_indicator_or_engine_is_rejected(market_data):
+    with pytest.raises(ValueError):
+        resolve_columns(['rsi', 'ichimoku'])
+    with pytest.raises(ValueError):
+        add_indicators(copy.deepcopy(market_data), engine='batched', indicators=['ichimoku'])
+    with pytest.raises(ValueError):
+        add_indicators(copy.deepcopy(market_data), indicators=['rsi'])
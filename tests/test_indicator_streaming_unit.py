@@ -0,0 +1,146 @@
+# tests/test_indicator_streaming_unit.py
+"""
+Unit tests for indicators/streaming (инкрементальные индикаторы с состоянием)
+и хранения состояний рядом с кэшем.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from fakeredis import FakeAsyncRedis
+
+import cache_manager
+from candle_columns import CandleColumns
+from indicator_calculator import update_streaming_indicators
+from indicators import calculate_adx, calculate_atr, calculate_ema, calculate_kama, calculate_macd, calculate_obv, calculate_rsi
+from indicators.streaming import STREAMING_COLUMNS, IndicatorState, update_indicators
+
+HOUR_MS = 3600000
+TOL = dict(rtol=1e-9, atol=1e-9, equal_nan=True)
+
+
+@pytest.fixture
+def series():
+    rng = np.random.default_rng(3)
+    n = 500
+    close = 100 + rng.standard_normal(n).cumsum()
+    return {
+        'openTime': np.arange(n, dtype=np.int64) * HOUR_MS,
+        'highPrice': close + rng.uniform(0.1, 2.0, n),
+        'lowPrice': close - rng.uniform(0.1, 2.0, n),
+        'closePrice': close,
+        'volume': rng.uniform(1, 10, n),
+    }
+
+
+def _reference(series, end):
+    """Те же колонки функциями calculate_* по свечам [0:end]."""
+    high, low, close, volume = (pd.Series(series[f][:end]) for f in ('highPrice', 'lowPrice', 'closePrice', 'volume'))
+    adx = calculate_adx(high, low, close, 14)
+    kama, kama_sc = calculate_kama(close, 10, 2, 30)
+    macd = calculate_macd(close, 12, 26, 9)
+    obv = calculate_obv(close, volume, 10)
+    return {
+        'adx': adx['adx'], 'di_plus': adx['di_plus'], 'di_minus': adx['di_minus'],
+        'atr': calculate_atr(high, low, close, 14),
+        'ema_50': calculate_ema(close, 50), 'ema_100': calculate_ema(close, 100), 'ema_150': calculate_ema(close, 150),
+        'kama': kama, 'kama_sc': kama_sc,
+        'macd': macd['macd'], 'macd_signal': macd['macd_signal'], 'macd_hist': macd['macd_hist'],
+        'obv': obv['obv'], 'obv_ema': obv['obv_ema'], 'rsi': calculate_rsi(close, 14),
+    }
+
+
+def _window(series, start, end):
+    return [series[f][start:end] for f in ('openTime', 'highPrice', 'lowPrice', 'closePrice', 'volume')]
+
+
+def test_resumed_state_matches_full_history(series):
+    reference = _reference(series, 500)
+
+    start, columns, state = update_indicators(*_window(series, 0, 300), None, HOUR_MS)
+    assert start == 0
+    for column in STREAMING_COLUMNS:
+        np.testing.assert_allclose(columns[column], reference[column][:300], err_msg=column, **TOL)
+
+    end = 300
+    for step in (1, 5, 40, 154):
+        new_end = end + step
+        # Окно кэша сдвигается (399 свечей), состояние проходит через to_dict/from_dict
+        window_start = max(0, new_end - 399)
+        start, columns, state = update_indicators(
+            *_window(series, window_start, new_end), IndicatorState.from_dict(state.to_dict()), HOUR_MS
+        )
+        # Последняя свеча прошлого вызова не была зафиксирована - считается заново
+        assert window_start + start == end - 1
+        for column in STREAMING_COLUMNS:
+            np.testing.assert_allclose(columns[column], reference[column][end - 1:new_end], err_msg=column, **TOL)
+        end = new_end
+
+
+def test_gap_or_changed_params_trigger_full_recompute(series):
+    _, _, state = update_indicators(*_window(series, 0, 300), None, HOUR_MS)
+
+    # Пропущена свеча после свечи состояния
+    gapped = [np.delete(values, 299) for values in _window(series, 0, 310)]
+    start, _, _ = update_indicators(*gapped, state, HOUR_MS)
+    assert start == 0
+
+    stale = state.copy()
+    stale.params = {**stale.params, 'version': 0}
+    start, _, _ = update_indicators(*_window(series, 0, 310), stale, HOUR_MS)
+    assert start == 0
+
+    start, _, _ = update_indicators(*_window(series, 0, 310), state, HOUR_MS)
+    assert start == 299
+
+
+def test_update_streaming_indicators_reuses_previous_columns(series):
+    candles = CandleColumns({f: series[f][:300] for f in series})
+    columns, state = update_streaming_indicators(candles, '1h')
+    reference = _reference(series, 300)
+    for column in STREAMING_COLUMNS:
+        np.testing.assert_allclose(columns[column], reference[column], err_msg=column, **TOL)
+
+    appended = CandleColumns({f: series[f][3:303] for f in series})
+    updated, _ = update_streaming_indicators(appended, '1h', state=state, previous=columns)
+    reference = _reference(series, 303)
+    assert updated['openTime'].tolist() == series['openTime'][3:303].tolist()
+    for column in STREAMING_COLUMNS:
+        np.testing.assert_allclose(updated[column], reference[column][3:303], err_msg=column, **TOL)
+
+    # Без прошлых значений - полный пересчет по текущему окну
+    recomputed, _ = update_streaming_indicators(appended, '1h', state=state)
+    np.testing.assert_allclose(recomputed['ema_50'], calculate_ema(pd.Series(series['closePrice'][3:303]), 50), **TOL)
+
+
+@pytest.mark.asyncio
+async def test_indicator_states_are_stored_next_to_cache(series):
+    redis_conn = FakeAsyncRedis()
+    _, _, state = update_indicators(*_window(series, 0, 300), None, HOUR_MS)
+
+    await cache_manager.save_indicator_states('1h', {'BTCUSDT': state.to_dict()}, redis_conn)
+
+    assert await redis_conn.exists('cache:1h:indicator_state')
+    loaded = await cache_manager.load_indicator_states('1h', redis_conn, symbols=['BTCUSDT', 'ETHUSDT'])
+    assert list(loaded) == ['BTCUSDT']
+    restored = IndicatorState.from_dict(loaded['BTCUSDT'])
+    assert restored.last_open_time == state.last_open_time
+    assert np.isnan(restored.smoothers['adx'].last)
+    assert restored.smoothers['ema_50'].last == state.smoothers['ema_50'].last
+
+
+@pytest.mark.asyncio
+async def test_indicator_states_expire_and_drop_delisted_symbols(series):
+    redis_conn = FakeAsyncRedis()
+    _, _, state = update_indicators(*_window(series, 0, 300), None, HOUR_MS)
+    await cache_manager.save_indicator_states('4h', {'OLDUSDT': state.to_dict(), 'BTCUSDT': state.to_dict()}, redis_conn)
+
+    # В новой публикации кэша OLDUSDT уже нет
+    await cache_manager.save_to_cache(redis_conn, '4h', {'data': [
+        {'symbol': symbol, 'data': [{'openTime': 1700000000000, 'closePrice': 1.0}]} for symbol in ('BTCUSDT', 'ETHUSDT')
+    ]})
+    await cache_manager.save_indicator_states('4h', {'ETHUSDT': state.to_dict(), 'OLDUSDT': state.to_dict()}, redis_conn)
+
+    assert sorted(await cache_manager.load_indicator_states('4h', redis_conn)) == ['BTCUSDT', 'ETHUSDT']
+    ttl = await redis_conn.ttl('cache:4h:indicator_state')
+    assert 0 < ttl <= cache_manager.INDICATOR_STATE_TTL_INTERVALS * 4 * 3600
+    assert ttl > cache_manager.INDICATOR_RESULT_TTL_SECONDS
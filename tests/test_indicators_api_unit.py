@@ -0,0 +1,144 @@
+# tests/test_indicators_api_unit.py
+"""
+Unit tests for GET /indicators/{timeframe}: расчет индикаторов по свечам
+из кэша и сохранение результатов по (таймфрейм, версия, набор, монета).
+"""
+import asyncio
+import json
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+from fastapi import HTTPException
+from fakeredis import FakeAsyncRedis
+
+import api_routes
+import cache_manager
+import indicator_calculator
+
+HOUR_MS = 3600000
+
+
+def _market_data(symbols, n=250):
+    rng = np.random.default_rng(5)
+    data = []
+    for symbol in symbols:
+        close = 100 + rng.standard_normal(n).cumsum()
+        data.append({"symbol": symbol, "exchanges": ["binance"], "data": [
+            {"openTime": 1700000000000 + i * HOUR_MS, "openPrice": p - 0.1, "highPrice": p + 1, "lowPrice": p - 1,
+             "closePrice": p, "volume": float(rng.uniform(1, 10)), "quoteVolume": float(rng.uniform(100, 1000))}
+            for i, p in enumerate(close)
+        ]})
+    return {"timeframe": "1h", "data": data}
+
+
+@pytest.fixture
+async def redis_conn():
+    conn = FakeAsyncRedis()
+    cache_manager._local_cache.clear()
+    with patch('api_routes.get_redis_connection', return_value=conn):
+        yield conn
+    await conn.flushall()
+    await conn.aclose()
+
+
+@pytest.mark.asyncio
+async def test_indicators_are_computed_once_per_cache_version(redis_conn):
+    await cache_manager.save_to_cache(redis_conn, "1h", _market_data(["BTCUSDT", "ETHUSDT"]))
+
+    with patch('api_routes.add_indicators_resumable', wraps=api_routes.add_indicators_resumable) as compute:
+        response = await api_routes.get_indicators("1h", symbols="ETHUSDT,BTCUSDT", indicator_set="rsi,atr")
+        body = json.loads(response.body)
+        assert body["indicators"] == ["atr", "rsi"]
+        assert [item["symbol"] for item in body["data"]] == ["ETHUSDT", "BTCUSDT"]
+        assert body["data"][0]["data"][-1]["rsi"] is not None and "macd" not in body["data"][0]["data"][-1]
+
+        # Тот же набор (в любом порядке) и все монеты таймфрейма - из Redis
+        again = await api_routes.get_indicators("1h", symbols="BTCUSDT,ETHUSDT", indicator_set="atr,rsi")
+        assert json.loads(again.body)["data"] == body["data"][::-1]
+        assert compute.call_count == 1
+
+        # Без symbols монеты берутся из манифеста: все посчитаны - шарды не читаются
+        with patch('api_routes.load_from_cache', wraps=api_routes.load_from_cache) as load:
+            everything = await api_routes.get_indicators("1h", symbols=None, indicator_set="rsi,atr")
+        assert [item["symbol"] for item in json.loads(everything.body)["data"]] == ["BTCUSDT", "ETHUSDT"]
+        assert load.call_count == 0 and compute.call_count == 1
+
+        # Новая публикация кэша - новая версия, расчет заново
+        await cache_manager.save_to_cache(redis_conn, "1h", _market_data(["BTCUSDT", "ETHUSDT"]))
+        await api_routes.get_indicators("1h", symbols="BTCUSDT", indicator_set="rsi,atr")
+        assert compute.call_count == 2
+
+    version = await cache_manager.get_cache_version("1h", redis_conn)
+    keys = await redis_conn.keys(f"cache:1h:v{version}:indicators:*")
+    assert len(keys) == 1 and 0 < await redis_conn.ttl(keys[0]) <= api_routes.INDICATOR_RESULT_TTL_SECONDS
+
+
+@pytest.mark.asyncio
+async def test_indicators_without_symbols_load_only_missing_shards(redis_conn):
+    await cache_manager.save_to_cache(redis_conn, "1h", _market_data(["BTCUSDT", "ETHUSDT", "SOLUSDT"]))
+    await api_routes.get_indicators("1h", symbols="ETHUSDT", indicator_set="rsi")
+
+    with patch('api_routes.load_from_cache', wraps=api_routes.load_from_cache) as load:
+        response = await api_routes.get_indicators("1h", symbols=None, indicator_set="rsi")
+
+    assert load.call_args.kwargs["symbols"] == ["BTCUSDT", "SOLUSDT"]
+    assert [item["symbol"] for item in json.loads(response.body)["data"]] == ["BTCUSDT", "ETHUSDT", "SOLUSDT"]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_indicator_requests_compute_once(redis_conn):
+    await cache_manager.save_to_cache(redis_conn, "1h", _market_data(["BTCUSDT", "ETHUSDT"]))
+
+    with patch('api_routes.add_indicators_resumable', wraps=api_routes.add_indicators_resumable) as compute:
+        responses = await asyncio.gather(*(
+            api_routes.get_indicators("1h", symbols=None, indicator_set="macd") for _ in range(3)
+        ))
+
+    # Расчет один (под ограничителем), остальные запросы получили сохраненный результат
+    assert compute.call_count == 1
+    assert len({response.body for response in responses}) == 1
+
+
+@pytest.mark.asyncio
+async def test_recursive_indicators_resume_from_saved_state(redis_conn):
+    full = _market_data(["BTCUSDT"], n=251)
+    candles = full["data"][0]["data"]
+    first = {"timeframe": "1h", "data": [{**full["data"][0], "data": candles[:250]}]}
+    second = {"timeframe": "1h", "data": [{**full["data"][0], "data": candles[1:]}]}
+
+    await cache_manager.save_to_cache(redis_conn, "1h", first)
+    await api_routes.get_indicators("1h", symbols="BTCUSDT", indicator_set="rsi,atr")
+    states = await cache_manager.load_indicator_states("1h", redis_conn)
+    assert list(states) == ["BTCUSDT"] and states["BTCUSDT"]["columns"]["openTime"][-1] == candles[249]["openTime"]
+
+    # Новая публикация (окно сдвинулось на свечу): RSI/ATR продолжаются с состояния
+    await cache_manager.save_to_cache(redis_conn, "1h", second)
+    with patch('indicator_calculator.update_streaming_indicators', wraps=indicator_calculator.update_streaming_indicators) as stream:
+        response = await api_routes.get_indicators("1h", symbols="BTCUSDT", indicator_set="rsi,atr")
+    assert stream.call_args.args[2] == states["BTCUSDT"]["state"]
+
+    resumed = json.loads(response.body)["data"][0]["data"]
+    recomputed = indicator_calculator.add_indicators(second, engine='batched', indicators=["rsi", "atr"])["data"][0]["data"]
+    assert [candle["openTime"] for candle in resumed] == [candle["openTime"] for candle in candles[1:]]
+    for column in ("rsi", "atr"):
+        np.testing.assert_allclose([c[column] for c in resumed[-50:]], [c[column] for c in recomputed[-50:]], rtol=1e-3)
+    assert [key for key in resumed[-1] if key in ("atr", "rsi")] == ["atr", "rsi"]
+
+    states = await cache_manager.load_indicator_states("1h", redis_conn)
+    assert states["BTCUSDT"]["columns"]["openTime"][-1] == candles[250]["openTime"]
+
+
+@pytest.mark.asyncio
+async def test_indicators_rejects_bad_requests(redis_conn):
+    with pytest.raises(HTTPException) as bad_set:
+        await api_routes.get_indicators("1h", symbols="BTCUSDT", indicator_set="ichimoku")
+    assert bad_set.value.status_code == 400
+
+    with pytest.raises(HTTPException) as bad_timeframe:
+        await api_routes.get_indicators("global_fr")
+    assert bad_timeframe.value.status_code == 400
+
+    with pytest.raises(HTTPException) as empty:
+        await api_routes.get_indicators("4h", symbols="BTCUSDT", indicator_set=None)
+    assert empty.value.status_code == 404
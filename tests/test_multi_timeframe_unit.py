@@ -0,0 +1,73 @@
+# tests/test_multi_timeframe_unit.py
+"""
+Unit tests for worker._process_multi_timeframe_task (несколько таймфреймов за один проход).
+"""
+import json
+from unittest.mock import patch, AsyncMock, MagicMock
+
+import pytest
+
+import worker
+
+COINS = [{'symbol': 'BTCUSDT', 'exchanges': ['binance']}]
+FR = {'BTCUSDT': [{'openTime': 1, 'fundingRate': 0.0001}]}
+
+
+@pytest.fixture
+def redis_conn():
+    conn = MagicMock()
+    conn.rpush = AsyncMock()
+    return conn
+
+
+@pytest.fixture
+def mocks():
+    with patch('worker.get_all_symbols', AsyncMock(return_value=COINS)) as get_coins, \
+         patch('worker.fetch_funding_rates', AsyncMock(return_value=FR)) as fetch_fr, \
+         patch('worker._collect_timeframe', AsyncMock(side_effect=lambda tf, *a, **k: {'timeframe': tf, 'data': [1]})) as collect, \
+         patch('worker._save_and_check_alerts', AsyncMock(return_value=True)) as save, \
+         patch('worker._build_derived_timeframe', AsyncMock(return_value=True)) as derive, \
+         patch('worker.AlertStorage', MagicMock()):
+        yield {"get_coins": get_coins, "fetch_fr": fetch_fr, "collect": collect, "save": save, "derive": derive}
+
+
+@pytest.mark.asyncio
+async def test_coins_and_fr_are_fetched_once(redis_conn, mocks):
+    payload = {"timeframes": ["1h", "4h", "8h", "1h"]}
+
+    assert await worker._process_multi_timeframe_task(redis_conn, payload) is True
+
+    mocks["get_coins"].assert_awaited_once()
+    mocks["fetch_fr"].assert_awaited_once_with(COINS)
+    collected = [c.args[0] for c in mocks["collect"].await_args_list]
+    assert collected == ["1h", "4h"]
+    assert all(c.args[4] is FR for c in mocks["collect"].await_args_list)
+    assert [c.args[0] for c in mocks["save"].await_args_list] == ["1h", "4h"]
+    mocks["derive"].assert_awaited_once()
+    assert mocks["derive"].await_args.args[:2] == ("8h", "4h")
+    redis_conn.rpush.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_single_fetched_timeframe_skips_shared_fr(redis_conn, mocks):
+    await worker._process_multi_timeframe_task(redis_conn, {"timeframes": ["1h"]})
+
+    mocks["fetch_fr"].assert_not_awaited()
+    assert mocks["collect"].await_args.args[4] is None
+
+
+@pytest.mark.asyncio
+async def test_failed_timeframes_are_requeued_with_dependencies(redis_conn, mocks):
+    async def collect(tf, *args, **kwargs):
+        if tf == "4h":
+            raise RuntimeError("boom")
+        return {'data': [1]}
+
+    mocks["collect"].side_effect = collect
+    mocks["derive"].return_value = False
+
+    await worker._process_multi_timeframe_task(redis_conn, {"timeframes": ["1h", "4h", "8h"]})
+
+    requeued = [json.loads(c.args[1]) for c in redis_conn.rpush.await_args_list]
+    assert requeued == [{"timeframes": ["4h", "8h"]}]
+    assert [c.args[0] for c in mocks["save"].await_args_list] == ["1h"]
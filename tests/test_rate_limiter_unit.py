@@ -0,0 +1,97 @@
+# tests/test_rate_limiter_unit.py
+"""
+Unit tests for data_collector.rate_limiter (адаптивные лимитеры запросов к биржам).
+"""
+import asyncio
+
+import pytest
+
+from data_collector import rate_limiter
+from data_collector.rate_limiter import AdaptiveLimiter, TokenBucket
+
+
+def test_request_weight_and_family():
+    url = "https://fapi.binance.com/fapi/v1/klines?symbol=BTCUSDT&interval=1h&limit={}"
+    assert rate_limiter.request_weight('binance', 'klines', url.format(50)) == 1
+    assert rate_limiter.request_weight('binance', 'klines', url.format(400)) == 2
+    assert rate_limiter.request_weight('binance', 'klines', url.format(800)) == 5
+    assert rate_limiter.request_weight('binance', 'klines', url.format(1500)) == 10
+    assert rate_limiter.request_weight('bybit', 'klines', url.format(800)) == 1
+
+    assert rate_limiter.endpoint_family('binance', 'oi') == 'binance:futures_data'
+    assert rate_limiter.endpoint_family('bybit', 'fr') == 'bybit:market'
+
+
+def test_retry_after_header():
+    assert rate_limiter.parse_retry_after({'retry-after': '7'}) == 7.0
+    assert rate_limiter.parse_retry_after({}) is None
+    assert rate_limiter.parse_retry_after(None) is None
+
+
+def test_token_bucket_waits_for_refill():
+    bucket = TokenBucket(capacity=10, period=1)
+    assert bucket.try_acquire(10) == 0
+    assert bucket.try_acquire(5) == pytest.approx(0.5, abs=0.05)
+
+    bucket.block(3)
+    assert bucket.try_acquire(1) == pytest.approx(3, abs=0.05)
+
+
+def test_throttle_halves_concurrency_and_pauses():
+    limiter = AdaptiveLimiter('test', capacity=100, period=1, max_concurrency=8)
+    assert limiter.concurrency == 4
+
+    pause = limiter.on_response(429, {'Retry-After': '2'})
+
+    assert pause == 2.0
+    assert limiter.concurrency == 2
+    assert limiter.stats['throttled'] == 1
+    assert limiter.bucket.try_acquire(1) > 1.5
+
+
+def test_used_weight_header_syncs_bucket_and_reduces_concurrency():
+    limiter = AdaptiveLimiter('test', capacity=2400, period=60, max_concurrency=8, weight_header='X-MBX-USED-WEIGHT-1M')
+
+    limiter.on_response(200, {'X-MBX-USED-WEIGHT-1M': '2200'})
+
+    assert limiter.concurrency == 2
+    assert limiter.bucket.tokens < limiter.bucket.capacity * 0.1
+
+
+@pytest.mark.asyncio
+async def test_used_weight_header_syncs_only_fapi_bucket():
+    fapi = rate_limiter.get_limiter('binance', 'klines')
+    futures_data = rate_limiter.get_limiter('binance', 'oi')
+    funding = rate_limiter.get_limiter('binance', 'fr')
+
+    for limiter in (fapi, futures_data, funding):
+        limiter.on_response(200, {'X-MBX-USED-WEIGHT-1M': '2200'})
+
+    assert fapi.bucket.tokens < fapi.bucket.capacity * 0.1
+    assert futures_data.bucket.tokens == futures_data.bucket.capacity
+    assert funding.bucket.tokens == funding.bucket.capacity
+
+
+def test_successes_increase_concurrency_up_to_max():
+    limiter = AdaptiveLimiter('test', capacity=100, period=1, max_concurrency=5)
+    for _ in range(50):
+        limiter.on_response(200, {})
+    assert limiter.concurrency == 5
+
+
+@pytest.mark.asyncio
+async def test_slot_limits_in_flight_requests():
+    limiter = AdaptiveLimiter('test', capacity=1000, period=1, max_concurrency=4)
+    peak = 0
+
+    async def request():
+        nonlocal peak
+        async with limiter.slot():
+            peak = max(peak, limiter.in_flight)
+            await asyncio.sleep(0.01)
+
+    await asyncio.gather(*(request() for _ in range(20)))
+
+    assert peak == limiter.concurrency == 2
+    assert limiter.in_flight == 0
+    assert limiter.stats['requests'] == 20
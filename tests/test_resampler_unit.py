@@ -0,0 +1,107 @@
+# tests/test_resampler_unit.py
+"""
+Unit tests for data_collector.resampler (старшие таймфреймы из базового ряда).
+"""
+import pytest
+
+from candle_columns import CandleColumns
+from data_collector import aggregation_8h
+from data_collector.resampler import resample_columns, resample_market_data, resample_multiple
+
+HOUR = 60 * 60 * 1000
+DAY_START = 1_704_067_200_000  # 2024-01-01 00:00 UTC
+
+
+def _hourly(count, start=DAY_START, skip=()):
+    candles = []
+    for i in range(count):
+        if i in skip:
+            continue
+        t = start + i * HOUR
+        candles.append({
+            "openTime": t, "openPrice": 100.0 + i, "highPrice": 110.0 + i, "lowPrice": 90.0 + i,
+            "closePrice": 101.0 + i, "volume": 1.0, "closeTime": t + HOUR - 1, "volumeDelta": 0.5,
+            "openInterest": 1000.0 + i,
+        })
+    return candles
+
+
+def test_resample_multiple_validation():
+    assert resample_multiple('1h', '4h') == 4
+    assert resample_multiple('1h', '1d') == 24
+    with pytest.raises(ValueError):
+        resample_multiple('4h', '6h')
+    with pytest.raises(ValueError):
+        resample_multiple('4h', '4h')
+
+
+def test_ohlcv_and_oi_of_full_buckets():
+    result = resample_columns(_hourly(8), '1h', '4h')
+    klines = result['klines'].to_records()
+
+    assert [k['openTime'] for k in klines] == [DAY_START, DAY_START + 4 * HOUR]
+    assert klines[0] == {
+        "openTime": DAY_START, "openPrice": 100.0, "highPrice": 113.0, "lowPrice": 90.0,
+        "closePrice": 104.0, "volume": 4.0, "closeTime": DAY_START + 4 * HOUR - 1, "volumeDelta": 2.0,
+    }
+    # OI - значение последней базовой свечи корзины
+    assert result['oi']['openInterest'].tolist() == [1003.0, 1007.0]
+
+
+def test_incomplete_misaligned_and_gapped_buckets_are_dropped():
+    # Старт в 01:00 -> первая корзина неполная; пропуск 06:00 -> вторая тоже
+    candles = _hourly(13, start=DAY_START + HOUR, skip=(5,))
+    klines = resample_columns(candles, '1h', '4h')['klines']
+
+    assert klines['openTime'].tolist() == [DAY_START + 8 * HOUR]
+
+
+def test_fr_takes_latest_value_in_bucket():
+    candles = _hourly(8)
+    candles[0]["fundingRate"] = 0.01
+    candles[1]["fundingRate"] = 0.02
+    fr = resample_columns(candles, '1h', '4h')['fr']
+
+    # Во второй корзине FR нет вовсе
+    assert fr['openTime'].tolist() == [DAY_START]
+    assert fr['fundingRate'].tolist() == [0.02]
+
+
+def test_4h_to_8h_matches_aggregation_8h_on_contiguous_data():
+    four_h = []
+    for i in range(12):
+        t = DAY_START + i * 4 * HOUR
+        four_h.append({
+            "openTime": t, "openPrice": 1.0 + i, "highPrice": 2.0 + i, "lowPrice": 0.5 + i, "closePrice": 1.5 + i,
+            "volume": 3.0, "closeTime": t + 4 * HOUR - 1, "volumeDelta": 1.0,
+            "openInterest": 10.0 + i, "fundingRate": 0.001 * i,
+        })
+
+    resampled = resample_columns(four_h, '4h', '8h')
+    aggregated = aggregation_8h.build_8h_columns(CandleColumns.from_records(four_h), 'S')
+
+    for key in ('klines', 'oi', 'fr'):
+        assert resampled[key].to_records() == aggregated[key].to_records()
+
+
+def test_resample_market_data_merges_all_symbols():
+    data_list = [
+        {"symbol": "BTCUSDT", "data": _hourly(24)},
+        {"symbol": "ETHUSDT", "data": _hourly(3)},
+    ]
+    merged = resample_market_data(data_list, '1h', '12h')
+
+    assert list(merged) == ["BTCUSDT"]
+    assert len(merged["BTCUSDT"]) == 2
+    assert merged["BTCUSDT"]['openInterest'].tolist() == [1011.0, 1023.0]
+
+
+def test_derived_timeframes_env_skips_malformed_pairs(caplog):
+    from config import _parse_derived_timeframes
+
+    default = {'8h': '4h'}
+    assert _parse_derived_timeframes("8h:4h,12h:4h,", default) == {'8h': '4h', '12h': '4h'}
+    assert _parse_derived_timeframes("8h:4h, 12h,1d:4h:1h, :1h", default) == {'8h': '4h'}
+    assert _parse_derived_timeframes("12h", default) == default
+    assert _parse_derived_timeframes(None, default) == default
+    assert "DERIVED_TIMEFRAMES" in caplog.text
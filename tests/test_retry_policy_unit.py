@@ -0,0 +1,72 @@
+# tests/test_retry_policy_unit.py
+"""
+Unit tests for data_collector.retry_policy (повторы с backoff/jitter и бюджетом времени).
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from unittest.mock import patch
+
+import pytest
+
+from data_collector import retry_policy
+from data_collector.retry_policy import RetryableFetchError, run_with_retry
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    retry_policy.reset_retry_stats()
+    yield
+    retry_policy.reset_retry_stats()
+
+
+def test_backoff_respects_cap_and_retry_after():
+    with patch('data_collector.retry_policy.random.uniform', side_effect=lambda a, b: b):
+        assert retry_policy.backoff_delay(1) == retry_policy.RETRY_BASE_DELAY
+        assert retry_policy.backoff_delay(30) == retry_policy.RETRY_MAX_DELAY
+        assert retry_policy.backoff_delay(1, retry_after=3.0) == 3.0
+
+
+@pytest.mark.asyncio
+async def test_attempts_are_exhausted():
+    calls = 0
+
+    async def attempt():
+        nonlocal calls
+        calls += 1
+        raise RetryableFetchError("HTTP 500")
+
+    with patch('data_collector.retry_policy.RETRY_BASE_DELAY', 0.001):
+        assert await run_with_retry(attempt, 'bybit', 'klines BTCUSDT') is None
+
+    assert calls == retry_policy.RETRY_MAX_ATTEMPTS
+    assert retry_policy.retry_stats()['bybit']['exhausted'] == 1
+    assert retry_policy.retry_stats()['bybit']['retries'] == retry_policy.RETRY_MAX_ATTEMPTS - 1
+
+
+@pytest.mark.asyncio
+async def test_task_budget_stops_slow_requests():
+    async def slow_attempt():
+        await asyncio.sleep(1)
+
+    async def throttled_attempt():
+        raise RetryableFetchError("HTTP 429", retry_after=60)
+
+    with patch('data_collector.retry_policy.RETRY_TASK_BUDGET_SECONDS', 0.05):
+        assert await run_with_retry(slow_attempt, 'binance', 'oi BTCUSDT') is None
+        assert await run_with_retry(throttled_attempt, 'binance', 'oi BTCUSDT') is None
+
+    assert retry_policy.retry_stats()['binance']['budget_exceeded'] == 2
+
+
+@pytest.mark.asyncio
+async def test_slot_wait_is_excluded_from_budget():
+    @asynccontextmanager
+    async def slow_slot():
+        await asyncio.sleep(0.2)
+        yield
+
+    async def attempt():
+        return 'ok'
+
+    with patch('data_collector.retry_policy.RETRY_TASK_BUDGET_SECONDS', 0.05):
+        assert await run_with_retry(attempt, 'binance', 'oi BTCUSDT', slot=slow_slot) == 'ok'
@@ -0,0 +1,45 @@
+# tests/test_service_mode_unit.py
+"""
+Unit tests for SERVICE_MODE (API без воркера / API + воркер в одном процессе).
+"""
+import asyncio
+from unittest.mock import patch, AsyncMock
+
+import pytest
+
+import main
+
+
+async def _run_lifespan():
+    async with main.lifespan(main.app):
+        await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_api_mode_does_not_start_worker():
+    worker_main = AsyncMock()
+    with patch('main.SERVICE_MODE', 'api'), patch('main.main', worker_main), \
+         patch('main.close_http_session', AsyncMock()):
+        await _run_lifespan()
+
+    worker_main.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_combined_mode_starts_and_cancels_worker():
+    started, cancelled = asyncio.Event(), asyncio.Event()
+
+    async def worker_main():
+        started.set()
+        try:
+            await asyncio.sleep(3600)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    with patch('main.SERVICE_MODE', 'combined'), patch('main.main', worker_main), \
+         patch('main.close_http_session', AsyncMock()):
+        await _run_lifespan()
+
+    assert started.is_set()
+    assert cancelled.is_set()
@@ -0,0 +1,104 @@
+# tests/test_streaming_pipeline_unit.py
+"""
+Unit tests for the streaming pipeline in data_collector (парсинг и слияние по мере прихода ответов).
+"""
+import asyncio
+from unittest.mock import patch, AsyncMock
+
+import pytest
+
+import data_collector
+from data_collector import data_processing
+
+HOUR = 60 * 60 * 1000
+START = 1_704_067_200_000
+
+
+def _klines(raw, timeframe):
+    return [
+        {"openTime": START + i * HOUR, "openPrice": p, "highPrice": p, "lowPrice": p,
+         "closePrice": p, "volume": 1.0, "closeTime": START + (i + 1) * HOUR - 1, "volumeDelta": 0.0}
+        for i, p in enumerate(raw)
+    ]
+
+
+def _oi(raw, timeframe):
+    return [{"openTime": START + i * HOUR, "openInterest": v, "closeTime": START + i * HOUR} for i, v in enumerate(raw)]
+
+
+def _task(symbol, data_type, raw, parser, delay=0.0, fails=False):
+    async def strategy(session, task_info, semaphore):
+        await asyncio.sleep(delay)
+        if fails:
+            raise RuntimeError("network down")
+        return task_info, raw
+
+    return {
+        "fetch_strategy": strategy,
+        "parser": parser,
+        "timeframe": "1h",
+        "task_info": {"symbol": symbol, "data_type": data_type, "exchange": "binance", "url": "test"},
+    }
+
+
+def _tasks():
+    return [
+        _task("BTCUSDT", "klines", [1.0, 2.0, 3.0], _klines, delay=0.02),
+        _task("BTCUSDT", "oi", [10.0, 20.0, 30.0], _oi),
+        _task("ETHUSDT", "klines", [5.0, 6.0], _klines),
+        _task("ETHUSDT", "oi", [1.0], _oi, fails=True),
+    ]
+
+
+@pytest.fixture(autouse=True)
+def session():
+    # Парсеры теста локальные - считаем в текущем процессе, без пула
+    with patch("data_collector.get_http_session", AsyncMock(return_value=None)), \
+         patch.object(data_collector.cpu_pool.cpu_pool, "workers", 0):
+        yield
+
+
+@pytest.mark.asyncio
+async def test_streaming_matches_batch_merge():
+    fr = {"BTCUSDT": [{"openTime": START, "fundingRate": 0.001, "closeTime": START}]}
+
+    processed = await data_collector._fetch_and_parse(_tasks(), "[TEST]", fr)
+    expected = data_processing.merge_columns(processed)
+    streamed = await data_collector._fetch_parse_merge_streaming(_tasks(), "[TEST]", fr)
+
+    assert set(streamed) == set(expected) == {"BTCUSDT", "ETHUSDT"}
+    for symbol in expected:
+        assert streamed[symbol].to_records() == expected[symbol].to_records()
+    assert streamed["BTCUSDT"].to_records()[-1]["openInterest"] == 30.0
+    assert streamed["BTCUSDT"].to_records()[-1]["fundingRate"] == 0.001
+
+
+@pytest.mark.asyncio
+async def test_symbol_is_merged_as_soon_as_its_responses_arrive():
+    merged_order = []
+    original_merge = data_processing.merge_columns
+
+    def tracking_merge(processed_data):
+        merged_order.extend(processed_data)
+        return original_merge(processed_data)
+
+    with patch("data_collector.data_processing.merge_columns", side_effect=tracking_merge):
+        await data_collector._fetch_parse_merge_streaming(_tasks(), "[TEST]")
+
+    # ETHUSDT ответил сразу и слит до медленных Klines BTCUSDT
+    assert merged_order == ["ETHUSDT", "BTCUSDT"]
+
+
+@pytest.mark.asyncio
+async def test_fetch_market_data_uses_streaming_when_enabled():
+    coins = [{"symbol": "BTCUSDT", "exchanges": ["binance"]}, {"symbol": "ETHUSDT", "exchanges": ["binance"]}]
+
+    with patch("data_collector.task_builder.prepare_tasks", return_value=_tasks()), \
+         patch("data_collector.STREAMING_PIPELINE", True), \
+         patch("data_collector._fetch_and_parse", AsyncMock()) as batch_path:
+        result = await data_collector.fetch_market_data(coins, "1h")
+
+    batch_path.assert_not_awaited()
+    assert [item["symbol"] for item in result["data"]] == ["BTCUSDT", "ETHUSDT"]
+    # Последняя (незакрытая) свеча отброшена
+    assert len(result["data"][0]["data"]) == 2
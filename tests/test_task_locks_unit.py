@@ -0,0 +1,115 @@
+# tests/test_task_locks_unit.py
+"""
+Unit tests for task_locks (блокировки по типу задачи с продлеваемой арендой).
+"""
+import asyncio
+import json
+from unittest.mock import patch, AsyncMock
+
+import fakeredis
+import pytest
+
+import worker
+from task_locks import LeaseLostError, TaskLease, poll_delays, running_task_types, task_dependencies, task_lock_key, task_types
+
+
+@pytest.fixture
+def redis_conn():
+    return fakeredis.FakeAsyncRedis()
+
+
+def test_task_types_and_dependencies():
+    assert task_types({"timeframe": "1h"}) == ["1h"]
+    assert task_types({"timeframes": ["4h", "8h", "4h"]}) == ["4h", "8h"]
+    assert task_dependencies(["8h"]) == ["4h"]
+    # Базовый таймфрейм входит в ту же задачу - ждать нечего
+    assert task_dependencies(["4h", "8h"]) == []
+
+
+@pytest.mark.asyncio
+async def test_lease_is_all_or_nothing_and_owned(redis_conn):
+    first = TaskLease(redis_conn, ["4h"], lease_seconds=30)
+    second = TaskLease(redis_conn, ["1h", "4h"], lease_seconds=30)
+
+    assert await first.try_acquire()
+    # 4h занят - 1h тоже не остается захваченным
+    assert not await second.try_acquire()
+    assert await running_task_types(redis_conn, ["1h", "4h"]) == ["4h"]
+
+    # Чужой токен не продлевает и не снимает блокировку
+    await redis_conn.set(task_lock_key("4h"), "someone-else", ex=30)
+    assert not await first.renew()
+    await first.release()
+    assert await redis_conn.get(task_lock_key("4h")) == b"someone-else"
+
+    await redis_conn.delete(task_lock_key("4h"))
+    assert await second.try_acquire()
+    await redis_conn.expire(task_lock_key("1h"), 1)
+    assert await second.renew()
+    assert await redis_conn.ttl(task_lock_key("1h")) > 1
+    await second.release()
+    assert await running_task_types(redis_conn, ["1h", "4h"]) == []
+
+
+@pytest.mark.asyncio
+async def test_lost_lease_stops_task_before_it_writes(redis_conn):
+    lease = TaskLease(redis_conn, ["4h"], lease_seconds=1)
+    saved = []
+
+    with pytest.raises(LeaseLostError):
+        async with lease.held(poll_seconds=0.01):
+            # Другой воркер перехватил блокировку (например, после паузы GC/сети)
+            await redis_conn.set(task_lock_key("4h"), "someone-else", ex=30)
+            await asyncio.sleep(2)
+            saved.append("4h")
+
+    assert saved == []
+    assert await redis_conn.get(task_lock_key("4h")) == b"someone-else"
+
+
+def test_poll_delays_back_off_to_cap():
+    delays = poll_delays(2, maximum=15)
+    values = [next(delays) for _ in range(6)]
+
+    assert 1.6 <= values[0] <= 2.4
+    assert values[1] > values[0] * 1.3
+    assert all(value <= 15 * 1.2 for value in values) and values[-1] >= 15 * 0.8
+
+
+@pytest.mark.asyncio
+async def test_worker_runs_different_timeframes_in_parallel(redis_conn):
+    started = set()
+    release = asyncio.Event()
+
+    async def process(conn, task_json):
+        started.add(json.loads(task_json)["timeframe"])
+        await release.wait()
+        return True
+
+    original_take = worker.ReliableTaskQueue.take
+
+    async def blocking_take(self, timeout):
+        task_json = await original_take(self, timeout)
+        if task_json is None:
+            await asyncio.sleep(timeout)
+        return task_json
+
+    await redis_conn.rpush(worker.REDIS_TASK_QUEUE_KEY, json.dumps({"timeframe": "4h"}), json.dumps({"timeframe": "1h"}))
+
+    with patch('task_queue.ReliableTaskQueue.take', blocking_take), \
+         patch('worker.check_redis_health', AsyncMock(return_value=True)), \
+         patch('worker.get_redis_connection', AsyncMock(return_value=redis_conn)), \
+         patch('worker._process_task_json', side_effect=process), \
+         patch('worker.WORKER_QUEUE_BLOCK_TIMEOUT', 0.05), \
+         patch('worker.WORKER_MAX_PARALLEL_TASKS', 2):
+        loop_task = asyncio.create_task(worker.background_worker())
+        while len(started) < 2:
+            await asyncio.sleep(0.01)
+        # Сбор 4h не блокирует 1h: обе задачи держат свои блокировки одновременно
+        assert await running_task_types(redis_conn, ["1h", "4h"]) == ["1h", "4h"]
+        release.set()
+        await asyncio.sleep(0.1)
+        assert await running_task_types(redis_conn, ["1h", "4h"]) == []
+        loop_task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await loop_task
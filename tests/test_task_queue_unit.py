@@ -0,0 +1,100 @@
+# tests/test_task_queue_unit.py
+"""
+Unit tests for task_queue (надежная очередь: BLMOVE, processing-список, восстановление).
+"""
+import asyncio
+import json
+from unittest.mock import patch, AsyncMock
+
+import fakeredis
+import pytest
+
+import worker
+from config import WORKER_LOCK_VALUE
+from task_locks import task_lock_key
+from task_queue import ReliableTaskQueue
+
+QUEUE = "test_queue"
+
+
+@pytest.fixture
+def redis_conn():
+    return fakeredis.FakeAsyncRedis()
+
+
+@pytest.mark.asyncio
+async def test_take_moves_task_to_processing_until_ack(redis_conn):
+    queue = ReliableTaskQueue(redis_conn, QUEUE, consumer_id="w1")
+    await queue.register()
+    await redis_conn.rpush(QUEUE, '{"timeframe": "1h"}')
+
+    task_json = await queue.take(timeout=0.1)
+
+    assert task_json == '{"timeframe": "1h"}'
+    assert await redis_conn.llen(QUEUE) == 0
+    assert await queue.pending() == [task_json]
+
+    await queue.ack(task_json)
+    assert await queue.pending() == []
+    assert await queue.take(timeout=0.1) is None
+
+
+@pytest.mark.asyncio
+async def test_tasks_of_dead_consumer_are_recovered(redis_conn):
+    dead = ReliableTaskQueue(redis_conn, QUEUE, consumer_id="dead")
+    alive = ReliableTaskQueue(redis_conn, QUEUE, consumer_id="alive")
+    await dead.register()
+    await alive.register()
+    await redis_conn.rpush(QUEUE, "a", "b", "c")
+    await dead.take(0.1)
+    await dead.take(0.1)
+
+    # Живой потребитель чужие задачи не трогает
+    assert await alive.recover_orphans() == 0
+
+    # Ключ жизни истек - задачи возвращаются в начало очереди в исходном порядке
+    await redis_conn.delete(dead.consumer_key())
+    assert await alive.recover_orphans() == 2
+    assert await redis_conn.lrange(QUEUE, 0, -1) == [b"a", b"b", b"c"]
+    assert await redis_conn.smembers(alive.consumers_key) == {b"alive"}
+
+
+@pytest.mark.asyncio
+async def test_worker_takes_lock_only_for_work_and_acks(redis_conn):
+    processed = []
+
+    async def process(conn, task_json):
+        processed.append((task_json, await conn.get(task_lock_key("1h"))))
+        return True
+
+    original_take = ReliableTaskQueue.take
+
+    async def blocking_take(self, timeout):
+        # fakeredis не блокируется на BLMOVE - имитируем ожидание
+        task_json = await original_take(self, timeout)
+        if task_json is None:
+            await asyncio.sleep(timeout)
+        return task_json
+
+    await redis_conn.rpush(worker.REDIS_TASK_QUEUE_KEY, json.dumps({"timeframe": "1h"}))
+
+    with patch('task_queue.ReliableTaskQueue.take', blocking_take), \
+         patch('worker.check_redis_health', AsyncMock(return_value=True)), \
+         patch('worker.get_redis_connection', AsyncMock(return_value=redis_conn)), \
+         patch('worker._process_task_json', side_effect=process), \
+         patch('worker.WORKER_QUEUE_BLOCK_TIMEOUT', 0.05):
+        loop_task = asyncio.create_task(worker.background_worker())
+        while not processed:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.1)
+        # Очередь пуста - блокировка не занята
+        assert await redis_conn.get(task_lock_key("1h")) is None
+        loop_task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await loop_task
+
+    [(task_json, token)] = processed
+    assert task_json == '{"timeframe": "1h"}'
+    assert token.decode().startswith(WORKER_LOCK_VALUE)
+    assert await redis_conn.llen(worker.REDIS_TASK_QUEUE_KEY) == 0
+    assert await redis_conn.smembers(f"{worker.REDIS_TASK_QUEUE_KEY}:consumers") == set()
@@ -12,11 +12,15 @@ BYBIT_BASE_URL = "https://api.bybit.com"
 
 # --- BINANCE URL Builders ---
 
-def get_binance_klines_url(symbol_api: str, interval: str, limit: int = 400) -> str:
+def get_binance_klines_url(symbol_api: str, interval: str, limit: int = 400, start_time: Optional[int] = None) -> str:
     """
     Формирует URL для получения Klines (свечей) с Binance Futures.
+    start_time (мс) - инкрементальное обновление: свечи начиная с этого openTime.
     """
-    return f"{BINANCE_BASE_URL}/fapi/v1/klines?symbol={symbol_api}&interval={interval}&limit={limit}"
+    url = f"{BINANCE_BASE_URL}/fapi/v1/klines?symbol={symbol_api}&interval={interval}&limit={limit}"
+    if start_time is not None:
+        url += f"&startTime={start_time}"
+    return url
 
 def get_binance_open_interest_url(symbol_api: str, period: str, limit: int = 400) -> str:
     """
@@ -36,10 +40,11 @@ def get_binance_funding_rate_url(symbol_api: str, limit: int = 400) -> str:
 
 # --- BYBIT URL Builders ---
 
-def get_bybit_klines_url(symbol_api: str, interval: str, limit: int = 400) -> str:
+def get_bybit_klines_url(symbol_api: str, interval: str, limit: int = 400, start_time: Optional[int] = None) -> str:
     """
     Формирует URL для получения Klines (свечей) с Bybit V5 (Linear).
     Bybit использует минуты (1h=60, 4h=240, 1D=D).
+    start_time (мс) - инкрементальное обновление (параметры start + limit).
     """
     interval_map = {
         '1h': '60',
@@ -50,11 +55,17 @@ def get_bybit_klines_url(symbol_api: str, interval: str, limit: int = 400) -> st
     }
     bybit_interval = interval_map.get(interval, '60') # По умолчанию 1h
 
-    # Bybit V5 Klines: limit (макс 200) устанавливается в fetch_strategies,
-    # так как мы используем пагинацию.
-    # Мы запрашиваем 800 свечей 4h (для 8h),
-    # fetch_bybit_paginated сделает 4 запроса по 200.
-    return f"{BYBIT_BASE_URL}/v5/market/klines?category=linear&symbol={symbol_api}&interval={bybit_interval}"
+    # Bybit V5 Klines: за один запрос не больше 200 свечей.
+    # limit здесь - ЗАПРОШЕННОЕ количество (например 800 свечей 4h для 8h):
+    # fetch_bybit_paginated разбивает его на окна start/end по 200 свечей
+    # и запрашивает их параллельно.
+    url = f"{BYBIT_BASE_URL}/v5/market/kline?category=linear&symbol={symbol_api}&interval={bybit_interval}"
+    if start_time is not None:
+        # Инкрементальный запрос укладывается в одну страницу (макс 200)
+        url += f"&start={start_time}&limit={min(limit, 200)}"
+    else:
+        url += f"&limit={limit}"
+    return url
 
 def get_bybit_open_interest_url(symbol_api: str, period: str, limit: int = 400) -> str:
     """
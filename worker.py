@@ -6,26 +6,31 @@ import aiohttp
 import json
 import time
 import os 
+import signal
 from redis.asyncio import Redis as AsyncRedis 
 
 # --- Импорты из config ---
 try:
     from config import (
         REDIS_TASK_QUEUE_KEY,
-        WORKER_LOCK_KEY,
-        WORKER_LOCK_TIMEOUT_SECONDS,
-        WORKER_LOCK_VALUE, 
+        WORKER_LOCK_LEASE_SECONDS,
+        WORKER_MAX_PARALLEL_TASKS,
         ALLOWED_CACHE_KEYS,
+        DERIVED_TIMEFRAMES,
+        INCREMENTAL_REFRESH_TIMEFRAMES,
+        WORKER_QUEUE_BLOCK_TIMEOUT,
         TG_BOT_TOKEN_KEY,
         TG_USER_KEY,
     )
 except ImportError:
     # Фоллбэки
     REDIS_TASK_QUEUE_KEY = "data_collector_task_queue"
-    WORKER_LOCK_KEY = "data_collector_lock"
-    WORKER_LOCK_TIMEOUT_SECONDS = 1800
-    WORKER_LOCK_VALUE = "processing"
+    WORKER_LOCK_LEASE_SECONDS = 60
+    WORKER_MAX_PARALLEL_TASKS = 2
     ALLOWED_CACHE_KEYS = ['1h', '4h', '8h', '12h', '1d', 'global_fr']
+    DERIVED_TIMEFRAMES = {'8h': '4h'}
+    INCREMENTAL_REFRESH_TIMEFRAMES = ['1h', '4h', '12h', '1d']
+    WORKER_QUEUE_BLOCK_TIMEOUT = 20
     TG_BOT_TOKEN_KEY = os.environ.get("TG_BOT_TOKEN")
     TG_USER_KEY = os.environ.get("TG_USER")
 
@@ -38,17 +43,23 @@ from cache_manager import (
     load_from_cache,
     save_to_cache, 
 )
+from task_queue import ReliableTaskQueue
+from task_locks import LeaseLostError, TaskLease, poll_delays, running_task_types, task_dependencies, task_lock_key, task_types
 
 # --- Импорты других модулей проекта ---
 try:
     # --- ИЗМЕНЕНИЕ №1: Используем абсолютные импорты от корня ---
     from data_collector import fetch_market_data
     from data_collector.aggregation_8h import generate_and_save_8h_cache
+    from data_collector.resampler import generate_and_save_resampled_cache
     from data_collector.logging_setup import logger
+    from data_collector.http_session import close_http_session
+    from data_collector.cpu_pool import cpu_pool
     from data_collector.coin_source import get_coins as get_all_symbols
     
     # --- ИЗМЕНЕНИЕ №1: Исправляем импорт FR ---
     from data_collector import get_global_fr_data 
+    from data_collector.fr_fetcher import fetch_funding_rates
     
     # --- ИЗМЕНЕНИЕ №1: Импорт Alert Manager (абсолютный) ---
     from alert_manager.storage import AlertStorage
@@ -60,15 +71,26 @@ except ImportError as e: # --- Добавил 'e' для дебага ---
     # --- ОБНОВЛЕНО: Логгируем саму ошибку импорта ---
     logger.error(f"Не удалось импортировать зависимости: {e}", exc_info=True)
     
-    async def fetch_market_data(coins, timeframe): 
+    async def fetch_market_data(coins, timeframe, **kwargs): 
         logger.error("Mock: Не удалось запустить fetch_market_data.")
         return {}
     async def generate_and_save_8h_cache(data_4h, coins): 
         logger.error("Mock: Не удалось запустить generate_and_save_8h_cache.")
         pass
+    async def generate_and_save_resampled_cache(data, coins, base_tf, target_tf):
+        logger.error("Mock: Не удалось запустить generate_and_save_resampled_cache.")
+        pass
     async def get_all_symbols(): 
         logger.error("Mock: Не удалось запустить get_all_symbols.")
         return []
+    async def close_http_session():
+        pass
+    class _NoCpuPool:
+        def shutdown(self): pass
+    cpu_pool = _NoCpuPool()
+    async def fetch_funding_rates(coins):
+        logger.error("Mock: Не удалось запустить fetch_funding_rates.")
+        return None
             
     # Заглушка для fr_fetcher
     async def get_global_fr_data(): # --- ИЗМЕНЕНИЕ №1 (Заглушка) ---
@@ -83,23 +105,12 @@ except ImportError as e: # --- Добавил 'e' для дебага ---
 
 
 # --- КОНСТАНТЫ ВОЗВРАТА ---
-WORKER_RETRY_DELAY = 2  # Проверка очереди каждые 2 секунды
+WORKER_RETRY_DELAY = 2  # Пауза после ошибки цикла / между попытками взять блокировку
 FR_UPDATE_FREQUENCY_SECONDS = 1800 # 30 минут
 
 
-async def _get_and_process_task_from_queue(redis_conn: AsyncRedis) -> bool:
-    """
-    Вынимает и обрабатывает одну задачу из очереди.
-    """
-    
-    # 1. Получаем задачу
-    logger.info(f"[TASK_PROCESSOR] >>> Попытка получить задачу из очереди '{REDIS_TASK_QUEUE_KEY}'...")
-    task_json = await redis_conn.lpop(REDIS_TASK_QUEUE_KEY)
-    
-    if not task_json:
-        logger.info(f"[TASK_PROCESSOR] <<< Очередь пуста (lpop вернул None).")
-        return False 
-    
+async def _process_task_json(redis_conn: AsyncRedis, task_json: Any) -> bool:
+    """Обрабатывает одну задачу (JSON из очереди)."""
     if isinstance(task_json, bytes):
         task_json = task_json.decode('utf-8')
 
@@ -112,6 +123,10 @@ async def _get_and_process_task_from_queue(redis_conn: AsyncRedis) -> bool:
         logger.error(f"[TASK_PROCESSOR] ❌ Не удалось декодировать JSON задачи: {task_json}. Ошибка: {e}")
         return True 
 
+    # Мульти-таймфреймовая задача: {"timeframes": [...]} - один проход воркера
+    if task_payload.get("timeframes"):
+        return await _process_multi_timeframe_task(redis_conn, task_payload)
+
     timeframe = task_payload.get("timeframe")
     
     if not timeframe:
@@ -123,12 +138,7 @@ async def _get_and_process_task_from_queue(redis_conn: AsyncRedis) -> bool:
 
     # 2. Обрабатываем задачу FR
     if timeframe == 'global_fr':
-        try:
-            logger.info(f"{log_prefix} Запуск обновления 'cache:global_fr' через get_global_fr_data()...")
-            # --- ИЗМЕНЕНИЕ №2: Исправляем вызов ---
-            await get_global_fr_data()
-        except Exception as e:
-            logger.error(f"{log_prefix} ❌ Ошибка при обновлении FR: {e}", exc_info=True)
+        await _run_global_fr_update(log_prefix)
         return True
 
     # --- ИЗМЕНЕНИЕ №3: Инициализируем AlertStorage ---
@@ -142,36 +152,21 @@ async def _get_and_process_task_from_queue(redis_conn: AsyncRedis) -> bool:
     
     try:
         # Получаем список монет
-        logger.info(f"{log_prefix} Запрашиваю список монет через get_all_symbols()...")
-        all_coins = await get_all_symbols()
-        logger.info(f"{log_prefix} Получено монет: {len(all_coins) if all_coins else 0}")
-        
+        all_coins = await _get_coins(log_prefix)
         if not all_coins:
-            logger.error(f"{log_prefix} ❌ Не удалось получить список монет. all_coins = {all_coins}")
             return True
         
-        # --- (ОРИГИНАЛЬНАЯ ЛОГИКА 8h (399 -> 199) - СОХРАНЕНА) ---
-        if timeframe == '8h':
-            logger.info(f"{log_prefix} Проверка зависимости: загрузка 'cache:4h'...")
-            data_4h = await load_from_cache('4h', redis_conn=redis_conn)
-            
-            if not data_4h or not data_4h.get('data'):
-                logger.warning(f"{log_prefix} ⚠️ Зависимость: Отсутствуют или пусты данные 'cache:4h'. Агрегация 8h невозможна.")
-                logger.info(f"{log_prefix} Возвращаю задачу '8h' обратно в очередь (конец)...")
-                await redis_conn.rpush(REDIS_TASK_QUEUE_KEY, json.dumps(task_payload)) 
+        # --- Производные таймфреймы (8h из 4h и т.п.) строятся из кэша базового ---
+        base_timeframe = DERIVED_TIMEFRAMES.get(timeframe)
+        if base_timeframe:
+            if not await _build_derived_timeframe(timeframe, base_timeframe, all_coins, redis_conn, log_prefix):
+                # Зависимость явная: одна задача "сначала базовый, затем производный"
+                # (вместо повторной постановки '{timeframe}' в конец очереди по кругу)
+                await _requeue_with_dependencies(redis_conn, [timeframe], log_prefix)
                 return True
-            
-            logger.info(f"{log_prefix} Запуск агрегации 4h->8h...")
-            
-            # (Передаем 399 свечей 4h, чтобы получить ~199 свечей 8h)
-            await generate_and_save_8h_cache(data_4h.get('data'), all_coins)
-            
-            logger.info(f"{log_prefix} Агрегация 4h->8h завершена.")
         else:
             # (Обычный путь для 1h, 4h, 12h, 1d)
-            logger.info(f"{log_prefix} Запуск fetch_market_data()...")
-            klines_data = await fetch_market_data(all_coins, timeframe)
-            logger.info(f"{log_prefix} fetch_market_data() завершён.")
+            klines_data = await _collect_timeframe(timeframe, all_coins, redis_conn, log_prefix)
             
             if not klines_data:
                 logger.warning(f"{log_prefix} ⚠️ Не получено данных Klines для {timeframe}.")
@@ -187,40 +182,228 @@ async def _get_and_process_task_from_queue(redis_conn: AsyncRedis) -> bool:
 
 
     # 4. Сохранение в кэш
-    if final_data: # (Для 8h это будет False, что корректно)
-        try:
-            logger.info(f"{log_prefix} Сохранение данных в 'cache:{timeframe}'...")
-            await save_to_cache(redis_conn, timeframe, final_data)
-            logger.info(f"{log_prefix} ✅ Данные успешно сохранены в кэш.")
-            
-            # --- ИЗМЕНЕНИЕ №3: "Включаем" проверку алертов (только для 1h) ---
-            if timeframe == '1h':
-                try:
-                    logger.info(f"{log_prefix} 🚀 Запуск проверки алертов (Line/VWAP)...")
-                    # Передаем 'final_data' (это 'cache_data') и 'storage'
-                    await run_alert_checks(final_data, storage)
-                except Exception as e:
-                    # (Ловим ошибку здесь, чтобы она не сломала основной цикл воркера)
-                    logger.error(f"{log_prefix} 💥 Ошибка во время проверки алертов: {e}", exc_info=True)
-            # --- КОНЕЦ ИЗМЕНЕНИЯ №3 ---
-            
-        except Exception as e:
-            logger.error(f"{log_prefix} ❌ Ошибка при СОХРАНЕНИИ в кэш: {e}", exc_info=True)
+    if final_data: # (Для производных таймфреймов это будет False, что корректно)
+        if not await _save_and_check_alerts(timeframe, final_data, redis_conn, storage, log_prefix):
             logger.info(f"{log_prefix} Возвращаю задачу обратно в очередь (ошибка сохранения)...")
             await redis_conn.rpush(REDIS_TASK_QUEUE_KEY, json.dumps(task_payload))
             return True
             
     else:
-        if timeframe != '8h':
+        if timeframe not in DERIVED_TIMEFRAMES:
             logger.warning(f"{log_prefix} ⚠️ final_data пустой. Ничего не сохранено в кэш.")
         else:
-            logger.info(f"{log_prefix} ✅ Кэш '8h' сохранен внутри generate_and_save_8h_cache. Пропускаю дублирующее сохранение.")
+            logger.info(f"{log_prefix} ✅ Кэш '{timeframe}' сохранен при построении из базового таймфрейма. Пропускаю дублирующее сохранение.")
 
 
     logger.info(f"{log_prefix} 🎉 Задача '{timeframe}' полностью обработана.")
     return True
 
 
+# --- Шаги обработки задачи (общие для одиночных и мульти-таймфреймовых задач) ---
+
+async def _run_global_fr_update(log_prefix: str) -> None:
+    try:
+        logger.info(f"{log_prefix} Запуск обновления 'cache:global_fr' через get_global_fr_data()...")
+        # --- ИЗМЕНЕНИЕ №2: Исправляем вызов ---
+        await get_global_fr_data()
+    except Exception as e:
+        logger.error(f"{log_prefix} ❌ Ошибка при обновлении FR: {e}", exc_info=True)
+
+
+async def _get_coins(log_prefix: str) -> Optional[List[Dict]]:
+    logger.info(f"{log_prefix} Запрашиваю список монет через get_all_symbols()...")
+    all_coins = await get_all_symbols()
+    logger.info(f"{log_prefix} Получено монет: {len(all_coins) if all_coins else 0}")
+    
+    if not all_coins:
+        logger.error(f"{log_prefix} ❌ Не удалось получить список монет. all_coins = {all_coins}")
+        return None
+    return all_coins
+
+
+async def _build_derived_timeframe(
+    timeframe: str,
+    base_timeframe: str,
+    all_coins: List[Dict],
+    redis_conn: AsyncRedis,
+    log_prefix: str
+) -> bool:
+    """Строит производный таймфрейм из cache:{base}. False - базового кэша нет."""
+    logger.info(f"{log_prefix} Проверка зависимости: загрузка 'cache:{base_timeframe}'...")
+    data_base = await load_from_cache(base_timeframe, redis_conn=redis_conn, as_columns=True)
+    
+    if not data_base or not data_base.get('data'):
+        logger.warning(f"{log_prefix} ⚠️ Зависимость: Отсутствуют или пусты данные 'cache:{base_timeframe}'. Построение {timeframe} невозможно.")
+        return False
+    
+    if timeframe == '8h' and base_timeframe == '4h':
+        # (ОРИГИНАЛЬНАЯ ЛОГИКА 8h (399 -> 199) - СОХРАНЕНА)
+        logger.info(f"{log_prefix} Запуск агрегации 4h->8h...")
+        await generate_and_save_8h_cache(data_base.get('data'), all_coins)
+        logger.info(f"{log_prefix} Агрегация 4h->8h завершена.")
+    else:
+        logger.info(f"{log_prefix} Запуск ресемплинга {base_timeframe}->{timeframe}...")
+        await generate_and_save_resampled_cache(data_base.get('data'), all_coins, base_timeframe, timeframe)
+        logger.info(f"{log_prefix} Ресемплинг {base_timeframe}->{timeframe} завершен.")
+    return True
+
+
+async def _collect_timeframe(
+    timeframe: str,
+    all_coins: List[Dict],
+    redis_conn: AsyncRedis,
+    log_prefix: str,
+    prefetched_fr_data: Optional[Dict[str, List[Dict]]] = None
+) -> Optional[Dict[str, Any]]:
+    """Сбор таймфрейма с бирж (инкрементально, если есть кэш)."""
+    kwargs = {}
+    if prefetched_fr_data is not None:
+        kwargs['prefetched_fr_data'] = prefetched_fr_data
+
+    # Инкрементальный режим: текущий кэш -> запрашиваются только новые свечи
+    if timeframe in INCREMENTAL_REFRESH_TIMEFRAMES:
+        cached = await load_from_cache(timeframe, redis_conn=redis_conn, as_columns=True)
+        if cached and cached.get('data'):
+            kwargs['previous_data'] = {item['symbol']: item['data'] for item in cached['data'] if item.get('symbol')}
+            logger.info(f"{log_prefix} Найден кэш для {len(kwargs['previous_data'])} монет (инкрементальное обновление).")
+
+    logger.info(f"{log_prefix} Запуск fetch_market_data()...")
+    klines_data = await fetch_market_data(all_coins, timeframe, **kwargs)
+    logger.info(f"{log_prefix} fetch_market_data() завершён.")
+    return klines_data
+
+
+async def _save_and_check_alerts(
+    timeframe: str,
+    final_data: Dict[str, Any],
+    redis_conn: AsyncRedis,
+    storage: 'AlertStorage',
+    log_prefix: str
+) -> bool:
+    """Сохраняет данные в cache:{timeframe} (и проверяет алерты для 1h). False - ошибка сохранения."""
+    try:
+        logger.info(f"{log_prefix} Сохранение данных в 'cache:{timeframe}'...")
+        await save_to_cache(redis_conn, timeframe, final_data)
+        logger.info(f"{log_prefix} ✅ Данные успешно сохранены в кэш.")
+    except Exception as e:
+        logger.error(f"{log_prefix} ❌ Ошибка при СОХРАНЕНИИ в кэш: {e}", exc_info=True)
+        return False
+
+    # --- ИЗМЕНЕНИЕ №3: "Включаем" проверку алертов (только для 1h) ---
+    if timeframe == '1h':
+        try:
+            logger.info(f"{log_prefix} 🚀 Запуск проверки алертов (Line/VWAP)...")
+            # Передаем 'final_data' (это 'cache_data') и 'storage'
+            await run_alert_checks(final_data, storage)
+        except Exception as e:
+            # (Ловим ошибку здесь, чтобы она не сломала основной цикл воркера)
+            logger.error(f"{log_prefix} 💥 Ошибка во время проверки алертов: {e}", exc_info=True)
+    # --- КОНЕЦ ИЗМЕНЕНИЯ №3 ---
+    return True
+
+
+async def _requeue_with_dependencies(redis_conn: AsyncRedis, timeframes: List[str], log_prefix: str) -> None:
+    """
+    Возвращает неудавшиеся таймфреймы в очередь. Производный таймфрейм
+    уходит одной задачей вместе с базовым ({"timeframes": ["4h", "8h"]}):
+    базовый собирается и сохраняется первым в том же проходе.
+    Остальные - одиночными задачами.
+    """
+    derived = [tf for tf in timeframes if tf in DERIVED_TIMEFRAMES]
+    combined = list(dict.fromkeys([DERIVED_TIMEFRAMES[tf] for tf in derived] + derived))
+
+    for tf in timeframes:
+        if tf not in combined:
+            logger.info(f"{log_prefix} Возвращаю '{tf}' в очередь отдельной задачей...")
+            await redis_conn.rpush(REDIS_TASK_QUEUE_KEY, json.dumps({"timeframe": tf}))
+    if combined:
+        logger.info(f"{log_prefix} Возвращаю {combined} в очередь одной задачей (производный после базового)...")
+        await redis_conn.rpush(REDIS_TASK_QUEUE_KEY, json.dumps({"timeframes": combined}))
+
+
+async def _process_multi_timeframe_task(redis_conn: AsyncRedis, task_payload: Dict[str, Any]) -> bool:
+    """
+    Задача {"timeframes": ["1h", "4h", "8h", ...]} за один проход воркера:
+        - список монет и FR запрашиваются один раз;
+        - таймфреймы, собираемые с бирж, идут параллельно через общие
+          лимитеры и общую HTTP-сессию (время ~ самого медленного таймфрейма);
+        - производные (8h из 4h и т.п.) строятся после сохранения базовых.
+    Неудавшиеся таймфреймы возвращаются в очередь (см. _requeue_with_dependencies).
+    """
+    timeframes = list(dict.fromkeys(task_payload.get("timeframes") or []))
+    log_prefix = f"[WORKER:MULTI:{','.join(timeframes).upper()}]"
+    logger.info(f"{log_prefix} 🔥 Начинаю обработку мульти-таймфреймовой задачи: {task_payload}")
+    start_time = time.time()
+
+    failed: List[str] = []
+
+    unknown = [tf for tf in timeframes if tf not in ALLOWED_CACHE_KEYS]
+    if unknown:
+        logger.error(f"{log_prefix} ❌ Неизвестные таймфреймы пропущены: {unknown}")
+    timeframes = [tf for tf in timeframes if tf in ALLOWED_CACHE_KEYS]
+
+    if 'global_fr' in timeframes:
+        await _run_global_fr_update(log_prefix)
+        timeframes.remove('global_fr')
+    if not timeframes:
+        return True
+
+    try:
+        all_coins = await _get_coins(log_prefix)
+        if not all_coins:
+            return True
+
+        fetched = [tf for tf in timeframes if tf not in DERIVED_TIMEFRAMES]
+        derived = [tf for tf in timeframes if tf in DERIVED_TIMEFRAMES]
+        storage = AlertStorage(redis_conn)
+
+        # 1. FR - один раз на все таймфреймы
+        prefetched_fr_data = None
+        if len(fetched) > 1:
+            logger.info(f"{log_prefix} Общий сбор Funding Rate для {len(fetched)} таймфреймов...")
+            prefetched_fr_data = await fetch_funding_rates(all_coins)
+            if not prefetched_fr_data:
+                logger.warning(f"{log_prefix} ⚠️ Общий FR не получен, каждый таймфрейм соберет FR сам.")
+                prefetched_fr_data = None
+
+        # 2. Таймфреймы с бирж - параллельно
+        results = await asyncio.gather(
+            *(_collect_timeframe(tf, all_coins, redis_conn, f"{log_prefix}[{tf.upper()}]", prefetched_fr_data) for tf in fetched),
+            return_exceptions=True
+        )
+        for tf, result in zip(fetched, results):
+            tf_prefix = f"{log_prefix}[{tf.upper()}]"
+            if isinstance(result, Exception):
+                logger.error(f"{tf_prefix} ❌ Критическая ошибка при сборе данных: {result}", exc_info=result)
+                failed.append(tf)
+            elif not result:
+                logger.warning(f"{tf_prefix} ⚠️ Не получено данных Klines для {tf}.")
+            elif not await _save_and_check_alerts(tf, result, redis_conn, storage, tf_prefix):
+                failed.append(tf)
+
+        # 3. Производные - после сохранения базовых
+        for tf in derived:
+            tf_prefix = f"{log_prefix}[{tf.upper()}]"
+            try:
+                if not await _build_derived_timeframe(tf, DERIVED_TIMEFRAMES[tf], all_coins, redis_conn, tf_prefix):
+                    failed.append(tf)
+            except Exception as e:
+                logger.error(f"{tf_prefix} ❌ Ошибка построения производного таймфрейма: {e}", exc_info=True)
+                failed.append(tf)
+
+        if failed:
+            await _requeue_with_dependencies(redis_conn, failed, log_prefix)
+
+    except Exception as e:
+        logger.error(f"{log_prefix} ❌ Критическая ошибка мульти-таймфреймовой задачи: {e}", exc_info=True)
+        logger.info(f"{log_prefix} Возвращаю задачу обратно в очередь (из-за ошибки)...")
+        await redis_conn.rpush(REDIS_TASK_QUEUE_KEY, json.dumps(task_payload))
+        return True
+
+    logger.info(f"{log_prefix} 🎉 Мульти-таймфреймовая задача обработана за {time.time() - start_time:.2f} сек.")
+    return True
+
+
 async def background_worker():
     """
     Основной асинхронный цикл для обработки очереди задач Redis.
@@ -242,65 +425,141 @@ async def background_worker():
         return
     logger.info("[MAIN_WORKER] ✅ Соединение с Redis установлено.")
     
-    logger.info(f"[MAIN_WORKER] ✅ Воркер готов к работе. Начинаю мониторинг очереди '{REDIS_TASK_QUEUE_KEY}'...")
-    logger.info(f"[MAIN_WORKER] 🔑 Lock Key: '{WORKER_LOCK_KEY}', Lock Value: '{WORKER_LOCK_VALUE}'")
-    logger.info(f"[MAIN_WORKER] ⏱️  Lock Timeout: {WORKER_LOCK_TIMEOUT_SECONDS} сек, Retry Delay: {WORKER_RETRY_DELAY} сек")
-        
-    iteration = 0
-    while True:
-        iteration += 1
-        logger.info(f"\n[MAIN_WORKER] ==================== ИТЕРАЦИЯ #{iteration} ====================")
-        
-        try:
-            # 4. Проверка и установка блокировки
-            logger.info(f"[MAIN_WORKER] 🔍 Проверяю статус блокировки '{WORKER_LOCK_KEY}'...")
-            lock_status_bytes = await redis_conn.get(WORKER_LOCK_KEY)
-            
-            lock_status = lock_status_bytes.decode('utf-8') if lock_status_bytes else None
-            
-            logger.info(f"[MAIN_WORKER] 🔑 Lock Status: {lock_status} (ожидаемое значение: '{WORKER_LOCK_VALUE}')")
-            
-            if lock_status and lock_status == WORKER_LOCK_VALUE:
-                logger.info(f"[MAIN_WORKER] ⏸️  Воркер занят (Lock установлен). Жду {WORKER_RETRY_DELAY} сек...")
-            else:
-                logger.info(f"[MAIN_WORKER] 🟢 Lock свободен. Попытка установить блокировку...")
-                
-                # 5. Установка блокировки и обработка задач
-                lock_set = await redis_conn.set(
-                    WORKER_LOCK_KEY, 
-                    WORKER_LOCK_VALUE, 
-                    ex=WORKER_LOCK_TIMEOUT_SECONDS, 
-                    nx=True
-                )
-                logger.info(f"[MAIN_WORKER] 🔐 Результат установки блокировки (nx=True): {lock_set}")
-                
-                if lock_set:
-                    logger.info("[MAIN_WORKER] ✅ Блокировка установлена успешно! Начинаю обработку очереди...")
-                    
-                    task_processed = await _get_and_process_task_from_queue(redis_conn)
-                    
-                    if not task_processed:
-                        logger.info("[MAIN_WORKER] 📭 Очередь пуста. Удаляю блокировку...")
-                        await redis_conn.delete(WORKER_LOCK_KEY)
-                        logger.info("[MAIN_WORKER] 🔓 Блокировка снята. Ожидаю новых задач...")
-                    else:
-                        logger.info("[MAIN_WORKER] ✅ Задача обработана. Удаляю блокировку...")
-                        await redis_conn.delete(WORKER_LOCK_KEY)
-                        logger.info("[MAIN_WORKER] 🔓 Блокировка снята. Проверяю очередь снова...")
-                        continue 
-
-                else:
-                    logger.info("[MAIN_WORKER] ⚠️  Не удалось установить блокировку (другой процесс успел раньше или она уже существует). Ожидаю.")
+    # 3. Регистрация потребителя надежной очереди (task_queue.py)
+    queue = ReliableTaskQueue(redis_conn)
+    await queue.register()
+    recovered = await queue.recover_orphans()
+    if recovered:
+        logger.warning(f"[MAIN_WORKER] ♻️  Возвращено в очередь задач упавших воркеров: {recovered}")
+    heartbeat_task = asyncio.create_task(queue.heartbeat_forever())
+
+    logger.info(f"[MAIN_WORKER] ✅ Воркер готов к работе. Жду задачи из очереди '{REDIS_TASK_QUEUE_KEY}' (BLMOVE, таймаут {WORKER_QUEUE_BLOCK_TIMEOUT} сек)...")
+    logger.info(f"[MAIN_WORKER] 🔑 Блокировки по типу задачи: '{task_lock_key('<tf>')}', аренда {WORKER_LOCK_LEASE_SECONDS} сек, параллельно до {WORKER_MAX_PARALLEL_TASKS} задач")
+
+    # 4. Задачи разных типов (1h и 4h) выполняются параллельно, не больше WORKER_MAX_PARALLEL_TASKS
+    slots = asyncio.Semaphore(WORKER_MAX_PARALLEL_TASKS)
+    running = set()
 
+    def _on_done(task: asyncio.Task) -> None:
+        running.discard(task)
+        slots.release()
+
+    try:
+        while True:
+            await slots.acquire()
+            try:
+                # Ждем задачу (без опроса: одна блокирующая команда на таймаут)
+                task_json = await queue.take(WORKER_QUEUE_BLOCK_TIMEOUT)
+            except asyncio.CancelledError:
+                slots.release()
+                raise
+            except Exception as e:
+                slots.release()
+                logger.critical(f"[MAIN_WORKER] 💥 КРИТИЧЕСКАЯ ОШИБКА в цикле воркера: {e}", exc_info=True)
+                await asyncio.sleep(WORKER_RETRY_DELAY)
+                continue
+
+            if task_json is None:
+                slots.release()
+                # Простой: заодно подбираем задачи упавших воркеров
+                try:
+                    await queue.recover_orphans()
+                except Exception as e:
+                    logger.error(f"[MAIN_WORKER] Ошибка восстановления задач: {e}", exc_info=True)
+                continue
+
+            task = asyncio.create_task(_run_queued_task(redis_conn, queue, task_json))
+            running.add(task)
+            task.add_done_callback(_on_done)
+    finally:
+        # Остановка (SIGTERM при деплое): неподтвержденные задачи возвращаются в очередь
+        for task in list(running):
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+        heartbeat_task.cancel()
+        try:
+            await queue.unregister()
         except Exception as e:
-            logger.critical(f"[MAIN_WORKER] 💥 КРИТИЧЕСКАЯ ОШИБКА в цикле воркера: {e}", exc_info=True)
-            
-        logger.info(f"[MAIN_WORKER] 💤 Сон {WORKER_RETRY_DELAY} сек перед следующей итерацией...")
-        await asyncio.sleep(WORKER_RETRY_DELAY)
+            logger.error(f"[MAIN_WORKER] Не удалось снять потребителя с учета: {e}")
+
+
+async def _wait_for_dependencies(redis_conn: AsyncRedis, dependencies: List[str], log_prefix: str) -> None:
+    """Ждет завершения выполняющихся задач, от которых зависит задача (8h ждет 4h)."""
+    delays = poll_delays(WORKER_RETRY_DELAY)
+    while True:
+        busy = await running_task_types(redis_conn, dependencies)
+        if not busy:
+            return
+        logger.info(f"{log_prefix} ⏸️  Жду завершения зависимостей {busy}...")
+        await asyncio.sleep(next(delays))
+
+
+async def _run_queued_task(redis_conn: AsyncRedis, queue: ReliableTaskQueue, task_json: str) -> None:
+    """Задача из очереди: зависимости -> блокировки ее типов (с арендой) -> обработка -> ack."""
+    try:
+        task_payload = json.loads(task_json)
+    except json.JSONDecodeError:
+        task_payload = {}
+    types = task_types(task_payload) if isinstance(task_payload, dict) else []
+    log_prefix = f"[MAIN_WORKER:{','.join(types).upper() or '?'}]"
+
+    try:
+        if types:
+            await _wait_for_dependencies(redis_conn, task_dependencies(types), log_prefix)
+            # Блокировка берется, только когда есть работа; heartbeat продлевает аренду
+            async with TaskLease(redis_conn, types, owner=queue.consumer_id).held(WORKER_RETRY_DELAY):
+                await _process_task_json(redis_conn, task_json)
+        else:
+            # (Битую задачу разбирает и отбрасывает _process_task_json)
+            await _process_task_json(redis_conn, task_json)
+    except asyncio.CancelledError:
+        # Задача остается в processing-списке и вернется в очередь (unregister)
+        raise
+    except LeaseLostError as e:
+        # Тип задачи уже выполняет другой воркер - эта копия остановлена до записи кэша
+        logger.error(f"{log_prefix} ⚠️ {e}: задача остановлена и снята.")
+    except Exception as e:
+        # (Повторять задачу, которая роняет обработчик, бессмысленно)
+        logger.error(f"{log_prefix} ❌ Задача {task_json} завершилась ошибкой и снята: {e}", exc_info=True)
+
+    await queue.ack(task_json)
+    logger.info(f"{log_prefix} ✅ Задача обработана, блокировки сняты.")
 
 
 async def main():
     """
     Основная функция для запуска воркера. 
     """
-    await background_worker()
\ No newline at end of file
+    try:
+        await background_worker()
+    finally:
+        # Общая HTTP-сессия к биржам живет, пока жив воркер
+        await close_http_session()
+        cpu_pool.shutdown()
+
+
+def run() -> None:
+    """
+    Точка входа отдельного процесса воркера: python -m worker
+    (API при этом запускается с SERVICE_MODE=api, см. config.py).
+    SIGTERM/SIGINT останавливают воркер и закрывают ресурсы.
+    """
+    async def _run():
+        main_task = asyncio.current_task()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(sig, main_task.cancel)
+            except (NotImplementedError, RuntimeError):
+                pass
+        try:
+            await main()
+        except asyncio.CancelledError:
+            logger.info("[MAIN_WORKER] 🛑 Получен сигнал остановки. Воркер завершен.")
+
+    logger.info(f"[MAIN_WORKER] Запуск отдельного процесса воркера (PID {os.getpid()})...")
+    asyncio.run(_run())
+
+
+if __name__ == "__main__":
+    run()